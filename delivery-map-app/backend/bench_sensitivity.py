@@ -0,0 +1,431 @@
+"""
+Benchmark: leader sensitivity aggregation, row loop vs columnar pipeline.
+
+Builds a synthetic order series (100k rows by default) and price series,
+runs the previous row-at-a-time aggregation and
+``services.sensitivity.summarize_leader_sensitivity``, checks that both
+produce the same records and prints the timings.
+
+Usage: python bench_sensitivity.py [rows]
+"""
+
+import math
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from services.benchmark_index import BenchmarkLocationIndex
+from services.sensitivity import (
+    DEFAULT_DISTRIBUTION_WEIGHT,
+    DEFAULT_LOCAL_WEIGHT,
+    summarize_leader_sensitivity,
+)
+
+
+def legacy_summarize_leader_sensitivity(order_rows, price_series, start_date, end_date, leader_coords=None):
+    """Row-at-a-time implementation kept for comparison."""
+    price_index = BenchmarkLocationIndex(price_series)
+
+    leader_stats: Dict[str, Dict[str, Any]] = {}
+
+    def ensure_stats(leader_id: str, leader_phone: Optional[str], leader_name: Optional[str]) -> Dict[str, Any]:
+        stats = leader_stats.get(leader_id)
+        if stats is None:
+            stats = {
+                "leader_id": leader_id,
+                "leader_phone": leader_phone,
+                "leader_name": leader_name,
+                "total_kg": 0.0,
+                "local_gap_sum": 0.0,
+                "local_weight": 0.0,
+                "local_pct_sum": 0.0,
+                "local_above_volume": 0.0,
+                "local_dates": set(),
+                "distribution_gap_sum": 0.0,
+                "distribution_weight": 0.0,
+                "distribution_pct_sum": 0.0,
+                "distribution_dates": set(),
+                "sources": set(),
+                "products": {},
+                "closest_local_benchmark": {"distance_km": None, "location_group": None, "location": None},
+                "closest_distribution_benchmark": {"distance_km": None, "location_group": None, "location": None},
+            }
+            leader_stats[leader_id] = stats
+        if leader_phone and not stats.get("leader_phone"):
+            stats["leader_phone"] = leader_phone
+        if leader_name and not stats.get("leader_name"):
+            stats["leader_name"] = leader_name
+        return stats
+
+    leader_coords = leader_coords or {}
+
+    for row in order_rows:
+        order_date = row["order_date"]
+        if order_date is None:
+            continue
+        canonical = row["canonical_product"]
+        key = (canonical, order_date)
+        price_entry = price_series.get(key)
+        leader_coord: Optional[Tuple[float, float]] = None
+        leader_phone = row.get("leader_phone")
+        if leader_phone:
+            leader_coord = leader_coords.get(leader_phone)
+        local_price, local_distance, local_location, local_location_group = price_index.select(key, "local", leader_coord)
+        distribution_price, dist_distance, dist_location, dist_location_group = price_index.select(key, "distribution", leader_coord)
+        price_sources = set()
+        if price_entry and "sources" in price_entry:
+            price_sources = price_entry["sources"]
+
+        stats = ensure_stats(row["leader_id"], row["leader_phone"], row["leader_name"])
+        
+        # Track closest benchmark info (keep closest if multiple orders)
+        if local_distance is not None:
+            current_local_dist = stats["closest_local_benchmark"]["distance_km"]
+            if current_local_dist is None or local_distance < current_local_dist:
+                stats["closest_local_benchmark"] = {
+                    "distance_km": local_distance,
+                    "location_group": local_location_group,
+                    "location": local_location,
+                }
+        if dist_distance is not None:
+            current_dist_dist = stats["closest_distribution_benchmark"]["distance_km"]
+            if current_dist_dist is None or dist_distance < current_dist_dist:
+                stats["closest_distribution_benchmark"] = {
+                    "distance_km": dist_distance,
+                    "location_group": dist_location_group,
+                    "location": dist_location,
+                }
+        total_kg = row["total_kg"]
+        unit_price = row["unit_price_etb"]
+
+        stats["total_kg"] += total_kg
+
+        products_map: Dict[str, Dict[str, Any]] = stats["products"]
+        product_stats = products_map.get(canonical)
+        if product_stats is None:
+            product_stats = {
+                "total_kg": 0.0,
+                "local_gap_sum": 0.0,
+                "local_weight": 0.0,
+                "local_pct_sum": 0.0,
+                "local_above_volume": 0.0,
+                "local_dates": set(),
+                "distribution_gap_sum": 0.0,
+                "distribution_weight": 0.0,
+                "distribution_pct_sum": 0.0,
+                "distribution_dates": set(),
+            }
+            products_map[canonical] = product_stats
+        product_stats["total_kg"] += total_kg
+
+        if local_price and local_price > 0:
+            gap = local_price - unit_price
+            stats["local_gap_sum"] += gap * total_kg
+            stats["local_weight"] += total_kg
+            stats["local_pct_sum"] += (gap / local_price) * total_kg
+            if unit_price >= local_price:
+                stats["local_above_volume"] += total_kg
+            stats["local_dates"].add(order_date)
+            product_stats["local_gap_sum"] += gap * total_kg
+            product_stats["local_weight"] += total_kg
+            product_stats["local_pct_sum"] += (gap / local_price) * total_kg
+            if unit_price >= local_price:
+                product_stats["local_above_volume"] += total_kg
+            product_stats["local_dates"].add(order_date)
+
+        if distribution_price and distribution_price > 0:
+            gap = distribution_price - unit_price
+            stats["distribution_gap_sum"] += gap * total_kg
+            stats["distribution_weight"] += total_kg
+            stats["distribution_pct_sum"] += (gap / distribution_price) * total_kg
+            stats["distribution_dates"].add(order_date)
+            product_stats["distribution_gap_sum"] += gap * total_kg
+            product_stats["distribution_weight"] += total_kg
+            product_stats["distribution_pct_sum"] += (gap / distribution_price) * total_kg
+            product_stats["distribution_dates"].add(order_date)
+
+        stats["sources"].update(price_sources)
+
+    by_phone: Dict[str, Dict[str, Any]] = {}
+    by_leader_id: Dict[str, Dict[str, Any]] = {}
+    by_name: Dict[str, Dict[str, Any]] = {}
+
+    for stats in leader_stats.values():
+        local_discount_etb = (
+            stats["local_gap_sum"] / stats["local_weight"] if stats["local_weight"] > 0 else None
+        )
+        local_discount_pct = (
+            stats["local_pct_sum"] / stats["local_weight"] if stats["local_weight"] > 0 else None
+        )
+        distribution_discount_etb = (
+            stats["distribution_gap_sum"] / stats["distribution_weight"]
+            if stats["distribution_weight"] > 0
+            else None
+        )
+        distribution_discount_pct = (
+            stats["distribution_pct_sum"] / stats["distribution_weight"]
+            if stats["distribution_weight"] > 0
+            else None
+        )
+
+        combined_sensitivity = None
+        if local_discount_etb is not None and distribution_discount_etb is not None:
+            combined_sensitivity = (
+                DEFAULT_LOCAL_WEIGHT * local_discount_etb
+                + DEFAULT_DISTRIBUTION_WEIGHT * distribution_discount_etb
+            )
+        elif local_discount_etb is not None:
+            combined_sensitivity = local_discount_etb
+        elif distribution_discount_etb is not None:
+            combined_sensitivity = distribution_discount_etb
+
+        combined_sensitivity_pct = None
+        if (
+            local_discount_pct is not None
+            and distribution_discount_pct is not None
+        ):
+            combined_sensitivity_pct = (
+                DEFAULT_LOCAL_WEIGHT * local_discount_pct
+                + DEFAULT_DISTRIBUTION_WEIGHT * distribution_discount_pct
+            )
+        elif local_discount_pct is not None:
+            combined_sensitivity_pct = local_discount_pct
+        elif distribution_discount_pct is not None:
+            combined_sensitivity_pct = distribution_discount_pct
+
+        pct_volume_at_or_above_local = (
+            (stats["local_above_volume"] / stats["local_weight"]) * 100
+            if stats["local_weight"] > 0
+            else None
+        )
+
+        coverage_days = len(stats["local_dates"] | stats["distribution_dates"])
+
+        product_entries: List[Dict[str, Any]] = []
+        total_leader_volume = stats["total_kg"] or 0.0
+        for product_name, pdata in stats["products"].items():
+            product_total = pdata["total_kg"]
+            if product_total <= 0:
+                continue
+
+            product_local_discount_etb = (
+                pdata["local_gap_sum"] / pdata["local_weight"] if pdata["local_weight"] > 0 else None
+            )
+            product_local_discount_pct = (
+                pdata["local_pct_sum"] / pdata["local_weight"] if pdata["local_weight"] > 0 else None
+            )
+            product_distribution_discount_etb = (
+                pdata["distribution_gap_sum"] / pdata["distribution_weight"]
+                if pdata["distribution_weight"] > 0
+                else None
+            )
+            product_distribution_discount_pct = (
+                pdata["distribution_pct_sum"] / pdata["distribution_weight"]
+                if pdata["distribution_weight"] > 0
+                else None
+            )
+
+            product_combined = None
+            if (
+                product_local_discount_etb is not None
+                and product_distribution_discount_etb is not None
+            ):
+                product_combined = (
+                    DEFAULT_LOCAL_WEIGHT * product_local_discount_etb
+                    + DEFAULT_DISTRIBUTION_WEIGHT * product_distribution_discount_etb
+                )
+            elif product_local_discount_etb is not None:
+                product_combined = product_local_discount_etb
+            elif product_distribution_discount_etb is not None:
+                product_combined = product_distribution_discount_etb
+
+            product_combined_pct = None
+            if (
+                product_local_discount_pct is not None
+                and product_distribution_discount_pct is not None
+            ):
+                product_combined_pct = (
+                    DEFAULT_LOCAL_WEIGHT * product_local_discount_pct
+                    + DEFAULT_DISTRIBUTION_WEIGHT * product_distribution_discount_pct
+                )
+            elif product_local_discount_pct is not None:
+                product_combined_pct = product_local_discount_pct
+            elif product_distribution_discount_pct is not None:
+                product_combined_pct = product_distribution_discount_pct
+
+            volume_share_pct = (
+                (product_total / total_leader_volume) * 100 if total_leader_volume > 0 else 0.0
+            )
+
+            product_entries.append(
+                {
+                    "product_name": product_name,
+                    "total_kg": product_total,
+                    "volume_share_pct": volume_share_pct,
+                    "local_discount_etb": product_local_discount_etb,
+                    "distribution_discount_etb": product_distribution_discount_etb,
+                    "combined_sensitivity_etb": product_combined,
+                    "borderline_discount_etb": product_combined,
+                    "borderline_discount_pct": product_combined_pct,
+                    "local_discount_pct": product_local_discount_pct,
+                    "distribution_discount_pct": product_distribution_discount_pct,
+                    "local_observations": len(pdata["local_dates"]),
+                    "distribution_observations": len(pdata["distribution_dates"]),
+                    "pct_volume_at_or_above_local": (
+                        (pdata["local_above_volume"] / pdata["local_weight"]) * 100
+                        if pdata["local_weight"] > 0
+                        else None
+                    ),
+                }
+            )
+
+        product_entries.sort(key=lambda item: item["total_kg"], reverse=True)
+        top_products = product_entries[:5]
+
+        # Get closest benchmark info (use the one with shortest distance)
+        local_bench = stats.get("closest_local_benchmark") or {}
+        dist_bench = stats.get("closest_distribution_benchmark") or {}
+        local_dist = local_bench.get("distance_km")
+        dist_dist = dist_bench.get("distance_km")
+        
+        if local_dist is not None and dist_dist is not None:
+            # Use whichever is closer
+            closest_benchmark = local_bench if local_dist <= dist_dist else dist_bench
+        elif local_dist is not None:
+            closest_benchmark = local_bench
+        elif dist_dist is not None:
+            closest_benchmark = dist_bench
+        else:
+            closest_benchmark = {}
+        
+        record = {
+            "leader_id": stats["leader_id"],
+            "leader_phone": stats.get("leader_phone"),
+            "leader_name": stats.get("leader_name"),
+            "total_kg": stats["total_kg"],
+            "local_discount_etb": local_discount_etb,
+            "distribution_discount_etb": distribution_discount_etb,
+            "combined_sensitivity_etb": combined_sensitivity,
+            "combined_sensitivity_pct": combined_sensitivity_pct,
+            "local_discount_pct": local_discount_pct,
+            "distribution_discount_pct": distribution_discount_pct,
+            "coverage_days": coverage_days,
+            "local_observations": len(stats["local_dates"]),
+            "distribution_observations": len(stats["distribution_dates"]),
+            "pct_volume_at_or_above_local": pct_volume_at_or_above_local,
+            "source_flags": {
+                "benchmark_api": "benchmark_api" in stats["sources"],
+                "distribution_fallback": "distribution_fallback" in stats["sources"],
+            },
+            "period": {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+            },
+            "product_sensitivity": top_products,
+            "closest_benchmark": {
+                "distance_km": closest_benchmark.get("distance_km"),
+                "location_group": closest_benchmark.get("location_group"),
+                "location": closest_benchmark.get("location"),
+            },
+            "closest_local_benchmark": stats.get("closest_local_benchmark", {}),
+            "closest_distribution_benchmark": stats.get("closest_distribution_benchmark", {}),
+        }
+
+        if record["leader_phone"]:
+            by_phone[record["leader_phone"]] = record
+        if record["leader_name"]:
+            by_name[record["leader_name"].strip().lower()] = record
+        by_leader_id[record["leader_id"]] = record
+
+    return {
+        "by_phone": by_phone,
+        "by_leader_id": by_leader_id,
+        "by_name": by_name,
+    }
+
+
+def build_synthetic_inputs(rows: int, seed: int = 7):
+    rng = random.Random(seed)
+    start = date(2025, 8, 1)
+    days = [start + timedelta(days=offset) for offset in range(90)]
+    products = [f"product-{index}" for index in range(40)]
+    locations = [(8.9 + rng.random() * 0.2, 38.7 + rng.random() * 0.2, f"market-{index}") for index in range(120)]
+
+    price_series: Dict[Tuple[str, date], Dict[str, Any]] = {}
+    for product in products:
+        for day in days:
+            if rng.random() < 0.15:
+                continue
+            entry: Dict[str, Any] = {"sources": {rng.choice(["benchmark_api", "distribution_fallback"])}}
+            for channel, group in (("local", "local-shops"), ("distribution", "farm"), ("sunday", "sunday-market")):
+                points = [
+                    {"price": rng.uniform(40, 120), "lat": lat, "lon": lon, "location": name, "location_group": group}
+                    for lat, lon, name in rng.sample(locations, rng.randint(0, 12))
+                ]
+                avg = sum(p["price"] for p in points) / len(points) if points else (rng.uniform(40, 120) if rng.random() < 0.5 else None)
+                entry[channel] = {"avg": avg, "points": points}
+            price_series[(product, day)] = entry
+
+    leaders = []
+    for index in range(3000):
+        phone = f"+2519{index:08d}" if rng.random() < 0.9 else None
+        name = f"Leader {index}" if rng.random() < 0.95 else None
+        leaders.append((f"leader-{index}", phone, name))
+    leader_coords = {
+        phone: (8.9 + rng.random() * 0.2, 38.7 + rng.random() * 0.2)
+        for _, phone, _ in leaders
+        if phone and rng.random() < 0.8
+    }
+
+    order_rows = []
+    for _ in range(rows):
+        leader_id, phone, name = rng.choice(leaders)
+        order_rows.append(
+            {
+                "order_date": rng.choice(days) if rng.random() > 0.001 else None,
+                "leader_id": leader_id,
+                "leader_phone": phone,
+                "leader_name": name,
+                "canonical_product": rng.choice(products),
+                "total_kg": rng.uniform(0.5, 40),
+                "unit_price_etb": rng.uniform(35, 130),
+            }
+        )
+    return order_rows, price_series, leader_coords, days[0], days[-1]
+
+
+def _same(left: Any, right: Any) -> bool:
+    if isinstance(left, dict) and isinstance(right, dict):
+        return left.keys() == right.keys() and all(_same(left[key], right[key]) for key in left)
+    if isinstance(left, list) and isinstance(right, list):
+        return len(left) == len(right) and all(_same(a, b) for a, b in zip(left, right))
+    if isinstance(left, float) and isinstance(right, float):
+        return math.isclose(left, right, rel_tol=1e-9, abs_tol=1e-9)
+    return left == right
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    order_rows, price_series, leader_coords, start_date, end_date = build_synthetic_inputs(rows)
+    print(f"{len(order_rows):,} order rows, {len(price_series):,} price keys, {len(leader_coords):,} leader coordinates")
+
+    started = time.perf_counter()
+    legacy = legacy_summarize_leader_sensitivity(order_rows, price_series, start_date, end_date, leader_coords)
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    columnar = summarize_leader_sensitivity(order_rows, price_series, start_date, end_date, leader_coords)
+    columnar_seconds = time.perf_counter() - started
+
+    identical = _same(legacy, columnar)
+    print(f"row loop:  {legacy_seconds:.2f}s")
+    print(f"columnar:  {columnar_seconds:.2f}s  ({legacy_seconds / columnar_seconds:.1f}x)")
+    print(f"leaders:   {len(columnar['by_leader_id']):,}  outputs match: {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
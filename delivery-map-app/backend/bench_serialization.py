@@ -0,0 +1,183 @@
+"""
+Benchmark: response serialization, FastAPI default path vs services.fast_json.
+
+Builds synthetic payloads shaped like ``/api/data`` (one 23-field record per
+leader/location) and ``/api/personas/leaders`` (leader records with nested
+benchmark dicts and product sensitivity arrays) from raw values as they come
+out of ClickHouse/pandas: ``date`` objects, numpy scalars and NaN.
+
+The default path cleans every record by hand (``str()`` dates, ``float()``/
+``int()`` casts, NaN to None), then runs ``jsonable_encoder`` and
+``JSONResponse.render``. The fast path hands the raw payload to
+``services.fast_json.dumps``. Both outputs are parsed and compared before the
+timings are printed.
+
+Usage: python bench_serialization.py [rows]
+"""
+
+import json
+import math
+import random
+import sys
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services.fast_json import FAST_JSON_ENABLED, dumps
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+PRODUCTS = ("Tomato", "Onion", "Potato", "Carrot", "Cabbage", "Green Beans", "Avocado", "Banana", "Garlic", "Pepper")
+
+
+def _maybe_nan(rng: random.Random, value: float, rate: float = 0.05) -> float:
+    return float("nan") if rng.random() < rate else value
+
+
+def build_data_payload(rows: int, seed: int = 11) -> Dict[str, Any]:
+    """Raw ``/api/data`` rows: numpy counts, ``date`` last-order days, occasional NaN averages."""
+    rng = random.Random(seed)
+    start = date(2025, 9, 1)
+    records = []
+    for index in range(rows):
+        lat = 8.9 + rng.random() * 0.2
+        lon = 38.7 + rng.random() * 0.2
+        record = {
+            "group_deal_category": rng.choice(("SUPER_GROUPS", "NORMAL_GROUPS")),
+            "group_created_by": f"user-{index}",
+            "leader_name": f"Leader {index}",
+            "leader_phone": f"2519{index:08d}",
+            "delivery_coordinates": f"{lat},{lon}",
+            "delivery_location_name": f"Location {index % 400}",
+            "total_kg": np.float64(rng.random() * 500),
+            "last_order_date": start + timedelta(days=rng.randrange(7)),
+            "products_ordered": np.uint64(rng.randrange(1, 12)),
+            "avg_kg_per_ordering_day": np.float64(_maybe_nan(rng, rng.random() * 80)),
+            "unique_group_members": np.uint64(rng.randrange(1, 40)),
+            "total_groups": np.uint64(rng.randrange(1, 10)),
+        }
+        for day in WEEKDAYS:
+            record[f"{day}_orders"] = np.uint64(rng.randrange(0, 20))
+        record["active_days"] = np.uint64(rng.randrange(1, 8))
+        record["total_orders"] = np.uint64(rng.randrange(1, 100))
+        record["latitude"] = lat
+        record["longitude"] = lon
+        records.append(record)
+    return {"records": records, "count": rows, "window": {"start": start, "end": start + timedelta(days=6)}}
+
+
+def _benchmark(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "distance_km": _maybe_nan(rng, rng.random() * 15, 0.2),
+        "location_group": f"Group {rng.randrange(30)}",
+        "location": f"Market {rng.randrange(120)}",
+    }
+
+
+def build_personas_payload(rows: int, seed: int = 13) -> Dict[str, Any]:
+    """Raw ``/api/personas/leaders`` records with nested benchmarks and product sensitivity arrays."""
+    rng = random.Random(seed)
+    period = {"start_date": date(2025, 4, 1), "end_date": date(2025, 11, 10)}
+    leaders = []
+    for index in range(rows):
+        products = [
+            {
+                "product_name": product,
+                "total_kg": np.float64(rng.random() * 200),
+                "local_discount_etb": np.float64(_maybe_nan(rng, rng.uniform(-10, 10), 0.3)),
+                "distribution_discount_etb": np.float64(_maybe_nan(rng, rng.uniform(-10, 10), 0.3)),
+                "observations": np.int64(rng.randrange(1, 60)),
+            }
+            for product in rng.sample(PRODUCTS, 5)
+        ]
+        combined = _maybe_nan(rng, rng.uniform(-8, 8), 0.2)
+        leaders.append(
+            {
+                "phone": f"2519{index:08d}",
+                "leader_name": f"Leader {index}",
+                "persona": rng.choice(("Hustler", "Community", "Reseller", "Occasional")),
+                "latitude": 8.9 + rng.random() * 0.2,
+                "longitude": 38.7 + rng.random() * 0.2,
+                "combined_sensitivity_etb": np.float64(combined),
+                "local_discount_etb": np.float64(_maybe_nan(rng, rng.uniform(-10, 10), 0.3)),
+                "distribution_discount_etb": np.float64(_maybe_nan(rng, rng.uniform(-10, 10), 0.3)),
+                "local_discount_pct": np.float64(_maybe_nan(rng, rng.uniform(-20, 20), 0.3)),
+                "distribution_discount_pct": np.float64(_maybe_nan(rng, rng.uniform(-20, 20), 0.3)),
+                "sensitivity_coverage_days": np.int64(rng.randrange(0, 120)),
+                "sensitivity_local_observations": np.int64(rng.randrange(0, 120)),
+                "sensitivity_distribution_observations": np.int64(rng.randrange(0, 120)),
+                "pct_volume_at_or_above_local": np.float64(_maybe_nan(rng, rng.random() * 100, 0.3)),
+                "sensitivity_source_flags": {"benchmark_api": rng.random() < 0.8, "distribution_fallback": rng.random() < 0.3},
+                "sensitivity_period": dict(period),
+                "sensitivity_total_kg": np.float64(rng.random() * 2000),
+                "product_sensitivity": products,
+                "closest_local_benchmark": _benchmark(rng),
+                "closest_distribution_benchmark": _benchmark(rng),
+                "price_sensitivity": np.float64(combined),
+            }
+        )
+    return {"leaders": leaders}
+
+
+def _clean(value: Any) -> Any:
+    """What endpoints did per record before: plain Python numbers, NaN/inf to None, ISO date strings."""
+    if isinstance(value, dict):
+        return {key: _clean(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clean(item) for item in value]
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        return value if math.isfinite(value) else None
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def default_path(payload: Dict[str, Any]) -> bytes:
+    return JSONResponse(jsonable_encoder(_clean(payload))).body
+
+
+def fast_path(payload: Dict[str, Any]) -> bytes:
+    return dumps(payload)
+
+
+def _time(fn: Callable[[Dict[str, Any]], bytes], payload: Dict[str, Any], repeat: int) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(name: str, payload: Dict[str, Any], repeat: int) -> bool:
+    default_body = default_path(payload)
+    fast_body = fast_path(payload)
+    identical = json.loads(default_body) == json.loads(fast_body)
+    default_seconds = _time(default_path, payload, repeat)
+    fast_seconds = _time(fast_path, payload, repeat)
+    print(f"{name}")
+    print(f"  default:  {default_seconds * 1000:8.1f} ms  {len(default_body):>12,} bytes")
+    print(f"  fast:     {fast_seconds * 1000:8.1f} ms  {len(fast_body):>12,} bytes  ({default_seconds / fast_seconds:.1f}x)")
+    print(f"  outputs match: {identical}")
+    return identical
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    print(f"orjson fast path: {'on' if FAST_JSON_ENABLED else 'off (json fallback)'}")
+    results: List[bool] = [
+        run(f"/api/data, {rows:,} records", build_data_payload(rows), repeat=5),
+        run(f"/api/personas/leaders, {rows // 4:,} leaders", build_personas_payload(rows // 4), repeat=5),
+    ]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
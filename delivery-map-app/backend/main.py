@@ -1,10 +1,9 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
-import clickhouse_connect
+import hashlib
 import os
 from dotenv import load_dotenv
 import logging
@@ -12,7 +11,6 @@ from typing import List, Dict, Any, Tuple, Union
 import json
 from pathlib import Path
 import csv
-import math
 from typing import Optional
 from datetime import date, datetime, timedelta
 import httpx
@@ -26,10 +24,60 @@ from services.google_sheets import (
     GoogleSheetsNotConfigured,
     is_configured as google_sheets_configured,
 )
-from services.sheet_data import fetch_sheet_metrics, fetch_raw_sheet_data
+from services.snapshots import Snapshot
+from services.sheet_data import (
+    fetch_sheet_metrics,
+    fetch_raw_sheet_data,
+    get_sheet_snapshot,
+    get_sheet_snapshot_store,
+    sheet_configured,
+    summarize_sales_purchases,
+)
 from services.sensitivity import compute_leader_sensitivity, compute_weekly_retention
 from services.b2b_mcp_client import get_b2b_mcp_client, format_date_range
-from services.b2b_purchase_price import get_b2b_purchase_price_service
+from services.b2b_facts import get_b2b_facts
+from services.clickhouse_pool import ClickHousePool
+from services.benchmark_chunks import benchmark_cache_stats
+from services.clickhouse_rollup import (
+    NORMAL_GROUP_DEAL_TYPES,
+    ORDER_ROLLUP_ENABLED,
+    SGL_VOLUME_DEAL_TYPES,
+    SUPER_GROUP_DEAL_TYPES,
+    OrderFactsRollup,
+    order_rollup_for,
+    order_rollup_stats,
+    query_rollup_or_raw,
+    set_active_order_rollup,
+    sql_list,
+)
+from services.coalesce import coalesced, coalescing_stats, get_single_flight
+from services.precompute import PRECOMPUTE_ENABLED, DashboardScheduler
+from services.response_cache import ResponseCache, ResponseCacheMiddleware
+from services.fast_json import FastJSONResponse, FastJSONRoute, dumps
+from services.columnar import ColumnarEncodingMiddleware, negotiated_format
+from services.delivery_points import (
+    WEEKDAYS,
+    DeliveryPoints,
+    get_delivery_points_store,
+    parse_category,
+    parse_days,
+)
+from services.map_clusters import MapClusterIndex, parse_bbox
+from services.density_bins import (
+    DENSITY_DEFAULT_RESOLUTION,
+    DENSITY_MAX_RESOLUTION,
+    DENSITY_MIN_RESOLUTION,
+    density_grid_for,
+)
+from services.consolidation import CONSOLIDATION_RETENTION, build_consolidation
+from services.spatial_coverage import coverage_curve_for, coverage_for
+from services.local_replica import (
+    LOCAL_REPLICA_ENABLED,
+    LocalOrderReplica,
+    order_replica_for,
+    order_replica_stats,
+    set_active_order_replica,
+)
 
 # Load environment variables
 load_dotenv()
@@ -47,6 +95,26 @@ CLICKHOUSE_DATABASE = os.getenv('CLICKHOUSE_DATABASE')
 CLICKHOUSE_SECURE = os.getenv('CLICKHOUSE_SECURE_STR', 'false').lower() == 'true'
 CLICKHOUSE_VERIFY = os.getenv('CLICKHOUSE_VERIFY_STR', 'false').lower() == 'true'
 
+# Shared across all requests; connections are opened lazily and health-checked in the background.
+CLICKHOUSE_POOL = ClickHousePool(
+    connect_kwargs={
+        "host": CLICKHOUSE_HOST,
+        "port": CLICKHOUSE_PORT,
+        "username": CLICKHOUSE_USER,
+        "password": CLICKHOUSE_PASSWORD,
+        "database": CLICKHOUSE_DATABASE,
+        "secure": CLICKHOUSE_SECURE,
+        "verify": CLICKHOUSE_VERIFY,
+        "connect_timeout": 10,
+        "send_receive_timeout": 60,
+    }
+)
+
+# Pre-joined daily order facts, built in ClickHouse by a background thread once the app starts.
+ORDER_ROLLUP = OrderFactsRollup(CLICKHOUSE_POOL)
+# Optional embedded copy of the order facts; dashboards read it when fresh or when ClickHouse is down.
+ORDER_REPLICA = LocalOrderReplica(CLICKHOUSE_POOL)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -54,11 +122,21 @@ async def lifespan(app: FastAPI):
     try:
         logger.info("Starting up: warming up caches...")
         
-        # 1. Warmup ClickHouse connection
-        try:
-            get_clickhouse_client()
-        except Exception as e:
-            logger.warning(f"ClickHouse warmup failed (non-fatal): {e}")
+        # 1. Open the ClickHouse pool and start background health checks
+        if CLICKHOUSE_HOST:
+            try:
+                CLICKHOUSE_POOL.start()
+            except Exception as e:
+                logger.warning(f"ClickHouse warmup failed (non-fatal): {e}")
+            if ORDER_ROLLUP_ENABLED:
+                set_active_order_rollup(ORDER_ROLLUP)
+                ORDER_ROLLUP.start()
+            if LOCAL_REPLICA_ENABLED:
+                try:
+                    ORDER_REPLICA.start()
+                    set_active_order_replica(ORDER_REPLICA)
+                except Exception as e:
+                    logger.warning(f"Local order replica failed to start (non-fatal): {e}")
 
         # 2. Warmup CSV/File caches
         # These are LRU cached, so calling them once loads them into memory
@@ -69,13 +147,31 @@ async def lifespan(app: FastAPI):
         except Exception as e:
              logger.warning(f"File cache warmup failed: {e}")
 
-        # 3. Warmup Google Sheets if enabled
+        # 3. Seed sheet snapshots from their Parquet copies on disk (no network)
+        try:
+            get_sheet_snapshot_store().load_persisted()
+        except Exception as e:
+            logger.warning(f"Failed to load persisted sheet snapshot: {e}")
+
+        # 4. Warmup Google Sheets if enabled
         if GOOGLE_SHEETS_ENABLED:
              try:
-                 GoogleSheetsClient.get_instance()
+                 sheets_client = GoogleSheetsClient.get_instance()
+                 for sheet_id, worksheet, kind in (
+                     (PROCUREMENT_SHEET_ID, PROCUREMENT_SHEET_WORKSHEET, "records"),
+                     (LOCAL_PRICE_SHEET_ID, LOCAL_PRICE_SHEET_WORKSHEET, "records"),
+                     (OPERATIONAL_COST_SHEET_ID, OPERATIONAL_COST_SHEET_WORKSHEET, "records"),
+                     (DAILY_OPERATIONAL_COST_SHEET_ID, DAILY_OPERATIONAL_COST_SHEET_WORKSHEET, "values"),
+                 ):
+                     if sheet_id:
+                         sheets_client.load_persisted(sheet_id, worksheet, kind)
              except Exception as e:
                  logger.warning(f"Failed to initialize Google Sheets client on startup: {e}")
 
+        # 5. Rebuild default dashboard responses in the background
+        if PRECOMPUTE_ENABLED:
+            DASHBOARD_SCHEDULER.start()
+
         logger.info("Startup warmup complete")
     except Exception as e:
         logger.error(f"Startup process encountered an error: {e}")
@@ -83,6 +179,10 @@ async def lifespan(app: FastAPI):
     yield
     
     logger.info("Shutting down")
+    await DASHBOARD_SCHEDULER.close()
+    ORDER_ROLLUP.close()
+    ORDER_REPLICA.close()
+    CLICKHOUSE_POOL.close()
 
 
 # Initialize FastAPI app
@@ -90,8 +190,11 @@ app = FastAPI(
     title="Delivery Map Analytics API",
     description="API for delivery data analytics and mapping",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
+# Plain return values are rendered by FastJSONResponse without the jsonable_encoder pass.
+app.router.route_class = FastJSONRoute
 
 # CORS configuration - allow localhost for development and Vercel domains for production
 ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS', '').split(',') if os.getenv('ALLOWED_ORIGINS') else []
@@ -108,6 +211,21 @@ default_origins = [
 # Combine default and environment origins, filter out empty strings
 cors_origins = [origin.strip() for origin in default_origins + ALLOWED_ORIGINS if origin.strip()]
 
+# Column JSON / Arrow IPC / MessagePack for the row-list endpoints (key = field holding the rows).
+COLUMNAR_ROUTES = {
+    "/api/data": "records",
+    "/api/personas/leaders": "leaders",
+    "/api/products/metrics": "metrics",
+    "/api/margins/daily-real": "daily_margins",
+    "/api/b2b/product-profit-analysis": "products",
+}
+app.add_middleware(ColumnarEncodingMiddleware, routes=COLUMNAR_ROUTES)
+
+# ETags, 304s and gzip/brotli for JSON responses; registered routes keep rendered bodies.
+# Added before CORS so it sits inside it and cached replies still get CORS headers.
+RESPONSE_CACHE = ResponseCache()
+app.add_middleware(ResponseCacheMiddleware, cache=RESPONSE_CACHE)
+
 # Add CORS middleware - allow all origins for now (can be restricted later)
 # Note: allow_credentials must be False when using allow_origins=["*"]
 app.add_middleware(
@@ -118,31 +236,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+def _sheet_version() -> Optional[str]:
+    snapshot = get_sheet_snapshot_store().peek()
+    return snapshot.version if snapshot else None
+
+
+for _path, _snapshot_name in (
+    ("/api/data", "data"),
+    ("/api/map/clusters", "data"),
+    ("/api/map/density", "data"),
+    ("/api/spatial/coverage", "data"),
+    ("/api/spatial/coverage-curve", "data"),
+    ("/api/spatial/consolidation", "data"),
+    ("/api/statistics", "statistics"),
+    ("/api/personas/leaders", "persona-leaders"),
+    ("/api/sgl/retention", "sgl-retention"),
+    *((f"/api/b2b/{route}", f"b2b-{route}") for route in (
+        "business-overview", "profit-margin-analysis", "cost-structure-analysis", "product-profit-analysis",
+        "revenue-trends", "cash-flow-analysis", "customer-profitability", "credit-risk-dashboard",
+        "payment-behavior",
+    )),
+):
+    RESPONSE_CACHE.register(
+        _path,
+        version=lambda name=_snapshot_name: DASHBOARD_SCHEDULER.snapshot_version(name),
+        variant=negotiated_format if _path in COLUMNAR_ROUTES else None,
+    )
+RESPONSE_CACHE.register(
+    "/api/products/metrics",
+    version=lambda: (DASHBOARD_SCHEDULER.snapshot_version("product-metrics"), _sheet_version()),
+    variant=negotiated_format,
+)
+RESPONSE_CACHE.register("/api/dashboard/bootstrap", version=_sheet_version)
+
 # Frontend static files directory (for Docker deployment)
 FRONTEND_DIST = Path(__file__).parent.parent / "frontend" / "dist"
 
-def get_clickhouse_client():
-    """Create a new ClickHouse client instance. Returns None if connection fails."""
-    try:
-        logger.info(f"Connecting to ClickHouse at {CLICKHOUSE_HOST}:{CLICKHOUSE_PORT}")
-        client = clickhouse_connect.get_client(
-            host=CLICKHOUSE_HOST,
-            port=CLICKHOUSE_PORT,
-            username=CLICKHOUSE_USER,
-            password=CLICKHOUSE_PASSWORD,
-            database=CLICKHOUSE_DATABASE,
-            secure=CLICKHOUSE_SECURE,
-            verify=CLICKHOUSE_VERIFY,
-            connect_timeout=10,
-            send_receive_timeout=60
-        )
-        # Test the connection
-        client.query("SELECT 1")
-        logger.info("Successfully connected to ClickHouse")
-        return client
-    except Exception as e:
-        logger.warning(f"Failed to connect to ClickHouse: {str(e)}")
+def get_clickhouse_client() -> Optional[ClickHousePool]:
+    """Return the shared ClickHouse pool. Returns None if ClickHouse is unavailable."""
+    if not CLICKHOUSE_HOST:
         return None
+    if not CLICKHOUSE_POOL.is_available():
+        logger.warning("ClickHouse pool is unhealthy; skipping query")
+        return None
+    return CLICKHOUSE_POOL
 
 def parse_coordinates(coord_str: str) -> tuple[float, float]:
     """Parse POINT(lon lat) format coordinates."""
@@ -196,6 +334,13 @@ BENCHMARK_LOCATION_GROUPS = [
 ]
 
 SELLING_PRICE_LOOKBACK_DAYS = int(os.getenv("SELLING_PRICE_LOOKBACK_DAYS", "30"))
+
+# Identical dashboard loads (several tabs, or the parallel DataStore requests) share one computation;
+# finished results are reused for COALESCE_RESULT_TTL_SECONDS.
+COALESCE_RESULT_TTL_SECONDS = float(os.getenv("COALESCE_RESULT_TTL_SECONDS", "5"))
+DASHBOARD_FLIGHT = get_single_flight("dashboard", ttl_seconds=COALESCE_RESULT_TTL_SECONDS)
+# Default-window responses of the heavy endpoints, rebuilt out of band (see services/precompute.py).
+DASHBOARD_SCHEDULER = DashboardScheduler()
 FORECAST_WEEKLY_LOOKBACK_WEEKS = int(os.getenv("FORECAST_WEEKLY_LOOKBACK_WEEKS", "26"))
 
 APRIL_DATA_START = date(2025, 4, 1)
@@ -225,89 +370,190 @@ def _get_week_window_datetimes(reference: Optional[date] = None) -> tuple[date,
     return week_start, week_end, start_dt, end_dt
 
 
+# ---------- Order facts rollup queries ----------
+# Same result columns as the raw-table queries they replace; windows are inclusive days.
+
+
+def _delivery_rollup_query(table: str, week_start: date, week_end: date) -> str:
+    return f"""
+    SELECT
+        CASE
+            WHEN deal_type IN ({sql_list(SUPER_GROUP_DEAL_TYPES)}) THEN 'SUPER_GROUPS'
+            WHEN deal_type IN ({sql_list(NORMAL_GROUP_DEAL_TYPES)}) THEN 'NORMAL_GROUPS'
+            ELSE deal_type
+        END                                                 AS group_deal_category,
+        leader_id                                           AS group_created_by,
+        any(r.leader_name)                                  AS leader_name,
+        any(r.leader_phone)                                 AS leader_phone,
+        location_coordinates                                AS delivery_coordinates,
+        location_name                                       AS delivery_location_name,
+        sum(r.total_kg)                                     AS total_kg,
+        max(order_day)                                      AS last_order_date,
+        uniqExact(product_id)                               AS products_ordered,
+        sum(r.total_kg) / nullIf(uniqExact(order_day), 0)   AS avg_kg_per_ordering_day,
+        uniqExactMerge(members_state)                       AS unique_group_members,
+        uniqExactMerge(groups_state)                        AS total_groups,
+        sumIf(order_rows, toDayOfWeek(order_day) = 1)       AS monday_orders,
+        sumIf(order_rows, toDayOfWeek(order_day) = 2)       AS tuesday_orders,
+        sumIf(order_rows, toDayOfWeek(order_day) = 3)       AS wednesday_orders,
+        sumIf(order_rows, toDayOfWeek(order_day) = 4)       AS thursday_orders,
+        sumIf(order_rows, toDayOfWeek(order_day) = 5)       AS friday_orders,
+        sumIf(order_rows, toDayOfWeek(order_day) = 6)       AS saturday_orders,
+        sumIf(order_rows, toDayOfWeek(order_day) = 7)       AS sunday_orders,
+        uniqExact(order_day)                                AS active_days,
+        sum(order_count)                                    AS total_orders
+    FROM {table} AS r
+    WHERE order_day >= toDate('{week_start.isoformat()}')
+      AND order_day <= toDate('{week_end.isoformat()}')
+      AND location_known = 1
+      AND leader_known = 1
+    GROUP BY group_deal_category, leader_id, location_coordinates, location_name
+    ORDER BY group_deal_category ASC, unique_group_members DESC
+    """
+
+
+def _statistics_rollup_query(table: str, week_start: date, week_end: date) -> str:
+    return f"""
+    SELECT
+        sum(order_count) AS total_orders,
+        sumIf(order_count, deal_type IN ({sql_list(NORMAL_GROUP_DEAL_TYPES)})) AS normal_group_orders,
+        sumIf(order_count, deal_type IN ({sql_list(SUPER_GROUP_DEAL_TYPES)})) AS super_group_orders,
+        uniqExact(location_id) AS unique_locations
+    FROM {table}
+    WHERE order_day >= toDate('{week_start.isoformat()}')
+      AND order_day <= toDate('{week_end.isoformat()}')
+      AND location_known = 1
+    """
+
+
+def _product_metrics_rollup_query(table: str, week_start: date, week_end: date) -> str:
+    return f"""
+    SELECT
+        any(coalesce(r.product_name, toString(r.product_id))) AS product_name,
+        product_id,
+        sum(total_kg) AS total_volume_kg,
+        sumIf(total_kg, deal_type IN ({sql_list(SGL_VOLUME_DEAL_TYPES)})) AS sgl_volume_kg,
+        total_volume_kg - sgl_volume_kg AS normal_volume_kg,
+        round(sum(positive_price_sum) / nullIf(sum(positive_price_rows), 0), 2) AS avg_selling_price,
+        argMaxMerge(latest_price_state) AS latest_selling_price,
+        sum(revenue_etb) AS total_revenue_etb,
+        sum(r.order_count) AS order_count
+    FROM {table} AS r
+    WHERE order_day >= toDate('{week_start.isoformat()}')
+      AND order_day <= toDate('{week_end.isoformat()}')
+    GROUP BY product_id
+    HAVING total_volume_kg > 0
+    ORDER BY total_volume_kg DESC
+    """
+
+
+def _latest_selling_price_rollup_query(table: str, period_start: date) -> str:
+    return f"""
+    SELECT
+        any(coalesce(r.product_name, r.product_local_name, '')) AS product_name,
+        argMaxMerge(latest_price_state) AS latest_selling_price
+    FROM {table} AS r
+    WHERE order_day >= toDate('{period_start.isoformat()}')
+    GROUP BY product_id
+    HAVING latest_selling_price > 0 AND product_name != ''
+    """
 
 
-@lru_cache(maxsize=8)
-def _get_sales_purchase_summary_for_window(start_key: str, end_key: str) -> dict[str, dict[str, Any]]:
+def _delivery_replica_query(week_start: date, week_end: date) -> str:
+    """DuckDB version of the /api/data query over the local order replica."""
+    return f"""
+    SELECT
+        CASE
+            WHEN deal_type IN ({sql_list(SUPER_GROUP_DEAL_TYPES)}) THEN 'SUPER_GROUPS'
+            WHEN deal_type IN ({sql_list(NORMAL_GROUP_DEAL_TYPES)}) THEN 'NORMAL_GROUPS'
+            ELSE deal_type
+        END                                                 AS group_deal_category,
+        leader_id                                           AS group_created_by,
+        any_value(leader_name)                              AS leader_name,
+        any_value(leader_phone)                             AS leader_phone,
+        location_coordinates                                AS delivery_coordinates,
+        location_name                                       AS delivery_location_name,
+        sum(quantity)                                       AS total_kg,
+        max(order_day)                                      AS last_order_date,
+        count(DISTINCT product_id)                          AS products_ordered,
+        sum(quantity) / nullif(count(DISTINCT order_day), 0) AS avg_kg_per_ordering_day,
+        count(DISTINCT user_id)                             AS unique_group_members,
+        count(DISTINCT group_id)                            AS total_groups,
+        count(*) FILTER (WHERE weekday = 1)                 AS monday_orders,
+        count(*) FILTER (WHERE weekday = 2)                 AS tuesday_orders,
+        count(*) FILTER (WHERE weekday = 3)                 AS wednesday_orders,
+        count(*) FILTER (WHERE weekday = 4)                 AS thursday_orders,
+        count(*) FILTER (WHERE weekday = 5)                 AS friday_orders,
+        count(*) FILTER (WHERE weekday = 6)                 AS saturday_orders,
+        count(*) FILTER (WHERE weekday = 7)                 AS sunday_orders,
+        count(DISTINCT order_day)                           AS active_days,
+        count(DISTINCT order_id)                            AS total_orders
+    FROM order_facts
+    WHERE order_day BETWEEN DATE '{week_start.isoformat()}' AND DATE '{week_end.isoformat()}'
+      AND location_id IS NOT NULL
+      AND leader_known
+    GROUP BY group_deal_category, leader_id, location_coordinates, location_name
+    ORDER BY group_deal_category ASC, unique_group_members DESC
+    """
+
+
+def _statistics_replica_query(week_start: date, week_end: date) -> str:
+    return f"""
+    SELECT
+        count(DISTINCT order_id) AS total_orders,
+        count(DISTINCT order_id) FILTER (WHERE deal_type IN ({sql_list(NORMAL_GROUP_DEAL_TYPES)})) AS normal_group_orders,
+        count(DISTINCT order_id) FILTER (WHERE deal_type IN ({sql_list(SUPER_GROUP_DEAL_TYPES)})) AS super_group_orders,
+        count(DISTINCT location_id) AS unique_locations
+    FROM order_facts
+    WHERE order_day BETWEEN DATE '{week_start.isoformat()}' AND DATE '{week_end.isoformat()}'
+      AND location_id IS NOT NULL
+    """
+
+
+def _weekly_summary_rollup_query(table: str, week_start: date, week_end: date) -> str:
+    return f"""
+    SELECT sum(r.order_count) AS total_orders, sum(r.total_kg) AS total_kg
+    FROM {table} AS r
+    WHERE order_day >= toDate('{week_start.isoformat()}')
+      AND order_day <= toDate('{week_end.isoformat()}')
+    """
+
+
+
+
+_SALES_SUMMARY_CACHE: dict[tuple[str, str, str], dict[str, dict[str, Any]]] = {}
+_SALES_SUMMARY_CACHE_SIZE = 8
+
+
+def _get_sales_purchase_summary_for_window(
+    start_key: str, end_key: str, snapshot: Optional[Snapshot] = None
+) -> dict[str, dict[str, Any]]:
+    """Per-product sales/purchase summary, memoized per sheet snapshot version and window."""
     try:
         week_start = datetime.strptime(start_key, "%Y-%m-%d").date()
         week_end = datetime.strptime(end_key, "%Y-%m-%d").date()
     except ValueError:
         week_start, week_end = _get_week_window()
 
-    df = fetch_raw_sheet_data()
-    summary: dict[str, dict[str, Any]] = {}
-    if df is None or df.empty:
-        return summary
-
-    for _, row in df.iterrows():
-        raw_name = str(row.get("Product Name", "")).strip()
-        if not raw_name:
-            continue
-        canonical = _normalize_product_name(raw_name)
-        if not canonical:
-            continue
-        
-        entry_date = row['date_dt'].date()
-        purchase_price = float(row.get("PurchasingPrice", 0.0))
-        selling_price = float(row.get("price", 0.0))
-        quantity = float(row.get("final_volume_kg", 0.0))
+    if snapshot is None:
+        snapshot = get_sheet_snapshot()
+    if snapshot is None or snapshot.data is None or snapshot.data.empty:
+        return {}
 
-        info = summary.setdefault(
-            canonical,
-            {
-                "latest_purchase_price": None,
-                "latest_purchase_date": None,
-                "latest_selling_price": None,
-                "latest_selling_date": None,
-                "purchase_sum": 0.0,
-                "purchase_count": 0,
-                "selling_sum": 0.0,
-                "selling_count": 0,
-                "total_quantity": 0.0,
-                "weekly_quantity": 0.0,
-                "weekly_purchase_cost": 0.0,
-                "weekly_sales_revenue": 0.0,
-            },
-        )
+    cache_key = (snapshot.version, week_start.isoformat(), week_end.isoformat())
+    cached = _SALES_SUMMARY_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
 
-        if purchase_price > 0:
-            info["purchase_sum"] += purchase_price
-            info["purchase_count"] += 1
-            latest_date = info["latest_purchase_date"]
-            if latest_date is None or entry_date > latest_date:
-                info["latest_purchase_price"] = purchase_price
-                info["latest_purchase_date"] = entry_date
-
-        if selling_price > 0:
-            info["selling_sum"] += selling_price
-            info["selling_count"] += 1
-            latest_sell_date = info["latest_selling_date"]
-            if latest_sell_date is None or entry_date > latest_sell_date:
-                info["latest_selling_price"] = selling_price
-                info["latest_selling_date"] = entry_date
-
-        info["total_quantity"] += quantity
-
-        if week_start <= entry_date <= week_end:
-            info["weekly_quantity"] += quantity
-            if purchase_price > 0:
-                info["weekly_purchase_cost"] += purchase_price * quantity
-            if selling_price > 0:
-                info["weekly_sales_revenue"] += selling_price * quantity
-
-    for info in summary.values():
-        info["avg_purchase_price"] = (
-            info["purchase_sum"] / info["purchase_count"] if info["purchase_count"] else None
-        )
-        info["avg_selling_price"] = (
-            info["selling_sum"] / info["selling_count"] if info["selling_count"] else None
-        )
-        info.pop("purchase_sum", None)
-        info.pop("purchase_count", None)
-        info.pop("selling_sum", None)
-        info.pop("selling_count", None)
+    summary = summarize_sales_purchases(snapshot.data, week_start, week_end, _load_product_alias_index())
 
+    # Entries for older sheet versions can never be hit again.
+    stale = [key for key in _SALES_SUMMARY_CACHE if key[0] != snapshot.version]
+    for key in stale:
+        _SALES_SUMMARY_CACHE.pop(key, None)
+    if len(_SALES_SUMMARY_CACHE) >= _SALES_SUMMARY_CACHE_SIZE:
+        _SALES_SUMMARY_CACHE.pop(next(iter(_SALES_SUMMARY_CACHE)), None)
+    _SALES_SUMMARY_CACHE[cache_key] = summary
     return summary
 
 
@@ -378,13 +624,6 @@ def _parse_float(value: Any, default: float = 0.0) -> float:
         return default
 
 
-def _sanitize_numeric_fields(record: dict[str, Any]) -> None:
-    """Replace NaN or infinity float values with 0.0 to keep JSON serialization safe."""
-    for key, value in record.items():
-        if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
-            record[key] = 0.0
-
-
 def _parse_datetime(value: Any) -> Optional[datetime]:
     if value is None:
         return None
@@ -445,6 +684,7 @@ def _load_products_from_xlsx(path: Path) -> Optional[list[str]]:
         return None
 
 
+@coalesced(DASHBOARD_FLIGHT, key=lambda: ("benchmark-map", datetime.utcnow().date().isoformat()))
 def _fetch_benchmark_price_map() -> dict[str, dict[str, Any]]:
     """Fetch benchmark prices from Supabase function and aggregate by product."""
     if not BENCHMARK_API_URL or not BENCHMARK_API_KEY:
@@ -528,6 +768,7 @@ def _fetch_benchmark_price_map() -> dict[str, dict[str, Any]]:
     return price_map
 
 
+@coalesced(DASHBOARD_FLIGHT, key=lambda: ("latest-selling-prices", date.today().isoformat()))
 def _fetch_latest_selling_price_map() -> dict[str, float]:
     """
     Query ClickHouse for the latest selling price per product within a recent window.
@@ -538,34 +779,37 @@ def _fetch_latest_selling_price_map() -> dict[str, float]:
         logger.warning("ClickHouse unavailable for latest selling prices")
         return {}
 
+    period_start = date.today() - timedelta(days=SELLING_PRICE_LOOKBACK_DAYS)
+    rollup = order_rollup_for(period_start, date.today())
+    rollup_query = _latest_selling_price_rollup_query(rollup.table, period_start) if rollup is not None else None
     query = f"""
-    WITH toDateTime(now()) - INTERVAL {SELLING_PRICE_LOOKBACK_DAYS} DAY AS period_start
-    SELECT
-        any(coalesce(pn.name, pn_fallback.local_name, '')) AS product_name,
-        argMax(gd.group_price, o.created_at) AS latest_selling_price
-    FROM orders AS o
-    JOIN groups_carts AS gc ON o.groups_carts_id = gc.id
-    JOIN groups AS g ON gc.group_id = g.id
-    JOIN group_deals AS gd ON g.group_deals_id = gd.id
-    LEFT JOIN products AS prod ON gd.product_id = prod.id
-    LEFT JOIN product_names AS pn ON prod.name_id = pn.id
-    LEFT JOIN product_name_localizations AS pn_fallback ON pn.id = pn_fallback.product_name_id
-        AND pn_fallback.language_code = 'en'
-    WHERE o._peerdb_is_deleted = 0
-      AND gc._peerdb_is_deleted = 0
-      AND g._peerdb_is_deleted = 0
-      AND gd._peerdb_is_deleted = 0
-      AND o.status = 'COMPLETED' AND o.deleted_at IS NULL
-      AND gc.status = 'COMPLETED' AND gc.deleted_at IS NULL
-      AND g.status = 'COMPLETED' AND g.deleted_at IS NULL
-      AND o.created_at >= period_start
-    GROUP BY gd.product_id
-    HAVING latest_selling_price > 0 AND product_name != ''
-    """
+        WITH toDateTime(now()) - INTERVAL {SELLING_PRICE_LOOKBACK_DAYS} DAY AS period_start
+        SELECT
+            any(coalesce(pn.name, pn_fallback.local_name, '')) AS product_name,
+            argMax(gd.group_price, o.created_at) AS latest_selling_price
+        FROM orders AS o
+        JOIN groups_carts AS gc ON o.groups_carts_id = gc.id
+        JOIN groups AS g ON gc.group_id = g.id
+        JOIN group_deals AS gd ON g.group_deals_id = gd.id
+        LEFT JOIN products AS prod ON gd.product_id = prod.id
+        LEFT JOIN product_names AS pn ON prod.name_id = pn.id
+        LEFT JOIN product_name_localizations AS pn_fallback ON pn.id = pn_fallback.product_name_id
+            AND pn_fallback.language_code = 'en'
+        WHERE o._peerdb_is_deleted = 0
+          AND gc._peerdb_is_deleted = 0
+          AND g._peerdb_is_deleted = 0
+          AND gd._peerdb_is_deleted = 0
+          AND o.status = 'COMPLETED' AND o.deleted_at IS NULL
+          AND gc.status = 'COMPLETED' AND gc.deleted_at IS NULL
+          AND g.status = 'COMPLETED' AND g.deleted_at IS NULL
+          AND o.created_at >= period_start
+        GROUP BY gd.product_id
+        HAVING latest_selling_price > 0 AND product_name != ''
+        """
 
     try:
         price_map: dict[str, float] = {}
-        result = client.query(query)
+        result = query_rollup_or_raw(client, rollup_query, query, "latest selling prices")
         for row in result.named_results():
             product_name = row.get("product_name")
             price = row.get("latest_selling_price")
@@ -702,6 +946,21 @@ def _fetch_latest_weekly_summary() -> Optional[dict[str, Any]]:
         return None
 
     week_start, week_end, week_start_dt, week_end_dt = _get_week_window_datetimes()
+    rollup = order_rollup_for(week_start, week_end)
+    if rollup is not None:
+        try:
+            result = client.query(_weekly_summary_rollup_query(rollup.table, week_start, week_end))
+            for row in result.named_results():
+                return {
+                    "week_start": week_start.isoformat(),
+                    "week_end": week_end.isoformat(),
+                    "orders": int(row.get("total_orders") or 0),
+                    "total_kg": float(row.get("total_kg") or 0),
+                    "source": "clickhouse",
+                }
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Failed to fetch weekly summary from the order rollup, using raw tables: %s", exc)
+
     start_str = week_start_dt.strftime("%Y-%m-%d %H:%M:%S")
     end_str = week_end_dt.strftime("%Y-%m-%d %H:%M:%S")
 
@@ -830,6 +1089,7 @@ def compute_product_shares(allowed_products: set[str]) -> dict:
     return {"shares": shares, "overall_sum": grand_total}
 
 
+@coalesced(DASHBOARD_FLIGHT, key=lambda: ("local-shop-prices",))
 def load_local_shop_price_map() -> dict[str, dict[str, Any]]:
     """Return latest local shop price per product from Google Sheets or CSV."""
     benchmark_price_map = _fetch_benchmark_price_map()
@@ -904,18 +1164,24 @@ def load_local_shop_price_map() -> dict[str, dict[str, Any]]:
     return price_map
 
 
+@coalesced(DASHBOARD_FLIGHT, key=lambda: ("product-costs",))
 def load_product_costs_data() -> list[dict[str, Any]]:
+    return _build_product_costs(get_sheet_snapshot())
+
+
+def _build_product_costs(snapshot: Optional[Snapshot]) -> list[dict[str, Any]]:
+    """Product cost rows priced from the given sheet snapshot."""
     latest_prices = _fetch_latest_selling_price_map()
     
     # Use sheet window to ensure consistency
-    sheet_result = fetch_sheet_metrics()
+    sheet_result = fetch_sheet_metrics(snapshot)
     if sheet_result and sheet_result.get("window"):
         week_start = sheet_result["window"]["start"]
         week_end = sheet_result["window"]["end"]
     else:
         week_start, week_end = _get_week_window()
 
-    sales_summary = _get_sales_purchase_summary_for_window(week_start.isoformat(), week_end.isoformat())
+    sales_summary = _get_sales_purchase_summary_for_window(week_start.isoformat(), week_end.isoformat(), snapshot)
 
     def _summary_for(product_name: str) -> Optional[dict[str, Any]]:
         canonical = _normalize_product_name(product_name)
@@ -1010,6 +1276,7 @@ def load_product_costs_data() -> list[dict[str, Any]]:
     return products
 
 
+@coalesced(DASHBOARD_FLIGHT, key=lambda: ("operational-costs",))
 def load_operational_costs_data() -> list[dict[str, Any]]:
     sheet_records = _fetch_sheet_records(OPERATIONAL_COST_SHEET_ID, OPERATIONAL_COST_SHEET_WORKSHEET)
     if sheet_records:
@@ -1081,11 +1348,9 @@ def load_daily_operational_costs_data() -> list[dict[str, Any]]:
     
     try:
         client = GoogleSheetsClient.get_instance()
-        spreadsheet = client._client.open_by_key(DAILY_OPERATIONAL_COST_SHEET_ID)
-        ws = spreadsheet.worksheet(DAILY_OPERATIONAL_COST_SHEET_WORKSHEET)
         
         # Get all values as raw data (handles duplicate headers)
-        all_values = ws.get_all_values()
+        all_values = client.get_worksheet_values(DAILY_OPERATIONAL_COST_SHEET_ID, DAILY_OPERATIONAL_COST_SHEET_WORKSHEET)
         if not all_values or len(all_values) < 2:
             logger.warning("Daily operational costs sheet is empty or has no data rows")
             return []
@@ -1244,12 +1509,35 @@ def load_daily_operational_costs_data() -> list[dict[str, Any]]:
         return []
 
 
-def load_product_metrics_data(return_window: bool = False) -> Union[List[Dict[str, Any]], Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]]:
-    """Aggregate product-level sales metrics from Google Sheets (primary) or ClickHouse/CSV fallback."""
+@coalesced(
+    DASHBOARD_FLIGHT,
+    key=lambda return_window=False: ("product-metrics", bool(return_window), date.today().isoformat()),
+)
+def load_product_metrics_data(
+    return_window: bool = False,
+) -> Union[List[Dict[str, Any]], Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]], List[str]]]:
+    """
+    Aggregate product-level sales metrics from Google Sheets (primary) or ClickHouse/CSV fallback.
+
+    With ``return_window`` also returns the sheet window and the sources that were unavailable.
+    """
+    metrics, sheet_window, degraded = _build_product_metrics(get_sheet_snapshot())
+    if return_window:
+        return metrics, sheet_window, degraded
+    return metrics
+
+
+def _build_product_metrics(
+    snapshot: Optional[Snapshot],
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]], List[str]]:
+    """Product metrics, the sheet window they cover and the unavailable sources, from the given sheet snapshot."""
     metrics: list[dict[str, Any]] = []
+    degraded: list[str] = []
+    if sheet_configured() and snapshot is None:
+        degraded.append("sheet unavailable")
     
     # 1. Fetch Primary Data from Google Sheets
-    sheet_result = fetch_sheet_metrics()
+    sheet_result = fetch_sheet_metrics(snapshot)
     sheet_metrics = sheet_result.get("metrics", []) if sheet_result else []
     sheet_window = sheet_result.get("window") if sheet_result else None
     
@@ -1296,68 +1584,71 @@ def load_product_metrics_data(return_window: bool = False) -> Union[List[Dict[st
 
     week_start_str = week_start_dt.strftime("%Y-%m-%d %H:%M:%S")
     week_end_str = week_end_dt.strftime("%Y-%m-%d %H:%M:%S")
-    sales_summary = _get_sales_purchase_summary_for_window(week_start.isoformat(), week_end.isoformat())
+    sales_summary = _get_sales_purchase_summary_for_window(week_start.isoformat(), week_end.isoformat(), snapshot)
 
     client = get_clickhouse_client()
     if not client:
         logger.warning("ClickHouse unavailable for product metrics")
+        degraded.append("database unavailable")
     
     if client:
         try:
+            rollup = order_rollup_for(week_start, week_end)
+            rollup_query = _product_metrics_rollup_query(rollup.table, week_start, week_end) if rollup is not None else None
             query = f"""
-        SELECT
-            any(
-                coalesce(
-                    pn.name,
-                    toString(gd.product_id)
-                )
-            ) AS product_name,
-            gd.product_id AS product_id,
-            sum(gc.quantity) AS total_volume_kg,
-            sumIf(
-                gc.quantity,
-                gd.deal_type IN (
-                    'SUPER_GROUP',
-                    'SUPER_GROUP_FLASH_SALE',
-                    'SUPER_GROUP_REGULAR',
-                    'SUPER_GROUP_RECURRENT'
-                )
-            ) AS sgl_volume_kg,
-            sum(gc.quantity)
-            - sumIf(
-                gc.quantity,
-                gd.deal_type IN (
-                    'SUPER_GROUP',
-                    'SUPER_GROUP_FLASH_SALE',
-                    'SUPER_GROUP_REGULAR',
-                    'SUPER_GROUP_RECURRENT'
-                )
-            ) AS normal_volume_kg,
-            round(avgIf(gd.group_price, gd.group_price > 0), 2) AS avg_selling_price,
-            argMax(gd.group_price, o.created_at) AS latest_selling_price,
-            sum(gc.quantity * gd.group_price) AS total_revenue_etb,
-            countDistinct(o.id) AS order_count
-        FROM orders AS o
-        JOIN groups_carts AS gc ON o.groups_carts_id = gc.id
-        JOIN groups AS g ON gc.group_id = g.id
-        JOIN group_deals AS gd ON g.group_deals_id = gd.id
-        LEFT JOIN products AS p ON gd.product_id = p.id
-        LEFT JOIN product_names AS pn ON pn.id = p.name_id
-        WHERE
-            o._peerdb_is_deleted = 0
-            AND gc._peerdb_is_deleted = 0
-            AND g._peerdb_is_deleted = 0
-            AND gd._peerdb_is_deleted = 0
-            AND o.status = 'COMPLETED' AND o.deleted_at IS NULL
-            AND gc.status = 'COMPLETED' AND gc.deleted_at IS NULL
-            AND g.status = 'COMPLETED' AND g.deleted_at IS NULL
-            AND o.created_at >= toDateTime('{week_start_str}')
-            AND o.created_at < toDateTime('{week_end_str}')
-        GROUP BY gd.product_id
-        HAVING total_volume_kg > 0
-        ORDER BY total_volume_kg DESC
-        """
-            result = client.query(query)
+            SELECT
+                any(
+                    coalesce(
+                        pn.name,
+                        toString(gd.product_id)
+                    )
+                ) AS product_name,
+                gd.product_id AS product_id,
+                sum(gc.quantity) AS total_volume_kg,
+                sumIf(
+                    gc.quantity,
+                    gd.deal_type IN (
+                        'SUPER_GROUP',
+                        'SUPER_GROUP_FLASH_SALE',
+                        'SUPER_GROUP_REGULAR',
+                        'SUPER_GROUP_RECURRENT'
+                    )
+                ) AS sgl_volume_kg,
+                sum(gc.quantity)
+                - sumIf(
+                    gc.quantity,
+                    gd.deal_type IN (
+                        'SUPER_GROUP',
+                        'SUPER_GROUP_FLASH_SALE',
+                        'SUPER_GROUP_REGULAR',
+                        'SUPER_GROUP_RECURRENT'
+                    )
+                ) AS normal_volume_kg,
+                round(avgIf(gd.group_price, gd.group_price > 0), 2) AS avg_selling_price,
+                argMax(gd.group_price, o.created_at) AS latest_selling_price,
+                sum(gc.quantity * gd.group_price) AS total_revenue_etb,
+                countDistinct(o.id) AS order_count
+            FROM orders AS o
+            JOIN groups_carts AS gc ON o.groups_carts_id = gc.id
+            JOIN groups AS g ON gc.group_id = g.id
+            JOIN group_deals AS gd ON g.group_deals_id = gd.id
+            LEFT JOIN products AS p ON gd.product_id = p.id
+            LEFT JOIN product_names AS pn ON pn.id = p.name_id
+            WHERE
+                o._peerdb_is_deleted = 0
+                AND gc._peerdb_is_deleted = 0
+                AND g._peerdb_is_deleted = 0
+                AND gd._peerdb_is_deleted = 0
+                AND o.status = 'COMPLETED' AND o.deleted_at IS NULL
+                AND gc.status = 'COMPLETED' AND gc.deleted_at IS NULL
+                AND g.status = 'COMPLETED' AND g.deleted_at IS NULL
+                AND o.created_at >= toDateTime('{week_start_str}')
+                AND o.created_at < toDateTime('{week_end_str}')
+            GROUP BY gd.product_id
+            HAVING total_volume_kg > 0
+            ORDER BY total_volume_kg DESC
+            """
+            result = query_rollup_or_raw(client, rollup_query, query, "product metrics")
             for row in result.named_results():
                 product_name = row.get("product_name")
                 if not product_name:
@@ -1379,16 +1670,14 @@ def load_product_metrics_data(return_window: bool = False) -> Union[List[Dict[st
                     "total_revenue_etb": _parse_float(row.get("total_revenue_etb")),
                     "order_count": int(row.get("order_count", 0)),
                 }
-                _sanitize_numeric_fields(entry)
                 metrics.append(entry)
             
             if metrics:
                 _apply_volume_ratio_overrides(metrics)
-                if return_window:
-                    return metrics, sheet_window
-                return metrics
+                return metrics, sheet_window, degraded
         except Exception as exc:  # pylint: disable=broad-except
             logger.error("Failed to load product metrics from ClickHouse: %s", exc)
+            degraded.append("database query failed")
 
     # Fallback to CSV data (SGL orders) if ClickHouse unavailable and not in Sheet
     # NOTE: This fallback is disabled because it lacks date filtering and causes massive inflation
@@ -1396,9 +1685,7 @@ def load_product_metrics_data(return_window: bool = False) -> Union[List[Dict[st
     if False and not SGL_ORDER_PRICE_CSV.exists():
         if metrics:
              _apply_volume_ratio_overrides(metrics)
-        if return_window:
-            return metrics, sheet_window
-        return metrics
+        return metrics, sheet_window, degraded
 
     if False: # Disabled CSV fallback
         try:
@@ -1447,7 +1734,6 @@ def load_product_metrics_data(return_window: bool = False) -> Union[List[Dict[st
                 entry["avg_selling_price"] = (
                     entry["total_revenue_etb"] / volume if volume else 0.0
                 )
-                _sanitize_numeric_fields(entry)
                 metrics.append(entry)
                 # Add to existing set so we don't double add in next fallback step
                 existing_products.add(_normalize_product_name(entry["product_name"]).lower())
@@ -1475,12 +1761,9 @@ def load_product_metrics_data(return_window: bool = False) -> Union[List[Dict[st
             "total_revenue_etb": info.get("weekly_sales_revenue") or 0.0,
             "order_count": int(round(weekly_qty)),
         }
-        _sanitize_numeric_fields(entry)
         metrics.append(entry)
 
-    if return_window:
-        return metrics, sheet_window
-    return metrics
+    return metrics, sheet_window, degraded
 
 @app.get("/")
 async def root():
@@ -1492,6 +1775,17 @@ async def root():
 @app.get("/api/health")
 async def health_check():
     """Detailed health check with database connectivity."""
+    stats = {
+        "clickhouse_pool": CLICKHOUSE_POOL.stats(),
+        "sheet_snapshot": get_sheet_snapshot_store().stats(),
+        "benchmark_cache": benchmark_cache_stats(),
+        "order_rollup": order_rollup_stats(),
+        "order_replica": order_replica_stats(),
+        "coalescing": coalescing_stats(),
+        "precompute": DASHBOARD_SCHEDULER.stats(),
+        "response_cache": RESPONSE_CACHE.stats(),
+        "delivery_points": get_delivery_points_store().stats(),
+    }
     try:
         client = get_clickhouse_client()
         if client:
@@ -1499,14 +1793,16 @@ async def health_check():
             return {
                 "status": "healthy",
                 "database": "connected",
-                "message": "API and database are operational"
+                "message": "API and database are operational",
+                **stats,
             }
         else:
             # API is healthy even if database is disconnected
             return {
                 "status": "healthy",
                 "database": "disconnected",
-                "message": "API is operational (database unavailable)"
+                "message": "API is operational (database unavailable)",
+                **stats,
             }
     except Exception as e:
         # API is still healthy even if database check fails
@@ -1514,10 +1810,12 @@ async def health_check():
             "status": "healthy",
             "database": "disconnected",
             "message": "API is operational (database unavailable)",
-            "error": str(e)
+            "error": str(e),
+            **stats,
         }
 
 @app.get("/api/data")
+@DASHBOARD_SCHEDULER.precomputed("data")
 def get_delivery_data():
     """Fetch delivery data from ClickHouse."""
     client = get_clickhouse_client()
@@ -1526,14 +1824,16 @@ def get_delivery_data():
     week_start, week_end, week_start_dt, week_end_dt = _get_week_window_datetimes()
     
     # Override with sheet window if available to ensure consistency across all sources
-    sheet_result = fetch_sheet_metrics()
+    sheet_snapshot = get_sheet_snapshot()
+    sheet_result = fetch_sheet_metrics(sheet_snapshot)
     if sheet_result and sheet_result.get("window"):
         week_start = sheet_result["window"]["start"]
         week_end = sheet_result["window"]["end"]
         week_start_dt = datetime.combine(week_start, datetime.min.time())
         week_end_dt = datetime.combine(week_end + timedelta(days=1), datetime.min.time())
     
-    if not client:
+    replica = order_replica_for(client)
+    if not client and replica is None:
         logger.warning("ClickHouse unavailable for delivery data")
         return {
             "records": [],
@@ -1542,7 +1842,16 @@ def get_delivery_data():
                 "start": week_start.isoformat(),
                 "end": week_end.isoformat(),
             },
+            "degraded": "database unavailable",
         }
+
+    # Reasons this payload may be incomplete; the precompute scheduler refuses to snapshot it.
+    # An unconfigured sheet or an empty week from healthy sources is a valid result.
+    degraded = []
+    if sheet_configured() and sheet_snapshot is None:
+        degraded.append("sheet unavailable")
+    if replica is not None and replica.stale:
+        degraded.append("database unavailable; local replica is stale")
     
     try:
         
@@ -1557,81 +1866,91 @@ def get_delivery_data():
         start_str = week_start_dt.strftime("%Y-%m-%d %H:%M:%S")
         end_str = week_end_dt.strftime("%Y-%m-%d %H:%M:%S")
         
-        # Your SQL query
-        query = f"""
-        SELECT
-            /* Existing bucket */
-            CASE
-                WHEN gd.deal_type IN ('SUPER_GROUP', 'SUPER_GROUP_FLASH_SALE') THEN 'SUPER_GROUPS'
-                WHEN gd.deal_type IN ('NORMAL', 'FLASH_SALE') THEN 'NORMAL_GROUPS'
-                ELSE gd.deal_type
-            END AS group_deal_category,
-
-            /* Leader identity */
-            g.created_by                                   AS group_created_by,
-            any(u.name)                                    AS leader_name,
-            any(u.phone)                                   AS leader_phone,
-
-            /* Delivery info */
-            dl.location                                    AS delivery_coordinates,
-            dl.name                                        AS delivery_location_name,
-
-            /* New metrics you asked for */
-            sum(gc.quantity)                               AS total_kg,                       -- total KG in the period
-            toDate(max(o.created_at))                      AS last_order_date,                -- last order date
-            countDistinct(gd.product_id)                   AS products_ordered,               -- number of distinct products ordered
-            sum(gc.quantity) / nullIf(countDistinct(toDate(o.created_at)), 0) 
-                                                           AS avg_kg_per_ordering_day,        -- average KG per active ordering day
-
-            /* Existing metrics */
-            countDistinct(gc.user_id)                      AS unique_group_members,
-            countDistinct(g.id)                            AS total_groups,
-
-            countIf(toDayOfWeek(o.created_at) = 1)         AS monday_orders,
-            countIf(toDayOfWeek(o.created_at) = 2)         AS tuesday_orders,
-            countIf(toDayOfWeek(o.created_at) = 3)         AS wednesday_orders,
-            countIf(toDayOfWeek(o.created_at) = 4)         AS thursday_orders,
-            countIf(toDayOfWeek(o.created_at) = 5)         AS friday_orders,
-            countIf(toDayOfWeek(o.created_at) = 6)         AS saturday_orders,
-            countIf(toDayOfWeek(o.created_at) = 7)         AS sunday_orders,
-
-            countDistinct(toDate(o.created_at))            AS active_days,
-            countDistinct(o.id)                            AS total_orders
-
-        FROM orders AS o
-        JOIN groups_carts AS gc
-          ON o.groups_carts_id = gc.id
-        JOIN groups AS g
-          ON gc.group_id = g.id
-        JOIN group_deals AS gd
-          ON g.group_deals_id = gd.id
-        JOIN delivery_location AS dl
-          ON o.location_id = dl.id
-        JOIN users u
-          ON u.id = g.created_by
-        WHERE
-          o._peerdb_is_deleted = 0
-          AND gc._peerdb_is_deleted = 0
-          AND g._peerdb_is_deleted = 0
-          AND gd._peerdb_is_deleted = 0
-          /* (Optional but recommended) Keep only completed, non-deleted facts */
-          AND o.status = 'COMPLETED'      AND o.deleted_at IS NULL
-          AND gc.status = 'COMPLETED'     AND gc.deleted_at IS NULL
-          AND g.status = 'COMPLETED'      AND g.deleted_at IS NULL
-          /* Date range */
-          AND o.created_at >= toDateTime('{start_str}')
-          AND o.created_at <  toDateTime('{end_str}')
-        GROUP BY
-          group_deal_category,
-          g.created_by,
-          dl.location,
-          dl.name
-        ORDER BY
-          group_deal_category ASC,
-          unique_group_members DESC
-        """
-        
-        result = client.query(query)
+        rollup = order_rollup_for(week_start, week_end)
+        rollup_query = None
+        if replica is not None:
+            query = _delivery_replica_query(week_start, week_end)
+        elif rollup is not None:
+            rollup_query = _delivery_rollup_query(rollup.table, week_start, week_end)
+        if replica is None:
+            # Your SQL query
+            query = f"""
+            SELECT
+                /* Existing bucket */
+                CASE
+                    WHEN gd.deal_type IN ('SUPER_GROUP', 'SUPER_GROUP_FLASH_SALE') THEN 'SUPER_GROUPS'
+                    WHEN gd.deal_type IN ('NORMAL', 'FLASH_SALE') THEN 'NORMAL_GROUPS'
+                    ELSE gd.deal_type
+                END AS group_deal_category,
+
+                /* Leader identity */
+                g.created_by                                   AS group_created_by,
+                any(u.name)                                    AS leader_name,
+                any(u.phone)                                   AS leader_phone,
+
+                /* Delivery info */
+                dl.location                                    AS delivery_coordinates,
+                dl.name                                        AS delivery_location_name,
+
+                /* New metrics you asked for */
+                sum(gc.quantity)                               AS total_kg,                       -- total KG in the period
+                toDate(max(o.created_at))                      AS last_order_date,                -- last order date
+                countDistinct(gd.product_id)                   AS products_ordered,               -- number of distinct products ordered
+                sum(gc.quantity) / nullIf(countDistinct(toDate(o.created_at)), 0) 
+                                                               AS avg_kg_per_ordering_day,        -- average KG per active ordering day
+
+                /* Existing metrics */
+                countDistinct(gc.user_id)                      AS unique_group_members,
+                countDistinct(g.id)                            AS total_groups,
+
+                countIf(toDayOfWeek(o.created_at) = 1)         AS monday_orders,
+                countIf(toDayOfWeek(o.created_at) = 2)         AS tuesday_orders,
+                countIf(toDayOfWeek(o.created_at) = 3)         AS wednesday_orders,
+                countIf(toDayOfWeek(o.created_at) = 4)         AS thursday_orders,
+                countIf(toDayOfWeek(o.created_at) = 5)         AS friday_orders,
+                countIf(toDayOfWeek(o.created_at) = 6)         AS saturday_orders,
+                countIf(toDayOfWeek(o.created_at) = 7)         AS sunday_orders,
+
+                countDistinct(toDate(o.created_at))            AS active_days,
+                countDistinct(o.id)                            AS total_orders
+
+            FROM orders AS o
+            JOIN groups_carts AS gc
+              ON o.groups_carts_id = gc.id
+            JOIN groups AS g
+              ON gc.group_id = g.id
+            JOIN group_deals AS gd
+              ON g.group_deals_id = gd.id
+            JOIN delivery_location AS dl
+              ON o.location_id = dl.id
+            JOIN users u
+              ON u.id = g.created_by
+            WHERE
+              o._peerdb_is_deleted = 0
+              AND gc._peerdb_is_deleted = 0
+              AND g._peerdb_is_deleted = 0
+              AND gd._peerdb_is_deleted = 0
+              /* (Optional but recommended) Keep only completed, non-deleted facts */
+              AND o.status = 'COMPLETED'      AND o.deleted_at IS NULL
+              AND gc.status = 'COMPLETED'     AND gc.deleted_at IS NULL
+              AND g.status = 'COMPLETED'      AND g.deleted_at IS NULL
+              /* Date range */
+              AND o.created_at >= toDateTime('{start_str}')
+              AND o.created_at <  toDateTime('{end_str}')
+            GROUP BY
+              group_deal_category,
+              g.created_by,
+              dl.location,
+              dl.name
+            ORDER BY
+              group_deal_category ASC,
+              unique_group_members DESC
+            """
+        
+        if replica is not None:
+            result = replica.query(query)
+        else:
+            result = query_rollup_or_raw(client, rollup_query, query, "delivery data")
         
         # Convert to list of dictionaries
         data = []
@@ -1647,7 +1966,7 @@ def get_delivery_data():
                 "delivery_coordinates": row[4],
                 "delivery_location_name": row[5],
                 "total_kg": float(row[6]) if row[6] is not None else 0.0,
-                "last_order_date": str(row[7]) if row[7] is not None else None,
+                "last_order_date": row[7],
                 "products_ordered": int(row[8]),
                 "avg_kg_per_ordering_day": float(row[9]) if row[9] is not None else 0.0,
                 "unique_group_members": int(row[10]),
@@ -1665,7 +1984,7 @@ def get_delivery_data():
                 "longitude": lon
             })
         
-        return {
+        payload = {
             "records": data,
             "count": len(data),
             "window": {
@@ -1673,16 +1992,181 @@ def get_delivery_data():
                 "end": week_end.isoformat(),
             },
         }
+        if degraded:
+            payload["degraded"] = "; ".join(degraded)
+        return payload
         
     except Exception as e:
         logger.error(f"Error fetching data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch data: {str(e)}")
 
+
+def _delivery_points() -> DeliveryPoints:
+    """Columnar delivery points of the current ``/api/data`` snapshot (built once per version)."""
+    latest = DASHBOARD_SCHEDULER.latest("data")
+    if latest is None:
+        # No precomputed snapshot yet: render the default window once, shared by concurrent map requests.
+        body = DASHBOARD_FLIGHT.do(("delivery-data-body",), lambda: dumps(get_delivery_data.__wrapped__()))
+        latest = (hashlib.sha1(body).hexdigest()[:16], body)
+    return get_delivery_points_store().load(*latest)
+
+
+@app.get("/api/map/clusters")
+def get_map_clusters(
+    bbox: Optional[str] = Query(None, description="Viewport as minLon,minLat,maxLon,maxLat (default: everything)"),
+    zoom: float = Query(12, ge=0, le=24, description="Map zoom level"),
+    category: Optional[str] = Query(None, description="all, sgl/SUPER_GROUPS or normal/NORMAL_GROUPS"),
+    day: Optional[str] = Query(None, description="Comma-separated weekdays; orders are summed over these days"),
+):
+    """
+    Delivery locations clustered for the map viewport.
+
+    Clusters carry pre-aggregated orders, kg, members and SGL/normal counts;
+    cells with a single location, and every location above the cluster zoom
+    range, come back as points with their ``/api/data`` record.
+    """
+    try:
+        viewport = parse_bbox(bbox)
+        group = parse_category(category)
+        days = parse_days(day)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    points = _delivery_points()
+    clusters = points.derived("map-clusters", MapClusterIndex)
+    return {
+        "version": points.version,
+        "bbox": list(viewport) if viewport else None,
+        "category": group or "all",
+        "days": [WEEKDAYS[weekday] for weekday in days],
+        "max_cluster_zoom": clusters.max_zoom,
+        **clusters.query(zoom, viewport, group, days),
+    }
+
+
+@app.get("/api/map/density")
+def get_map_density(
+    resolution: int = Query(
+        DENSITY_DEFAULT_RESOLUTION, ge=DENSITY_MIN_RESOLUTION, le=DENSITY_MAX_RESOLUTION,
+        description="Geohash length of the cells (4 ~ 39 km, 6 ~ 1.2 x 0.6 km, 8 ~ 38 x 19 m)",
+    ),
+    bbox: Optional[str] = Query(None, description="Viewport as minLon,minLat,maxLon,maxLat (default: everything)"),
+    category: Optional[str] = Query(None, description="all, sgl/SUPER_GROUPS or normal/NORMAL_GROUPS"),
+    day: Optional[str] = Query(None, description="Comma-separated weekdays; orders are summed over these days"),
+):
+    """
+    Delivery density binned into geohash cells, for heatmaps.
+
+    Each cell carries its locations, orders, kg, members, SGL share of orders
+    and orders per weekday. Cells are built once per data snapshot and
+    resolution; whole-week and single-weekday totals are precomputed.
+    """
+    try:
+        viewport = parse_bbox(bbox)
+        group = parse_category(category)
+        days = parse_days(day)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    points = _delivery_points()
+    grid = density_grid_for(points, resolution)
+    return {
+        "version": points.version,
+        "bbox": list(viewport) if viewport else None,
+        "category": group or "all",
+        "days": [WEEKDAYS[weekday] for weekday in days],
+        **grid.query(group, days, viewport),
+    }
+
+
+SPATIAL_MAX_RADIUS_KM = float(os.getenv("SPATIAL_MAX_RADIUS_KM", "25"))
+
+
+@app.get("/api/spatial/coverage")
+def get_spatial_coverage(
+    radius_km: float = Query(1.0, gt=0, description="Radius around each SGL location in km"),
+    day: Optional[str] = Query(None, description="Comma-separated weekdays; orders are summed over these days"),
+    assignments: bool = Query(False, description="Include each covered normal location's nearest SGL location"),
+):
+    """
+    Normal-group locations, orders and kg within ``radius_km`` of each SGL leader.
+
+    Leaders are sorted by their own orders; a normal location near several of a
+    leader's locations counts once. ``network`` has the deduplicated totals over
+    all leaders. Computed once per data snapshot, radius and weekday filter.
+    """
+    if radius_km > SPATIAL_MAX_RADIUS_KM:
+        raise HTTPException(status_code=400, detail=f"radius_km must be at most {SPATIAL_MAX_RADIUS_KM:g}")
+    try:
+        days = parse_days(day)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    points = _delivery_points()
+    coverage = coverage_for(points, radius_km, days)
+    payload = {"version": points.version, **coverage}
+    if not assignments:
+        payload.pop("assignments")
+    return payload
+
+
+@app.get("/api/spatial/coverage-curve")
+def get_spatial_coverage_curve(
+    step_km: float = Query(0.1, gt=0, description="Spacing of the sampled radii in km"),
+    top: int = Query(15, ge=0, description="Leaders with a curve, by their own orders (0 = all)"),
+    radius_km: Optional[float] = Query(None, gt=0, description="Also return every leader's coverage at this radius"),
+):
+    """
+    Cumulative normal-group coverage (locations, orders, kg, members) as a function of radius.
+
+    Curves are sampled every ``step_km`` up to the curve's ``max_radius_km`` for the
+    network (nearest SGL) and the ``top`` SGL leaders. The curve is built once per
+    data snapshot; any radius is then a lookup.
+    """
+    points = _delivery_points()
+    curve = coverage_curve_for(points)
+    try:
+        payload = curve.payload(step_km, top or None, radius_km)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"version": points.version, **payload}
+
+
+@app.get("/api/spatial/consolidation")
+def get_spatial_consolidation(
+    radius_km: float = Query(0.5, gt=0, description="Largest distance from a normal location to its SGL in km"),
+    capacity_orders: Optional[float] = Query(None, ge=0, description="Most orders per SGL leader, own orders included"),
+    capacity_kg: Optional[float] = Query(None, ge=0, description="Most kg per SGL leader, own kg included"),
+    top: int = Query(0, ge=0, description="Only the largest SGL leaders by their own orders (0 = all)"),
+    day: Optional[str] = Query(None, description="Comma-separated weekdays; orders are summed over these days"),
+    retention: float = Query(CONSOLIDATION_RETENTION, ge=0, le=1, description="Share of moved orders kept"),
+    assignments: bool = Query(False, description="Include each assigned normal location and its SGL location"),
+):
+    """
+    Consolidation scenario: normal-group locations assigned to nearby SGL leaders.
+
+    Each normal location within ``radius_km`` of a leader goes to the nearest
+    leader that still has capacity. Returns every leader's load, the network
+    totals, the projected cost, incentive and revenue deltas of the moved orders
+    and the warehouse km x kg before and after.
+    """
+    if radius_km > SPATIAL_MAX_RADIUS_KM:
+        raise HTTPException(status_code=400, detail=f"radius_km must be at most {SPATIAL_MAX_RADIUS_KM:g}")
+    try:
+        days = parse_days(day)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    points = _delivery_points()
+    payload = build_consolidation(points, radius_km, capacity_orders, capacity_kg, top or None, days, retention)
+    if not assignments:
+        payload.pop("assignments")
+    return {"version": points.version, **payload}
+
+
 @app.get("/api/statistics")
+@DASHBOARD_SCHEDULER.precomputed("statistics")
 def get_statistics():
     """Get aggregated statistics."""
     client = get_clickhouse_client()
-    if not client:
+    replica = order_replica_for(client)
+    if not client and replica is None:
         logger.warning("ClickHouse unavailable for statistics")
         return {
             "totalRecords": 0,
@@ -1698,7 +2182,8 @@ def get_statistics():
                 "maxLat": 0.0,
                 "minLon": 0.0,
                 "maxLon": 0.0
-            }
+            },
+            "degraded": "database unavailable",
         }
     
     try:
@@ -1715,34 +2200,44 @@ def get_statistics():
         start_str = week_start_dt.strftime("%Y-%m-%d %H:%M:%S")
         end_str = week_end_dt.strftime("%Y-%m-%d %H:%M:%S")
         
-        # Simple statistics query - just return basic counts
-        stats_query = f"""
-        SELECT
-            COUNT(DISTINCT o.id) AS total_orders,
-            COUNT(DISTINCT CASE 
-                WHEN gd.deal_type IN ('NORMAL', 'FLASH_SALE') THEN o.id 
-            END) AS normal_group_orders,
-            COUNT(DISTINCT CASE 
-                WHEN gd.deal_type IN ('SUPER_GROUP', 'SUPER_GROUP_FLASH_SALE') THEN o.id 
-            END) AS super_group_orders,
-            COUNT(DISTINCT dl.id) AS unique_locations
-        FROM orders AS o
-        JOIN groups_carts AS gc ON o.groups_carts_id = gc.id
-        JOIN groups AS g ON gc.group_id = g.id
-        JOIN group_deals AS gd ON g.group_deals_id = gd.id
-        JOIN delivery_location AS dl ON o.location_id = dl.id
-        WHERE o._peerdb_is_deleted = 0
-          AND gc._peerdb_is_deleted = 0
-          AND g._peerdb_is_deleted = 0
-          AND gd._peerdb_is_deleted = 0
-          AND o.status = 'COMPLETED' AND o.deleted_at IS NULL
-          AND gc.status = 'COMPLETED' AND gc.deleted_at IS NULL
-          AND g.status = 'COMPLETED' AND g.deleted_at IS NULL
-          AND o.created_at >= toDateTime('{start_str}')
-          AND o.created_at <  toDateTime('{end_str}')
-        """
-        
-        result = client.query(stats_query)
+        rollup = order_rollup_for(week_start, week_end)
+        rollup_query = None
+        if replica is not None:
+            stats_query = _statistics_replica_query(week_start, week_end)
+        elif rollup is not None:
+            rollup_query = _statistics_rollup_query(rollup.table, week_start, week_end)
+        if replica is None:
+            # Simple statistics query - just return basic counts
+            stats_query = f"""
+            SELECT
+                COUNT(DISTINCT o.id) AS total_orders,
+                COUNT(DISTINCT CASE 
+                    WHEN gd.deal_type IN ('NORMAL', 'FLASH_SALE') THEN o.id 
+                END) AS normal_group_orders,
+                COUNT(DISTINCT CASE 
+                    WHEN gd.deal_type IN ('SUPER_GROUP', 'SUPER_GROUP_FLASH_SALE') THEN o.id 
+                END) AS super_group_orders,
+                COUNT(DISTINCT dl.id) AS unique_locations
+            FROM orders AS o
+            JOIN groups_carts AS gc ON o.groups_carts_id = gc.id
+            JOIN groups AS g ON gc.group_id = g.id
+            JOIN group_deals AS gd ON g.group_deals_id = gd.id
+            JOIN delivery_location AS dl ON o.location_id = dl.id
+            WHERE o._peerdb_is_deleted = 0
+              AND gc._peerdb_is_deleted = 0
+              AND g._peerdb_is_deleted = 0
+              AND gd._peerdb_is_deleted = 0
+              AND o.status = 'COMPLETED' AND o.deleted_at IS NULL
+              AND gc.status = 'COMPLETED' AND gc.deleted_at IS NULL
+              AND g.status = 'COMPLETED' AND g.deleted_at IS NULL
+              AND o.created_at >= toDateTime('{start_str}')
+              AND o.created_at <  toDateTime('{end_str}')
+            """
+        
+        if replica is not None:
+            result = replica.query(stats_query)
+        else:
+            result = query_rollup_or_raw(client, rollup_query, stats_query, "statistics")
         row = result.result_rows[0]
         
         total_orders = int(row[0])
@@ -1750,7 +2245,7 @@ def get_statistics():
         super_orders = int(row[2])
         unique_locs = int(row[3])
         
-        return {
+        payload = {
             "totalRecords": unique_locs,
             "normalGroups": normal_orders,
             "superGroups": super_orders,
@@ -1770,6 +2265,9 @@ def get_statistics():
                 "end": week_end.isoformat(),
             },
         }
+        if replica is not None and replica.stale:
+            payload["degraded"] = "database unavailable; local replica is stale"
+        return payload
         
     except Exception as e:
         logger.error(f"Error fetching statistics: {str(e)}")
@@ -2008,6 +2506,7 @@ def _parse_iso_date(value: Optional[str], default: date) -> date:
 
 
 @app.get("/api/personas/leaders")
+@DASHBOARD_SCHEDULER.precomputed("persona-leaders", interval=1800, start_date=None, end_date=None)
 def get_persona_leaders(
     start_date: Optional[str] = Query(
         None, description="Inclusive start date (YYYY-MM-DD) for sensitivity analysis"
@@ -2034,29 +2533,37 @@ def get_persona_leaders(
     sensitivity_by_leader_id: Dict[str, Dict[str, Any]] = {}
     sensitivity_by_name: Dict[str, Dict[str, Any]] = {}
 
-    client = None
     leader_coords_map = _load_leader_coordinate_map()
 
+    # Reasons the sensitivity metrics may be missing or partial; the precompute scheduler refuses to snapshot them.
+    degraded = []
     try:
         client = get_clickhouse_client()
-        if client:
-            sensitivity_maps = compute_leader_sensitivity(client, analysis_start, analysis_end, leader_coords_map)
+        replica = order_replica_for(client)
+        if replica is not None and replica.stale:
+            logger.warning(
+                "ClickHouse unavailable; leader sensitivity served from a replica last synced at %s and not cached",
+                replica.last_sync,
+            )
+            degraded.append("database unavailable; local replica is stale")
+        if client or replica is not None:
+            sensitivity_maps, complete = compute_leader_sensitivity(
+                client, analysis_start, analysis_end, leader_coords_map
+            )
+            if not complete:
+                degraded.append("sensitivity inputs incomplete")
             sensitivity_by_phone = sensitivity_maps.get("by_phone", {})
             sensitivity_by_leader_id = sensitivity_maps.get("by_leader_id", {})
             sensitivity_by_name = sensitivity_maps.get("by_name", {})
         else:
             logger.warning("ClickHouse client unavailable; continuing without sensitivity metrics")
+            degraded.append("database unavailable")
     except HTTPException:
         # Propagate upstream errors (likely ClickHouse configuration issues)
         raise
     except Exception as exc:  # pylint: disable=broad-except
         logger.warning("Failed to compute sensitivity metrics; continuing without them: %s", exc)
-    finally:
-        if client is not None:
-            try:
-                client.close()  # type: ignore[attr-defined]
-            except Exception:  # pylint: disable=broad-except
-                pass
+        degraded.append("sensitivity computation failed")
 
     try:
         import csv
@@ -2155,10 +2662,14 @@ def get_persona_leaders(
 
         enriched_leaders.append(leader)
 
-    return {"leaders": enriched_leaders}
+    payload = {"leaders": enriched_leaders}
+    if degraded:
+        payload["degraded"] = "; ".join(degraded)
+    return payload
 
 
 @app.get("/api/sgl/retention")
+@DASHBOARD_SCHEDULER.precomputed("sgl-retention", interval=1800, start_date=None, end_date=None, curve_weeks=8)
 def get_sgl_retention(
     start_date: Optional[str] = Query(
         None, description="Inclusive start date (YYYY-MM-DD) for retention analysis"
@@ -2166,6 +2677,9 @@ def get_sgl_retention(
     end_date: Optional[str] = Query(
         None, description="Inclusive end date (YYYY-MM-DD) for retention analysis"
     ),
+    curve_weeks: int = Query(
+        8, ge=0, le=26, description="Weeks of retention curve per cohort week (0 disables curves)"
+    ),
 ):
     default_start = date(2025, 4, 4)  # first Friday in April 2025
     _, current_week_end = _get_week_window()
@@ -2177,7 +2691,8 @@ def get_sgl_retention(
     leader_coords_map = _load_leader_coordinate_map()
 
     client = get_clickhouse_client()
-    if not client:
+    replica = order_replica_for(client)
+    if not client and replica is None:
         logger.warning("ClickHouse unavailable for SGL retention")
         return {
             "products": [],
@@ -2185,31 +2700,56 @@ def get_sgl_retention(
                 "start": analysis_start.isoformat(),
                 "end": analysis_end.isoformat(),
             },
-            "message": "Database unavailable"
+            "message": "Database unavailable",
+            "degraded": "database unavailable",
         }
     
     try:
-        retention = compute_weekly_retention(client, analysis_start, analysis_end, leader_coords_map)
+        retention, complete = compute_weekly_retention(
+            client, analysis_start, analysis_end, leader_coords_map, curve_weeks=curve_weeks
+        )
     except Exception as exc:  # pylint: disable=broad-except
         logger.error("Failed to compute SGL retention: %s", exc)
         raise HTTPException(status_code=500, detail="Failed to compute SGL retention data") from exc
 
-    return {
+    degraded = []
+    response = {
         "products": retention,
         "window": {
             "start": analysis_start.isoformat(),
             "end": analysis_end.isoformat(),
         },
     }
+    if replica is not None and replica.stale:
+        # Cohorts from a lagging replica are not cached; tell the caller how old they are.
+        last_sync = datetime.fromtimestamp(replica.last_sync).isoformat() if replica.last_sync else None
+        response["message"] = "Database unavailable; served from local replica"
+        response["replica_last_sync"] = last_sync
+        degraded.append("database unavailable; local replica is stale")
+    if not complete:
+        degraded.append("retention inputs incomplete")
+    if degraded:
+        # The precompute scheduler refuses to snapshot payloads built on missing or stale inputs.
+        response["degraded"] = "; ".join(degraded)
+    return response
 
 
 # ---------- Cost Management Endpoints ----------
 
 
 @app.get("/api/products/metrics")
+@DASHBOARD_SCHEDULER.precomputed("product-metrics", interval=600)
 def get_product_metrics():
     """Return product sales metrics for profitability and forecasting."""
-    metrics, window = load_product_metrics_data(return_window=True)
+    metrics, window, degraded = load_product_metrics_data(return_window=True)
+    return _product_metrics_payload(metrics, window, degraded)
+
+
+def _product_metrics_payload(
+    metrics: list[dict[str, Any]],
+    window: Optional[dict[str, Any]],
+    degraded: Optional[list[str]] = None,
+) -> dict[str, Any]:
     if window:
         start_str = window["start"].isoformat()
         end_str = window["end"].isoformat()
@@ -2218,7 +2758,7 @@ def get_product_metrics():
         start_str = week_start.isoformat()
         end_str = week_end.isoformat()
 
-    return {
+    payload = {
         "metrics": metrics,
         "lookback_days": WEEK_LENGTH_DAYS,
         "window": {
@@ -2226,6 +2766,10 @@ def get_product_metrics():
             "end": end_str,
         },
     }
+    if degraded:
+        # Built without one of its sources; the precompute scheduler refuses to snapshot it.
+        payload["degraded"] = "; ".join(degraded)
+    return payload
 
 @app.get("/api/costs/products")
 def get_product_costs():
@@ -2334,7 +2878,8 @@ def get_daily_real_margins(
     
     # Filter by date range and minimum date
     if 'date_dt' in df.columns:
-        df['date'] = df['date_dt'].dt.date
+        # The sheet frame is a shared snapshot; derive a new frame instead of mutating it.
+        df = df.assign(date=df['date_dt'].dt.date)
         if date_from:
             from_date = datetime.fromisoformat(date_from).date()
             df = df[df['date'] >= from_date]
@@ -2506,6 +3051,10 @@ def get_latest_operational_costs():
 @app.get("/api/costs/tiers")
 def get_sgl_tiers():
     """Return SGL tier definitions from SGL_TIERS.csv."""
+    return {"tiers": load_sgl_tiers_data()}
+
+
+def load_sgl_tiers_data() -> list[dict[str, Any]]:
     tiers_file = DATA_POINTS_DIR / "SGL_TIERS.csv"
     if not tiers_file.exists():
         raise HTTPException(status_code=404, detail="SGL tiers file not found.")
@@ -2526,29 +3075,62 @@ def get_sgl_tiers():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load SGL tiers: {e}")
     
-    return {"tiers": tiers}
+    return tiers
+
+
+def _build_dashboard_bootstrap() -> dict[str, Any]:
+    """All playground inputs, built once against a single sheet snapshot."""
+    snapshot = get_sheet_snapshot()
+    metrics, window, degraded = _build_product_metrics(snapshot)
+    sections = {
+        "costs": {"products": _build_product_costs(snapshot)},
+        "operational": {"costs": load_operational_costs_data()},
+        "tiers": {"tiers": load_sgl_tiers_data()},
+        "metrics": _product_metrics_payload(metrics, window, degraded),
+        "local_prices": {"prices": list(load_local_shop_price_map().values())},
+    }
+    # Content hash: the Google Sheet and ClickHouse sources carry no versions of their own.
+    digest = hashlib.sha1(
+        json.dumps(sections, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    ).hexdigest()
+    return {
+        "version": digest,
+        "sheet_version": snapshot.version if snapshot else None,
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        **sections,
+    }
+
+
+@app.get("/api/dashboard/bootstrap")
+def get_dashboard_bootstrap(request: Request):
+    """
+    Product costs, operational costs, SGL tiers, product metrics and local shop prices in one response.
+
+    Each section has the shape of its standalone endpoint. ``version`` changes only
+    when the content does and is returned as the ETag; ``If-None-Match`` gets a 304.
+    """
+    payload = DASHBOARD_FLIGHT.do(("dashboard-bootstrap", date.today().isoformat()), _build_dashboard_bootstrap)
+    etag = '"%s"' % payload["version"]
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}:
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(content=payload, headers=headers)
 
 
 # ========== B2B Analytics Endpoints ==========
 
 @app.get("/api/b2b/business-overview")
+@DASHBOARD_SCHEDULER.precomputed("b2b-business-overview", interval=900, date_from=None, date_to=None)
 async def get_b2b_business_overview(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
 ):
     """Get B2B business overview: revenue, orders, profit summary. Calculated from daily product orders."""
     try:
-        from collections import defaultdict
-        from datetime import datetime as dt
+        facts = await get_b2b_facts(date_from, date_to)
+        date_range = facts.date_range
         
-        client = get_b2b_mcp_client()
-        purchase_price_service = get_b2b_purchase_price_service()
-        date_range = format_date_range(date_from, date_to)
-        
-        # Get daily product orders data from Product Orders MCP
-        daily_sales = await client.get_daily_sales_data(date_from, date_to)
-        
-        if not daily_sales or "items" not in daily_sales or len(daily_sales.get("items", [])) == 0:
+        if facts.empty:
             return {
                 "revenue": 0,
                 "orders": 0,
@@ -2560,56 +3142,22 @@ async def get_b2b_business_overview(
                 "error": "No B2B data available for the specified date range"
             }
         
-        # Calculate totals from daily data (already correctly calculated per day)
-        total_revenue = 0.0
-        total_orders = 0
-        total_cogs = 0.0
-        total_warehouse = 0.0
-        total_delivery = 0.0
-        unique_customers = set()
-        
-        for item in daily_sales["items"]:
-            product_name = item.get("product_name")
-            order_date_str = item.get("order_date") or item.get("sale_date")
-            quantity_kg = float(item.get("quantity_kg") or item.get("quantity_sold") or 0.0)
-            revenue = float(item.get("total_revenue") or item.get("revenue") or 0.0)
-            order_count = int(item.get("number_of_orders") or item.get("order_count") or 0)
-            
-            # Include items with revenue > 0 even if quantity is 0 (some orders may have 0 quantity but still have revenue)
-            # Or include items with orders > 0 (to count orders even if quantity/revenue is 0)
-            if not product_name or (quantity_kg <= 0 and revenue <= 0 and order_count <= 0):
-                continue
-            
-            # Parse order date
-            try:
-                if isinstance(order_date_str, str):
-                    order_date = dt.strptime(order_date_str.split("T")[0], "%Y-%m-%d").date()
-                else:
-                    order_date = order_date_str
-            except:
-                continue
-            
-            # Get purchase price for this specific order date (with next-day offset)
-            purchase_price, _ = purchase_price_service.get_purchase_price_for_sale_date(
-                product_name, order_date
-            )
-            
-            # Calculate daily COGS = purchase_price × quantity
-            daily_cogs = purchase_price * quantity_kg if purchase_price > 0 else 0.0
-            daily_warehouse = quantity_kg * 3.0  # 3 birr/kg
-            daily_delivery = quantity_kg * 2.0   # 2 birr/kg
-            
-            # Sum totals
-            total_revenue += revenue
-            total_orders += order_count
-            total_cogs += daily_cogs
-            total_warehouse += daily_warehouse
-            total_delivery += daily_delivery
-            
-            # Track unique customers (if customer_type_id is available)
-            customer_type_id = item.get("customer_type_id")
-            if customer_type_id:
-                unique_customers.add(customer_type_id)
+        df = facts.frame
+        # Include items with revenue > 0 even if quantity is 0 (some orders may have 0 quantity but still have revenue)
+        # Or include items with orders > 0 (to count orders even if quantity/revenue is 0)
+        rows = df[
+            df["has_name"]
+            & df["valid_date"]
+            & ((df["quantity_kg"] > 0) | (df["revenue"] > 0) | (df["number_of_orders"] > 0))
+        ]
+        
+        total_revenue = float(rows["revenue"].sum())
+        total_orders = int(rows["number_of_orders"].sum())
+        total_cogs = float(rows["cogs"].sum())
+        total_warehouse = float(rows["warehouse_cost"].sum())
+        total_delivery = float(rows["delivery_cost"].sum())
+        customers = rows["customer_type_id"]
+        unique_customers = customers[customers.notna() & customers.astype(bool)].nunique()
         
         # Calculate profit
         total_profit = total_revenue - total_cogs - total_warehouse - total_delivery
@@ -2621,7 +3169,7 @@ async def get_b2b_business_overview(
             "orders": total_orders,
             "profit": round(total_profit, 2),
             "profit_margin": round(profit_margin, 2),
-            "total_customers": len(unique_customers),
+            "total_customers": int(unique_customers),
             "avg_order_value": round(avg_order_value, 2),
             "date_range": date_range,
             "costs": {
@@ -2635,210 +3183,121 @@ async def get_b2b_business_overview(
         raise HTTPException(status_code=500, detail=f"Failed to fetch B2B business overview: {str(e)}")
 
 
+def _empty_b2b_margin_response(date_range: Dict[str, str], error: str) -> dict[str, Any]:
+    return {
+        "margin_breakdown": {
+            "cm1_gross_profit": {"amount": 0, "percentage": "0%", "formula": "Revenue - Product COGS", "description": "Revenue minus direct product costs."},
+            "cm2_after_warehouse": {"amount": 0, "percentage": "0%", "formula": "CM1 - Warehouse Costs", "description": "CM1 minus warehouse handling costs."},
+            "cm3_net_profit": {"amount": 0, "percentage": "0%", "formula": "CM2 - Delivery Costs", "description": "CM2 minus last-mile delivery costs."},
+        },
+        "summary": {
+            "total_revenue": 0,
+            "product_cogs": 0,
+            "warehouse_costs": 0,
+            "delivery_costs": 0,
+            "final_profit": 0,
+            "final_margin": "0%",
+        },
+        "period": date_range,
+        "error": error
+    }
+
+
 @app.get("/api/b2b/profit-margin-analysis")
+@DASHBOARD_SCHEDULER.precomputed("b2b-profit-margin-analysis", interval=900, date_from=None, date_to=None)
 async def get_b2b_profit_margin_analysis(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
 ):
     """Get B2B profit margin analysis: CM1, CM2, CM3 breakdown with actual purchase prices."""
     try:
-        from datetime import datetime as dt
-        
-        client = get_b2b_mcp_client()
-        purchase_price_service = get_b2b_purchase_price_service()
-        date_range = format_date_range(date_from, date_to)
+        facts = await get_b2b_facts(date_from, date_to)
+        date_range = facts.date_range
         
-        # Get daily product orders data (new MCP provides this directly)
-        daily_sales = await client.get_daily_sales_data(date_from, date_to)
+        if facts.empty:
+            return _empty_b2b_margin_response(date_range, "No B2B data available for the specified date range")
         
-        # Calculate profit margin analysis from daily data
-        if not daily_sales or "items" not in daily_sales or len(daily_sales.get("items", [])) == 0:
-            return {
-                "margin_breakdown": {
-                    "cm1_gross_profit": {"amount": 0, "percentage": "0%", "formula": "Revenue - Product COGS", "description": "Revenue minus direct product costs."},
-                    "cm2_after_warehouse": {"amount": 0, "percentage": "0%", "formula": "CM1 - Warehouse Costs", "description": "CM1 minus warehouse handling costs."},
-                    "cm3_net_profit": {"amount": 0, "percentage": "0%", "formula": "CM2 - Delivery Costs", "description": "CM2 minus last-mile delivery costs."},
-                },
-                "summary": {
-                    "total_revenue": 0,
-                    "product_cogs": 0,
-                    "warehouse_costs": 0,
-                    "delivery_costs": 0,
-                    "final_profit": 0,
-                    "final_margin": "0%",
-                },
-                "period": date_range,
-                "error": "No B2B data available for the specified date range"
-            }
-        
-        # Calculate from daily data (already fetched above)
         try:
-            use_daily_data = daily_sales and "items" in daily_sales and len(daily_sales.get("items", [])) > 0
+            df = facts.frame
+            # Calculate on daily basis: COGS = purchase_price × quantity per row, then sum
+            rows = df[(df["product_key"] != "") & df["valid_date"] & (df["quantity_kg"] > 0)]
+            # Revenue from MCP, falling back to unit_price × quantity when not provided
+            total_revenue = float(rows["revenue_effective"].sum())
+            total_actual_cogs = float(rows["cogs"].sum())
+            purchase_price_stats = rows.loc[rows["purchase_price"] > 0, "price_source"].value_counts(sort=False)
             
-            if use_daily_data:
-                # Calculate on daily basis: for each day, calculate COGS = purchase_price × quantity, then sum
-                total_actual_cogs = 0.0
-                total_actual_revenue = 0.0
-                purchase_price_stats = defaultdict(int)
-                
-                for item in daily_sales["items"]:
-                    product_name = item.get("product_name") or item.get("product_id", "")
-                    if not product_name:
-                        continue
-                    
-                    sale_date_str = item.get("sale_date") or item.get("order_date") or item.get("date")
-                    quantity_kg = float(item.get("quantity_sold") or item.get("quantity_kg") or item.get("quantity") or item.get("weight_kg") or 0.0)
-                    selling_price = float(item.get("selling_price") or item.get("price") or item.get("unit_price") or 0.0)
-                    
-                    if quantity_kg <= 0:
-                        continue
-                    
-                    # Parse sale date
-                    try:
-                        if isinstance(sale_date_str, str):
-                            sale_date = dt.strptime(sale_date_str.split("T")[0], "%Y-%m-%d").date()
-                        else:
-                            sale_date = sale_date_str
-                    except:
-                        continue
-                    
-                    # Calculate daily revenue - use total_revenue from MCP (already calculated correctly per day)
-                    daily_revenue = float(item.get("total_revenue") or item.get("revenue") or 0.0)
-                    # If revenue not provided, calculate from unit_price × quantity
-                    if daily_revenue <= 0 and selling_price > 0:
-                        daily_revenue = selling_price * quantity_kg
-                    total_actual_revenue += daily_revenue
-                    
-                    # Get purchase price for this specific sale date (with next-day offset)
-                    purchase_price, source = purchase_price_service.get_purchase_price_for_sale_date(
-                        product_name, sale_date
-                    )
-                    
-                    # Calculate daily COGS = purchase_price × quantity
-                    if purchase_price > 0:
-                        total_actual_cogs += purchase_price * quantity_kg
-                        purchase_price_stats[source] += 1
-                
-                # Use daily-calculated revenue
-                total_revenue = total_actual_revenue
-                
-                # Calculate warehouse and delivery costs (3 birr/kg and 2 birr/kg)
-                total_warehouse_costs = 0.0
-                total_delivery_costs = 0.0
-                for item in daily_sales["items"]:
-                    quantity_kg = float(item.get("quantity_sold", 0.0) or item.get("quantity_kg", 0.0))
-                    if quantity_kg > 0:
-                        total_warehouse_costs += quantity_kg * 3.0
-                        total_delivery_costs += quantity_kg * 2.0
-                
-                # Calculate CM1, CM2, CM3
-                cm1_amount = total_revenue - total_actual_cogs
-                cm1_percent = (cm1_amount / total_revenue * 100) if total_revenue > 0 else 0
-                
-                cm2_amount = cm1_amount - total_warehouse_costs
-                cm2_percent = (cm2_amount / total_revenue * 100) if total_revenue > 0 else 0
-                
-                cm3_amount = cm2_amount - total_delivery_costs
-                cm3_percent = (cm3_amount / total_revenue * 100) if total_revenue > 0 else 0
-                
-                # Build result structure
-                result = {
-                    "margin_breakdown": {
-                        "cm1_gross_profit": {
-                            "amount": round(cm1_amount, 2),
-                            "percentage": f"{cm1_percent:.2f}%",
-                            "formula": "Revenue - Product COGS",
-                            "description": "Revenue minus direct product costs (purchase price)."
-                        },
-                        "cm2_after_warehouse": {
-                            "amount": round(cm2_amount, 2),
-                            "percentage": f"{cm2_percent:.2f}%",
-                            "formula": "CM1 - Warehouse Costs",
-                            "description": "CM1 minus warehouse handling costs."
-                        },
-                        "cm3_net_profit": {
-                            "amount": round(cm3_amount, 2),
-                            "percentage": f"{cm3_percent:.2f}%",
-                            "formula": "CM2 - Delivery Costs",
-                            "description": "CM2 minus last-mile delivery costs, representing final profit."
-                        },
-                    },
-                    "summary": {
-                        "total_revenue": round(total_revenue, 2),
-                        "product_cogs": round(total_actual_cogs, 2),
-                        "warehouse_costs": round(total_warehouse_costs, 2),
-                        "delivery_costs": round(total_delivery_costs, 2),
-                        "final_profit": round(cm3_amount, 2),
-                        "final_margin": f"{cm3_percent:.2f}%",
+            # Warehouse and delivery costs (3 birr/kg and 2 birr/kg) cover every row with quantity
+            shipped = df[df["quantity_kg"] > 0]
+            total_warehouse_costs = float(shipped["warehouse_cost"].sum())
+            total_delivery_costs = float(shipped["delivery_cost"].sum())
+            
+            # Calculate CM1, CM2, CM3
+            cm1_amount = total_revenue - total_actual_cogs
+            cm1_percent = (cm1_amount / total_revenue * 100) if total_revenue > 0 else 0
+            
+            cm2_amount = cm1_amount - total_warehouse_costs
+            cm2_percent = (cm2_amount / total_revenue * 100) if total_revenue > 0 else 0
+            
+            cm3_amount = cm2_amount - total_delivery_costs
+            cm3_percent = (cm3_amount / total_revenue * 100) if total_revenue > 0 else 0
+            
+            return {
+                "margin_breakdown": {
+                    "cm1_gross_profit": {
+                        "amount": round(cm1_amount, 2),
+                        "percentage": f"{cm1_percent:.2f}%",
+                        "formula": "Revenue - Product COGS",
+                        "description": "Revenue minus direct product costs (purchase price)."
                     },
-                    "period": date_range,
-                    "purchase_price_metadata": {
-                        "cogs_recalculated": True,
-                        "calculation_method": "daily_transactions",
-                        "purchase_price_sources": dict(purchase_price_stats),
-                        "note": "Calculated on daily basis: COGS = purchase_price × quantity per day, then summed. Revenue from daily product orders."
-                    }
-                }
-                
-                return result
-            else:
-                # No daily data available
-                return {
-                    "margin_breakdown": {
-                        "cm1_gross_profit": {"amount": 0, "percentage": "0%", "formula": "Revenue - Product COGS", "description": "Revenue minus direct product costs."},
-                        "cm2_after_warehouse": {"amount": 0, "percentage": "0%", "formula": "CM1 - Warehouse Costs", "description": "CM1 minus warehouse handling costs."},
-                        "cm3_net_profit": {"amount": 0, "percentage": "0%", "formula": "CM2 - Delivery Costs", "description": "CM2 minus last-mile delivery costs."},
+                    "cm2_after_warehouse": {
+                        "amount": round(cm2_amount, 2),
+                        "percentage": f"{cm2_percent:.2f}%",
+                        "formula": "CM1 - Warehouse Costs",
+                        "description": "CM1 minus warehouse handling costs."
                     },
-                    "summary": {
-                        "total_revenue": 0,
-                        "product_cogs": 0,
-                        "warehouse_costs": 0,
-                        "delivery_costs": 0,
-                        "final_profit": 0,
-                        "final_margin": "0%",
+                    "cm3_net_profit": {
+                        "amount": round(cm3_amount, 2),
+                        "percentage": f"{cm3_percent:.2f}%",
+                        "formula": "CM2 - Delivery Costs",
+                        "description": "CM2 minus last-mile delivery costs, representing final profit."
                     },
-                    "period": date_range,
-                    "error": "No B2B data available for the specified date range"
-                }
-        except Exception as e:
-            logger.warning(f"Could not calculate profit margins: {e}")
-            return {
-                "margin_breakdown": {
-                    "cm1_gross_profit": {"amount": 0, "percentage": "0%", "formula": "Revenue - Product COGS", "description": "Revenue minus direct product costs."},
-                    "cm2_after_warehouse": {"amount": 0, "percentage": "0%", "formula": "CM1 - Warehouse Costs", "description": "CM1 minus warehouse handling costs."},
-                    "cm3_net_profit": {"amount": 0, "percentage": "0%", "formula": "CM2 - Delivery Costs", "description": "CM2 minus last-mile delivery costs."},
                 },
                 "summary": {
-                    "total_revenue": 0,
-                    "product_cogs": 0,
-                    "warehouse_costs": 0,
-                    "delivery_costs": 0,
-                    "final_profit": 0,
-                    "final_margin": "0%",
+                    "total_revenue": round(total_revenue, 2),
+                    "product_cogs": round(total_actual_cogs, 2),
+                    "warehouse_costs": round(total_warehouse_costs, 2),
+                    "delivery_costs": round(total_delivery_costs, 2),
+                    "final_profit": round(cm3_amount, 2),
+                    "final_margin": f"{cm3_percent:.2f}%",
                 },
                 "period": date_range,
-                "error": f"Failed to calculate profit margins: {str(e)}"
+                "purchase_price_metadata": {
+                    "cogs_recalculated": True,
+                    "calculation_method": "daily_transactions",
+                    "purchase_price_sources": {str(k): int(v) for k, v in purchase_price_stats.items()},
+                    "note": "Calculated on daily basis: COGS = purchase_price × quantity per day, then summed. Revenue from daily product orders."
+                }
             }
+        except Exception as e:
+            logger.warning(f"Could not calculate profit margins: {e}")
+            return _empty_b2b_margin_response(date_range, f"Failed to calculate profit margins: {str(e)}")
     except Exception as e:
         logger.error(f"Error fetching B2B profit margin analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch B2B profit margin analysis: {str(e)}")
 
 
 @app.get("/api/b2b/cost-structure-analysis")
+@DASHBOARD_SCHEDULER.precomputed("b2b-cost-structure-analysis", interval=900, date_from=None, date_to=None)
 async def get_b2b_cost_structure_analysis(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
 ):
     """Get B2B cost structure analysis: COGS, warehouse, delivery costs. Calculated from daily product orders."""
     try:
-        client = get_b2b_mcp_client()
-        purchase_price_service = get_b2b_purchase_price_service()
-        date_range = format_date_range(date_from, date_to)
-        
-        # Get daily product orders data
-        daily_sales = await client.get_daily_sales_data(date_from, date_to)
+        facts = await get_b2b_facts(date_from, date_to)
+        date_range = facts.date_range
         
-        if not daily_sales or "items" not in daily_sales or len(daily_sales.get("items", [])) == 0:
+        if facts.empty:
             return {
                 "cogs": 0,
                 "warehouse_costs": 0,
@@ -2850,38 +3309,12 @@ async def get_b2b_cost_structure_analysis(
                 "error": "No B2B data available for the specified date range"
             }
         
-        # Calculate costs from daily data
-        total_cogs = 0.0
-        total_warehouse = 0.0
-        total_delivery = 0.0
-        
-        for item in daily_sales["items"]:
-            product_name = item.get("product_name", "")
-            order_date_str = item.get("order_date") or item.get("sale_date")
-            quantity_kg = float(item.get("quantity_sold", 0.0) or item.get("quantity_kg", 0.0))
-            
-            if quantity_kg <= 0:
-                continue
-            
-            # Parse order date for purchase price lookup
-            try:
-                if isinstance(order_date_str, str):
-                    order_date = datetime.strptime(order_date_str.split("T")[0], "%Y-%m-%d").date()
-                else:
-                    order_date = order_date_str
-            except:
-                continue
-            
-            # Get purchase price for this order date (with next-day offset)
-            purchase_price, _ = purchase_price_service.get_purchase_price_for_sale_date(
-                product_name, order_date
-            )
-            
-            # Calculate costs for this day
-            if purchase_price > 0:
-                total_cogs += purchase_price * quantity_kg
-            total_warehouse += quantity_kg * 3.0
-            total_delivery += quantity_kg * 2.0
+        df = facts.frame
+        rows = df[df["valid_date"] & (df["quantity_kg"] > 0)]
+        # COGS is only attributed to rows that carry a product name
+        total_cogs = float(rows.loc[rows["has_name"], "cogs"].sum())
+        total_warehouse = float(rows["warehouse_cost"].sum())
+        total_delivery = float(rows["delivery_cost"].sum())
         
         total_costs = total_cogs + total_warehouse + total_delivery
         
@@ -2916,89 +3349,17 @@ async def get_b2b_cost_structure_analysis(
 
 
 @app.get("/api/b2b/product-profit-analysis")
+@DASHBOARD_SCHEDULER.precomputed("b2b-product-profit-analysis", interval=900, date_from=None, date_to=None)
 async def get_b2b_product_profit_analysis(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
 ):
     """Get B2B per-product profit and volume analysis with actual purchase prices."""
     try:
-        from datetime import datetime as dt
-        from collections import defaultdict
+        facts = await get_b2b_facts(date_from, date_to)
+        date_range = facts.date_range
         
-        client = get_b2b_mcp_client()
-        purchase_price_service = get_b2b_purchase_price_service()
-        date_range = format_date_range(date_from, date_to)
-        
-        # First, try to get daily transaction-level data for accurate calculations
-        daily_sales = await client.get_daily_sales_data(date_from, date_to)
-        use_daily_data = daily_sales and "items" in daily_sales and len(daily_sales.get("items", [])) > 0
-        
-        if use_daily_data:
-            # Calculate on daily basis: for each day, calculate revenue and COGS, then sum
-            product_data: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
-                "product_name": "",
-                "total_revenue": 0.0,
-                "total_quantity_kg": 0.0,
-                "order_ids": set(),
-                "total_cogs": 0.0,
-                "warehouse_costs": 0.0,
-                "delivery_costs": 0.0,
-                "purchase_price_sources": defaultdict(int),
-                "days_with_data": set(),
-                "order_count": 0
-            })
-            
-            # Process each daily transaction
-            for item in daily_sales["items"]:
-                product_name = item.get("product_name") or item.get("product_id", "")
-                if not product_name:
-                    continue
-                
-                # Get daily transaction data from new MCP structure
-                order_date_str = item.get("order_date") or item.get("sale_date") or item.get("date")
-                quantity_kg = float(item.get("quantity_sold", 0.0) or item.get("quantity_kg", 0.0) or item.get("quantity", 0.0))
-                # Use total_revenue from MCP (already calculated correctly per day)
-                daily_revenue = float(item.get("total_revenue", 0.0) or item.get("revenue", 0.0))
-                num_orders = int(item.get("number_of_orders", 0))
-                
-                if quantity_kg <= 0:
-                    continue
-                
-                # Parse order date
-                try:
-                    if isinstance(order_date_str, str):
-                        order_date = dt.strptime(order_date_str.split("T")[0], "%Y-%m-%d").date()
-                    else:
-                        order_date = order_date_str
-                except:
-                    continue
-                
-                # Get purchase price for this specific order date (with next-day offset)
-                purchase_price, source = purchase_price_service.get_purchase_price_for_sale_date(
-                    product_name, order_date
-                )
-                
-                # Calculate daily COGS = purchase_price × quantity
-                daily_cogs = purchase_price * quantity_kg if purchase_price > 0 else 0.0
-                
-                # Calculate daily warehouse and delivery costs (3 birr/kg and 2 birr/kg)
-                daily_warehouse = quantity_kg * 3.0
-                daily_delivery = quantity_kg * 2.0
-                
-                # Aggregate by product
-                prod = product_data[product_name]
-                prod["product_name"] = product_name
-                prod["total_revenue"] += daily_revenue
-                prod["total_quantity_kg"] += quantity_kg
-                prod["total_cogs"] += daily_cogs
-                prod["warehouse_costs"] += daily_warehouse
-                prod["delivery_costs"] += daily_delivery
-                prod["purchase_price_sources"][source] += 1
-                prod["days_with_data"].add(order_date)
-                # Track order count from number_of_orders field
-                prod["order_count"] = prod.get("order_count", 0) + num_orders
-        
-        if not use_daily_data:
+        if facts.empty:
             # No daily data available - return empty (new MCP should always provide daily data)
             logger.warning("Daily product orders data not available from new MCP endpoint")
             return {
@@ -3013,42 +3374,52 @@ async def get_b2b_product_profit_analysis(
                 "error": "Daily product orders data not available from MCP endpoint"
             }
         
-        # Convert to list and calculate final metrics
+        df = facts.frame
+        rows = df[(df["product_key"] != "") & df["valid_date"] & (df["quantity_kg"] > 0)]
+        per_product = rows.groupby("product_key", sort=False).agg(
+            total_revenue=("revenue", "sum"),
+            total_quantity_kg=("quantity_kg", "sum"),
+            total_cogs=("cogs", "sum"),
+            warehouse_costs=("warehouse_cost", "sum"),
+            delivery_costs=("delivery_cost", "sum"),
+            order_count=("number_of_orders", "sum"),
+            days_with_data=("sale_date", "nunique"),
+        )
+        
         products_list = []
         total_revenue = 0.0
         total_profit = 0.0
         
-        for product_name, data in product_data.items():
-            revenue = data["total_revenue"]
-            cogs = data["total_cogs"]
-            warehouse = data["warehouse_costs"]
-            delivery = data["delivery_costs"]
+        for product_name, data in zip(per_product.index, per_product.itertuples(index=False)):
+            revenue = float(data.total_revenue)
+            quantity_kg = float(data.total_quantity_kg)
+            cogs = float(data.total_cogs)
+            warehouse = float(data.warehouse_costs)
+            delivery = float(data.delivery_costs)
             profit = revenue - cogs - warehouse - delivery
             margin = (profit / revenue * 100) if revenue > 0 else 0.0
-            profit_per_kg = (profit / data["total_quantity_kg"]) if data["total_quantity_kg"] > 0 else 0.0
+            profit_per_kg = (profit / quantity_kg) if quantity_kg > 0 else 0.0
             
-            # Calculate average purchase price used (weighted by quantity if daily data)
-            # For aggregated data, this is the single price used
-            # For daily data, this is the weighted average
-            avg_purchase_price = (cogs / data["total_quantity_kg"]) if data["total_quantity_kg"] > 0 else 0.0
+            # Quantity-weighted average purchase price across the days in range
+            avg_purchase_price = (cogs / quantity_kg) if quantity_kg > 0 else 0.0
             
             # Calculate average selling price per kg (for display only - revenue is already correctly calculated)
-            avg_selling_price = (revenue / data["total_quantity_kg"]) if data["total_quantity_kg"] > 0 else 0.0
+            avg_selling_price = (revenue / quantity_kg) if quantity_kg > 0 else 0.0
             
             products_list.append({
                 "product_name": product_name,
                 "total_revenue": round(revenue, 2),
-                "total_quantity_kg": round(data["total_quantity_kg"], 2),
-                "total_orders": data.get("order_count", len(data["order_ids"])),
+                "total_quantity_kg": round(quantity_kg, 2),
+                "total_orders": int(data.order_count),
                 "avg_selling_price": round(avg_selling_price, 2),
-                "purchase_price_used": round(data.get("purchase_price_used", avg_purchase_price), 2),
+                "purchase_price_used": round(avg_purchase_price, 2),
                 "total_cogs": round(cogs, 2),
                 "warehouse_costs": round(warehouse, 2),
                 "delivery_costs": round(delivery, 2),
                 "total_profit": round(profit, 2),
                 "profit_margin_percent": round(margin, 2),
                 "profit_per_kg": round(profit_per_kg, 2),
-                "days_with_data": len(data["days_with_data"]) if data["days_with_data"] else 1  # Default to 1 for aggregated data
+                "days_with_data": int(data.days_with_data) or 1
             })
             
             total_revenue += revenue
@@ -3079,6 +3450,7 @@ async def get_b2b_product_profit_analysis(
 
 
 @app.get("/api/b2b/revenue-trends")
+@DASHBOARD_SCHEDULER.precomputed("b2b-revenue-trends", interval=900, date_from=None, date_to=None, granularity="day")
 async def get_b2b_revenue_trends(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
@@ -3086,33 +3458,25 @@ async def get_b2b_revenue_trends(
 ):
     """Get B2B revenue trends over time. Calculated from daily product orders."""
     try:
-        from collections import defaultdict
-        
-        client = get_b2b_mcp_client()
-        date_range = format_date_range(date_from, date_to)
-        
-        # Get daily product orders data
-        daily_sales = await client.get_daily_sales_data(date_from, date_to)
+        facts = await get_b2b_facts(date_from, date_to)
+        date_range = facts.date_range
         
-        if not daily_sales or "items" not in daily_sales or len(daily_sales.get("items", [])) == 0:
+        if facts.empty:
             return {
                 "trends": [],
                 "period": date_range,
                 "error": "No B2B data available for the specified date range"
             }
         
-        # Aggregate revenue by date
-        revenue_by_date = defaultdict(float)
-        for item in daily_sales["items"]:
-            order_date_str = item.get("order_date") or item.get("sale_date")
-            revenue = float(item.get("total_revenue", 0.0) or item.get("revenue", 0.0))
-            if order_date_str and revenue > 0:
-                revenue_by_date[order_date_str] += revenue
+        # Aggregate revenue by the date string reported by the MCP
+        df = facts.frame
+        dated = df["date_str"].notna() & df["date_str"].astype(bool)
+        rows = df[dated & (df["revenue"] > 0)]
+        revenue_by_date = rows.groupby(rows["date_str"].astype(str), sort=True)["revenue"].sum()
         
-        # Convert to list sorted by date
         trends = [
-            {"date": date_str, "revenue": round(revenue, 2)}
-            for date_str, revenue in sorted(revenue_by_date.items())
+            {"date": date_str, "revenue": round(float(revenue), 2)}
+            for date_str, revenue in revenue_by_date.items()
         ]
         
         return {
@@ -3126,6 +3490,7 @@ async def get_b2b_revenue_trends(
 
 
 @app.get("/api/b2b/cash-flow-analysis")
+@DASHBOARD_SCHEDULER.precomputed("b2b-cash-flow-analysis", interval=900, date_from=None, date_to=None)
 async def get_b2b_cash_flow_analysis(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
@@ -3154,6 +3519,7 @@ async def get_b2b_cash_flow_analysis(
 
 
 @app.get("/api/b2b/customer-profitability")
+@DASHBOARD_SCHEDULER.precomputed("b2b-customer-profitability", interval=900, date_from=None, date_to=None)
 async def get_b2b_customer_profitability(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
@@ -3170,6 +3536,7 @@ async def get_b2b_customer_profitability(
 
 
 @app.get("/api/b2b/credit-risk-dashboard")
+@DASHBOARD_SCHEDULER.precomputed("b2b-credit-risk-dashboard", interval=900, date_from=None, date_to=None)
 async def get_b2b_credit_risk_dashboard(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
@@ -3186,6 +3553,7 @@ async def get_b2b_credit_risk_dashboard(
 
 
 @app.get("/api/b2b/payment-behavior")
+@DASHBOARD_SCHEDULER.precomputed("b2b-payment-behavior", interval=900, date_from=None, date_to=None)
 async def get_b2b_payment_behavior(
     date_from: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
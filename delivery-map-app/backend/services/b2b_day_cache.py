@@ -0,0 +1,225 @@
+"""
+Day-partitioned cache for B2B MCP daily product orders.
+
+Closed days are kept in memory and in a JSON file on disk indefinitely;
+recent (still open) days expire after a short TTL. A range request fetches
+only the contiguous spans of days that are missing or expired.
+
+Only days the MCP actually returned rows for are kept as closed. A span
+that came back empty is served but not cached, and empty days inside an
+otherwise non-empty span are cached as open, so an outage or a partially
+loaded source is retried instead of being frozen on disk. The lock only
+guards the day table; MCP calls run outside it and identical spans are
+coalesced on the ``b2b`` single flight.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .clickhouse_rollup import ORDER_ROLLUP_OPEN_DAYS
+from .coalesce import get_single_flight
+from .snapshot_files import SNAPSHOT_DIR, SNAPSHOT_PERSIST_ENABLED
+
+logger = logging.getLogger(__name__)
+
+B2B_DAY_CACHE_FILE = Path(os.getenv("B2B_DAY_CACHE_FILE") or SNAPSHOT_DIR / "b2b_daily_orders.json")
+# Days newer than the order open window may still change and are re-fetched after the TTL.
+B2B_OPEN_DAYS = ORDER_ROLLUP_OPEN_DAYS
+B2B_OPEN_DAY_TTL_SECONDS = float(os.getenv("B2B_OPEN_DAY_TTL_SECONDS", "300"))
+
+RowLoader = Callable[[date, date], Awaitable[List[Dict[str, Any]]]]
+
+_FLIGHT = get_single_flight("b2b")
+
+
+@dataclass
+class _DayEntry:
+    rows: List[Dict[str, Any]]
+    fetched_at: float
+    closed: bool
+
+
+def _row_day(row: Dict[str, Any]) -> Optional[date]:
+    value = row.get("order_date")
+    if isinstance(value, date):
+        return value
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.strptime(value.split("T")[0], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def missing_spans(days: List[date], is_missing: Callable[[date], bool]) -> List[Tuple[date, date]]:
+    """Group the missing days of an ascending day list into inclusive contiguous spans."""
+    spans: List[Tuple[date, date]] = []
+    for day in days:
+        if not is_missing(day):
+            continue
+        if spans and spans[-1][1] == day - timedelta(days=1):
+            spans[-1] = (spans[-1][0], day)
+        else:
+            spans.append((day, day))
+    return spans
+
+
+class B2BDayCache:
+    """Caches raw ``getDailyProductOrders`` rows per order day."""
+
+    def __init__(self, path: Path = B2B_DAY_CACHE_FILE) -> None:
+        self._path = path
+        self._days: Dict[date, _DayEntry] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._mcp_calls = 0
+        self._days_fetched = 0
+        self._days_served = 0
+
+    def _today(self) -> date:
+        return date.today()
+
+    def _is_closed(self, day: date) -> bool:
+        return day <= self._today() - timedelta(days=B2B_OPEN_DAYS)
+
+    def _is_fresh(self, day: date) -> bool:
+        entry = self._days.get(day)
+        if entry is None:
+            return False
+        if entry.closed:
+            return True
+        return time.time() - entry.fetched_at <= B2B_OPEN_DAY_TTL_SECONDS
+
+    # ---- disk ----
+
+    def _load_from_disk(self) -> None:
+        self._loaded = True
+        if not SNAPSHOT_PERSIST_ENABLED or not self._path.exists():
+            return
+        try:
+            with self._path.open("r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+            fetched_at = float(payload.get("saved_at") or time.time())
+            for day_str, rows in (payload.get("days") or {}).items():
+                day = date.fromisoformat(day_str)
+                if self._is_closed(day):
+                    self._days[day] = _DayEntry(rows=rows, fetched_at=fetched_at, closed=True)
+            logger.info("Loaded %d cached B2B order days from %s", len(self._days), self._path)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Failed to read B2B day cache %s: %s", self._path, exc)
+
+    def _save_to_disk(self) -> None:
+        if not SNAPSHOT_PERSIST_ENABLED:
+            return
+        payload = {
+            "saved_at": time.time(),
+            "days": {day.isoformat(): entry.rows for day, entry in sorted(self._days.items()) if entry.closed},
+        }
+        tmp_path = self._path.with_name(f".{self._path.name}.{os.getpid()}.tmp")
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump(payload, handle, separators=(",", ":"), default=str)
+            os.replace(tmp_path, self._path)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Failed to persist B2B day cache to %s: %s", self._path, exc)
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    # ---- lookup ----
+
+    async def _load_span(self, start: date, end: date, loader: RowLoader) -> List[Dict[str, Any]]:
+        rows = await loader(start, end)
+        self._mcp_calls += 1
+        return rows
+
+    def _merge_span(self, start: date, end: date, rows: List[Dict[str, Any]]) -> Tuple[Dict[date, List[Dict[str, Any]]], bool]:
+        """Store the rows of a fetched span per day; returns them by day and whether a closed day was added."""
+        by_day: Dict[date, List[Dict[str, Any]]] = {}
+        dropped = 0
+        for row in rows:
+            day = _row_day(row)
+            if day is None or day < start or day > end:
+                dropped += 1
+                continue
+            by_day.setdefault(day, []).append(row)
+        if dropped:
+            logger.warning(
+                "Dropped %d MCP rows outside %s..%s or without a parsable order_date",
+                dropped, start, end,
+            )
+        if not by_day:
+            logger.warning("MCP returned no rows for %s..%s; not caching the span", start, end)
+            return by_day, False
+
+        fetched_at = time.time()
+        new_closed_days = False
+        day = start
+        while day <= end:
+            day_rows = by_day.get(day)
+            closed = day_rows is not None and self._is_closed(day)
+            self._days[day] = _DayEntry(rows=day_rows or [], fetched_at=fetched_at, closed=closed)
+            new_closed_days = new_closed_days or closed
+            self._days_fetched += 1
+            day += timedelta(days=1)
+        return by_day, new_closed_days
+
+    async def get_rows(self, start: date, end: date, loader: RowLoader) -> List[Dict[str, Any]]:
+        """
+        Return raw rows for ``[start, end]`` ordered by day.
+
+        Only missing or expired days are requested from ``loader``, one call per
+        contiguous span. Loader errors propagate and nothing is cached for that span.
+        """
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        async with self._lock:
+            if not self._loaded:
+                self._load_from_disk()
+            spans = missing_spans(days, lambda day: not self._is_fresh(day))
+            by_day = {day: self._days[day].rows for day in days if day in self._days}
+
+        for span_start, span_end in spans:
+            rows = await _FLIGHT.do_async(
+                ("b2b-days", span_start.isoformat(), span_end.isoformat()),
+                self._load_span, span_start, span_end, loader,
+            )
+            async with self._lock:
+                fetched, new_closed_days = self._merge_span(span_start, span_end, rows)
+                if new_closed_days:
+                    self._save_to_disk()
+            day = span_start
+            while day <= span_end:
+                by_day[day] = fetched.get(day, [])
+                day += timedelta(days=1)
+
+        self._days_served += len(days)
+        result: List[Dict[str, Any]] = []
+        for day in days:
+            result.extend(by_day.get(day, []))
+        return result
+
+    def clear(self) -> None:
+        self._days.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        closed = sum(1 for entry in self._days.values() if entry.closed)
+        return {
+            "days_cached": len(self._days),
+            "closed_days": closed,
+            "open_days": len(self._days) - closed,
+            "mcp_calls": self._mcp_calls,
+            "days_fetched": self._days_fetched,
+            "days_served": self._days_served,
+            "path": str(self._path),
+        }
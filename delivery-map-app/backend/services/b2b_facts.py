@@ -0,0 +1,213 @@
+"""
+B2B Fact Layer
+
+Fetches daily product orders from the B2B MCP once per date range and turns
+them into one typed DataFrame with purchase prices, COGS and CM1/CM2/CM3
+columns. The B2B analytics endpoints are projections over that frame.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.b2b_mcp_client import format_date_range, get_b2b_mcp_client
+from services.b2b_purchase_price import B2BPurchasePriceService, get_b2b_purchase_price_service
+from services.coalesce import get_single_flight
+
+logger = logging.getLogger(__name__)
+
+B2B_CACHE_TTL_SECONDS = float(os.getenv("B2B_CACHE_TTL_SECONDS", "300"))
+B2B_CACHE_MAX_RANGES = int(os.getenv("B2B_CACHE_MAX_RANGES", "16"))
+
+WAREHOUSE_COST_PER_KG = 3.0  # birr/kg
+DELIVERY_COST_PER_KG = 2.0  # birr/kg
+
+FACT_COLUMNS = [
+    "product_name",
+    "product_key",
+    "has_name",
+    "date_str",
+    "sale_date",
+    "valid_date",
+    "quantity_kg",
+    "revenue",
+    "selling_price",
+    "revenue_effective",
+    "number_of_orders",
+    "customer_type_id",
+    "purchase_price",
+    "price_source",
+    "cogs",
+    "warehouse_cost",
+    "delivery_cost",
+    "cm1",
+    "cm2",
+    "cm3",
+]
+
+
+@dataclass
+class B2BFacts:
+    """One MCP fetch for a date range, projected into a per-row fact frame."""
+
+    frame: pd.DataFrame
+    date_range: Dict[str, str]
+    price_version: Optional[str]
+    fetched_at: float
+    error: Optional[str] = None
+
+    @property
+    def empty(self) -> bool:
+        return self.frame.empty
+
+
+@dataclass
+class _RangeEntry:
+    items: List[Dict[str, Any]]
+    error: Optional[str]
+    fetched_at: float
+    facts_by_version: Dict[Optional[str], B2BFacts] = field(default_factory=dict)
+
+
+_RANGE_CACHE: Dict[Tuple[str, str], _RangeEntry] = {}
+# Concurrent requests for the same range share one MCP fetch.
+_RANGE_FLIGHT = get_single_flight("b2b")
+
+
+def _first_present(df: pd.DataFrame, columns: List[str], default: Any) -> pd.Series:
+    """Mimic ``item.get(a) or item.get(b) or default`` column-wise."""
+    result = pd.Series([None] * len(df), index=df.index, dtype=object)
+    for col in columns:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        take = result.isna() & values.notna() & values.astype(bool)
+        result = result.where(~take, values)
+    return result.where(result.notna(), default)
+
+
+def _numeric(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    return pd.to_numeric(_first_present(df, columns, 0.0), errors="coerce").fillna(0.0).to_numpy(dtype=float)
+
+
+def build_fact_frame(items: List[Dict[str, Any]], price_service: B2BPurchasePriceService) -> pd.DataFrame:
+    """Build the per-row B2B fact frame from MCP daily product order items."""
+    if not items:
+        return pd.DataFrame(columns=FACT_COLUMNS)
+
+    raw = pd.DataFrame.from_records(items)
+    product_name = _first_present(raw, ["product_name"], "").astype(str)
+    product_key = _first_present(raw, ["product_name", "product_id"], "").astype(str)
+    date_str = _first_present(raw, ["order_date", "sale_date", "date"], "")
+    date_text = date_str.map(lambda v: v.split("T")[0] if isinstance(v, str) else "")
+    sale_day = pd.to_datetime(date_text, format="%Y-%m-%d", errors="coerce")
+
+    quantity = _numeric(raw, ["quantity_sold", "quantity_kg", "quantity", "weight_kg"])
+    revenue = _numeric(raw, ["total_revenue", "revenue"])
+    selling_price = _numeric(raw, ["selling_price", "price", "unit_price"])
+    orders = _numeric(raw, ["number_of_orders", "order_count"]).astype("int64")
+    revenue_effective = np.where((revenue <= 0) & (selling_price > 0), selling_price * quantity, revenue)
+
+    facts = pd.DataFrame(
+        {
+            "product_name": product_name.to_numpy(),
+            "product_key": product_key.to_numpy(),
+            "has_name": (product_name != "").to_numpy(),
+            "date_str": date_str.to_numpy(),
+            "sale_date": sale_day.to_numpy(),
+            "valid_date": sale_day.notna().to_numpy(),
+            "quantity_kg": quantity,
+            "revenue": revenue,
+            "selling_price": selling_price,
+            "revenue_effective": revenue_effective,
+            "number_of_orders": orders,
+            "customer_type_id": _first_present(raw, ["customer_type_id"], None).to_numpy(),
+        }
+    )
+
+    # Resolve purchase prices once per distinct (product, day) with a single as-of join.
+    priced = facts["valid_date"] & (facts["product_key"] != "")
+    pairs = facts.loc[priced, ["product_key", "sale_date"]].drop_duplicates()
+    prices = price_service.get_purchase_prices_for_sales(
+        pairs["product_key"].tolist(), [ts.date() for ts in pairs["sale_date"]]
+    )
+    pairs = pairs.assign(
+        purchase_price=[price for price, _ in prices],
+        price_source=[source for _, source in prices],
+    )
+    facts = facts.merge(pairs, on=["product_key", "sale_date"], how="left")
+    facts["purchase_price"] = facts["purchase_price"].fillna(0.0)
+    facts["price_source"] = facts["price_source"].fillna("missing")
+
+    facts["cogs"] = np.where(facts["purchase_price"] > 0, facts["purchase_price"] * facts["quantity_kg"], 0.0)
+    facts["warehouse_cost"] = facts["quantity_kg"] * WAREHOUSE_COST_PER_KG
+    facts["delivery_cost"] = facts["quantity_kg"] * DELIVERY_COST_PER_KG
+    facts["cm1"] = facts["revenue"] - facts["cogs"]
+    facts["cm2"] = facts["cm1"] - facts["warehouse_cost"]
+    facts["cm3"] = facts["cm2"] - facts["delivery_cost"]
+    return facts[FACT_COLUMNS]
+
+
+async def _fetch_range(key: Tuple[str, str]) -> _RangeEntry:
+    client = get_b2b_mcp_client()
+    daily_sales = await client.get_daily_sales_data(key[0], key[1])
+    items = (daily_sales or {}).get("items") or []
+    return _RangeEntry(items=items, error=(daily_sales or {}).get("error"), fetched_at=time.time())
+
+
+async def _fetch_and_cache_range(key: Tuple[str, str]) -> _RangeEntry:
+    entry = await _fetch_range(key)
+    # Failed fetches are not cached so the next request retries.
+    if entry.error is None:
+        if key not in _RANGE_CACHE and len(_RANGE_CACHE) >= B2B_CACHE_MAX_RANGES:
+            oldest = min(_RANGE_CACHE, key=lambda k: _RANGE_CACHE[k].fetched_at)
+            _RANGE_CACHE.pop(oldest, None)
+        _RANGE_CACHE[key] = entry
+    return entry
+
+
+async def _get_range_entry(key: Tuple[str, str]) -> _RangeEntry:
+    entry = _RANGE_CACHE.get(key)
+    if entry is not None and time.time() - entry.fetched_at <= B2B_CACHE_TTL_SECONDS:
+        return entry
+    return await _RANGE_FLIGHT.do_async(("b2b-range",) + key, _fetch_and_cache_range, key)
+
+
+async def get_b2b_facts(date_from: Optional[str] = None, date_to: Optional[str] = None) -> B2BFacts:
+    """
+    Return the B2B fact frame for a date range.
+
+    Concurrent callers for the same range share one MCP request; the fetched
+    rows are reused for ``B2B_CACHE_TTL_SECONDS``, and the derived frame is
+    rebuilt only when the purchase-price snapshot changes.
+    """
+    date_range = format_date_range(date_from, date_to)
+    key = (date_range["from"], date_range["to"])
+    entry = await _get_range_entry(key)
+
+    price_service = get_b2b_purchase_price_service()
+    version = price_service.sheet_version
+    facts = entry.facts_by_version.get(version)
+    if facts is None:
+        frame = build_fact_frame(entry.items, price_service)
+        facts = B2BFacts(
+            frame=frame,
+            date_range=date_range,
+            price_version=version,
+            fetched_at=entry.fetched_at,
+            error=entry.error,
+        )
+        entry.facts_by_version = {version: facts}
+    return facts
+
+
+def clear_b2b_facts_cache() -> None:
+    """Drop every cached date range (mainly for testing)."""
+    _RANGE_CACHE.clear()
@@ -8,11 +8,13 @@ Supports both JSON-RPC 2.0 and REST API formats.
 import os
 import httpx
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import date, timedelta
 from functools import lru_cache
 from datetime import datetime
 
+from services.b2b_day_cache import B2BDayCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -45,6 +47,7 @@ class B2BMCPClient:
                 "Content-Type": "application/json"
             }
         )
+        self._day_cache = B2BDayCache()
     
     async def call_tool(
         self, 
@@ -106,6 +109,38 @@ class B2BMCPClient:
             logger.error(f"Unexpected error calling {tool_name}: {str(e)}")
             raise
     
+    async def _fetch_daily_rows(self, start: Any, end: Any) -> List[Dict[str, Any]]:
+        """Fetch raw getDailyProductOrders rows for an inclusive date span."""
+        result = await self.call_tool(
+            "getDailyProductOrders",
+            {
+                "startDate": str(start),
+                "endDate": str(end)
+            },
+            use_rest=False  # Use JSON-RPC 2.0 format
+        )
+        
+        # The Product Orders MCP returns an array of daily product orders
+        # The JSON-RPC result could be a list directly, or wrapped in a dict
+        if isinstance(result, list):
+            # Direct list of items
+            return result
+        if isinstance(result, dict):
+            # Could be wrapped in a dict - check for common keys
+            if "data" in result:
+                return result["data"]
+            if "items" in result:
+                return result["items"]
+            if "orders" in result:
+                return result["orders"]
+            # Try to extract list from dict values
+            # If it's a dict with array-like structure, get the first list value
+            list_values = [v for v in result.values() if isinstance(v, list)]
+            if list_values:
+                return list_values[0]
+            raise ValueError(f"Could not find list data in getDailyProductOrders result: {list(result.keys())}")
+        raise ValueError(f"Unexpected response type from getDailyProductOrders: {type(result)}")
+    
     async def get_daily_sales_data(
         self,
         date_from: Optional[str] = None,
@@ -131,48 +166,21 @@ class B2BMCPClient:
         """
         date_range = format_date_range(date_from, date_to)
         
-        # Use getDailyProductOrders from the Product Orders MCP
         try:
-            result = await self.call_tool(
-                "getDailyProductOrders",
-                {
-                    "startDate": date_range["from"],
-                    "endDate": date_range["to"]
-                },
-                use_rest=False  # Use JSON-RPC 2.0 format
-            )
+            try:
+                start = datetime.strptime(date_range["from"], "%Y-%m-%d").date()
+                end = datetime.strptime(date_range["to"], "%Y-%m-%d").date()
+            except ValueError:
+                start = end = None
             
-            # Transform the response to match expected format
-            # The Product Orders MCP returns an array of daily product orders
-            # The JSON-RPC result could be a list directly, or wrapped in a dict
-            items = []
-            
-            # Handle different response formats
-            if isinstance(result, list):
-                # Direct list of items
-                data_list = result
-            elif isinstance(result, dict):
-                # Could be wrapped in a dict - check for common keys
-                if "data" in result:
-                    data_list = result["data"]
-                elif "items" in result:
-                    data_list = result["items"]
-                elif "orders" in result:
-                    data_list = result["orders"]
-                else:
-                    # Try to extract list from dict values
-                    # If it's a dict with array-like structure, get the first list value
-                    list_values = [v for v in result.values() if isinstance(v, list)]
-                    if list_values:
-                        data_list = list_values[0]
-                    else:
-                        logger.warning(f"Could not find list data in dict result: {list(result.keys())}")
-                        data_list = []
+            if start is not None and end is not None and start <= end:
+                # Only days missing from the per-day cache are requested from the MCP
+                data_list = await self._day_cache.get_rows(start, end, self._fetch_daily_rows)
             else:
-                logger.warning(f"Unexpected response type from getDailyProductOrders: {type(result)}")
-                data_list = []
+                data_list = await self._fetch_daily_rows(date_range["from"], date_range["to"])
             
             # Process the list of items
+            items = []
             for row in data_list:
                 # Map the MCP response structure to our expected format
                 # Each row is already aggregated by date + product + customer_type
@@ -299,6 +307,10 @@ class B2BMCPClient:
                 "error": f"Product-level sales data not available: {str(e)}"
             }
     
+    def day_cache_stats(self) -> Dict[str, Any]:
+        """Hit/fetch counters of the per-day getDailyProductOrders cache."""
+        return self._day_cache.stats()
+    
     async def close(self):
         """Close the HTTP client session."""
         await self.session.aclose()
@@ -6,104 +6,144 @@ with next-day offset logic (today's purchase price applies to tomorrow's B2B sal
 """
 
 import logging
+import threading
 from datetime import date, timedelta
-from typing import Dict, Optional, Tuple
-from functools import lru_cache
-from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from services.sheet_data import fetch_raw_sheet_data
+import numpy as np
+import pandas as pd
+
+from services.sheet_data import get_sheet_snapshot
 
 logger = logging.getLogger(__name__)
 
 
 class B2BPurchasePriceService:
-    """Service for fetching and caching purchase prices from Google Sheets."""
-    
+    """
+    Service for fetching and caching purchase prices from Google Sheets.
+
+    Prices are indexed per product as a sorted array of purchase days, so the
+    "latest price before the sale date" fallback is a binary search. The index
+    is rebuilt whenever the sheet snapshot version changes.
+    """
+
     _instance: Optional['B2BPurchasePriceService'] = None
-    _purchase_price_map: Dict[date, Dict[str, float]] = {}
-    _product_averages: Dict[str, float] = {}
-    _last_fetch_date: Optional[date] = None
-    
+    _lock = threading.Lock()
+
     def __init__(self):
         """Initialize the purchase price service."""
+        self._purchase_price_map: Dict[date, Dict[str, float]] = {}
+        self._price_index: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._price_frame: pd.DataFrame = pd.DataFrame(columns=["product", "day", "purchase_price"])
+        self._product_averages: Dict[str, float] = {}
+        self._last_fetch_date: Optional[date] = None
+        self._sheet_version: Optional[str] = None
+        self._reload_lock = threading.Lock()
         self._load_purchase_prices()
-    
+
     @classmethod
     def get_instance(cls) -> 'B2BPurchasePriceService':
-        """Get or create singleton instance."""
-        if cls._instance is None:
-            cls._instance = cls()
+        """Get or create singleton instance, reloading it if the sheet snapshot changed."""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+                return cls._instance
+        cls._instance.refresh_if_stale()
         return cls._instance
-    
+
+    @property
+    def sheet_version(self) -> Optional[str]:
+        """Version of the sheet snapshot the current index was built from."""
+        return self._sheet_version
+
     def _load_purchase_prices(self):
-        """Load purchase prices from Google Sheets and build lookup maps."""
-        try:
-            df = fetch_raw_sheet_data()
-            if df is None or df.empty:
-                logger.warning("No purchase price data available from Google Sheets")
-                return
-            
-            # Clear existing maps
-            self._purchase_price_map.clear()
-            self._product_averages.clear()
-            
-            # Build date-based lookup map and calculate averages
-            product_prices: Dict[str, list[float]] = defaultdict(list)
-            
-            # Import normalize function to avoid circular import
-            from main import _normalize_product_name
-            
-            for _, row in df.iterrows():
-                raw_name = str(row.get("Product Name", "")).strip()
-                if not raw_name:
-                    continue
-                
-                normalized_name = _normalize_product_name(raw_name)
-                if not normalized_name:
-                    continue
-                
-                entry_date = row['date_dt']
-                if hasattr(entry_date, 'date'):
-                    entry_date = entry_date.date()
-                elif isinstance(entry_date, str):
-                    from datetime import datetime
-                    entry_date = datetime.strptime(entry_date, "%Y-%m-%d").date()
-                
-                purchase_price = float(row.get("PurchasingPrice", 0.0))
-                
-                if purchase_price > 0:
-                    # Add to date-based map
-                    if entry_date not in self._purchase_price_map:
-                        self._purchase_price_map[entry_date] = {}
-                    self._purchase_price_map[entry_date][normalized_name] = purchase_price
-                    
-                    # Track for average calculation
-                    product_prices[normalized_name].append(purchase_price)
-            
-            # Calculate averages for each product
-            for product_name, prices in product_prices.items():
-                if prices:
-                    self._product_averages[product_name] = sum(prices) / len(prices)
-            
-            self._last_fetch_date = date.today()
-            logger.info(f"Loaded purchase prices for {len(self._purchase_price_map)} dates, {len(self._product_averages)} products")
-            
-        except Exception as e:
-            logger.error(f"Error loading purchase prices: {e}")
-    
+        """Load purchase prices from the sheet snapshot and build lookup indexes."""
+        with self._reload_lock:
+            try:
+                snapshot = get_sheet_snapshot()
+                df = snapshot.data if snapshot else None
+                if df is None or df.empty:
+                    logger.warning("No purchase price data available from Google Sheets")
+                    return
+                if snapshot.version == self._sheet_version:
+                    return
+
+                # Import normalize function to avoid circular import
+                from main import _load_product_alias_index
+
+                alias_map = _load_product_alias_index()
+                names = df["Product Name"].astype(str).str.strip() if "Product Name" in df.columns else None
+                if names is None:
+                    logger.warning("Column 'Product Name' missing; no purchase prices loaded")
+                    return
+                canonical = names.str.lower().map(alias_map).fillna(names)
+
+                dates = df["date_dt"]
+                if getattr(dates.dt, "tz", None) is not None:
+                    dates = dates.dt.tz_localize(None)
+
+                prices = pd.DataFrame(
+                    {
+                        "product": canonical.to_numpy(),
+                        "day": dates.dt.normalize().to_numpy().astype("datetime64[D]"),
+                        "purchase_price": pd.to_numeric(df["PurchasingPrice"], errors="coerce").fillna(0.0).to_numpy(),
+                    }
+                )
+                prices = prices[(names != "").to_numpy() & (prices["purchase_price"] > 0).to_numpy()]
+
+                # Averages count every priced row; the per-day map keeps the last row for a day.
+                averages = prices.groupby("product", sort=False)["purchase_price"].mean()
+                daily = (
+                    prices.drop_duplicates(subset=["product", "day"], keep="last")
+                    .sort_values(["product", "day"], kind="stable")
+                    .reset_index(drop=True)
+                )
+
+                price_index: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+                for product, group in daily.groupby("product", sort=False):
+                    price_index[product] = (group["day"].to_numpy(), group["purchase_price"].to_numpy())
+
+                price_map: Dict[date, Dict[str, float]] = {}
+                for product, day, price in zip(daily["product"], daily["day"], daily["purchase_price"]):
+                    price_map.setdefault(pd.Timestamp(day).date(), {})[product] = float(price)
+
+                # Swap in the new indexes together so readers never see a half-built state.
+                self._price_index = price_index
+                self._price_frame = daily
+                self._purchase_price_map = price_map
+                self._product_averages = {product: float(avg) for product, avg in averages.items()}
+                self._sheet_version = snapshot.version
+                self._last_fetch_date = date.today()
+                logger.info(
+                    f"Loaded purchase prices for {len(self._purchase_price_map)} dates, "
+                    f"{len(self._product_averages)} products (sheet version {snapshot.version})"
+                )
+
+            except Exception as e:
+                logger.error(f"Error loading purchase prices: {e}")
+
+    def refresh_if_stale(self) -> bool:
+        """Rebuild the indexes if the sheet snapshot has a new version. Returns True if reloaded."""
+        snapshot = get_sheet_snapshot()
+        if snapshot is None or snapshot.version == self._sheet_version:
+            return False
+        logger.info("Sheet snapshot changed (%s -> %s); reloading purchase prices", self._sheet_version, snapshot.version)
+        self._load_purchase_prices()
+        return self._sheet_version == snapshot.version
+
     def get_purchase_price_for_sale_date(
-        self, 
-        product_name: str, 
+        self,
+        product_name: str,
         sale_date: date
     ) -> Tuple[float, str]:
         """
         Get purchase price for a product on a sale date.
         Uses purchase price from previous day (sale_date - 1 day).
-        
+
         Args:
             product_name: Name of the product
             sale_date: Date of the B2B sale
-            
+
         Returns:
             Tuple of (purchase_price, source_description)
             source_description indicates where the price came from:
@@ -114,79 +154,141 @@ class B2BPurchasePriceService:
         """
         # Import normalize function to avoid circular import
         from main import _normalize_product_name
-        
+
         # Normalize product name
         normalized_name = _normalize_product_name(product_name)
         if not normalized_name:
             return 0.0, "missing"
-        
-        # Calculate purchase date (previous day)
-        purchase_date = sale_date - timedelta(days=1)
-        
-        # Try 1: Exact date match (previous day)
-        if purchase_date in self._purchase_price_map:
-            if normalized_name in self._purchase_price_map[purchase_date]:
-                price = self._purchase_price_map[purchase_date][normalized_name]
-                return price, "exact_date"
-        
-        # Try 2: Find latest available price before sale_date
-        latest_price = None
-        latest_date = None
-        for price_date in sorted(self._purchase_price_map.keys(), reverse=True):
-            if price_date < sale_date:
-                if normalized_name in self._purchase_price_map[price_date]:
-                    latest_price = self._purchase_price_map[price_date][normalized_name]
-                    latest_date = price_date
-                    break
-        
-        if latest_price is not None:
-            return latest_price, f"latest_before_{latest_date}"
-        
-        # Try 3: Use average price for product
+
+        # Latest price strictly before the sale date; the previous day is an exact match
+        entry = self._price_index.get(normalized_name)
+        if entry is not None:
+            days, prices = entry
+            pos = int(np.searchsorted(days, np.datetime64(sale_date, "D"), side="left")) - 1
+            if pos >= 0:
+                price_date = pd.Timestamp(days[pos]).date()
+                if price_date == sale_date - timedelta(days=1):
+                    return float(prices[pos]), "exact_date"
+                return float(prices[pos]), f"latest_before_{price_date}"
+
+        # Use average price for product
         if normalized_name in self._product_averages:
             return self._product_averages[normalized_name], "average"
-        
+
         # Fallback: No price found
         logger.warning(f"No purchase price found for product '{product_name}' (normalized: '{normalized_name}') on sale date {sale_date}")
         return 0.0, "missing"
-    
+
+    def get_purchase_prices_for_sales(
+        self,
+        product_names: Sequence[str],
+        sale_dates: Sequence[date],
+    ) -> List[Tuple[float, str]]:
+        """
+        Resolve purchase prices for many (product, sale_date) pairs with one as-of join.
+
+        Returns ``(purchase_price, source_description)`` per input pair, with the
+        same semantics as ``get_purchase_price_for_sale_date``.
+        """
+        if len(product_names) != len(sale_dates):
+            raise ValueError("product_names and sale_dates must have the same length")
+        if not product_names:
+            return []
+
+        # Import normalize function to avoid circular import
+        from main import _normalize_product_name
+
+        normalized_cache: Dict[str, str] = {}
+        normalized: List[str] = []
+        for name in product_names:
+            key = name or ""
+            if key not in normalized_cache:
+                normalized_cache[key] = _normalize_product_name(key)
+            normalized.append(normalized_cache[key])
+
+        sales = pd.DataFrame(
+            {
+                "row": np.arange(len(normalized)),
+                "product": normalized,
+                "sale_day": np.array(sale_dates, dtype="datetime64[D]"),
+            }
+        ).sort_values("sale_day", kind="stable")
+
+        prices = self._price_frame.rename(columns={"day": "price_day"}).sort_values("price_day", kind="stable")
+        if prices.empty:
+            matched = sales.assign(price_day=pd.NaT, purchase_price=np.nan)
+        else:
+            matched = pd.merge_asof(
+                sales,
+                prices,
+                left_on="sale_day",
+                right_on="price_day",
+                by="product",
+                allow_exact_matches=False,
+                direction="backward",
+            )
+        matched = matched.sort_values("row")
+
+        results: List[Tuple[float, str]] = []
+        missing: List[str] = []
+        for product, sale_day, price_day, price in zip(
+            matched["product"], matched["sale_day"], matched["price_day"], matched["purchase_price"]
+        ):
+            if not product:
+                results.append((0.0, "missing"))
+            elif not pd.isna(price_day):
+                price_date = pd.Timestamp(price_day).date()
+                if price_date == pd.Timestamp(sale_day).date() - timedelta(days=1):
+                    results.append((float(price), "exact_date"))
+                else:
+                    results.append((float(price), f"latest_before_{price_date}"))
+            elif product in self._product_averages:
+                results.append((self._product_averages[product], "average"))
+            else:
+                results.append((0.0, "missing"))
+                missing.append(product)
+
+        if missing:
+            logger.warning(f"No purchase price found for {len(missing)} sales rows across products: {sorted(set(missing))}")
+        return results
+
     def get_purchase_prices_for_date_range(
-        self, 
-        from_date: date, 
+        self,
+        from_date: date,
         to_date: date
     ) -> Dict[date, Dict[str, float]]:
         """
         Get purchase prices for a date range.
         Returns prices for dates [from_date - 1, to_date - 1] to cover next-day offset.
-        
+
         Args:
             from_date: Start date of B2B sales
             to_date: End date of B2B sales
-            
+
         Returns:
             Dictionary mapping date -> {product_name: purchase_price}
         """
         # Fetch prices for previous day range
         purchase_from = from_date - timedelta(days=1)
         purchase_to = to_date - timedelta(days=1)
-        
+
         result: Dict[date, Dict[str, float]] = {}
-        
+
         current_date = purchase_from
         while current_date <= purchase_to:
             if current_date in self._purchase_price_map:
                 result[current_date] = self._purchase_price_map[current_date].copy()
             current_date += timedelta(days=1)
-        
+
         return result
-    
+
     def refresh_cache(self):
-        """Refresh the purchase price cache from Google Sheets."""
+        """Refresh the purchase price cache from the latest sheet snapshot."""
         logger.info("Refreshing purchase price cache...")
+        self._sheet_version = None
         self._load_purchase_prices()
 
 
 def get_b2b_purchase_price_service() -> B2BPurchasePriceService:
     """Get the singleton B2B purchase price service instance."""
     return B2BPurchasePriceService.get_instance()
-
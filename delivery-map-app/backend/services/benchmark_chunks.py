@@ -0,0 +1,308 @@
+"""
+Chunked benchmark price history fetching with concurrency, retries and a disk cache.
+
+The analysis window is split into chunks aligned to a fixed grid so the same
+historical chunk always has the same key. Chunks that ended before the open
+window are immutable: they are kept in a bounded in-memory LRU and as JSON
+files on disk (evicted oldest-first beyond a size budget). Recent chunks are
+cached in memory for a short TTL only. The open window is the order rollup's
+``ORDER_ROLLUP_OPEN_DAYS``, so prices are not frozen before the orders they
+are compared with.
+
+An empty chunk is never cached: the API answering ``data: []`` for a past
+window usually means a transient failure or prices not backfilled yet, so it
+is served as is and reported as incomplete.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from .clickhouse_rollup import ORDER_ROLLUP_OPEN_DAYS
+from .snapshot_files import SNAPSHOT_DIR, SNAPSHOT_PERSIST_ENABLED
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_API_URL = os.getenv("BENCHMARK_API_URL")
+BENCHMARK_API_KEY = os.getenv("BENCHMARK_API_KEY")
+BENCHMARK_LOCATION_GROUPS = [
+    "farm",
+    "distribution-center",
+    "local-shops",
+    "sunday-market",
+    "supermarket",
+    "ecommerce",
+    "chipchip",
+]
+
+BENCHMARK_CHUNK_DAYS = int(os.getenv("BENCHMARK_CHUNK_DAYS", "21"))
+BENCHMARK_FETCH_CONCURRENCY = int(os.getenv("BENCHMARK_FETCH_CONCURRENCY", "4"))
+BENCHMARK_FETCH_RETRIES = int(os.getenv("BENCHMARK_FETCH_RETRIES", "3"))
+BENCHMARK_FETCH_TIMEOUT = float(os.getenv("BENCHMARK_FETCH_TIMEOUT", "20"))
+# Chunks touching the order open window may still change and are only cached briefly.
+BENCHMARK_OPEN_DAYS = ORDER_ROLLUP_OPEN_DAYS
+BENCHMARK_OPEN_CHUNK_TTL_SECONDS = float(os.getenv("BENCHMARK_OPEN_CHUNK_TTL_SECONDS", "600"))
+BENCHMARK_MEMORY_CACHE_CHUNKS = int(os.getenv("BENCHMARK_MEMORY_CACHE_CHUNKS", "64"))
+BENCHMARK_DISK_CACHE_DIR = Path(os.getenv("BENCHMARK_DISK_CACHE_DIR") or SNAPSHOT_DIR / "benchmark")
+BENCHMARK_DISK_CACHE_MAX_MB = float(os.getenv("BENCHMARK_DISK_CACHE_MAX_MB", "200"))
+
+# Chunk grid anchor; only needs to be stable across processes.
+_GRID_ANCHOR = date(2025, 1, 3)
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class BenchmarkChunkError(Exception):
+    """Raised when a chunk could not be fetched after all retries."""
+
+
+def chunk_grid(start_date: date, end_date: date, chunk_days: int = BENCHMARK_CHUNK_DAYS) -> List[Tuple[date, date]]:
+    """Grid-aligned inclusive chunks covering ``[start_date, end_date]``."""
+    chunk_days = max(1, chunk_days)
+    first = (start_date - _GRID_ANCHOR).days // chunk_days
+    last = (end_date - _GRID_ANCHOR).days // chunk_days
+    chunks = []
+    for index in range(first, last + 1):
+        chunk_start = _GRID_ANCHOR + timedelta(days=index * chunk_days)
+        chunks.append((chunk_start, chunk_start + timedelta(days=chunk_days - 1)))
+    return chunks
+
+
+class BenchmarkChunkCache:
+    """Two-level (memory LRU + disk) cache of raw benchmark rows per chunk."""
+
+    def __init__(
+        self,
+        directory: Path = BENCHMARK_DISK_CACHE_DIR,
+        memory_chunks: int = BENCHMARK_MEMORY_CACHE_CHUNKS,
+        disk_budget_bytes: int = int(BENCHMARK_DISK_CACHE_MAX_MB * 1024 * 1024),
+    ) -> None:
+        self._directory = directory
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[float, bool, List[Dict[str, Any]]]]" = OrderedDict()
+        self._memory_chunks = max(1, memory_chunks)
+        self._disk_budget = disk_budget_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def is_closed(chunk_end: date) -> bool:
+        return chunk_end < date.today() - timedelta(days=BENCHMARK_OPEN_DAYS)
+
+    def _path(self, key: Tuple[str, str]) -> Path:
+        return self._directory / f"{key[0]}_{key[1]}.json"
+
+    def get(self, key: Tuple[str, str]) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                stored_at, closed, rows = cached
+                if closed or time.time() - stored_at <= BENCHMARK_OPEN_CHUNK_TTL_SECONDS:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return rows
+                self._memory.pop(key, None)
+
+        rows = self._read_disk(key)
+        if rows:
+            with self._lock:
+                self.disk_hits += 1
+            self._remember(key, rows, closed=True)
+            return rows
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: Tuple[str, str], rows: List[Dict[str, Any]], closed: bool) -> None:
+        self._remember(key, rows, closed)
+        if closed:
+            self._write_disk(key, rows)
+
+    def _remember(self, key: Tuple[str, str], rows: List[Dict[str, Any]], closed: bool) -> None:
+        with self._lock:
+            self._memory[key] = (time.time(), closed, rows)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._memory_chunks:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key: Tuple[str, str]) -> Optional[List[Dict[str, Any]]]:
+        if not SNAPSHOT_PERSIST_ENABLED:
+            return None
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                rows = json.load(handle)
+            os.utime(path)  # keep recently used chunks at the back of the eviction order
+            return rows
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Discarding unreadable benchmark cache file %s: %s", path, exc)
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+
+    def _write_disk(self, key: Tuple[str, str], rows: List[Dict[str, Any]]) -> None:
+        if not SNAPSHOT_PERSIST_ENABLED:
+            return
+        path = self._path(key)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump(rows, handle, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Failed to persist benchmark chunk %s: %s", path, exc)
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        try:
+            files = [(p.stat().st_mtime, p.stat().st_size, p) for p in self._directory.glob("*.json")]
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self._disk_budget:
+                break
+            try:
+                path.unlink()
+                total -= size
+                logger.info("Evicted benchmark cache file %s", path.name)
+            except OSError:
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "memory_chunks": len(self._memory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "directory": str(self._directory),
+            }
+
+
+_CHUNK_CACHE = BenchmarkChunkCache()
+_http_client: Optional[httpx.Client] = None
+_http_lock = threading.Lock()
+
+
+def _get_http_client() -> httpx.Client:
+    """Shared pooled client; httpx.Client is safe to use from several threads."""
+    global _http_client
+    with _http_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                timeout=BENCHMARK_FETCH_TIMEOUT,
+                limits=httpx.Limits(max_connections=max(1, BENCHMARK_FETCH_CONCURRENCY)),
+                headers={
+                    "apikey": BENCHMARK_API_KEY or "",
+                    "Authorization": f"Bearer {BENCHMARK_API_KEY}",
+                    "Content-Type": "application/json",
+                },
+            )
+        return _http_client
+
+
+def _download_chunk(chunk_start: date, chunk_end: date) -> List[Dict[str, Any]]:
+    params = {
+        "dateFrom": chunk_start.strftime("%Y-%m-%d"),
+        "dateTo": chunk_end.strftime("%Y-%m-%d"),
+        "frequency": "daily",
+        "comparisonType": "avg",
+        "locationGroups": ",".join(BENCHMARK_LOCATION_GROUPS),
+    }
+    attempts = max(1, BENCHMARK_FETCH_RETRIES)
+    last_error: Optional[Exception] = None
+    for attempt in range(attempts):
+        try:
+            response = _get_http_client().get(BENCHMARK_API_URL, params=params)
+            if response.status_code in _RETRYABLE_STATUS:
+                raise httpx.HTTPStatusError(
+                    f"Retryable status {response.status_code}", request=response.request, response=response
+                )
+            response.raise_for_status()
+            return response.json().get("data", [])
+        except httpx.HTTPStatusError as exc:
+            last_error = exc
+            if exc.response.status_code not in _RETRYABLE_STATUS:
+                break
+        except (httpx.TransportError, ValueError) as exc:
+            last_error = exc
+        if attempt + 1 < attempts:
+            time.sleep(0.5 * (2 ** attempt))
+    raise BenchmarkChunkError(
+        f"Benchmark chunk {params['dateFrom']}..{params['dateTo']} failed after {attempts} attempt(s): {last_error}"
+    )
+
+
+def _load_chunk(chunk: Tuple[date, date]) -> List[Dict[str, Any]]:
+    key = (chunk[0].isoformat(), chunk[1].isoformat())
+    rows = _CHUNK_CACHE.get(key)
+    if rows is not None:
+        return rows
+    rows = _download_chunk(*chunk)
+    if rows:
+        _CHUNK_CACHE.put(key, rows, closed=BenchmarkChunkCache.is_closed(chunk[1]))
+    return rows
+
+
+def fetch_benchmark_rows(start_date: date, end_date: date) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Raw benchmark API rows for every grid chunk overlapping ``[start_date, end_date]``.
+
+    Returns ``(rows, complete)``. Rows are in chunk order; callers filter by date.
+    Chunks that still fail after retries are logged and left out, so callers get
+    partial data with ``complete`` False; empty chunks and an unconfigured API
+    also report False.
+    """
+    if not BENCHMARK_API_URL or not BENCHMARK_API_KEY:
+        return [], False
+
+    chunks = chunk_grid(start_date, end_date)
+    workers = max(1, min(BENCHMARK_FETCH_CONCURRENCY, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="benchmark") as pool:
+        futures = [pool.submit(_load_chunk, chunk) for chunk in chunks]
+
+    rows: List[Dict[str, Any]] = []
+    failed = empty = 0
+    for chunk, future in zip(chunks, futures):
+        try:
+            chunk_rows = future.result()
+        except Exception as exc:  # pylint: disable=broad-except
+            failed += 1
+            logger.warning("Skipping benchmark chunk %s..%s: %s", chunk[0], chunk[1], exc)
+            continue
+        if not chunk_rows:
+            empty += 1
+        rows.extend(chunk_rows)
+    if failed or empty:
+        logger.warning(
+            "%d of %d benchmark chunks unavailable and %d empty for %s..%s",
+            failed, len(chunks), empty, start_date, end_date,
+        )
+    return rows, failed == 0 and empty == 0
+
+
+def benchmark_cache_stats() -> Dict[str, Any]:
+    return _CHUNK_CACHE.stats()
@@ -0,0 +1,261 @@
+"""
+Nearest-benchmark lookups for leader pricing.
+
+Benchmark locations are geocoded place names, so the same few hundred
+coordinates recur across products and days. Each distinct coordinate is
+registered once (in radians); a leader's haversine distances to every
+registered location are computed in one vectorized pass and kept for the
+life of the process. A (product, day, channel) point list is stored as a
+list of location ids, so choosing the closest benchmark for an order is a
+single ``min`` over precomputed distances, and the result is memoized per
+leader coordinate.
+
+Point lists per key are short (tens of entries), so the per-order step uses
+plain list indexing; numpy is only used for the distance rows. Bulk callers
+use ``select_many``, which resolves every leader of a key with one ``argmin``
+over a leader x location distance matrix.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+Coordinate = Tuple[float, float]
+Selection = Tuple[Optional[float], Optional[float], Optional[str], Optional[str]]
+
+_EMPTY_SELECTION: Selection = (None, None, None, None)
+
+
+def haversine_km(lat_rad: np.ndarray, lon_rad: np.ndarray, coord: Tuple[Any, Any]) -> np.ndarray:
+    """Great-circle distances in km from ``coord`` (degrees, scalars or broadcastable arrays) to radians."""
+    phi1 = np.radians(coord[0])
+    lam1 = np.radians(coord[1])
+    a = np.sin((lat_rad - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(lat_rad) * np.sin((lon_rad - lam1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class LocationRegistry:
+    """Process-wide table of benchmark coordinates with cached per-leader distances."""
+
+    def __init__(self, max_leaders: int = 20000) -> None:
+        self._ids: Dict[Coordinate, int] = {}
+        self._lat: List[float] = []
+        self._lon: List[float] = []
+        self._lat_rad = np.empty(0)
+        self._lon_rad = np.empty(0)
+        self._distances: Dict[Coordinate, List[float]] = {}
+        self._max_leaders = max_leaders
+        self._lock = threading.Lock()
+
+    def register(self, lat: float, lon: float) -> int:
+        coord = (float(lat), float(lon))
+        with self._lock:
+            location_id = self._ids.get(coord)
+            if location_id is None:
+                location_id = len(self._lat)
+                self._ids[coord] = location_id
+                self._lat.append(coord[0])
+                self._lon.append(coord[1])
+            return location_id
+
+    def _sync_radians(self) -> None:
+        if len(self._lat_rad) != len(self._lat):
+            self._lat_rad = np.radians(np.asarray(self._lat, dtype=float))
+            self._lon_rad = np.radians(np.asarray(self._lon, dtype=float))
+
+    def distances(self, leader: Coordinate) -> List[float]:
+        """Distances from ``leader`` to every registered location, indexed by location id."""
+        with self._lock:
+            cached = self._distances.get(leader)
+            size = len(self._lat)
+            if cached is not None and len(cached) == size:
+                return cached
+            self._sync_radians()
+            start = 0 if cached is None else len(cached)
+            fresh = haversine_km(self._lat_rad[start:], self._lon_rad[start:], leader).tolist()
+            row = fresh if cached is None else cached + fresh
+            if cached is None and len(self._distances) >= self._max_leaders:
+                self._distances.clear()
+            self._distances[leader] = row
+            return row
+
+    def distance_matrix(self, leaders: List[Coordinate]) -> np.ndarray:
+        """``len(leaders) x locations`` distance matrix; row ``i`` is ``distances(leaders[i])``."""
+        with self._lock:
+            self._sync_radians()
+            lat_rad, lon_rad = self._lat_rad, self._lon_rad
+        coords = np.asarray(leaders, dtype=float).reshape(-1, 2)
+        return haversine_km(lat_rad[np.newaxis, :], lon_rad[np.newaxis, :], (coords[:, :1], coords[:, 1:]))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"locations": len(self._lat), "leaders": len(self._distances)}
+
+
+_REGISTRY = LocationRegistry()
+
+
+class _ChannelPoints:
+    __slots__ = ("ids", "prices", "locations", "groups", "_arrays")
+
+    def __init__(self, points: List[Dict[str, Any]], registry: LocationRegistry) -> None:
+        self.ids: List[int] = []
+        self.prices: List[Any] = []
+        self.locations: List[Any] = []
+        self.groups: List[Any] = []
+        for point in points:
+            lat = point.get("lat")
+            lon = point.get("lon")
+            if lat is None or lon is None:
+                continue
+            self.ids.append(registry.register(lat, lon))
+            self.prices.append(point.get("price"))
+            self.locations.append(point.get("location", "Unknown"))
+            self.groups.append(point.get("location_group"))
+        self._arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """``(ids, prices, locations, groups)`` as numpy arrays for bulk selection."""
+        if self._arrays is None:
+            locations = np.empty(len(self.ids), dtype=object)
+            locations[:] = self.locations
+            groups = np.empty(len(self.ids), dtype=object)
+            groups[:] = self.groups
+            self._arrays = (
+                np.asarray(self.ids, dtype=np.intp),
+                np.array([np.nan if price is None else price for price in self.prices], dtype=float),
+                locations,
+                groups,
+            )
+        return self._arrays
+
+
+class BenchmarkLocationIndex:
+    """
+    Closest-benchmark selection over a merged price series.
+
+    ``select`` returns the same ``(price, distance_km, location, location_group)``
+    tuple as a linear scan: the first point at the strictly smallest distance,
+    or the channel average when the leader or the points have no coordinates.
+    """
+
+    def __init__(self, price_series: Dict[Hashable, Dict[str, Any]], registry: LocationRegistry = _REGISTRY) -> None:
+        self._series = price_series
+        self._registry = registry
+        self._points: Dict[Tuple[Hashable, str], Optional[_ChannelPoints]] = {}
+        self._results: Dict[Tuple[Hashable, str, Coordinate], Selection] = {}
+
+    def _channel_points(self, key: Hashable, channel: str, channel_entry: Dict[str, Any]) -> Optional[_ChannelPoints]:
+        cache_key = (key, channel)
+        if cache_key not in self._points:
+            points = channel_entry.get("points") or []
+            indexed = _ChannelPoints(points, self._registry) if points else None
+            self._points[cache_key] = indexed if indexed is not None and len(indexed.ids) else None
+        return self._points[cache_key]
+
+    def select(self, key: Hashable, channel: str, leader_coord: Optional[Coordinate]) -> Selection:
+        price_entry = self._series.get(key)
+        if not price_entry:
+            return _EMPTY_SELECTION
+        channel_entry = price_entry.get(channel)
+        if not channel_entry:
+            return _EMPTY_SELECTION
+
+        if leader_coord:
+            leader = (float(leader_coord[0]), float(leader_coord[1]))
+            result_key = (key, channel, leader)
+            cached = self._results.get(result_key)
+            if cached is not None:
+                return cached
+            indexed = self._channel_points(key, channel, channel_entry)
+            if indexed is not None:
+                distances = self._registry.distances(leader)
+                # min() keeps the first of equally distant ids, and index() its first position
+                best_id = min(indexed.ids, key=distances.__getitem__)
+                best = indexed.ids.index(best_id)
+                price = indexed.prices[best]
+                if price is not None:
+                    result: Selection = (price, distances[best_id], indexed.locations[best], indexed.groups[best])
+                    self._results[result_key] = result
+                    return result
+
+        return (channel_entry.get("avg"), None, None, None)
+
+
+    def select_many(
+        self,
+        keys: Sequence[Hashable],
+        leader_coords: Sequence[Optional[Coordinate]],
+        channels: Sequence[str] = ("local", "distribution"),
+    ) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Vectorized ``select`` for parallel sequences of keys and leader coordinates.
+
+        Returns ``{channel: (prices, distances_km, locations, location_groups)}``;
+        missing prices and distances are NaN, missing names None (object arrays).
+        """
+        size = len(keys)
+        positions: Dict[Hashable, List[int]] = {}
+        for position, key in enumerate(keys):
+            positions.setdefault(key, []).append(position)
+
+        leader_rows: Dict[Coordinate, int] = {}
+        position_rows = np.full(size, -1, dtype=np.intp)
+        for position, coord in enumerate(leader_coords):
+            if coord:
+                leader = (float(coord[0]), float(coord[1]))
+                position_rows[position] = leader_rows.setdefault(leader, len(leader_rows))
+
+        # Register every point before building the matrix so it covers all location ids.
+        entries: List[Tuple[str, np.ndarray, Dict[str, Any], Optional[_ChannelPoints]]] = []
+        for key, key_positions in positions.items():
+            price_entry = self._series.get(key)
+            if not price_entry:
+                continue
+            where = np.asarray(key_positions, dtype=np.intp)
+            for channel in channels:
+                channel_entry = price_entry.get(channel)
+                if channel_entry:
+                    entries.append((channel, where, channel_entry, self._channel_points(key, channel, channel_entry)))
+        matrix = self._registry.distance_matrix(list(leader_rows)) if leader_rows else None
+
+        results = {
+            channel: (
+                np.full(size, np.nan),
+                np.full(size, np.nan),
+                np.full(size, None, dtype=object),
+                np.full(size, None, dtype=object),
+            )
+            for channel in channels
+        }
+        for channel, where, channel_entry, indexed in entries:
+            prices, distances, locations, groups = results[channel]
+            avg = channel_entry.get("avg")
+            prices[where] = np.nan if avg is None else avg
+            if indexed is None or matrix is None:
+                continue
+            rows = position_rows[where]
+            located = rows >= 0
+            if not located.any():
+                continue
+            ids, point_prices, point_locations, point_groups = indexed.arrays()
+            block = matrix[np.ix_(rows[located], ids)]
+            best = block.argmin(axis=1)
+            best_prices = point_prices[best]
+            priced = ~np.isnan(best_prices)
+            chosen = where[located][priced]
+            best = best[priced]
+            prices[chosen] = best_prices[priced]
+            distances[chosen] = block[priced, best]
+            locations[chosen] = point_locations[best]
+            groups[chosen] = point_groups[best]
+        return results
+
+
+def location_index_stats() -> Dict[str, int]:
+    return _REGISTRY.stats()
@@ -0,0 +1,256 @@
+"""Process-wide pool of long-lived ClickHouse clients with background health checks."""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import clickhouse_connect
+from clickhouse_connect.driver.exceptions import OperationalError
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("CLICKHOUSE_POOL_SIZE", "4"))
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("CLICKHOUSE_POOL_ACQUIRE_TIMEOUT", "30"))
+HEALTH_CHECK_INTERVAL = float(os.getenv("CLICKHOUSE_HEALTH_CHECK_INTERVAL", "30"))
+UNHEALTHY_RETRY_INTERVAL = float(os.getenv("CLICKHOUSE_UNHEALTHY_RETRY_INTERVAL", "5"))
+QUERY_TIMEOUT_SECONDS = int(os.getenv("CLICKHOUSE_QUERY_TIMEOUT", "60"))
+QUERY_MAX_THREADS = int(os.getenv("CLICKHOUSE_MAX_THREADS", "0"))  # 0 = server default
+
+
+class ClickHousePoolExhausted(Exception):
+    """Raised when no pooled client becomes available within the acquire timeout."""
+
+
+class ClickHousePool:
+    """
+    Bounded pool of clickhouse_connect clients shared by the whole process.
+
+    Each client owns its own ClickHouse session, so a client is leased for the
+    duration of a single query and handed back afterwards. Connectivity is
+    verified by a background thread instead of a ``SELECT 1`` on every request.
+    Instances expose ``query`` and ``command`` so they can be passed anywhere a
+    plain client was used before.
+    """
+
+    def __init__(
+        self,
+        connect_kwargs: Dict[str, Any],
+        size: int = POOL_SIZE,
+        acquire_timeout: float = POOL_ACQUIRE_TIMEOUT,
+        health_check_interval: float = HEALTH_CHECK_INTERVAL,
+        query_settings: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self._connect_kwargs = connect_kwargs
+        self._size = max(1, size)
+        self._acquire_timeout = acquire_timeout
+        self._health_check_interval = health_check_interval
+        self._query_settings = dict(query_settings or {})
+        if "max_execution_time" not in self._query_settings and QUERY_TIMEOUT_SECONDS > 0:
+            self._query_settings["max_execution_time"] = QUERY_TIMEOUT_SECONDS
+        if "max_threads" not in self._query_settings and QUERY_MAX_THREADS > 0:
+            self._query_settings["max_threads"] = QUERY_MAX_THREADS
+
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open_clients = 0
+        self._healthy: Optional[bool] = None
+        self._last_health_check: Optional[float] = None
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+        self._acquisitions = 0
+        self._waits = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+
+    # ---- lifecycle ----
+
+    def start(self) -> None:
+        """Run an initial health check and start the background checker thread."""
+        self.check_health()
+        if self._health_thread is None or not self._health_thread.is_alive():
+            self._stop.clear()
+            self._health_thread = threading.Thread(
+                target=self._health_loop, name="clickhouse-health", daemon=True
+            )
+            self._health_thread.start()
+
+    def close(self) -> None:
+        """Stop the health checker and close every idle client."""
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join(timeout=5)
+            self._health_thread = None
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(client)
+
+    # ---- leasing ----
+
+    def _create_client(self) -> Any:
+        host = self._connect_kwargs.get("host")
+        port = self._connect_kwargs.get("port")
+        logger.info("Opening pooled ClickHouse connection to %s:%s", host, port)
+        return clickhouse_connect.get_client(**self._connect_kwargs)
+
+    def _discard(self, client: Any) -> None:
+        with self._lock:
+            self._open_clients = max(0, self._open_clients - 1)
+            self._discarded += 1
+        try:
+            client.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """Lease a client from the pool, opening a new one while below the size limit."""
+        client = None
+        try:
+            client = self._idle.get_nowait()
+        except queue.Empty:
+            reserve = False
+            with self._lock:
+                if self._open_clients < self._size:
+                    self._open_clients += 1
+                    reserve = True
+            if reserve:
+                try:
+                    client = self._create_client()
+                except Exception:
+                    with self._lock:
+                        self._open_clients -= 1
+                    raise
+            else:
+                started = time.monotonic()
+                try:
+                    client = self._idle.get(timeout=self._acquire_timeout)
+                except queue.Empty as exc:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise ClickHousePoolExhausted(
+                        f"No ClickHouse connection available after {self._acquire_timeout:.0f}s"
+                    ) from exc
+                finally:
+                    waited = time.monotonic() - started
+                    with self._lock:
+                        self._waits += 1
+                        self._wait_seconds_total += waited
+                        self._wait_seconds_max = max(self._wait_seconds_max, waited)
+
+        with self._lock:
+            self._acquisitions += 1
+
+        try:
+            yield client
+        except OperationalError:
+            # Connection-level failure: drop the client so the next lease reconnects.
+            self._discard(client)
+            client = None
+            raise
+        finally:
+            if client is not None:
+                self._idle.put(client)
+
+    def _merged_settings(self, settings: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        merged = dict(self._query_settings)
+        if settings:
+            merged.update(settings)
+        return merged
+
+    def query(self, query: str, parameters: Any = None, settings: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        """Run a query on a leased client, applying the pool's default per-query settings."""
+        with self.acquire() as client:
+            return client.query(query, parameters=parameters, settings=self._merged_settings(settings), **kwargs)
+
+    def command(self, cmd: str, parameters: Any = None, settings: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        """Run a command (DDL, INSERT ... SELECT) on a leased client."""
+        with self.acquire() as client:
+            return client.command(cmd, parameters=parameters, settings=self._merged_settings(settings), **kwargs)
+
+    # ---- health ----
+
+    def check_health(self) -> bool:
+        """Ping ClickHouse once and record the result."""
+        healthy = False
+        try:
+            with self.acquire() as client:
+                client.query("SELECT 1")
+            healthy = True
+        except ClickHousePoolExhausted:
+            # Every connection is busy serving queries, which means the server is reachable.
+            healthy = True
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("ClickHouse health check failed: %s", exc)
+            self._drain_idle()
+
+        if healthy and self._healthy is not True:
+            logger.info("ClickHouse connection pool is healthy")
+        self._healthy = healthy
+        self._last_health_check = time.time()
+        return healthy
+
+    def _drain_idle(self) -> None:
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(client)
+
+    def _health_loop(self) -> None:
+        while True:
+            interval = self._health_check_interval if self._healthy else UNHEALTHY_RETRY_INTERVAL
+            if self._stop.wait(interval):
+                return
+            self.check_health()
+
+    def is_available(self) -> bool:
+        """Return the last known health state, checking synchronously only if never checked."""
+        if self._healthy is None:
+            return self.check_health()
+        background_running = self._health_thread is not None and self._health_thread.is_alive()
+        if not self._healthy and not background_running:
+            # Scripts that import the app without running the lifespan hook have no
+            # checker thread; retry at the unhealthy cadence so a blip is not permanent.
+            if time.time() - (self._last_health_check or 0.0) >= UNHEALTHY_RETRY_INTERVAL:
+                return self.check_health()
+        return self._healthy
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for pool sizing and wait-time tuning."""
+        with self._lock:
+            open_clients = self._open_clients
+            idle = self._idle.qsize()
+            return {
+                "max_size": self._size,
+                "open": open_clients,
+                "idle": idle,
+                "in_use": max(0, open_clients - idle),
+                "healthy": self._healthy,
+                "last_health_check": self._last_health_check,
+                "acquisitions": self._acquisitions,
+                "waits": self._waits,
+                "wait_ms_total": round(self._wait_seconds_total * 1000, 2),
+                "wait_ms_max": round(self._wait_seconds_max * 1000, 2),
+                "wait_ms_avg": round(self._wait_seconds_total * 1000 / self._waits, 2) if self._waits else 0.0,
+                "acquire_timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "query_settings": dict(self._query_settings),
+            }
+
+    def __repr__(self) -> str:
+        host = self._connect_kwargs.get("host")
+        port = self._connect_kwargs.get("port")
+        return f"ClickHousePool(host={host!r}, port={port!r}, size={self._size})"
@@ -0,0 +1,346 @@
+"""
+Pre-joined daily rollup of completed order facts in ClickHouse.
+
+The dashboard endpoints all join ``orders``, ``groups_carts``, ``groups`` and
+``group_deals`` (with the PeerDB soft-delete and ``COMPLETED`` filters) over
+the raw mirrored tables. This module owns a rollup table at
+``(order_day, leader_id, product_id, deal_type, location_id)`` grain that
+holds the joined sums, exact distinct-count states and latest-price states
+those endpoints need, so they scan pre-aggregated rows instead.
+
+A materialized view over the join would only fire on inserts into
+``orders`` and could never retract facts when PeerDB mirrors a status change
+or a soft delete as a new row version. The rollup is therefore rebuilt one
+monthly partition at a time: the month is aggregated into a staging table
+and swapped in with ``ALTER TABLE ... REPLACE PARTITION``, which is atomic
+for readers. A background thread backfills missing months (newest first) and
+re-builds the months that still contain open days on a fixed interval.
+
+Which months are built, and when, is recorded in a small state table so a
+restart does not rebuild history. Callers check ``covers(start, end)`` and
+fall back to the raw tables whenever the window is not fully built or its
+open days are staler than ``ORDER_ROLLUP_MAX_STALENESS_SECONDS``.
+
+The rollup writes to the shared ClickHouse, so it is opt-in
+(``ORDER_ROLLUP_ENABLED``) and only one process should own the rebuilds:
+enable it on a single instance, never on every replica of a deployment.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: the enabled process creates and rewrites tables in ClickHouse, so enable it on one instance only.
+ORDER_ROLLUP_ENABLED = os.getenv("ORDER_ROLLUP_ENABLED", "false").lower() in ("1", "true", "yes")
+# Bump the suffix whenever the rollup SELECT changes; a new table is then backfilled from scratch.
+ORDER_ROLLUP_TABLE = os.getenv("ORDER_ROLLUP_TABLE") or "analytics_order_facts_daily_v1"
+ORDER_ROLLUP_BACKFILL_START = date.fromisoformat(os.getenv("ORDER_ROLLUP_BACKFILL_START") or "2025-01-01")
+# Months containing any of the last ORDER_ROLLUP_OPEN_DAYS days are rebuilt every refresh.
+ORDER_ROLLUP_OPEN_DAYS = int(os.getenv("ORDER_ROLLUP_OPEN_DAYS", "7"))
+ORDER_ROLLUP_REFRESH_SECONDS = float(os.getenv("ORDER_ROLLUP_REFRESH_SECONDS", "300"))
+ORDER_ROLLUP_MAX_STALENESS_SECONDS = float(os.getenv("ORDER_ROLLUP_MAX_STALENESS_SECONDS", "900"))
+ORDER_ROLLUP_BUILD_TIMEOUT = int(os.getenv("ORDER_ROLLUP_BUILD_TIMEOUT", "900"))
+
+SUPER_GROUP_DEAL_TYPES = ("SUPER_GROUP", "SUPER_GROUP_FLASH_SALE")
+NORMAL_GROUP_DEAL_TYPES = ("NORMAL", "FLASH_SALE")
+SGL_VOLUME_DEAL_TYPES = ("SUPER_GROUP", "SUPER_GROUP_FLASH_SALE", "SUPER_GROUP_REGULAR", "SUPER_GROUP_RECURRENT")
+
+# One row per (day, leader, product, deal type, location); each order lands in exactly one row,
+# so order counts add up across rows. LEFT JOINs keep orders without a location or user row,
+# and join_use_nulls marks them with NULLs (see location_known / leader_known).
+_ROLLUP_SELECT = """
+    SELECT
+        toDate(o.created_at)                                AS order_day,
+        g.created_by                                        AS leader_id,
+        gd.product_id                                       AS product_id,
+        gd.deal_type                                        AS deal_type,
+        o.location_id                                       AS location_id,
+        max(dl.id IS NOT NULL)                              AS location_known,
+        anyOrNull(dl.location)                              AS location_coordinates,
+        anyOrNull(dl.name)                                  AS location_name,
+        max(u.id IS NOT NULL)                               AS leader_known,
+        anyOrNull(u.name)                                   AS leader_name,
+        anyOrNull(u.phone)                                  AS leader_phone,
+        anyOrNull(pn.name)                                  AS product_name,
+        anyOrNull(pn_loc.local_name)                        AS product_local_name,
+        count()                                             AS order_rows,
+        uniqExact(o.id)                                     AS order_count,
+        sum(gc.quantity)                                    AS total_kg,
+        sum(gc.quantity * gd.group_price)                   AS revenue_etb,
+        sumIf(gd.group_price, gd.group_price > 0)           AS positive_price_sum,
+        countIf(gd.group_price > 0)                         AS positive_price_rows,
+        max(o.created_at)                                   AS last_order_at,
+        argMaxState(gd.group_price, o.created_at)           AS latest_price_state,
+        uniqExactState(gc.user_id)                          AS members_state,
+        uniqExactState(g.id)                                AS groups_state
+    FROM orders AS o
+    INNER JOIN groups_carts AS gc ON o.groups_carts_id = gc.id
+    INNER JOIN groups AS g ON gc.group_id = g.id
+    INNER JOIN group_deals AS gd ON g.group_deals_id = gd.id
+    LEFT JOIN delivery_location AS dl ON o.location_id = dl.id
+    LEFT JOIN users AS u ON u.id = g.created_by
+    LEFT JOIN products AS prod ON gd.product_id = prod.id
+    LEFT JOIN product_names AS pn ON prod.name_id = pn.id
+    LEFT JOIN product_name_localizations AS pn_loc
+        ON pn.id = pn_loc.product_name_id AND pn_loc.language_code = 'en'
+    WHERE
+        o._peerdb_is_deleted = 0
+        AND gc._peerdb_is_deleted = 0
+        AND g._peerdb_is_deleted = 0
+        AND gd._peerdb_is_deleted = 0
+        AND o.status = 'COMPLETED' AND o.deleted_at IS NULL
+        AND gc.status = 'COMPLETED' AND gc.deleted_at IS NULL
+        AND g.status = 'COMPLETED' AND g.deleted_at IS NULL
+        AND o.created_at >= toDateTime('{start}')
+        AND o.created_at < toDateTime('{end}')
+    GROUP BY order_day, leader_id, product_id, deal_type, location_id
+"""
+
+_BUILD_SETTINGS = {"join_use_nulls": 1}
+
+
+def sql_list(values: Any) -> str:
+    """Quote a sequence of plain identifiers (deal types) for an ``IN (...)`` clause."""
+    return ", ".join(f"'{value}'" for value in values)
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _months(start_day: date, end_day: date) -> List[date]:
+    months = []
+    month = _month_start(start_day)
+    while month <= end_day:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+
+class OrderFactsRollup:
+    """Builds, refreshes and reports coverage of the daily order facts rollup."""
+
+    def __init__(
+        self,
+        client,
+        table: str = ORDER_ROLLUP_TABLE,
+        refresh_interval: float = ORDER_ROLLUP_REFRESH_SECONDS,
+    ) -> None:
+        self._client = client
+        self.table = table
+        self._state_table = f"{table}_state"
+        self._refresh_interval = refresh_interval
+        self._built: Dict[date, float] = {}
+        self._ready = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._builds = 0
+        self._build_seconds_total = 0.0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+
+    # ---- schema ----
+
+    def ensure_schema(self) -> None:
+        """Create the rollup and state tables if they do not exist and load the built months."""
+        window = {"start": "1970-01-01 00:00:00", "end": "1970-01-01 00:00:00"}
+        self._client.command(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.table}
+            ENGINE = MergeTree
+            PARTITION BY toYYYYMM(order_day)
+            ORDER BY (order_day, leader_id, product_id, deal_type)
+            SETTINGS allow_nullable_key = 1
+            AS {_ROLLUP_SELECT.format(**window)}
+            LIMIT 0
+            """,
+            settings=dict(_BUILD_SETTINGS, max_execution_time=ORDER_ROLLUP_BUILD_TIMEOUT),
+        )
+        self._client.command(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self._state_table} (
+                partition_month Date,
+                built_at DateTime,
+                row_count UInt64
+            )
+            ENGINE = ReplacingMergeTree(built_at)
+            ORDER BY partition_month
+            """
+        )
+        result = self._client.query(
+            f"SELECT partition_month, toUnixTimestamp(max(built_at)) FROM {self._state_table} GROUP BY partition_month"
+        )
+        with self._lock:
+            self._built = {month: float(built_at) for month, built_at in result.result_rows}
+            self._ready = True
+        logger.info("Order facts rollup %s has %d built months", self.table, len(self._built))
+
+    # ---- building ----
+
+    def build_month(self, month: date) -> int:
+        """Rebuild one monthly partition and record it as built; returns its row count."""
+        month = _month_start(month)
+        # Unique per build: pids repeat across containers (often all pid 1).
+        staging = f"{self.table}_staging_{uuid.uuid4().hex}"
+        partition = month.strftime("%Y%m")
+        window = {
+            "start": datetime.combine(month, datetime.min.time()).strftime("%Y-%m-%d %H:%M:%S"),
+            "end": datetime.combine(_next_month(month), datetime.min.time()).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        settings = dict(_BUILD_SETTINGS, max_execution_time=ORDER_ROLLUP_BUILD_TIMEOUT)
+        started = time.monotonic()
+        with self._build_lock:
+            self._client.command(f"DROP TABLE IF EXISTS {staging}")
+            self._client.command(f"CREATE TABLE {staging} AS {self.table}")
+            try:
+                self._client.command(
+                    f"INSERT INTO {staging} {_ROLLUP_SELECT.format(**window)}", settings=settings
+                )
+                row_count = int(self._client.command(f"SELECT count() FROM {staging}") or 0)
+                if row_count:
+                    self._client.command(f"ALTER TABLE {self.table} REPLACE PARTITION {partition} FROM {staging}")
+                else:
+                    self._client.command(f"ALTER TABLE {self.table} DROP PARTITION {partition}")
+            finally:
+                self._client.command(f"DROP TABLE IF EXISTS {staging}")
+
+            built_at = time.time()
+            self._client.command(
+                f"INSERT INTO {self._state_table} (partition_month, built_at, row_count) "
+                f"VALUES ('{month.isoformat()}', {int(built_at)}, {row_count})"
+            )
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._built[month] = built_at
+            self._builds += 1
+            self._build_seconds_total += elapsed
+        logger.info("Built order facts rollup %s for %s: %d rows in %.1fs", self.table, partition, row_count, elapsed)
+        return row_count
+
+    def _open_months(self) -> List[date]:
+        today = date.today()
+        return _months(today - timedelta(days=ORDER_ROLLUP_OPEN_DAYS), today)
+
+    def refresh(self) -> None:
+        """Backfill missing months newest-first, then rebuild the months with open days."""
+        open_months = self._open_months()
+        with self._lock:
+            built = set(self._built)
+        missing = [month for month in _months(ORDER_ROLLUP_BACKFILL_START, date.today()) if month not in built]
+        for month in sorted(set(missing) | set(open_months), reverse=True):
+            if self._stop.is_set():
+                return
+            try:
+                self.build_month(month)
+            except Exception as exc:  # pylint: disable=broad-except
+                with self._lock:
+                    self._failures += 1
+                    self._last_error = str(exc)
+                logger.warning("Failed to build order facts rollup for %s: %s", month, exc)
+
+    # ---- lifecycle ----
+
+    def start(self) -> None:
+        """Create the schema and start the background backfill/refresh thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="order-facts-rollup", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if not self._ready:
+                    self.ensure_schema()
+                self.refresh()
+            except Exception as exc:  # pylint: disable=broad-except
+                with self._lock:
+                    self._failures += 1
+                    self._last_error = str(exc)
+                logger.warning("Order facts rollup refresh failed: %s", exc)
+            if self._stop.wait(self._refresh_interval):
+                return
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # ---- coverage ----
+
+    def covers(self, start_day: date, end_day: date) -> bool:
+        """True when every month of ``[start_day, end_day]`` is built and its open days are fresh."""
+        if not self._ready:
+            return False
+        open_from = date.today() - timedelta(days=ORDER_ROLLUP_OPEN_DAYS)
+        now = time.time()
+        with self._lock:
+            for month in _months(start_day, end_day):
+                built_at = self._built.get(month)
+                if built_at is None:
+                    return False
+                touches_open_days = end_day >= open_from and _next_month(month) > open_from
+                if touches_open_days and now - built_at > ORDER_ROLLUP_MAX_STALENESS_SECONDS:
+                    return False
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            newest = max(self._built.values(), default=None)
+            return {
+                "table": self.table,
+                "ready": self._ready,
+                "months_built": len(self._built),
+                "last_built_at": newest,
+                "builds": self._builds,
+                "build_seconds_total": round(self._build_seconds_total, 2),
+                "failures": self._failures,
+                "last_error": self._last_error,
+            }
+
+
+_ACTIVE: Optional[OrderFactsRollup] = None
+
+
+def set_active_order_rollup(rollup: Optional[OrderFactsRollup]) -> None:
+    global _ACTIVE
+    _ACTIVE = rollup
+
+
+def order_rollup_for(start_day: date, end_day: date) -> Optional[OrderFactsRollup]:
+    """The running rollup if it can answer ``[start_day, end_day]``, else None (use raw tables)."""
+    rollup = _ACTIVE
+    if rollup is None or not rollup.covers(start_day, end_day):
+        return None
+    return rollup
+
+
+def query_rollup_or_raw(client, rollup_query: Optional[str], raw_query: str, label: str):
+    """Run ``rollup_query`` when there is one; if it fails (or there is none), run ``raw_query`` on the raw tables."""
+    if rollup_query is not None:
+        try:
+            return client.query(rollup_query)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Order rollup query for %s failed, using raw tables: %s", label, exc)
+    return client.query(raw_query)
+
+
+def order_rollup_stats() -> Optional[Dict[str, Any]]:
+    rollup = _ACTIVE
+    return rollup.stats() if rollup is not None else None
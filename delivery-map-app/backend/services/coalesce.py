@@ -0,0 +1,197 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+``SingleFlight.do(key, fn)`` runs ``fn`` once per key at a time: the first
+caller (the leader) computes, callers that arrive while it runs wait for the
+same result or exception instead of repeating the work. ``do_async`` does the
+same for coroutines on the event loop. With ``ttl_seconds`` a finished result
+is also served to callers arriving shortly afterwards.
+
+Keys name the logical work, e.g. ``("benchmark-map", "2025-06-01")``; the
+first element of a tuple key is the namespace that counters are grouped by.
+Results are shared between callers and must be treated as read-only.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def _namespace(key: Hashable) -> str:
+    return str(key[0] if isinstance(key, tuple) and key else key)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key; counts hits, misses and joins per namespace."""
+
+    def __init__(self, name: str, ttl_seconds: float = 0.0, max_results: int = 256) -> None:
+        self.name = name
+        self._ttl = ttl_seconds
+        self._max_results = max_results
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, key: Hashable, counter: str) -> None:
+        counters = self._counters.setdefault(_namespace(key), {"hits": 0, "misses": 0, "joins": 0, "errors": 0})
+        counters[counter] += 1
+
+    def _cached(self, key: Hashable) -> Tuple[bool, Any]:
+        """``(True, value)`` for a result finished within the TTL; caller holds the lock."""
+        if self._ttl <= 0:
+            return False, None
+        cached = self._results.get(key)
+        if cached is None:
+            return False, None
+        if time.monotonic() - cached[0] > self._ttl:
+            self._results.pop(key, None)
+            return False, None
+        return True, cached[1]
+
+    def _remember(self, key: Hashable, value: Any) -> None:
+        if self._ttl <= 0:
+            return
+        if key not in self._results and len(self._results) >= self._max_results:
+            oldest = min(self._results, key=lambda k: self._results[k][0])
+            self._results.pop(oldest, None)
+        self._results[key] = (time.monotonic(), value)
+
+    def do(self, key: Hashable, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn(*args, **kwargs)`` unless an identical call is in flight, then share its outcome."""
+        with self._lock:
+            hit, value = self._cached(key)
+            if hit:
+                self._count(key, "hits")
+                return value
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._count(key, "misses")
+            else:
+                self._count(key, "joins")
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                if call.error is None:
+                    self._remember(key, call.result)
+                else:
+                    self._count(key, "errors")
+            call.event.set()
+        return call.result
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """Coroutine version of ``do``; joiners await the leader's task (shielded from their own cancellation)."""
+        with self._lock:
+            hit, value = self._cached(key)
+            if hit:
+                self._count(key, "hits")
+                return value
+            task = self._tasks.get(key)
+            if task is not None and not task.done():
+                self._count(key, "joins")
+            else:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                self._tasks[key] = task
+                self._count(key, "misses")
+                task.add_done_callback(functools.partial(self._task_done, key))
+        return await asyncio.shield(task)
+
+    def _task_done(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        with self._lock:
+            if self._tasks.get(key) is task:
+                self._tasks.pop(key, None)
+            if task.cancelled() or task.exception() is not None:
+                self._count(key, "errors")
+            else:
+                self._remember(key, task.result())
+
+    def forget(self, key: Optional[Hashable] = None) -> None:
+        """Drop finished results for ``key`` (or all keys); in-flight calls are unaffected."""
+        with self._lock:
+            if key is None:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + sum(1 for task in self._tasks.values() if not task.done()),
+                "cached_results": len(self._results),
+                "ttl_seconds": self._ttl,
+                "keys": {namespace: dict(counters) for namespace, counters in self._counters.items()},
+            }
+
+
+_REGISTRY: Dict[str, SingleFlight] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_single_flight(name: str, ttl_seconds: float = 0.0) -> SingleFlight:
+    """Process-wide ``SingleFlight`` registered under ``name`` (created on first use)."""
+    with _REGISTRY_LOCK:
+        flight = _REGISTRY.get(name)
+        if flight is None:
+            flight = _REGISTRY[name] = SingleFlight(name, ttl_seconds=ttl_seconds)
+        return flight
+
+
+def coalesced(flight: SingleFlight, key: Callable[..., Hashable]) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorator form: calls are keyed by ``key(*args, **kwargs)`` and coalesced on ``flight``.
+
+    Works for plain functions and ``async def`` functions alike.
+    """
+
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                return await flight.do_async(key(*args, **kwargs), fn, *args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return flight.do(key(*args, **kwargs), fn, *args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def coalescing_stats() -> Dict[str, Any]:
+    with _REGISTRY_LOCK:
+        flights = list(_REGISTRY.values())
+    return {flight.name: flight.stats() for flight in flights}
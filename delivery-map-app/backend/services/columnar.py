@@ -0,0 +1,195 @@
+"""
+Alternate encodings for list-heavy JSON endpoints, chosen by content negotiation.
+
+Registered routes name the top-level key that holds their row list (``records``
+for ``/api/data``, ``leaders`` for ``/api/personas/leaders``...). Row JSON stays
+the default; a ``format=`` query parameter or the ``Accept`` header selects:
+
+``columns``  ``application/vnd.delivery-map.columns+json``
+    The row list becomes ``{"length": n, "columns": {name: [values...]}}`` and
+    ``"layout": "columns"`` is added at the top level. Keys are sent once per
+    column instead of once per row; missing keys are ``null``.
+``arrow``    ``application/vnd.apache.arrow.stream``
+    The rows as an Arrow IPC stream; the other top-level fields are JSON in the
+    schema metadata under ``payload``.
+``msgpack``  ``application/msgpack``
+    The ``columns`` layout packed as MessagePack.
+
+The middleware encodes the endpoint's rendered JSON, so it composes with the
+precomputed snapshots and, sitting inside ``ResponseCacheMiddleware``, the
+encoded bodies are cached per format (see ``negotiated_format``). If a payload
+cannot be encoded, or pyarrow/msgpack is missing, row JSON is sent instead.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from .fast_json import dumps
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNS_MEDIA_TYPE = "application/vnd.delivery-map.columns+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+_FORMAT_PARAMS = {"json": "rows", "rows": "rows", "columns": "columns", "arrow": "arrow", "msgpack": "msgpack"}
+_ACCEPT_TYPES = {
+    "application/json": "rows",
+    "*/*": "rows",
+    COLUMNS_MEDIA_TYPE: "columns",
+    ARROW_MEDIA_TYPE: "arrow",
+    "application/vnd.apache.arrow.file": "arrow",
+    MSGPACK_MEDIA_TYPE: "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+}
+
+
+def negotiated_format(scope: Dict[str, Any]) -> str:
+    """``rows``, ``columns``, ``arrow`` or ``msgpack`` for this request; ``format=`` wins over ``Accept``."""
+    for name, value in parse_qsl(scope.get("query_string", b"").decode("latin-1")):
+        if name == "format":
+            return _FORMAT_PARAMS.get(value.strip().lower(), "rows")
+
+    accept = dict(scope.get("headers", [])).get(b"accept", b"").decode("latin-1")
+    candidates: List[Tuple[float, int, str]] = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        fmt = _ACCEPT_TYPES.get(media_type.lower())
+        if fmt is None:
+            continue
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, fmt))
+    return min(candidates)[2] if candidates else "rows"
+
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Column-oriented form of a list of row dicts (keys in first-seen order)."""
+    names: Dict[str, None] = {}
+    for row in rows:
+        for name in row:
+            if name not in names:
+                names[name] = None
+    return {"length": len(rows), "columns": {name: [row.get(name) for row in rows] for name in names}}
+
+
+def _columns_payload(payload: Dict[str, Any], table_key: str) -> Dict[str, Any]:
+    encoded = dict(payload)
+    encoded[table_key] = to_columns(payload[table_key])
+    encoded["layout"] = "columns"
+    return encoded
+
+
+def _arrow_stream(payload: Dict[str, Any], table_key: str) -> bytes:
+    import pyarrow as pa
+
+    table = pa.Table.from_pylist(payload[table_key])
+    meta = {key: value for key, value in payload.items() if key != table_key}
+    table = table.replace_schema_metadata({"payload": dumps(meta), "table": table_key})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _msgpack(payload: Dict[str, Any], table_key: str) -> bytes:
+    import msgpack
+
+    return msgpack.packb(_columns_payload(payload, table_key), use_bin_type=True)
+
+
+def encode(payload: Any, table_key: str, fmt: str) -> Optional[Tuple[bytes, str]]:
+    """``(body, media_type)`` of ``payload`` in ``fmt``, or None when it cannot be encoded that way."""
+    if not isinstance(payload, dict) or not isinstance(payload.get(table_key), list):
+        return None
+    if fmt == "columns":
+        return dumps(_columns_payload(payload, table_key)), COLUMNS_MEDIA_TYPE
+    if fmt == "arrow":
+        return _arrow_stream(payload, table_key), ARROW_MEDIA_TYPE
+    if fmt == "msgpack":
+        return _msgpack(payload, table_key), MSGPACK_MEDIA_TYPE
+    return None
+
+
+class ColumnarEncodingMiddleware:
+    """Re-encodes 200 JSON responses of the registered routes in the negotiated format."""
+
+    def __init__(self, app, routes: Dict[str, str]) -> None:
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send) -> None:
+        table_key = self.routes.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "GET" else None
+        if table_key is None:
+            await self.app(scope, receive, send)
+            return
+        fmt = negotiated_format(scope)
+
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def reencode(message) -> None:
+            nonlocal passthrough
+            if message["type"] == "http.response.start":
+                headers = dict((name.lower(), value) for name, value in message.get("headers", []))
+                if (
+                    fmt != "rows"
+                    and message["status"] == 200
+                    and headers.get(b"content-type", b"").startswith(b"application/json")
+                    and b"content-encoding" not in headers
+                ):
+                    start.update(message)
+                    return
+                passthrough = True
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"vary", b"Accept")]
+                await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            encoded = None
+            try:
+                payload = orjson.loads(body) if orjson is not None else json.loads(body)
+                encoded = encode(payload, table_key, fmt)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("Could not encode %s as %s, sending row JSON: %s", scope["path"], fmt, exc)
+            if encoded is None:
+                body, media_type = body, "application/json"
+            else:
+                body, media_type = encoded
+            headers = [
+                (name, value)
+                for name, value in start.get("headers", [])
+                if name.lower() not in (b"content-length", b"content-type", b"etag")
+            ]
+            headers += [
+                (b"content-type", media_type.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"vary", b"Accept"),
+            ]
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, reencode)
@@ -0,0 +1,286 @@
+"""
+Capacity-constrained consolidation of normal-group locations onto SGL leaders
+(``/api/spatial/consolidation``).
+
+The scenario of ``SGL_CONSOLIDATION_BUSINESS_PLAN.md``: normal-group orders
+are delivered to a nearby super-group leader instead of their own location.
+Each normal location's candidates are its ``CONSOLIDATION_CANDIDATES``
+nearest SGL leaders within ``radius_km`` (k-NN over a ``GridIndex`` of the SGL
+locations, at the leader's nearest location), so the work stays proportional
+to the number of locations even for radii that cover the whole city.
+
+Assignment is a nearest-feasible greedy, vectorized by rounds: every
+unassigned normal location proposes to its nearest leader that still has room
+for it; each leader accepts its nearest proposals up to the first that no
+longer fits, and the rest propose again next round against the reduced
+capacities. Every leader that received proposals accepts at least one, and a
+pair whose leader ran out of room for it is dropped for good, so a round is
+one sort of the remaining pairs and there are few of them. Without
+capacities this is one round: the nearest leader within the radius.
+
+Economics follow the business plan's per-order model and tiered SGL
+incentive, over the data window of the snapshot (one week): moved orders
+swap the current per-order cost for the consolidated one plus the leader's
+incentive, and the share of moved orders not retained is lost revenue.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .delivery_points import WEEKDAYS, DeliveryPoints
+from .spatial_coverage import _SglLeaders, _share
+from .spatial_index import SPATIAL_GRID_BASE_KM, GridIndex, grid_cell_km, haversine_pairs_km
+
+# Per-order economics of SGL_CONSOLIDATION_BUSINESS_PLAN.md (ETB).
+CONSOLIDATION_CURRENT_COST_PER_ORDER = float(os.getenv("CONSOLIDATION_CURRENT_COST_PER_ORDER", "88.68"))
+CONSOLIDATION_COST_PER_ORDER = float(os.getenv("CONSOLIDATION_COST_PER_ORDER", "46.01"))
+CONSOLIDATION_REVENUE_PER_ORDER = float(os.getenv("CONSOLIDATION_REVENUE_PER_ORDER", "73.56"))
+CONSOLIDATION_RETENTION = float(os.getenv("CONSOLIDATION_RETENTION", "0.9"))
+CONSOLIDATION_WAREHOUSE_LAT = float(os.getenv("CONSOLIDATION_WAREHOUSE_LAT", "8.992697915198226"))
+CONSOLIDATION_WAREHOUSE_LON = float(os.getenv("CONSOLIDATION_WAREHOUSE_LON", "38.821279561426266"))
+# Nearest SGL leaders considered per normal location.
+CONSOLIDATION_CANDIDATES = int(os.getenv("CONSOLIDATION_CANDIDATES", "8"))
+
+# (tier, minimum monthly orders, ETB per order, ETB per kg); the first tier applies from zero.
+INCENTIVE_TIERS: Tuple[Tuple[str, float, float, float], ...] = (
+    ("bronze", 0.0, 12.0, 0.50),
+    ("silver", 500.0, 15.0, 0.75),
+    ("gold", 1500.0, 18.0, 1.00),
+)
+WEEKS_PER_MONTH = 52.0 / 12.0
+
+
+def _group_cumsum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Cumulative sums restarting at each of the sorted group ``starts``."""
+    total = np.cumsum(values)
+    offsets = np.r_[0.0, total][starts]
+    return total - np.repeat(offsets, np.diff(np.r_[starts, len(values)]))
+
+
+def _candidate_pairs(points: DeliveryPoints, sgl: _SglLeaders, leaders: np.ndarray, active: np.ndarray,
+                     radius_km: float, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ``(leader, normal point id, sgl point id, km)`` for the ``k`` nearest leaders within ``radius_km``
+    of every normal location, with the leader's nearest location.
+
+    The search radius doubles from ``SPATIAL_GRID_BASE_KM``: a location with ``k`` leaders inside the
+    current radius has its answer, only the others are searched again at the next one.
+    """
+    chosen = np.isin(sgl.leader_of, leaders)
+    sgl_ids, leader_of = sgl.ids[chosen], sgl.leader_of[chosen]
+    pending = np.flatnonzero(active & ~points.is_sgl)
+    n_leaders = len(sgl)
+    found = []
+    radius = min(SPATIAL_GRID_BASE_KM, radius_km)
+    while len(pending) and len(sgl_ids):
+        last = radius >= radius_km
+        grid = GridIndex(points.lat[sgl_ids], points.lon[sgl_ids], grid_cell_km(radius))
+        resolved = np.zeros(len(pending), dtype=bool)
+        for query_rows, grid_rows, distance in grid.pairs(points.lat[pending], points.lon[pending], radius):
+            # Nearest location of each leader, then the k nearest leaders of each normal location.
+            key = query_rows * n_leaders + leader_of[grid_rows]
+            order = np.lexsort((distance, key))
+            order = order[np.r_[True, key[order][1:] != key[order][:-1]]] if len(order) else order
+            order = order[np.lexsort((distance[order], query_rows[order]))]
+            query_rows, grid_rows, distance = query_rows[order], grid_rows[order], distance[order]
+            starts = np.flatnonzero(np.r_[True, query_rows[1:] != query_rows[:-1]]) if len(order) else order
+            counts = np.diff(np.r_[starts, len(order)])
+            rank = np.arange(len(order)) - np.repeat(starts, counts)
+            done = np.repeat(last | (counts >= k), counts)
+            keep = done & (rank < k)
+            resolved[query_rows[starts[counts >= k]]] = True
+            found.append((
+                leader_of[grid_rows[keep]], pending[query_rows[keep]], sgl_ids[grid_rows[keep]], distance[keep]
+            ))
+        if last:
+            break
+        pending = pending[~resolved]
+        radius = min(radius * 2, radius_km)
+    if not found:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, np.empty(0)
+    return tuple(np.concatenate(column) for column in zip(*found))  # type: ignore[return-value]
+
+
+def _assign(pair_leader: np.ndarray, pair_normal: np.ndarray, pair_km: np.ndarray, orders: np.ndarray,
+            kg: np.ndarray, room_orders: np.ndarray, room_kg: np.ndarray) -> np.ndarray:
+    """Indexes of the accepted pairs, one per assigned normal location."""
+    room_orders, room_kg = room_orders.astype(np.float64), room_kg.astype(np.float64)
+    assigned = np.zeros(len(orders), dtype=bool)
+    alive = np.lexsort((pair_km, pair_normal))
+    accepted = []
+    while len(alive):
+        # Pairs whose leader no longer has room for the location never fit again: room only shrinks.
+        normal, leader = pair_normal[alive], pair_leader[alive]
+        feasible = (orders[normal] <= room_orders[leader] + 1e-9) & (kg[normal] <= room_kg[leader] + 1e-9)
+        alive, normal = alive[feasible], normal[feasible]
+        if not len(alive):
+            break
+        proposals = alive[np.r_[True, normal[1:] != normal[:-1]]]
+        leader = pair_leader[proposals]
+        rank = np.lexsort((pair_km[proposals], leader))
+        proposals, leader = proposals[rank], leader[rank]
+        starts = np.flatnonzero(np.r_[True, leader[1:] != leader[:-1]])
+        proposed = pair_normal[proposals]
+        fits = (_group_cumsum(orders[proposed], starts) <= room_orders[leader] + 1e-9) & (
+            _group_cumsum(kg[proposed], starts) <= room_kg[leader] + 1e-9
+        )
+        # Each leader takes its nearest proposals up to the first that does not fit (at least one).
+        won = proposals[_group_cumsum((~fits).astype(np.float64), starts) == 0]
+        accepted.append(won)
+        won_leader, won_normal = pair_leader[won], pair_normal[won]
+        room_orders -= np.bincount(won_leader, weights=orders[won_normal], minlength=len(room_orders))
+        room_kg -= np.bincount(won_leader, weights=kg[won_normal], minlength=len(room_kg))
+        assigned[won_normal] = True
+        alive = alive[~assigned[pair_normal[alive]]]
+    return np.concatenate(accepted) if accepted else np.empty(0, dtype=np.int64)
+
+
+def _tiers(monthly_orders: np.ndarray) -> np.ndarray:
+    """Index into ``INCENTIVE_TIERS`` for each monthly order volume."""
+    minimums = np.array([minimum for _, minimum, _, _ in INCENTIVE_TIERS])
+    return np.maximum(np.searchsorted(minimums, monthly_orders, "right") - 1, 0)
+
+
+def build_consolidation(
+    points: DeliveryPoints,
+    radius_km: float,
+    capacity_orders: Optional[float] = None,
+    capacity_kg: Optional[float] = None,
+    top: Optional[int] = None,
+    days: Sequence[int] = (),
+    retention: float = CONSOLIDATION_RETENTION,
+) -> Dict[str, Any]:
+    """Assignment, per-leader load, network totals and cost/revenue deltas for one scenario."""
+    active, orders = points.select(None, days)
+    sgl = _SglLeaders(points, active, orders)
+    ranked = sgl.by_orders()
+    leaders = np.asarray(ranked if top is None else ranked[:top], dtype=np.int64)
+    n_leaders = len(sgl)
+
+    pair_leader, pair_normal, pair_sgl, pair_km = _candidate_pairs(
+        points, sgl, leaders, active, radius_km, CONSOLIDATION_CANDIDATES
+    )
+    unlimited = np.full(n_leaders, np.inf)
+    room_orders = unlimited if capacity_orders is None else capacity_orders - sgl.orders
+    room_kg = unlimited if capacity_kg is None else capacity_kg - sgl.kg
+    accepted = _assign(pair_leader, pair_normal, pair_km, orders, points.kg, room_orders, room_kg)
+    leader, normal, km = pair_leader[accepted], pair_normal[accepted], pair_km[accepted]
+    location = pair_sgl[accepted]
+
+    assigned_locations = np.bincount(leader, minlength=n_leaders)
+    assigned_orders = np.bincount(leader, weights=orders[normal], minlength=n_leaders)
+    assigned_kg = np.bincount(leader, weights=points.kg[normal], minlength=n_leaders)
+    assigned_members = np.bincount(leader, weights=points.members[normal], minlength=n_leaders)
+    order_km = np.bincount(leader, weights=orders[normal] * km, minlength=n_leaders)
+    max_km = np.zeros(n_leaders)
+    np.maximum.at(max_km, leader, km)
+
+    load_orders = sgl.orders + assigned_orders
+    load_kg = sgl.kg + assigned_kg
+    tier = _tiers(load_orders * WEEKS_PER_MONTH)
+    per_order = np.array([rate for _, _, rate, _ in INCENTIVE_TIERS])[tier]
+    per_kg = np.array([rate for _, _, _, rate in INCENTIVE_TIERS])[tier]
+    incentive = retention * (assigned_orders * per_order + assigned_kg * per_kg)
+    mean_km = np.divide(order_km, assigned_orders, out=np.zeros(n_leaders), where=assigned_orders > 0)
+    sgls: List[Dict[str, Any]] = []
+    for index in leaders.tolist():
+        sgls.append({
+            **sgl.describe(index),
+            "assigned_locations": int(assigned_locations[index]),
+            "assigned_orders": assigned_orders[index],
+            "assigned_kg": assigned_kg[index],
+            "assigned_members": int(assigned_members[index]),
+            "load_orders": load_orders[index],
+            "load_kg": load_kg[index],
+            "orders_utilization": _share(load_orders[index], capacity_orders) if capacity_orders is not None else None,
+            "kg_utilization": _share(load_kg[index], capacity_kg) if capacity_kg is not None else None,
+            "mean_distance_km": mean_km[index],
+            "max_distance_km": max_km[index],
+            "tier": INCENTIVE_TIERS[tier[index]][0],
+            "incentive": incentive[index],
+        })
+    incentive_cost = float(incentive[leaders].sum())
+
+    normal_ids = np.flatnonzero(active & ~points.is_sgl)
+    candidates = np.unique(pair_normal)
+    moved_orders = float(orders[normal].sum())
+    moved_kg = float(points.kg[normal].sum())
+    network = {
+        "sgl_leaders": int(len(leaders)),
+        "normal_locations": int(len(normal_ids)),
+        "normal_orders": orders[normal_ids].sum(),
+        "normal_kg": points.kg[normal_ids].sum(),
+        "candidate_locations": int(len(candidates)),
+        "candidate_orders": orders[candidates].sum(),
+        "assigned_locations": int(len(normal)),
+        "assigned_orders": moved_orders,
+        "assigned_kg": moved_kg,
+        "capacity_limited_locations": int(len(candidates) - len(normal)),
+        "capacity_limited_orders": orders[candidates].sum() - moved_orders,
+    }
+    network["assigned_locations_pct"] = _share(network["assigned_locations"], network["normal_locations"])
+    network["assigned_orders_pct"] = _share(moved_orders, network["normal_orders"])
+    network["assigned_kg_pct"] = _share(moved_kg, network["normal_kg"])
+
+    retained = moved_orders * retention
+    current_cost = moved_orders * CONSOLIDATION_CURRENT_COST_PER_ORDER
+    consolidated_cost = retained * CONSOLIDATION_COST_PER_ORDER + incentive_cost
+    revenue_delta = (retained - moved_orders) * CONSOLIDATION_REVENUE_PER_ORDER
+    economics = {
+        "retention": retention,
+        "moved_orders": moved_orders,
+        "retained_orders": retained,
+        "lost_orders": moved_orders - retained,
+        "current_cost": current_cost,
+        "consolidated_cost": consolidated_cost,
+        "incentive_cost": incentive_cost,
+        "cost_delta": consolidated_cost - current_cost,
+        "revenue_delta": revenue_delta,
+        "profit_delta": revenue_delta - (consolidated_cost - current_cost),
+        "cost_per_order": {
+            "current": CONSOLIDATION_CURRENT_COST_PER_ORDER,
+            "consolidated": CONSOLIDATION_COST_PER_ORDER,
+            "revenue": CONSOLIDATION_REVENUE_PER_ORDER,
+        },
+    }
+
+    # Warehouse km x kg for the Playground's logistics estimate: moved kg travel to their SGL location.
+    delivered = np.flatnonzero(active & (points.kg > 0))
+    warehouse_km = haversine_pairs_km(
+        CONSOLIDATION_WAREHOUSE_LAT, CONSOLIDATION_WAREHOUSE_LON, points.lat, points.lon
+    )
+    baseline = float((warehouse_km[delivered] * points.kg[delivered]).sum())
+    consolidated = baseline - float(((warehouse_km[normal] - warehouse_km[location]) * points.kg[normal]).sum())
+    logistics = {
+        "baseline_km_kg": baseline,
+        "consolidated_km_kg": consolidated,
+        "multiplier": consolidated / baseline if baseline > 0 else 1.0,
+    }
+
+    assignments = [
+        {
+            "group_created_by": points.records[n].get("group_created_by"),
+            "delivery_location_name": points.records[n].get("delivery_location_name"),
+            "sgl_group_created_by": sgl.keys[owner],
+            "sgl_lat": points.lat[site],
+            "sgl_lon": points.lon[site],
+            "distance_km": distance,
+        }
+        for n, owner, site, distance in zip(normal.tolist(), leader.tolist(), location.tolist(), km.tolist())
+    ]
+
+    return {
+        "radius_km": radius_km,
+        "days": [WEEKDAYS[day] for day in days],
+        "capacity": {"orders": capacity_orders, "kg": capacity_kg},
+        "network": network,
+        "economics": economics,
+        "logistics": logistics,
+        "sgls": sgls,
+        "assignments": assignments,
+    }
@@ -0,0 +1,198 @@
+"""
+Columnar view of the ``/api/data`` delivery records for the spatial endpoints.
+
+``DeliveryPoints`` holds one numpy array per field (coordinates, SGL flag,
+orders, kg, members, per-weekday orders) for the records with usable
+coordinates, in record order. It is built once per data snapshot: the store
+keeps the points of the latest snapshot version, and indexes derived from
+them (cluster trees, coverage tables...) are memoized on the points object
+through ``derived``, so they are rebuilt exactly when the data changes.
+
+Records without coordinates (missing, or the ``0, 0`` that
+``parse_coordinates`` returns on failure) are dropped, as the map does.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+SGL_CATEGORY = "SUPER_GROUPS"
+NORMAL_CATEGORY = "NORMAL_GROUPS"
+
+_CATEGORY_ALIASES = {
+    "": None,
+    "all": None,
+    "sgl": SGL_CATEGORY,
+    "super": SGL_CATEGORY,
+    "super_groups": SGL_CATEGORY,
+    "normal": NORMAL_CATEGORY,
+    "normal_groups": NORMAL_CATEGORY,
+}
+
+
+def parse_category(value: Optional[str]) -> Optional[str]:
+    """``SUPER_GROUPS``, ``NORMAL_GROUPS`` or None (all) for a ``category=`` value; ValueError otherwise."""
+    key = (value or "").strip().lower()
+    if key not in _CATEGORY_ALIASES:
+        raise ValueError(f"Unknown category {value!r}; expected all, sgl/SUPER_GROUPS or normal/NORMAL_GROUPS")
+    return _CATEGORY_ALIASES[key]
+
+
+def parse_days(value: Optional[str]) -> Tuple[int, ...]:
+    """Weekday indexes (Monday = 0) for a comma-separated ``day=`` value; empty means every day."""
+    days = set()
+    for part in (value or "").split(","):
+        name = part.strip().lower()
+        if not name or name == "all":
+            continue
+        matches = [index for index, day in enumerate(WEEKDAYS) if day.startswith(name)] if len(name) >= 3 else []
+        if len(matches) != 1:
+            raise ValueError(f"Unknown day {part.strip()!r}; expected weekday names such as monday,tue")
+        days.add(matches[0])
+    return tuple(sorted(days))
+
+
+def _number(record: Dict[str, Any], key: str) -> float:
+    value = record.get(key)
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class DeliveryPoints:
+    """Per-field arrays of one data snapshot. Treat arrays and ``records`` as read-only."""
+
+    def __init__(self, version: str, records: Sequence[Dict[str, Any]], max_derived: int = 32) -> None:
+        kept = []
+        for record in records:
+            lat, lon = _number(record, "latitude"), _number(record, "longitude")
+            if lat == 0.0 and lon == 0.0 or not (np.isfinite(lat) and np.isfinite(lon)):
+                continue
+            kept.append(record)
+        self.version = version
+        self.records: List[Dict[str, Any]] = kept
+        self.built_at = time.time()
+        self.lat = np.fromiter((_number(r, "latitude") for r in kept), dtype=np.float64, count=len(kept))
+        self.lon = np.fromiter((_number(r, "longitude") for r in kept), dtype=np.float64, count=len(kept))
+        # Exact match, as in the frontend filters (``group_deal_category === 'SUPER_GROUPS'``).
+        self.is_sgl = np.fromiter(
+            (r.get("group_deal_category") == SGL_CATEGORY for r in kept), dtype=bool, count=len(kept)
+        )
+        self.orders = np.fromiter((_number(r, "total_orders") for r in kept), dtype=np.float64, count=len(kept))
+        self.kg = np.fromiter((_number(r, "total_kg") for r in kept), dtype=np.float64, count=len(kept))
+        self.members = np.fromiter((_number(r, "unique_group_members") for r in kept), dtype=np.float64, count=len(kept))
+        self.groups = np.fromiter((_number(r, "total_groups") for r in kept), dtype=np.float64, count=len(kept))
+        self.weekday_orders = np.array(
+            [[_number(r, f"{day}_orders") for day in WEEKDAYS] for r in kept], dtype=np.float64
+        ).reshape(len(kept), len(WEEKDAYS))
+        self._derived: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._max_derived = max_derived
+        self._derived_lock = threading.Lock()
+        self._building: Dict[Hashable, threading.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def select(self, category: Optional[str] = None, days: Sequence[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        ``(mask, orders)`` for a category/day filter, matching the map filters:
+        with ``days`` a record is kept only if it ordered on one of them, and its
+        orders are the sum over those days.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if category is not None:
+            mask &= self.is_sgl if category == SGL_CATEGORY else ~self.is_sgl
+        if not days:
+            return mask, self.orders
+        orders = self.weekday_orders[:, list(days)].sum(axis=1)
+        return mask & (orders > 0), orders
+
+    def derived(self, key: Hashable, build: Callable[["DeliveryPoints"], Any]) -> Any:
+        """``build(self)``, computed once per key for this snapshot (LRU of ``max_derived`` keys)."""
+        with self._derived_lock:
+            if key in self._derived:
+                self._derived.move_to_end(key)
+                return self._derived[key]
+            gate = self._building.setdefault(key, threading.Lock())
+        with gate:
+            with self._derived_lock:
+                if key in self._derived:
+                    return self._derived[key]
+            value = build(self)
+            with self._derived_lock:
+                self._derived[key] = value
+                while len(self._derived) > self._max_derived:
+                    self._derived.popitem(last=False)
+                self._building.pop(key, None)
+            return value
+
+    def derived_keys(self) -> List[str]:
+        with self._derived_lock:
+            return [str(key) for key in self._derived]
+
+
+class DeliveryPointsStore:
+    """Keeps the ``DeliveryPoints`` of the latest data snapshot version."""
+
+    def __init__(self) -> None:
+        self._points: Optional[DeliveryPoints] = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def load(self, version: str, body: bytes) -> DeliveryPoints:
+        """Points for the rendered ``/api/data`` ``body``; parsed only when ``version`` is new."""
+        points = self._points
+        if points is not None and points.version == version:
+            return points
+        with self._lock:
+            points = self._points
+            if points is not None and points.version == version:
+                return points
+            started = time.monotonic()
+            payload = orjson.loads(body) if orjson is not None else json.loads(body)
+            points = DeliveryPoints(version, payload.get("records") or [])
+            self._points = points
+            self.builds += 1
+            logger.info(
+                "Delivery points %s built: %d locations in %.3fs", version, len(points), time.monotonic() - started
+            )
+            return points
+
+    def stats(self) -> Dict[str, Any]:
+        points = self._points
+        return {
+            "version": points.version if points else None,
+            "points": len(points) if points else 0,
+            "age_seconds": round(time.time() - points.built_at, 1) if points else None,
+            "builds": self.builds,
+            "derived": points.derived_keys() if points else [],
+        }
+
+
+_STORE: Optional[DeliveryPointsStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_delivery_points_store() -> DeliveryPointsStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = DeliveryPointsStore()
+    return _STORE
@@ -0,0 +1,211 @@
+"""
+Geohash-binned delivery density for heatmaps (``/api/map/density``).
+
+Every location is encoded once, with numpy bit interleaving, to a
+``DENSITY_MAX_RESOLUTION``-character geohash held as an integer; geohashes
+are hierarchical, so the cell at any coarser resolution is the same integer
+shifted right by five bits per dropped character. A ``DensityGrid`` per
+resolution sums locations, SGL locations, orders, SGL orders, kg and members
+per cell, and keeps those tables for every weekday as well as for the whole
+week, so the common requests are a lookup. Other filters (category, several
+weekdays) are re-summed per cell with ``bincount``, O(locations).
+
+Weekday tables follow the map filters (``DeliveryPoints.select``): a location
+counts on a day when it ordered on that day, with its orders for that day
+and its full kg and members.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .delivery_points import SGL_CATEGORY, WEEKDAYS, DeliveryPoints
+from .map_clusters import BBox
+from .spatial_index import KM_PER_DEGREE
+
+DENSITY_MIN_RESOLUTION = 4
+DENSITY_MAX_RESOLUTION = 8
+DENSITY_DEFAULT_RESOLUTION = int(os.getenv("DENSITY_DEFAULT_RESOLUTION", "6"))
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_ALPHABET = np.array(list(GEOHASH_ALPHABET))
+
+# Per-cell aggregate columns.
+_FIELDS = ("locations", "sgl_locations", "orders", "sgl_orders", "kg", "members", "lat", "lon")
+_LOCATIONS, _SGL_LOCATIONS, _ORDERS, _SGL_ORDERS, _KG, _MEMBERS, _LAT, _LON = range(len(_FIELDS))
+
+
+def _split_bits(resolution: int) -> Tuple[int, int]:
+    """``(lon_bits, lat_bits)`` of a geohash with ``resolution`` characters (longitude takes the odd bit)."""
+    bits = 5 * resolution
+    return (bits + 1) // 2, bits // 2
+
+
+def geohash_codes(lat: np.ndarray, lon: np.ndarray, resolution: int = DENSITY_MAX_RESOLUTION) -> np.ndarray:
+    """Integer geohashes (``5 * resolution`` bits, longitude first) of coordinate arrays in degrees."""
+    lon_bits, lat_bits = _split_bits(resolution)
+    lon_cells = np.floor((np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64)
+    lat_cells = np.floor((np.asarray(lat, dtype=np.float64) + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64)
+    lon_cells = np.clip(lon_cells, 0, (1 << lon_bits) - 1)
+    lat_cells = np.clip(lat_cells, 0, (1 << lat_bits) - 1)
+    codes = np.zeros(len(lon_cells), dtype=np.int64)
+    for position in range(lon_bits + lat_bits):
+        cells, bits = (lon_cells, lon_bits) if position % 2 == 0 else (lat_cells, lat_bits)
+        codes = (codes << 1) | ((cells >> (bits - 1 - position // 2)) & 1)
+    return codes
+
+
+def geohash_bounds(codes: np.ndarray, resolution: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """``(min_lon, min_lat, max_lon, max_lat)`` arrays of the cells of integer geohashes."""
+    lon_bits, lat_bits = _split_bits(resolution)
+    codes = np.asarray(codes, dtype=np.int64)
+    lon_cells = np.zeros(len(codes), dtype=np.int64)
+    lat_cells = np.zeros(len(codes), dtype=np.int64)
+    for position in range(lon_bits + lat_bits):
+        bit = (codes >> (lon_bits + lat_bits - 1 - position)) & 1
+        if position % 2 == 0:
+            lon_cells |= bit << (lon_bits - 1 - position // 2)
+        else:
+            lat_cells |= bit << (lat_bits - 1 - position // 2)
+    lon_step, lat_step = 360.0 / (1 << lon_bits), 180.0 / (1 << lat_bits)
+    min_lon, min_lat = lon_cells * lon_step - 180.0, lat_cells * lat_step - 90.0
+    return min_lon, min_lat, min_lon + lon_step, min_lat + lat_step
+
+
+def geohash_strings(codes: np.ndarray, resolution: int) -> List[str]:
+    """Base-32 geohash strings of integer geohashes."""
+    shifts = 5 * np.arange(resolution - 1, -1, -1)
+    chars = _ALPHABET[(np.asarray(codes, dtype=np.int64)[:, None] >> shifts) & 31]
+    return ["".join(row) for row in chars.tolist()]
+
+
+def cell_size_km(resolution: int, lat: float = 0.0) -> Dict[str, float]:
+    """Height and width in km of a cell at ``resolution`` around latitude ``lat``."""
+    lon_bits, lat_bits = _split_bits(resolution)
+    return {
+        "height": 180.0 / (1 << lat_bits) * KM_PER_DEGREE,
+        "width": 360.0 / (1 << lon_bits) * KM_PER_DEGREE * math.cos(math.radians(lat)),
+    }
+
+
+def _weights(points: DeliveryPoints, mask: np.ndarray, orders: np.ndarray) -> np.ndarray:
+    """Per-point aggregate columns (zero rows for points outside ``mask``)."""
+    weights = np.zeros((len(points), len(_FIELDS)), dtype=np.float64)
+    sgl = mask & points.is_sgl
+    weights[mask, _LOCATIONS] = 1.0
+    weights[sgl, _SGL_LOCATIONS] = 1.0
+    weights[mask, _ORDERS] = orders[mask]
+    weights[sgl, _SGL_ORDERS] = orders[sgl]
+    weights[mask, _KG] = points.kg[mask]
+    weights[mask, _MEMBERS] = points.members[mask]
+    weights[mask, _LAT] = points.lat[mask]
+    weights[mask, _LON] = points.lon[mask]
+    return weights
+
+
+class DensityGrid:
+    """Geohash cells at one resolution over a ``DeliveryPoints`` snapshot, with weekday tables."""
+
+    def __init__(self, points: DeliveryPoints, resolution: int = DENSITY_DEFAULT_RESOLUTION) -> None:
+        if not DENSITY_MIN_RESOLUTION <= resolution <= DENSITY_MAX_RESOLUTION:
+            raise ValueError(f"resolution must be between {DENSITY_MIN_RESOLUTION} and {DENSITY_MAX_RESOLUTION}")
+        self.points = points
+        self.resolution = resolution
+        finest = points.derived("geohash", lambda snapshot: geohash_codes(snapshot.lat, snapshot.lon))
+        codes = finest >> (5 * (DENSITY_MAX_RESOLUTION - resolution))
+        self.codes, self.cell_of = np.unique(codes, return_inverse=True)
+        self.ids = geohash_strings(self.codes, resolution)
+        self.bounds = np.column_stack(geohash_bounds(self.codes, resolution))
+        # Whole week (None) and each single weekday, unfiltered by category.
+        self._tables: Dict[Optional[int], np.ndarray] = {
+            day: self._sum(*points.select(None, () if day is None else (day,)))
+            for day in (None, *range(len(WEEKDAYS)))
+        }
+        self._weekday_orders = np.column_stack([self._tables[day][:, _ORDERS] for day in range(len(WEEKDAYS))])
+
+    def _sum(self, mask: np.ndarray, orders: np.ndarray) -> np.ndarray:
+        weights = _weights(self.points, mask, orders)
+        return np.column_stack([
+            np.bincount(self.cell_of, weights=weights[:, column], minlength=len(self.codes))
+            for column in range(len(_FIELDS))
+        ])
+
+    def _weekday_table(self, category: Optional[str]) -> np.ndarray:
+        if category is None:
+            return self._weekday_orders
+        mask = self.points.is_sgl if category == SGL_CATEGORY else ~self.points.is_sgl
+        return np.column_stack([
+            np.bincount(self.cell_of, weights=np.where(mask, self.points.weekday_orders[:, day], 0.0),
+                        minlength=len(self.codes))
+            for day in range(len(WEEKDAYS))
+        ])
+
+    def query(self, category: Optional[str] = None, days: Sequence[int] = (),
+              bbox: Optional[BBox] = None) -> Dict[str, Any]:
+        """Non-empty cells (optionally inside ``bbox``) with their totals for a category/weekday filter."""
+        days = tuple(days)
+        if category is None and len(days) <= 1:
+            table = self._tables[days[0] if days else None]
+        else:
+            table = self._sum(*self.points.select(category, days))
+        keep = table[:, _LOCATIONS] > 0
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            keep &= (self.bounds[:, 2] >= min_lon) & (self.bounds[:, 0] <= max_lon)
+            keep &= (self.bounds[:, 3] >= min_lat) & (self.bounds[:, 1] <= max_lat)
+        cells = np.flatnonzero(keep)
+        rows, weekday_orders = table[cells], self._weekday_table(category)[cells]
+        count = rows[:, _LOCATIONS]
+        sgl_share = np.divide(
+            rows[:, _SGL_ORDERS], rows[:, _ORDERS], out=np.zeros(len(cells)), where=rows[:, _ORDERS] > 0
+        )
+        payload_cells = [
+            {
+                "id": self.ids[cell],
+                "lat": row[_LAT] / n,
+                "lon": row[_LON] / n,
+                "bounds": bounds,
+                "locations": int(n),
+                "sgl_locations": int(row[_SGL_LOCATIONS]),
+                "orders": row[_ORDERS],
+                "sgl_orders": row[_SGL_ORDERS],
+                "kg": row[_KG],
+                "members": int(row[_MEMBERS]),
+                "sgl_share": share,
+                "weekday_orders": weekday,
+            }
+            for cell, row, n, bounds, share, weekday in zip(
+                cells.tolist(), rows.tolist(), count.tolist(), self.bounds[cells].tolist(),
+                sgl_share.tolist(), weekday_orders.tolist(),
+            )
+        ]
+        totals = rows.sum(axis=0) if len(cells) else np.zeros(len(_FIELDS))
+        center_lat = float(np.mean(self.points.lat)) if len(self.points) else 0.0
+        return {
+            "resolution": self.resolution,
+            "cell_km": cell_size_km(self.resolution, center_lat),
+            "cells": payload_cells,
+            "totals": {
+                "cells": len(cells),
+                "locations": int(totals[_LOCATIONS]),
+                "sgl_locations": int(totals[_SGL_LOCATIONS]),
+                "orders": totals[_ORDERS],
+                "sgl_orders": totals[_SGL_ORDERS],
+                "kg": totals[_KG],
+                "members": int(totals[_MEMBERS]),
+            },
+            "max": {
+                "orders": float(rows[:, _ORDERS].max()) if len(cells) else 0.0,
+                "kg": float(rows[:, _KG].max()) if len(cells) else 0.0,
+                "locations": int(count.max()) if len(cells) else 0,
+            },
+        }
+
+
+def density_grid_for(points: DeliveryPoints, resolution: int) -> DensityGrid:
+    """The ``DensityGrid`` of a snapshot at ``resolution``, built on first use."""
+    return points.derived(("density", resolution), lambda snapshot: DensityGrid(snapshot, resolution))
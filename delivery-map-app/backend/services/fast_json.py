@@ -0,0 +1,128 @@
+"""
+Fast JSON rendering for API responses.
+
+``FastJSONResponse`` is the app-wide default response class. With ``orjson``
+installed and ``FAST_JSON_ENABLED`` on, payloads are serialized in one native
+pass: ``date``/``datetime`` become ISO strings, NaN and infinity become
+``null`` and numpy scalars and arrays are written as plain numbers and lists,
+so endpoints can return values as they come out of pandas/ClickHouse without
+per-record cleanup.
+
+FastAPI normally runs ``jsonable_encoder`` over a returned payload before the
+response class sees it. ``FastJSONRoute`` skips that walk for routes without a
+``response_model`` by wrapping the result in ``FastJSONResponse`` directly.
+
+Without orjson the same types are handled by ``jsonable_encoder`` plus a
+NaN/infinity scrub, so responses stay valid JSON either way.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import math
+import os
+from decimal import Decimal
+from typing import Any, Callable
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from starlette.routing import request_response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy ships with pandas
+    np = None
+
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "true").lower() == "true" and orjson is not None
+
+_ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not serialize natively."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if np is not None and isinstance(value, np.generic):
+        return value.item()
+    isoformat = getattr(value, "isoformat", None)
+    if callable(isoformat):
+        try:
+            return None if value != value else isoformat()  # pandas NaT compares unequal to itself
+        except (TypeError, ValueError):
+            return isoformat()
+    return jsonable_encoder(value)
+
+
+def _scrub_non_finite(value: Any) -> Any:
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _scrub_non_finite(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_scrub_non_finite(item) for item in value]
+    return value
+
+
+def _numpy_encoders() -> dict:
+    if np is None:
+        return {}
+    return {np.generic: lambda value: value.item(), np.ndarray: lambda value: value.tolist()}
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize ``content`` to compact JSON bytes (NaN/inf as null, dates as ISO strings)."""
+    if FAST_JSON_ENABLED:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+    encoded = _scrub_non_finite(jsonable_encoder(content, custom_encoder=_numpy_encoders()))
+    return json.dumps(encoded, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class FastJSONRoute(APIRoute):
+    """Route that renders plain return values with ``FastJSONResponse``, bypassing ``jsonable_encoder``."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, endpoint, **kwargs)
+        if self.response_field is not None:
+            return
+        status_code = self.status_code
+
+        def wrap(result: Any) -> Any:
+            if isinstance(result, Response):
+                return result
+            if status_code is None:
+                return FastJSONResponse(result)
+            return FastJSONResponse(result, status_code=status_code)
+
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+
+            @functools.wraps(call)
+            async def async_call(*args: Any, **kw: Any) -> Any:
+                return wrap(await call(*args, **kw))
+
+            self.dependant.call = async_call
+        else:
+
+            @functools.wraps(call)
+            def sync_call(*args: Any, **kw: Any) -> Any:
+                return wrap(call(*args, **kw))
+
+            self.dependant.call = sync_call
+        self.app = request_response(self.get_route_handler())
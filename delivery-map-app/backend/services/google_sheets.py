@@ -14,6 +14,9 @@ import gspread
 from google.auth.exceptions import GoogleAuthError
 from google.oauth2.service_account import Credentials
 
+from .snapshot_files import ParquetSnapshotFile, frame_to_grid, frame_to_records, grid_to_frame, records_to_frame
+from .snapshots import SnapshotStore, json_version
+
 logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
@@ -40,6 +43,8 @@ class GoogleSheetsClient:
         self._client = gspread.authorize(credentials)
         self._cache_ttl = cache_ttl_seconds
         self._cache: Dict[str, CacheEntry] = {}
+        self._stores: Dict[str, SnapshotStore] = {}
+        self._stores_lock = threading.Lock()
 
     @classmethod
     def get_instance(cls) -> "GoogleSheetsClient":
@@ -83,19 +88,33 @@ class GoogleSheetsClient:
     def _set_cache(self, key: str, data: Any) -> None:
         self._cache[key] = CacheEntry(timestamp=time.time(), data=data)
 
-    def get_records(self, sheet_id: str, worksheet: str) -> List[Dict[str, Any]]:
-        """Return sheet data as list of dicts using the first row as headers."""
-        cache_key = f"records:{sheet_id}:{worksheet}"
-        cached = self._get_cache(cache_key)
-        if cached is not None:
-            return cached
-
+    def _worksheet_store(self, kind: str, sheet_id: str, worksheet: str) -> SnapshotStore:
+        """Persisted snapshot store for one worksheet, created on first use."""
+        cache_key = f"{kind}:{sheet_id}:{worksheet}"
+        with self._stores_lock:
+            store = self._stores.get(cache_key)
+            if store is None:
+                if kind == "records":
+                    loader = lambda: self._download_records(sheet_id, worksheet)
+                    persist = ParquetSnapshotFile(
+                        f"records_{sheet_id}_{worksheet}", to_frame=records_to_frame, from_frame=frame_to_records
+                    )
+                else:
+                    loader = lambda: self._download_worksheet_values(sheet_id, worksheet)
+                    persist = ParquetSnapshotFile(
+                        f"grid_{sheet_id}_{worksheet}", to_frame=grid_to_frame, from_frame=frame_to_grid
+                    )
+                store = SnapshotStore(
+                    cache_key, loader, ttl_seconds=self._cache_ttl, versioner=json_version, persist=persist
+                )
+                self._stores[cache_key] = store
+            return store
+
+    def _download_records(self, sheet_id: str, worksheet: str) -> List[Dict[str, Any]]:
         try:
             spreadsheet = self._client.open_by_key(sheet_id)
             ws = spreadsheet.worksheet(worksheet)
-            records = ws.get_all_records(empty2zero=False, head=1)
-            self._set_cache(cache_key, records)
-            return records
+            return ws.get_all_records(empty2zero=False, head=1)
         except gspread.SpreadsheetNotFound as exc:
             logger.error("Google Sheet not found: %s", sheet_id)
             raise
@@ -103,6 +122,36 @@ class GoogleSheetsClient:
             logger.error("Worksheet '%s' not found in sheet %s", worksheet, sheet_id)
             raise
 
+    def _download_worksheet_values(self, sheet_id: str, worksheet: str) -> List[List[Any]]:
+        spreadsheet = self._client.open_by_key(sheet_id)
+        return spreadsheet.worksheet(worksheet).get_all_values()
+
+    def _snapshot_data(self, kind: str, sheet_id: str, worksheet: str) -> Any:
+        store = self._worksheet_store(kind, sheet_id, worksheet)
+        snapshot = store.get()
+        if snapshot is None:
+            raise RuntimeError(
+                f"Worksheet '{worksheet}' in sheet {sheet_id} is unavailable: {store.stats()['last_error']}"
+            )
+        return snapshot.data
+
+    def get_records(self, sheet_id: str, worksheet: str) -> List[Dict[str, Any]]:
+        """
+        Return sheet data as list of dicts using the first row as headers.
+
+        Served from a snapshot that is persisted to disk, so a restart or a
+        Sheets outage returns the last downloaded copy.
+        """
+        return self._snapshot_data("records", sheet_id, worksheet)
+
+    def get_worksheet_values(self, sheet_id: str, worksheet: str) -> List[List[Any]]:
+        """Return every cell of a worksheet as raw strings (tolerates duplicate headers)."""
+        return self._snapshot_data("values", sheet_id, worksheet)
+
+    def load_persisted(self, sheet_id: str, worksheet: str, kind: str = "records") -> bool:
+        """Seed a worksheet snapshot from disk without contacting Google Sheets."""
+        return self._worksheet_store(kind, sheet_id, worksheet).load_persisted()
+
     def get_values(self, sheet_id: str, range_name: str) -> List[List[Any]]:
         """Return raw values for a given A1 range."""
         cache_key = f"values:{sheet_id}:{range_name}"
@@ -126,4 +175,6 @@ def clear_cache() -> None:
     """Utility to clear cached sheet data (mainly for testing)."""
     if GoogleSheetsClient._instance:
         GoogleSheetsClient._instance._cache.clear()
+        for store in GoogleSheetsClient._instance._stores.values():
+            store.invalidate()
 
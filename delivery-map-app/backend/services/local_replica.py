@@ -0,0 +1,394 @@
+"""
+Embedded DuckDB replica of completed order facts.
+
+One row per order holds everything the map, statistics and sensitivity
+queries join for (leader, location, product, deal, cart quantity and price).
+A background thread keeps it current with watermark-based delta syncs: each
+pass asks ClickHouse only for orders whose joined ``_peerdb_version`` or
+``created_at`` moved past the stored watermarks, including orders that were
+cancelled or soft-deleted since, which are then removed locally.
+
+``order_replica_for`` is the router: it returns the replica when its last
+successful sync is within ``LOCAL_REPLICA_MAX_LAG_SECONDS``, or when
+ClickHouse is unavailable and the replica holds any data, so dashboards keep
+working through outages. Such a replica reports ``stale``; its ``last_sync``
+watermark says how old its data is, and callers must not keep results built
+from it in persistent caches. DuckDB is optional; without it the replica
+stays disabled and callers use ClickHouse as before.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+from .snapshot_files import SNAPSHOT_DIR
+
+logger = logging.getLogger(__name__)
+
+LOCAL_REPLICA_ENABLED = os.getenv("LOCAL_REPLICA_ENABLED", "false").lower() in ("1", "true", "yes")
+LOCAL_REPLICA_PATH = Path(os.getenv("LOCAL_REPLICA_PATH") or SNAPSHOT_DIR / "order_facts.duckdb")
+LOCAL_REPLICA_START = date.fromisoformat(os.getenv("LOCAL_REPLICA_START") or "2025-01-01")
+LOCAL_REPLICA_SYNC_SECONDS = float(os.getenv("LOCAL_REPLICA_SYNC_SECONDS", "60"))
+LOCAL_REPLICA_MAX_LAG_SECONDS = float(os.getenv("LOCAL_REPLICA_MAX_LAG_SECONDS", "300"))
+# Initial loads are pulled this many days at a time to bound memory.
+LOCAL_REPLICA_BACKFILL_DAYS = int(os.getenv("LOCAL_REPLICA_BACKFILL_DAYS", "31"))
+LOCAL_REPLICA_SYNC_TIMEOUT = int(os.getenv("LOCAL_REPLICA_SYNC_TIMEOUT", "600"))
+
+FACT_COLUMNS = [
+    "order_id",
+    "created_at",
+    "order_day",
+    "weekday",
+    "leader_id",
+    "leader_known",
+    "leader_name",
+    "leader_phone",
+    "product_id",
+    "product_name",
+    "product_local_name",
+    "deal_type",
+    "location_id",
+    "location_coordinates",
+    "location_name",
+    "user_id",
+    "group_id",
+    "quantity",
+    "group_price",
+    "version",
+]
+
+_FACTS_DDL = """
+CREATE TABLE IF NOT EXISTS order_facts (
+    order_id VARCHAR PRIMARY KEY,
+    created_at TIMESTAMP,
+    order_day DATE,
+    weekday INTEGER,
+    leader_id VARCHAR,
+    leader_known BOOLEAN,
+    leader_name VARCHAR,
+    leader_phone VARCHAR,
+    product_id VARCHAR,
+    product_name VARCHAR,
+    product_local_name VARCHAR,
+    deal_type VARCHAR,
+    location_id VARCHAR,
+    location_coordinates VARCHAR,
+    location_name VARCHAR,
+    user_id VARCHAR,
+    group_id VARCHAR,
+    quantity DOUBLE,
+    group_price DOUBLE,
+    version BIGINT
+)
+"""
+_STATE_DDL = "CREATE TABLE IF NOT EXISTS replica_state (key VARCHAR PRIMARY KEY, value VARCHAR)"
+
+# Every version of the joined rows, active or not: ``active = 0`` rows delete the order locally.
+# Names come from LEFT JOINs with join_use_nulls so a missing location or user stays NULL.
+_DELTA_QUERY = """
+    SELECT
+        toString(o.id)                                      AS order_id,
+        o.created_at                                        AS created_at,
+        toDate(o.created_at)                                AS order_day,
+        toDayOfWeek(o.created_at)                           AS weekday,
+        toString(g.created_by)                              AS leader_id,
+        u.id IS NOT NULL                                    AS leader_known,
+        u.name                                              AS leader_name,
+        u.phone                                             AS leader_phone,
+        toString(gd.product_id)                             AS product_id,
+        pn.name                                             AS product_name,
+        pn_loc.local_name                                   AS product_local_name,
+        gd.deal_type                                        AS deal_type,
+        if(dl.id IS NULL, NULL, toString(o.location_id))    AS location_id,
+        dl.location                                         AS location_coordinates,
+        dl.name                                             AS location_name,
+        toString(gc.user_id)                                AS user_id,
+        toString(g.id)                                      AS group_id,
+        toFloat64(gc.quantity)                              AS quantity,
+        toFloat64(gd.group_price)                           AS group_price,
+        greatest(o._peerdb_version, gc._peerdb_version, g._peerdb_version, gd._peerdb_version) AS version,
+        (
+            o._peerdb_is_deleted = 0 AND gc._peerdb_is_deleted = 0
+            AND g._peerdb_is_deleted = 0 AND gd._peerdb_is_deleted = 0
+            AND o.status = 'COMPLETED' AND o.deleted_at IS NULL
+            AND gc.status = 'COMPLETED' AND gc.deleted_at IS NULL
+            AND g.status = 'COMPLETED' AND g.deleted_at IS NULL
+        )                                                   AS active
+    FROM orders AS o
+    INNER JOIN groups_carts AS gc ON o.groups_carts_id = gc.id
+    INNER JOIN groups AS g ON gc.group_id = g.id
+    INNER JOIN group_deals AS gd ON g.group_deals_id = gd.id
+    LEFT JOIN delivery_location AS dl ON o.location_id = dl.id
+    LEFT JOIN users AS u ON u.id = g.created_by
+    LEFT JOIN products AS prod ON gd.product_id = prod.id
+    LEFT JOIN product_names AS pn ON prod.name_id = pn.id
+    LEFT JOIN product_name_localizations AS pn_loc
+        ON pn.id = pn_loc.product_name_id AND pn_loc.language_code = 'en'
+    WHERE {where}
+"""
+
+
+class ReplicaResult:
+    """The slice of the clickhouse_connect ``QueryResult`` interface callers rely on."""
+
+    def __init__(self, column_names: Sequence[str], result_rows: List[tuple]) -> None:
+        self.column_names = tuple(column_names)
+        self.result_rows = result_rows
+
+    def named_results(self) -> Iterator[Dict[str, Any]]:
+        for row in self.result_rows:
+            yield dict(zip(self.column_names, row))
+
+
+class LocalOrderReplica:
+    """DuckDB file with one row per order, synced from ClickHouse by version watermark."""
+
+    def __init__(self, client, path: Path = LOCAL_REPLICA_PATH, sync_interval: float = LOCAL_REPLICA_SYNC_SECONDS) -> None:
+        self._client = client
+        self.path = path
+        self._sync_interval = sync_interval
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_sync: Optional[float] = None
+        self._row_count = 0
+        self._syncs = 0
+        self._rows_pulled = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+        self._queries = 0
+
+    # ---- storage ----
+
+    def open(self) -> bool:
+        """Open (or create) the DuckDB file; False when DuckDB is not installed."""
+        if self._conn is not None:
+            return True
+        try:
+            import duckdb
+        except ImportError:
+            logger.warning("duckdb is not installed; local order replica disabled")
+            return False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = duckdb.connect(str(self.path))
+        conn.execute(_FACTS_DDL)
+        conn.execute(_STATE_DDL)
+        self._conn = conn
+        self._row_count = int(conn.execute("SELECT count(*) FROM order_facts").fetchone()[0])
+        last_sync = self._state("last_sync")
+        self._last_sync = float(last_sync) if last_sync else None
+        logger.info("Opened local order replica %s with %d orders", self.path, self._row_count)
+        return True
+
+    def _state(self, key: str) -> Optional[str]:
+        row = self._conn.cursor().execute("SELECT value FROM replica_state WHERE key = ?", [key]).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---- sync ----
+
+    def _pull(self, where: str) -> pd.DataFrame:
+        result = self._client.query(
+            _DELTA_QUERY.format(where=where),
+            settings={"join_use_nulls": 1, "max_execution_time": LOCAL_REPLICA_SYNC_TIMEOUT},
+        )
+        frame = pd.DataFrame(result.result_rows, columns=list(FACT_COLUMNS) + ["active"])
+        self._rows_pulled += len(frame)
+        return frame
+
+    def apply(self, delta: pd.DataFrame, version_watermark: int, created_watermark: Optional[datetime]) -> None:
+        """Upsert active orders, delete inactive ones and advance the watermarks in one transaction."""
+        if not delta.empty:
+            # Unmerged PeerDB row versions can return an order more than once; keep its newest state.
+            delta = delta.sort_values("version", kind="stable").drop_duplicates("order_id", keep="last")
+        active = delta.loc[delta["active"].astype(bool), FACT_COLUMNS] if not delta.empty else delta
+        cursor = self._conn.cursor()
+        cursor.execute("BEGIN TRANSACTION")
+        try:
+            if not delta.empty:
+                cursor.register("delta_ids", delta[["order_id"]])
+                cursor.execute("DELETE FROM order_facts WHERE order_id IN (SELECT order_id FROM delta_ids)")
+                cursor.unregister("delta_ids")
+            if not active.empty:
+                cursor.register("delta_rows", active)
+                cursor.execute(f"INSERT INTO order_facts SELECT {', '.join(FACT_COLUMNS)} FROM delta_rows")
+                cursor.unregister("delta_rows")
+            now = time.time()
+            state = {"version": str(version_watermark), "last_sync": repr(now)}
+            if created_watermark is not None:
+                state["created_at"] = created_watermark.isoformat()
+            for key, value in state.items():
+                cursor.execute("INSERT OR REPLACE INTO replica_state VALUES (?, ?)", [key, value])
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        self._row_count = int(cursor.execute("SELECT count(*) FROM order_facts").fetchone()[0])
+        self._last_sync = now
+
+    def sync_once(self) -> int:
+        """Pull and apply everything past the watermarks; returns the number of rows pulled."""
+        with self._lock:
+            if not self.open():
+                return 0
+            version = int(self._state("version") or 0)
+            created = self._state("created_at")
+            if created is None:
+                pulled = self._backfill()
+            else:
+                since = datetime.fromisoformat(created)
+                frame = self._pull(
+                    f"(greatest(o._peerdb_version, gc._peerdb_version, g._peerdb_version, gd._peerdb_version) > {version}"
+                    f" OR o.created_at > toDateTime('{since.strftime('%Y-%m-%d %H:%M:%S')}'))"
+                    f" AND o.created_at >= toDateTime('{LOCAL_REPLICA_START.isoformat()} 00:00:00')"
+                )
+                self.apply(frame, *self._watermarks(frame, version, since))
+                pulled = len(frame)
+            self._syncs += 1
+            return pulled
+
+    @staticmethod
+    def _watermarks(frame: pd.DataFrame, version: int, created: Optional[datetime]):
+        if frame.empty:
+            return version, created
+        newest = frame["created_at"].max()
+        newest = newest.to_pydatetime() if hasattr(newest, "to_pydatetime") else newest
+        return max(version, int(frame["version"].max())), max(created, newest) if created else newest
+
+    def _backfill(self) -> int:
+        """Initial load in ``LOCAL_REPLICA_BACKFILL_DAYS`` slices; watermarks are committed per slice."""
+        version, created = 0, None
+        pulled = 0
+        start = LOCAL_REPLICA_START
+        tomorrow = date.today() + timedelta(days=1)
+        while start < tomorrow and not self._stop.is_set():
+            end = min(start + timedelta(days=max(1, LOCAL_REPLICA_BACKFILL_DAYS)), tomorrow)
+            frame = self._pull(
+                f"o.created_at >= toDateTime('{start.isoformat()} 00:00:00')"
+                f" AND o.created_at < toDateTime('{end.isoformat()} 00:00:00')"
+            )
+            version, created = self._watermarks(frame, version, created)
+            # Keep the created watermark unset until the last slice so an interrupted backfill restarts.
+            self.apply(frame, version, created if end >= tomorrow else None)
+            pulled += len(frame)
+            logger.info("Local order replica backfilled %s..%s: %d rows", start, end, len(frame))
+            start = end
+        return pulled
+
+    def start(self) -> None:
+        """Open the local file (so it can serve during an outage) and start the sync thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if not self.open():
+                return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="order-replica-sync", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as exc:  # pylint: disable=broad-except
+                self._failures += 1
+                self._last_error = str(exc)
+                logger.warning("Local order replica sync failed: %s", exc)
+            if self._stop.wait(self._sync_interval):
+                return
+
+    # ---- reads ----
+
+    @property
+    def last_sync(self) -> Optional[float]:
+        """Epoch seconds of the last successful sync (the replica holds every order up to then)."""
+        return self._last_sync
+
+    def is_fresh(self) -> bool:
+        return self._last_sync is not None and time.time() - self._last_sync <= LOCAL_REPLICA_MAX_LAG_SECONDS
+
+    @property
+    def stale(self) -> bool:
+        """True when the last sync is older than ``LOCAL_REPLICA_MAX_LAG_SECONDS`` (or never happened)."""
+        return not self.is_fresh()
+
+    def has_data(self) -> bool:
+        return self._conn is not None and self._row_count > 0
+
+    def query(self, sql: str, parameters: Optional[Sequence[Any]] = None) -> ReplicaResult:
+        """Run a read-only DuckDB query on its own cursor; safe alongside a running sync."""
+        conn = self._conn
+        if conn is None:
+            raise RuntimeError("Local order replica is not open")
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, parameters or [])
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        self._queries += 1
+        return ReplicaResult(columns, rows)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "open": self._conn is not None,
+            "orders": self._row_count,
+            "last_sync": self._last_sync,
+            "lag_seconds": time.time() - self._last_sync if self._last_sync is not None else None,
+            "fresh": self.is_fresh(),
+            "stale": self.stale,
+            "syncs": self._syncs,
+            "rows_pulled": self._rows_pulled,
+            "failures": self._failures,
+            "last_error": self._last_error,
+            "queries": self._queries,
+        }
+
+
+_ACTIVE: Optional[LocalOrderReplica] = None
+
+
+def set_active_order_replica(replica: Optional[LocalOrderReplica]) -> None:
+    global _ACTIVE
+    _ACTIVE = replica
+
+
+def order_replica_for(client) -> Optional[LocalOrderReplica]:
+    """
+    Replica to answer a dashboard query instead of ClickHouse, or None.
+
+    Fresh replicas always win (local disk instead of a WAN round trip); a stale
+    one is only used while ClickHouse (``client``) is unavailable. Callers check
+    ``replica.stale`` before caching anything derived from it.
+    """
+    replica = _ACTIVE
+    if replica is None or not replica.has_data():
+        return None
+    if replica.is_fresh() or client is None:
+        return replica
+    return None
+
+
+def order_replica_stats() -> Optional[Dict[str, Any]]:
+    replica = _ACTIVE
+    return replica.stats() if replica is not None else None
@@ -0,0 +1,234 @@
+"""
+Hierarchical grid clustering of delivery locations for ``/api/map/clusters``.
+
+Points are projected to Web Mercator once. At zoom ``z`` a cluster is a square
+grid cell of about ``MAP_CLUSTER_RADIUS_PX`` screen pixels; the cell size is
+rounded to a power of two so that the four cells at ``z + 1`` nest exactly in
+their parent. Each zoom level stores the points sorted by cell key (x-major),
+the cell boundaries, and per-cell totals for SGL and normal locations (count,
+orders, kg, members, groups, coordinate sums for the centroid). The index is
+built once per data snapshot (see ``services.delivery_points``).
+
+A viewport query binary-searches the x range of the bbox and masks the y
+range, so the unfiltered answer costs O(visible cells). A weekday filter
+changes which locations count and their orders; those totals are re-summed
+per cell from the sorted points (one ``reduceat``, O(points)). Cells left
+with a single location are returned as points, and above
+``MAP_CLUSTER_MAX_ZOOM`` every location in the bbox is a point.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .delivery_points import NORMAL_CATEGORY, SGL_CATEGORY, DeliveryPoints
+
+MAP_CLUSTER_RADIUS_PX = int(os.getenv("MAP_CLUSTER_RADIUS_PX", "64"))
+MAP_CLUSTER_MAX_ZOOM = int(os.getenv("MAP_CLUSTER_MAX_ZOOM", "16"))
+MAP_CLUSTER_MAX_POINTS = int(os.getenv("MAP_CLUSTER_MAX_POINTS", "2000"))
+
+TILE_SIZE = 256
+MAX_LATITUDE = 85.05112878
+
+BBox = Tuple[float, float, float, float]
+
+# Per-category aggregate columns; the SGL block comes first, then the normal block.
+_FIELDS = ("count", "orders", "kg", "members", "groups", "lat", "lon")
+_WIDTH = len(_FIELDS)
+_COUNT, _ORDERS, _KG, _MEMBERS, _GROUPS, _LAT, _LON = range(_WIDTH)
+
+
+def parse_bbox(value: Optional[str]) -> Optional[BBox]:
+    """``(min_lon, min_lat, max_lon, max_lat)`` from ``"minLon,minLat,maxLon,maxLat"``; ValueError if malformed."""
+    if not value:
+        return None
+    parts = [part.strip() for part in value.split(",")]
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in parts)
+    except ValueError:
+        raise ValueError("bbox must be minLon,minLat,maxLon,maxLat") from None
+    if not all(map(math.isfinite, (min_lon, min_lat, max_lon, max_lat))) or min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox must be minLon,minLat,maxLon,maxLat with min <= max")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _project(lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Web Mercator coordinates in [0, 1) (x east, y south)."""
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    sin = np.sin(np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE)))
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+    upper = np.nextafter(1.0, 0.0)
+    return np.clip(x, 0.0, upper), np.clip(y, 0.0, upper)
+
+
+def _weights(points: DeliveryPoints, mask: np.ndarray, orders: np.ndarray) -> np.ndarray:
+    """Per-point aggregate columns (zero rows for points outside ``mask``)."""
+    weights = np.zeros((len(points), 2 * _WIDTH), dtype=np.float64)
+    for block, in_block in enumerate((points.is_sgl, ~points.is_sgl)):
+        rows = mask & in_block
+        offset = block * _WIDTH
+        weights[rows, offset + _COUNT] = 1.0
+        weights[rows, offset + _ORDERS] = orders[rows]
+        weights[rows, offset + _KG] = points.kg[rows]
+        weights[rows, offset + _MEMBERS] = points.members[rows]
+        weights[rows, offset + _GROUPS] = points.groups[rows]
+        weights[rows, offset + _LAT] = points.lat[rows]
+        weights[rows, offset + _LON] = points.lon[rows]
+    return weights
+
+
+class _ZoomLevel:
+    """Cells of one zoom level: sorted keys, point order and boundaries, unfiltered totals."""
+
+    def __init__(self, zoom: int, bits: int, cx: np.ndarray, cy: np.ndarray, weights: np.ndarray) -> None:
+        self.zoom = zoom
+        self.bits = bits
+        keys = (cx << bits) | cy
+        self.order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self.order]
+        self.starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(keys) else np.empty(0, int)
+        self.keys = sorted_keys[self.starts]
+        self.totals = np.add.reduceat(weights[self.order], self.starts, axis=0) if len(keys) else weights[:0]
+        self.expansion_zoom = np.full(len(self.keys), zoom + 1, dtype=np.int64)
+
+    def visible(self, bbox: Optional[BBox]) -> np.ndarray:
+        """Indexes of the cells intersecting ``bbox`` (all cells without one)."""
+        if bbox is None:
+            return np.arange(len(self.keys))
+        min_lon, min_lat, max_lon, max_lat = bbox
+        scale = 1 << self.bits
+        (x0, x1), (y1, y0) = _project(np.array([min_lat, max_lat]), np.array([min_lon, max_lon]))
+        cx0, cx1 = int(x0 * scale), int(x1 * scale)
+        cy0, cy1 = int(y0 * scale), int(y1 * scale)
+        lo, hi = np.searchsorted(self.keys, [cx0 << self.bits, (cx1 + 1) << self.bits])
+        cy = self.keys[lo:hi] & (scale - 1)
+        return lo + np.flatnonzero((cy >= cy0) & (cy <= cy1))
+
+
+class MapClusterIndex:
+    """Cluster cells for zooms 0..``max_zoom`` over one ``DeliveryPoints`` snapshot."""
+
+    def __init__(self, points: DeliveryPoints, radius_px: int = MAP_CLUSTER_RADIUS_PX,
+                 max_zoom: int = MAP_CLUSTER_MAX_ZOOM) -> None:
+        self.points = points
+        self.max_zoom = max_zoom
+        self.shift = max(0, round(math.log2(TILE_SIZE / max(1, radius_px))))
+        x, y = _project(points.lat, points.lon)
+        finest = max_zoom + self.shift
+        cx = (x * (1 << finest)).astype(np.int64)
+        cy = (y * (1 << finest)).astype(np.int64)
+        all_points = np.ones(len(points), dtype=bool)
+        weights = _weights(points, all_points, points.orders)
+        self.levels: List[_ZoomLevel] = [
+            _ZoomLevel(zoom, zoom + self.shift, cx >> (max_zoom - zoom), cy >> (max_zoom - zoom), weights)
+            for zoom in range(max_zoom + 1)
+        ]
+        self._link_expansion_zooms()
+
+    def _link_expansion_zooms(self) -> None:
+        """Zoom at which each cell first splits into several non-empty cells (bottom-up)."""
+        for zoom in range(self.max_zoom - 1, -1, -1):
+            parent, child = self.levels[zoom], self.levels[zoom + 1]
+            parent_keys = ((child.keys >> child.bits) >> 1 << parent.bits) | ((child.keys & ((1 << child.bits) - 1)) >> 1)
+            parent_index = np.searchsorted(parent.keys, parent_keys)
+            children = np.bincount(parent_index, minlength=len(parent.keys))
+            only_child = children[parent_index] == 1
+            parent.expansion_zoom[parent_index[only_child]] = child.expansion_zoom[only_child]
+
+    def query(self, zoom: float, bbox: Optional[BBox] = None, category: Optional[str] = None,
+              days: Sequence[int] = ()) -> Dict[str, Any]:
+        """Clusters and single points inside ``bbox`` at ``zoom`` for a category/weekday filter."""
+        level_zoom = max(0, int(math.floor(zoom)))
+        mask, orders = self.points.select(category, days)
+        if level_zoom > self.max_zoom:
+            return self._points_only(level_zoom, bbox, mask, orders)
+
+        level = self.levels[level_zoom]
+        cells = level.visible(bbox)
+        if days and len(cells):
+            totals = np.add.reduceat(_weights(self.points, mask, orders)[level.order], level.starts, axis=0)[cells]
+        else:
+            totals = level.totals[cells]
+        blocks = [slice(0, _WIDTH), slice(_WIDTH, 2 * _WIDTH)]
+        if category is not None:
+            blocks = [blocks[0] if category == SGL_CATEGORY else blocks[1]]
+        combined = sum(totals[:, block] for block in blocks) if len(cells) else np.zeros((0, _WIDTH))
+        count = combined[:, _COUNT]
+
+        clusters: List[Dict[str, Any]] = []
+        for row in np.flatnonzero(count > 1):
+            cell, totals_row, n = cells[row], combined[row], count[row]
+            clusters.append({
+                "id": f"{level_zoom}/{int(level.keys[cell])}",
+                "lat": totals_row[_LAT] / n,
+                "lon": totals_row[_LON] / n,
+                "count": int(n),
+                "sgl_count": int(totals[row, _COUNT]) if category != NORMAL_CATEGORY else 0,
+                "normal_count": int(totals[row, _WIDTH + _COUNT]) if category != SGL_CATEGORY else 0,
+                "orders": totals_row[_ORDERS],
+                "kg": totals_row[_KG],
+                "members": int(totals_row[_MEMBERS]),
+                "groups": int(totals_row[_GROUPS]),
+                "expansion_zoom": int(level.expansion_zoom[cell]),
+            })
+        single_cells = cells[count == 1].tolist()
+        if single_cells:
+            starts = level.starts[single_cells]
+            ends = np.append(level.starts, len(level.order))[np.asarray(single_cells) + 1]
+            members = np.concatenate([level.order[start:end] for start, end in zip(starts, ends)])
+            point_ids = members[mask[members]]
+        else:
+            point_ids = np.empty(0, dtype=np.int64)
+        return {
+            "zoom": level_zoom,
+            "clusters": clusters,
+            "points": self._point_rows(point_ids, orders),
+            "totals": self._totals(combined),
+            "truncated": False,
+        }
+
+    def _points_only(self, zoom: int, bbox: Optional[BBox], mask: np.ndarray, orders: np.ndarray) -> Dict[str, Any]:
+        inside = mask.copy()
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            lat, lon = self.points.lat, self.points.lon
+            inside &= (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+        point_ids = np.flatnonzero(inside)
+        combined = _weights(self.points, inside, orders)
+        combined = (combined[:, :_WIDTH] + combined[:, _WIDTH:]).sum(axis=0, keepdims=True)
+        return {
+            "zoom": zoom,
+            "clusters": [],
+            "points": self._point_rows(point_ids[:MAP_CLUSTER_MAX_POINTS], orders),
+            "totals": self._totals(combined),
+            "truncated": len(point_ids) > MAP_CLUSTER_MAX_POINTS,
+        }
+
+    def _point_rows(self, point_ids: np.ndarray, orders: np.ndarray) -> List[Dict[str, Any]]:
+        points = self.points
+        return [
+            {
+                "id": int(index),
+                "lat": points.lat[index],
+                "lon": points.lon[index],
+                "sgl": bool(points.is_sgl[index]),
+                "orders": orders[index],
+                "record": points.records[index],
+            }
+            for index in point_ids.tolist()
+        ]
+
+    @staticmethod
+    def _totals(combined: np.ndarray) -> Dict[str, Any]:
+        total = combined.sum(axis=0) if len(combined) else np.zeros(_WIDTH)
+        return {
+            "locations": int(total[_COUNT]),
+            "orders": total[_ORDERS],
+            "kg": total[_KG],
+            "members": int(total[_MEMBERS]),
+            "groups": int(total[_GROUPS]),
+        }
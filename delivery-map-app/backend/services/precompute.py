@@ -0,0 +1,269 @@
+"""
+Precomputed default-window dashboard responses (stale-while-revalidate).
+
+Heavy endpoints are wrapped with ``DashboardScheduler.precomputed(name, **defaults)``.
+A request whose arguments equal ``defaults`` is answered from the last rendered
+snapshot straight away, with ``Age`` and ``X-Snapshot-*`` headers; any other
+request, or a default request before the first build, runs the endpoint as
+before. The scheduler task started from ``lifespan`` rebuilds each snapshot out
+of band by calling the endpoint with its defaults.
+
+Cadence is configurable per endpoint through the environment, e.g. for
+``sgl-retention``::
+
+    PRECOMPUTE_SGL_RETENTION_INTERVAL_SECONDS   rebuild period
+    PRECOMPUTE_SGL_RETENTION_JITTER_SECONDS     random delay added to each period
+    PRECOMPUTE_SGL_RETENTION_BACKOFF_SECONDS    first retry delay after a failure (doubles)
+    PRECOMPUTE_SGL_RETENTION_MAX_AGE_SECONDS    older snapshots are no longer served
+
+Unset values fall back to the registration defaults, then to the global
+``PRECOMPUTE_*`` settings below. A build that raises, or that returns a dict
+with a truthy ``error`` or ``degraded`` key (the endpoint ran while one of its
+sources was unavailable), keeps the previous snapshot and is retried with
+exponential backoff.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi.responses import Response
+
+from .fast_json import dumps
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true"
+PRECOMPUTE_INTERVAL_SECONDS = float(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "300"))
+PRECOMPUTE_JITTER_SECONDS = float(os.getenv("PRECOMPUTE_JITTER_SECONDS", "30"))
+PRECOMPUTE_BACKOFF_SECONDS = float(os.getenv("PRECOMPUTE_BACKOFF_SECONDS", "30"))
+PRECOMPUTE_BACKOFF_MAX_SECONDS = float(os.getenv("PRECOMPUTE_BACKOFF_MAX_SECONDS", "1800"))
+PRECOMPUTE_MAX_AGE_SECONDS = float(os.getenv("PRECOMPUTE_MAX_AGE_SECONDS", "21600"))
+
+
+def _setting(name: str, field: str, default: Optional[float], fallback: float) -> float:
+    env_key = f"PRECOMPUTE_{name.upper().replace('-', '_')}_{field}"
+    value = os.getenv(env_key)
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            logger.warning("Ignoring non-numeric %s=%r", env_key, value)
+    return fallback if default is None else default
+
+
+@dataclass
+class _RenderedSnapshot:
+    body: bytes
+    built_at: float
+    build_seconds: float
+
+
+class PrecomputedEndpoint:
+    """Schedule and latest rendered response for one endpoint's default window."""
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        defaults: Dict[str, Any],
+        interval: Optional[float] = None,
+        jitter: Optional[float] = None,
+        backoff: Optional[float] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.defaults = defaults
+        self.interval = _setting(name, "INTERVAL_SECONDS", interval, PRECOMPUTE_INTERVAL_SECONDS)
+        self.jitter = _setting(name, "JITTER_SECONDS", jitter, PRECOMPUTE_JITTER_SECONDS)
+        self.backoff = _setting(name, "BACKOFF_SECONDS", backoff, PRECOMPUTE_BACKOFF_SECONDS)
+        self.max_age = _setting(name, "MAX_AGE_SECONDS", max_age, PRECOMPUTE_MAX_AGE_SECONDS)
+        self.snapshot: Optional[_RenderedSnapshot] = None
+        self.next_due = 0.0
+        self.running = False
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.builds = 0
+        self.hits = 0
+        self.misses = 0
+
+    def matches(self, kwargs: Dict[str, Any]) -> bool:
+        return all(kwargs.get(key) == value for key, value in self.defaults.items())
+
+    def serve(self) -> Optional[Response]:
+        snapshot = self.snapshot
+        if snapshot is None:
+            self.misses += 1
+            return None
+        age = time.time() - snapshot.built_at
+        if age > self.max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        headers = {
+            "Age": str(int(age)),
+            "X-Snapshot-Built-At": datetime.fromtimestamp(snapshot.built_at, tz=timezone.utc).isoformat(),
+            "X-Snapshot-Status": "fresh" if age <= self.interval + self.jitter else "stale",
+        }
+        return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+    def schedule_after_success(self) -> None:
+        self.failures = 0
+        self.last_error = None
+        self.next_due = time.monotonic() + self.interval + random.uniform(0, self.jitter)
+
+    def schedule_after_failure(self, error: str) -> None:
+        self.failures += 1
+        self.last_error = error
+        delay = min(PRECOMPUTE_BACKOFF_MAX_SECONDS, self.backoff * 2 ** (self.failures - 1))
+        self.next_due = time.monotonic() + delay + random.uniform(0, self.jitter)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "age_seconds": round(time.time() - snapshot.built_at, 1) if snapshot else None,
+            "build_seconds": round(snapshot.build_seconds, 3) if snapshot else None,
+            "bytes": len(snapshot.body) if snapshot else 0,
+            "interval_seconds": self.interval,
+            "builds": self.builds,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class DashboardScheduler:
+    """Registry of precomputed endpoints plus the asyncio task that refreshes them."""
+
+    def __init__(self, tick_seconds: float = 1.0) -> None:
+        self._endpoints: Dict[str, PrecomputedEndpoint] = {}
+        self._tick = tick_seconds
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._builds: set = set()
+        self._lock = threading.Lock()
+
+    def precomputed(self, name: str, *, interval: Optional[float] = None, jitter: Optional[float] = None,
+                    backoff: Optional[float] = None, max_age: Optional[float] = None,
+                    **defaults: Any) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Decorator: serve calls whose keyword arguments equal ``defaults`` from the snapshot."""
+
+        def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+            endpoint = PrecomputedEndpoint(name, fn, defaults, interval, jitter, backoff, max_age)
+            with self._lock:
+                self._endpoints[name] = endpoint
+
+            if asyncio.iscoroutinefunction(fn):
+
+                @functools.wraps(fn)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    if not args and endpoint.matches(kwargs):
+                        cached = endpoint.serve()
+                        if cached is not None:
+                            return cached
+                    return await fn(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not args and endpoint.matches(kwargs):
+                    cached = endpoint.serve()
+                    if cached is not None:
+                        return cached
+                return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    async def _build(self, endpoint: PrecomputedEndpoint) -> None:
+        started = time.monotonic()
+        try:
+            if asyncio.iscoroutinefunction(endpoint.fn):
+                payload = await endpoint.fn(**endpoint.defaults)
+            else:
+                payload = await asyncio.to_thread(endpoint.fn, **endpoint.defaults)
+            if isinstance(payload, Response):
+                raise ValueError(f"endpoint returned a {type(payload).__name__}, not a payload")
+            if isinstance(payload, dict) and payload.get("error"):
+                raise ValueError(str(payload["error"]))
+            if isinstance(payload, dict) and payload.get("degraded"):
+                raise ValueError(f"degraded payload: {payload['degraded']}")
+            body = dumps(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # pylint: disable=broad-except
+            endpoint.schedule_after_failure(str(getattr(exc, "detail", None) or exc))
+            logger.warning("Precompute of %s failed (attempt %d): %s", endpoint.name, endpoint.failures, endpoint.last_error)
+        else:
+            endpoint.snapshot = _RenderedSnapshot(body, time.time(), time.monotonic() - started)
+            endpoint.builds += 1
+            endpoint.schedule_after_success()
+        finally:
+            endpoint.running = False
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                due = [ep for ep in self._endpoints.values() if not ep.running and ep.next_due <= now]
+            for endpoint in due:
+                endpoint.running = True
+                task = asyncio.create_task(self._build(endpoint))
+                self._builds.add(task)
+                task.add_done_callback(self._builds.discard)
+            await asyncio.sleep(self._tick)
+
+    def start(self) -> None:
+        """Start refreshing on the running loop; first builds are spread over each endpoint's jitter."""
+        if self._task is not None and not self._task.done():
+            return
+        now = time.monotonic()
+        with self._lock:
+            for endpoint in self._endpoints.values():
+                endpoint.next_due = now + random.uniform(0, endpoint.jitter)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("Dashboard precompute scheduler started for %d endpoints", len(self._endpoints))
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        for build in list(self._builds):
+            build.cancel()
+        await asyncio.gather(task, *self._builds, return_exceptions=True)
+
+    def snapshot_version(self, name: str) -> Optional[str]:
+        """Changes whenever the snapshot of ``name`` is rebuilt; None before the first build."""
+        endpoint = self._endpoints.get(name)
+        snapshot = endpoint.snapshot if endpoint else None
+        return f"{snapshot.built_at:.6f}" if snapshot else None
+
+    def latest(self, name: str) -> Optional[Tuple[str, bytes]]:
+        """``(snapshot_version, rendered JSON body)`` of ``name`` while it may still be served, else None."""
+        endpoint = self._endpoints.get(name)
+        snapshot = endpoint.snapshot if endpoint else None
+        if snapshot is None or time.time() - snapshot.built_at > endpoint.max_age:
+            return None
+        return f"{snapshot.built_at:.6f}", snapshot.body
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = dict(self._endpoints)
+        return {
+            "enabled": PRECOMPUTE_ENABLED,
+            "running": self._task is not None and not self._task.done(),
+            "endpoints": {name: endpoint.stats() for name, endpoint in endpoints.items()},
+        }
@@ -0,0 +1,359 @@
+"""
+HTTP response cache with strong ETags and precompressed bodies.
+
+``ResponseCacheMiddleware`` handles every ``GET`` that produces a 200 JSON body:
+it adds an ``ETag``, ``Cache-Control`` and ``Vary: Accept-Encoding``, answers
+``If-None-Match`` with 304 and compresses with brotli or gzip as negotiated.
+
+Routes registered on the ``ResponseCache`` additionally keep the rendered body
+and its gzip/brotli variants, keyed by path, normalized query string, an
+optional header-dependent variant (the negotiated ``services.columnar``
+format) and the route's source version (e.g. the precomputed snapshot it is
+served from). A
+repeat request with the same key is answered from memory - a 304 costs one
+ETag comparison, a 200 one dictionary lookup - without reaching the endpoint.
+Entries also expire after the route TTL, so sources without a version of their
+own are re-read periodically.
+
+Brotli is optional; without the ``brotli`` package only gzip is offered.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESPONSE_CACHE_CONTROL = os.getenv("RESPONSE_CACHE_CONTROL", "private, no-cache")
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+
+# Headers recomputed per response rather than replayed from the endpoint.
+_DROPPED_HEADERS = {b"content-length", b"content-encoding", b"etag", b"cache-control", b"vary", b"age"}
+# Bodies the middleware tags and compresses: JSON plus the alternate encodings of services/columnar.py.
+_HANDLED_TYPES = (
+    b"application/json",
+    b"application/vnd.delivery-map.columns+json",
+    b"application/vnd.apache.arrow.stream",
+    b"application/msgpack",
+)
+
+CacheKey = Tuple[str, str, str, str]
+
+
+def _negotiate(accept_encoding: str) -> Optional[str]:
+    """Preferred encoding the client accepts: ``br``, then ``gzip``, else None."""
+    offered: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _etag_matches(if_none_match: str, base_tag: str) -> bool:
+    """True when any tag in ``If-None-Match`` names this content, in any of its encodings."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag == base_tag or tag.rsplit("-", 1)[0] == base_tag:
+            return True
+    return False
+
+
+@dataclass
+class CachedBody:
+    """A serialized 200 response: identity body, compressed variants and the headers to replay."""
+
+    body: bytes
+    base_tag: str
+    headers: List[Tuple[bytes, bytes]]
+    cache_control: str
+    age_at_store: Optional[int] = None
+    vary: bytes = b"Accept-Encoding"
+    stored_at: float = field(default_factory=time.time)
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def render(
+        cls,
+        body: bytes,
+        headers: List[Tuple[bytes, bytes]],
+        cache_control: str,
+        precompress: bool = False,
+    ) -> "CachedBody":
+        base_tag = None
+        age = None
+        vary = [b"Accept-Encoding"]
+        kept: List[Tuple[bytes, bytes]] = []
+        for name, value in headers:
+            lowered = name.lower()
+            if lowered == b"etag":
+                base_tag = value.decode("latin-1").strip().removeprefix("W/").strip('"')
+            elif lowered == b"age":
+                try:
+                    age = int(value)
+                except ValueError:
+                    age = None
+            elif lowered == b"vary":
+                vary.extend(item.strip() for item in value.split(b",") if item.strip().lower() != b"accept-encoding")
+            if lowered not in _DROPPED_HEADERS:
+                kept.append((name, value))
+        if not base_tag:
+            base_tag = hashlib.sha1(body).hexdigest()
+        entry = cls(
+            body=body,
+            base_tag=base_tag,
+            headers=kept,
+            cache_control=cache_control,
+            age_at_store=age,
+            vary=b", ".join(dict.fromkeys(vary)),
+        )
+        if precompress and len(body) >= RESPONSE_COMPRESS_MIN_BYTES:
+            entry.encoded["gzip"] = _compress(body, "gzip")
+            if brotli is not None:
+                entry.encoded["br"] = _compress(body, "br")
+        return entry
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(data) for data in self.encoded.values())
+
+    def representation(self, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+        if len(self.body) < RESPONSE_COMPRESS_MIN_BYTES:
+            return None, self.body
+        encoding = _negotiate(accept_encoding)
+        if encoding is None:
+            return None, self.body
+        data = self.encoded.get(encoding)
+        if data is None:
+            data = _compress(self.body, encoding)
+        return encoding, data
+
+    async def send(self, send, request_headers: Dict[bytes, bytes]) -> bool:
+        """Send as 304 or 200 depending on ``If-None-Match``; returns True for a 304."""
+        accept_encoding = request_headers.get(b"accept-encoding", b"").decode("latin-1")
+        encoding, payload = self.representation(accept_encoding)
+        etag = f'"{self.base_tag}-{encoding}"' if encoding else f'"{self.base_tag}"'
+        headers = list(self.headers) + [
+            (b"etag", etag.encode("latin-1")),
+            (b"cache-control", self.cache_control.encode("latin-1")),
+            (b"vary", self.vary),
+        ]
+        if self.age_at_store is not None:
+            age = self.age_at_store + int(time.time() - self.stored_at)
+            headers.append((b"age", str(age).encode("latin-1")))
+        if _etag_matches(request_headers.get(b"if-none-match", b"").decode("latin-1"), self.base_tag):
+            headers = [(name, value) for name, value in headers if name.lower() != b"content-type"]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return True
+        if encoding:
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+        headers.append((b"content-length", str(len(payload)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": payload})
+        return False
+
+
+@dataclass
+class CachedRoute:
+    path: str
+    version: Optional[Callable[[], Any]]
+    ttl: float
+    cache_control: str
+    variant: Optional[Callable[[Dict[str, Any]], str]] = None
+
+    def key(self, scope: Dict[str, Any]) -> CacheKey:
+        query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+        variant = self.variant(scope) if self.variant else ""
+        try:
+            version = str(self.version()) if self.version else ""
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.debug("Version lookup for %s failed: %s", self.path, exc)
+            version = f"t{time.time_ns():x}"  # never matches: effectively uncached
+        return self.path, query, variant, version
+
+
+class ResponseCache:
+    """LRU of rendered responses for the registered routes, bounded by entries and bytes."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES) -> None:
+        self._routes: Dict[str, CachedRoute] = {}
+        self._entries: "OrderedDict[CacheKey, Tuple[float, CachedBody]]" = OrderedDict()
+        self._bytes = 0
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+
+    def register(
+        self,
+        path: str,
+        version: Optional[Callable[[], Any]] = None,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        cache_control: str = RESPONSE_CACHE_CONTROL,
+        variant: Optional[Callable[[Dict[str, Any]], str]] = None,
+    ) -> None:
+        """
+        Cache ``GET path`` per query string and ``version()`` for at most ``ttl_seconds``.
+
+        ``variant(scope)`` names request-header dependent representations
+        (e.g. the format negotiated from ``Accept``) so each gets its own entry.
+        """
+        self._routes[path] = CachedRoute(path, version, ttl_seconds, cache_control, variant)
+
+    def route(self, path: str) -> Optional[CachedRoute]:
+        return self._routes.get(path)
+
+    def get(self, key: CacheKey) -> Optional[CachedBody]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    self._evict(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return item[1]
+
+    def put(self, key: CacheKey, entry: CachedBody, ttl: float) -> None:
+        if entry.size > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            # Entries of an older version of the same path, query and variant can never be hit again.
+            for stale in [k for k in self._entries if k[:3] == key[:3]]:
+                self._evict(stale)
+            self._entries[key] = (time.monotonic() + ttl, entry)
+            self._bytes += entry.size
+            while self._entries and (len(self._entries) > self._max_entries or self._bytes > self._max_bytes):
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: CacheKey) -> None:
+        _, entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def count_not_modified(self) -> None:
+        with self._lock:
+            self._not_modified += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": RESPONSE_CACHE_ENABLED,
+                "routes": sorted(self._routes),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "not_modified": self._not_modified,
+                "brotli": brotli is not None,
+            }
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware applying ``ResponseCache`` plus ETag/compression to JSON GET responses."""
+
+    def __init__(self, app, cache: ResponseCache) -> None:
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send) -> None:
+        if not RESPONSE_CACHE_ENABLED or scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        route = self.cache.route(scope["path"])
+        key = route.key(scope) if route else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if await cached.send(send, request_headers):
+                    self.cache.count_not_modified()
+                return
+
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def capture(message) -> None:
+            nonlocal passthrough
+            if message["type"] == "http.response.start":
+                headers = dict((name.lower(), value) for name, value in message.get("headers", []))
+                if (
+                    message["status"] == 200
+                    and headers.get(b"content-type", b"").startswith(_HANDLED_TYPES)
+                    and b"content-encoding" not in headers
+                ):
+                    start.update(message)
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            cache_control = route.cache_control if route else RESPONSE_CACHE_CONTROL
+            entry = CachedBody.render(body, start.get("headers", []), cache_control, precompress=key is not None)
+            if key is not None:
+                self.cache.put(key, entry, route.ttl)
+            if await entry.send(send, request_headers):
+                self.cache.count_not_modified()
+
+        await self.app(scope, receive, capture)
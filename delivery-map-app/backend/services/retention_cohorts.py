@@ -0,0 +1,393 @@
+"""
+Bitmap-backed weekly retention cohorts for ``/api/sgl/retention``.
+
+Leader ids are interned to small integers, and the leaders active for a
+product on a day are kept as an integer bitmap (bit ``i`` set for leader
+``i``) next to the additive price sums of that day (see
+``sensitivity.build_day_cohorts``). A week is the OR of its days, so
+retention between any two weeks is ``popcount(a & b) / popcount(a)``, and
+reactivation and new-leader counts are ``AND``/``AND NOT`` over the weekly
+bitmaps and the union of earlier weeks.
+
+Day cohorts are cached like the leader sensitivity partials: closed days are
+kept for the life of the context and persisted to JSON, open days expire
+after ``SENSITIVITY_OPEN_DAY_TTL_SECONDS``, and only missing spans are
+fetched. Merged weeks whose seven days are all closed are cached as well, so
+extending the window only merges the new weeks. Spans whose inputs were
+incomplete (a failed benchmark chunk, no sheet, a lagging replica) are used
+for the request at hand but neither cached nor merged into cached weeks.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .b2b_day_cache import missing_spans
+from .clickhouse_rollup import ORDER_ROLLUP_OPEN_DAYS
+from .sensitivity import RETENTION_SUM_COLUMNS, _week_start_from_date, fetch_day_cohorts
+from .sensitivity_partials import SENSITIVITY_OPEN_DAY_TTL_SECONDS, sensitivity_context_version
+from .snapshot_files import SNAPSHOT_DIR, SNAPSHOT_PERSIST_ENABLED
+
+logger = logging.getLogger(__name__)
+
+RETENTION_COHORT_FILE = Path(os.getenv("RETENTION_COHORT_FILE") or SNAPSHOT_DIR / "sgl_retention_cohorts.json")
+
+Cohort = Dict[str, Any]
+DayCohorts = Dict[str, Cohort]
+
+
+class LeaderInterner:
+    """Stable ``leader_id -> bit position`` mapping."""
+
+    def __init__(self, leaders: Optional[List[str]] = None) -> None:
+        self.leaders: List[str] = list(leaders or [])
+        self._ids: Dict[str, int] = {leader: index for index, leader in enumerate(self.leaders)}
+
+    def __call__(self, leader_id: str) -> int:
+        index = self._ids.get(leader_id)
+        if index is None:
+            index = self._ids[leader_id] = len(self.leaders)
+            self.leaders.append(leader_id)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.leaders)
+
+
+def _empty_cohort() -> Cohort:
+    cohort: Cohort = {column: 0.0 for column in RETENTION_SUM_COLUMNS}
+    cohort["leaders"] = 0
+    return cohort
+
+
+def _merge_into(target: Cohort, cohort: Cohort) -> None:
+    target["leaders"] |= cohort["leaders"]
+    for column in RETENTION_SUM_COLUMNS:
+        target[column] += cohort[column]
+
+
+def _bitmap_to_ids(bitmap: int) -> List[int]:
+    ids = []
+    while bitmap:
+        low = bitmap & -bitmap
+        ids.append(low.bit_length() - 1)
+        bitmap ^= low
+    return ids
+
+
+def _ids_to_bitmap(ids: List[int]) -> int:
+    bitmap = 0
+    for index in ids:
+        bitmap |= 1 << index
+    return bitmap
+
+
+def _ratio_pct(numerator: int, denominator: int) -> Optional[float]:
+    return (numerator / denominator) * 100 if denominator else None
+
+
+def _weighted(info: Cohort, column: str, weight_column: str) -> Optional[float]:
+    weight = info[weight_column]
+    return info[column] / weight if weight > 0 else None
+
+
+class WeeklyCohorts:
+    """Per-product weekly cohorts over one analysis window."""
+
+    def __init__(self, weeks: Dict[str, Dict[date, Cohort]], end_date: date) -> None:
+        self.weeks = weeks
+        self.last_week = _week_start_from_date(end_date)
+
+    def _curve(self, weeks_map: Dict[date, Cohort], week_start: date, cohort: int, curve_weeks: int) -> List[Dict[str, Any]]:
+        size = cohort.bit_count()
+        curve: List[Dict[str, Any]] = []
+        returned = 0
+        for offset in range(1, curve_weeks + 1):
+            target = week_start + timedelta(days=7 * offset)
+            if target > self.last_week:
+                curve.append({"weeks_after": offset, "retained_pct": None, "returned_pct": None})
+                continue
+            active = weeks_map[target]["leaders"] if target in weeks_map else 0
+            returned |= cohort & active
+            curve.append(
+                {
+                    "weeks_after": offset,
+                    "retained_pct": _ratio_pct((cohort & active).bit_count(), size),
+                    "returned_pct": _ratio_pct(returned.bit_count(), size),
+                }
+            )
+        return curve
+
+    def _week_payload(self, week_start: date, info: Cohort, retained_pct: Optional[float]) -> Dict[str, Any]:
+        local_pct = _weighted(info, "local_pct_sum", "local_weight")
+        distribution_pct = _weighted(info, "distribution_pct_sum", "distribution_weight")
+        sunday_pct = _weighted(info, "sunday_pct_sum", "sunday_weight")
+        return {
+            "week_start": week_start.isoformat(),
+            "active_leaders": info["leaders"].bit_count(),
+            "avg_unit_price": _weighted(info, "unit_price_sum", "unit_price_weight"),
+            "retained_pct": retained_pct,
+            "price_down": {
+                "local_etb": _weighted(info, "local_gap_sum", "local_weight"),
+                "local_pct": (local_pct * 100) if local_pct is not None else None,
+                "distribution_etb": _weighted(info, "distribution_gap_sum", "distribution_weight"),
+                "distribution_pct": (distribution_pct * 100) if distribution_pct is not None else None,
+                "sunday_etb": _weighted(info, "sunday_gap_sum", "sunday_weight"),
+                "sunday_pct": (sunday_pct * 100) if sunday_pct is not None else None,
+            },
+        }
+
+    def products_payload(self, curve_weeks: int = 0) -> List[Dict[str, Any]]:
+        """
+        ``[{"product", "weeks": [...]}]`` in the ``/api/sgl/retention`` shape.
+
+        ``retained_pct`` compares a week with the next week that has orders.
+        With ``curve_weeks > 0`` each week also carries ``new_leaders``,
+        ``reactivated_leaders`` (active again after missing the previous
+        calendar week) and a ``retention_curve`` of exact-week and cumulative
+        retention for 1..N weeks later; offsets past the window end are None.
+        """
+        products_payload: List[Dict[str, Any]] = []
+        for product, weeks_map in self.weeks.items():
+            sorted_weeks = sorted(weeks_map)
+            seen_before = 0
+            weeks_payload: List[Dict[str, Any]] = []
+            for idx, week_start in enumerate(sorted_weeks):
+                info = weeks_map[week_start]
+                leaders = info["leaders"]
+                retained_pct = None
+                if idx + 1 < len(sorted_weeks) and leaders:
+                    next_leaders = weeks_map[sorted_weeks[idx + 1]]["leaders"]
+                    retained_pct = _ratio_pct((leaders & next_leaders).bit_count(), leaders.bit_count())
+
+                payload = self._week_payload(week_start, info, retained_pct)
+                if curve_weeks > 0:
+                    previous = weeks_map.get(week_start - timedelta(days=7))
+                    previous_leaders = previous["leaders"] if previous else 0
+                    payload["new_leaders"] = (leaders & ~seen_before).bit_count()
+                    payload["reactivated_leaders"] = (leaders & ~previous_leaders & seen_before).bit_count()
+                    payload["retention_curve"] = self._curve(weeks_map, week_start, leaders, curve_weeks)
+                seen_before |= leaders
+                weeks_payload.append(payload)
+            products_payload.append({"product": product, "weeks": weeks_payload})
+        return products_payload
+
+
+class RetentionCohortStore:
+    """Day cohorts with interned leader bitmaps, plus cached merges of closed weeks."""
+
+    def __init__(self, path: Optional[Path] = RETENTION_COHORT_FILE) -> None:
+        self._path = path
+        self._interner = LeaderInterner()
+        self._days: Dict[date, DayCohorts] = {}
+        self._fetched_at: Dict[date, float] = {}
+        self._closed_weeks: Dict[date, Dict[str, Cohort]] = {}
+        self._context: Optional[str] = None
+        self._lock = threading.Lock()
+        self._fetches = 0
+        self._days_fetched = 0
+        self._weeks_merged = 0
+        self._weeks_reused = 0
+
+    def _is_closed(self, day: date) -> bool:
+        return day <= date.today() - timedelta(days=ORDER_ROLLUP_OPEN_DAYS)
+
+    def _is_fresh(self, day: date) -> bool:
+        fetched_at = self._fetched_at.get(day)
+        if fetched_at is None:
+            return False
+        return self._is_closed(day) or time.time() - fetched_at <= SENSITIVITY_OPEN_DAY_TTL_SECONDS
+
+    # ---- disk ----
+
+    def _reset(self, context: str) -> None:
+        self._interner = LeaderInterner()
+        self._days.clear()
+        self._fetched_at.clear()
+        self._closed_weeks.clear()
+        self._context = context
+        if not SNAPSHOT_PERSIST_ENABLED or self._path is None or not self._path.exists():
+            return
+        try:
+            with self._path.open("r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+            if payload.get("version") != context:
+                logger.info("Ignoring persisted retention cohorts built for another leader/alias context")
+                return
+            fetched_at = float(payload.get("saved_at") or time.time())
+            interner = LeaderInterner(payload.get("leaders") or [])
+            days: Dict[date, DayCohorts] = {}
+            for day_str, products in (payload.get("days") or {}).items():
+                day = date.fromisoformat(day_str)
+                if not self._is_closed(day):
+                    continue
+                days[day] = {}
+                for product, stored in products.items():
+                    cohort = {column: float(stored[column]) for column in RETENTION_SUM_COLUMNS}
+                    cohort["leaders"] = _ids_to_bitmap(stored["leaders"])
+                    days[day][product] = cohort
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Failed to read retention cohorts %s: %s", self._path, exc)
+            return
+        self._interner = interner
+        self._days = days
+        self._fetched_at = {day: fetched_at for day in days}
+        logger.info("Loaded retention cohorts for %d days from %s", len(days), self._path)
+
+    def _save(self) -> None:
+        if not SNAPSHOT_PERSIST_ENABLED or self._path is None or self._context is None:
+            return
+        days: Dict[str, Dict[str, Any]] = {}
+        for day, products in sorted(self._days.items()):
+            if not self._is_closed(day):
+                continue
+            days[day.isoformat()] = {
+                product: {
+                    **{column: cohort[column] for column in RETENTION_SUM_COLUMNS},
+                    "leaders": _bitmap_to_ids(cohort["leaders"]),
+                }
+                for product, cohort in products.items()
+            }
+        payload = {
+            "version": self._context,
+            "saved_at": time.time(),
+            "leaders": self._interner.leaders,
+            "days": days,
+        }
+        tmp_path = self._path.with_name(f".{self._path.name}.{os.getpid()}.tmp")
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump(payload, handle, separators=(",", ":"))
+            os.replace(tmp_path, self._path)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Failed to persist retention cohorts to %s: %s", self._path, exc)
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    # ---- lookup ----
+
+    def _store_span(self, span_start: date, span_end: date, cohorts: Dict[date, DayCohorts]) -> None:
+        fetched_at = time.time()
+        day = span_start
+        while day <= span_end:
+            self._days[day] = cohorts.get(day, {})
+            self._fetched_at[day] = fetched_at
+            self._days_fetched += 1
+            day += timedelta(days=1)
+
+    def _merge_week(self, week_days: List[date], uncached: Dict[date, DayCohorts]) -> Dict[str, Cohort]:
+        merged: Dict[str, Cohort] = {}
+        for day in week_days:
+            for product, cohort in uncached.get(day, self._days.get(day, {})).items():
+                target = merged.get(product)
+                if target is None:
+                    target = merged[product] = _empty_cohort()
+                _merge_into(target, cohort)
+        return merged
+
+    def _weeks(self, days: List[date], uncached: Dict[date, DayCohorts]) -> Dict[str, Dict[date, Cohort]]:
+        by_week: Dict[date, List[date]] = {}
+        for day in days:
+            by_week.setdefault(_week_start_from_date(day), []).append(day)
+
+        weeks: Dict[str, Dict[date, Cohort]] = {}
+        for week_start, week_days in by_week.items():
+            full_closed_week = (
+                len(week_days) == 7
+                and self._is_closed(week_days[-1])
+                and not any(day in uncached for day in week_days)
+            )
+            merged = self._closed_weeks.get(week_start) if full_closed_week else None
+            if merged is None:
+                merged = self._merge_week(week_days, uncached)
+                self._weeks_merged += 1
+                if full_closed_week:
+                    self._closed_weeks[week_start] = merged
+            else:
+                self._weeks_reused += 1
+            for product, cohort in merged.items():
+                weeks.setdefault(product, {})[week_start] = cohort
+        return weeks
+
+    def engine(
+        self,
+        client,
+        start_date: date,
+        end_date: date,
+        leader_coords: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> Tuple[WeeklyCohorts, bool]:
+        """
+        Weekly cohorts for ``[start_date, end_date]``, fetching only missing or expired days.
+
+        Also returns whether every fetched span had complete inputs.
+        """
+        leader_coords = leader_coords or {}
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        with self._lock:
+            context = sensitivity_context_version(leader_coords)
+            if context != self._context:
+                self._reset(context)
+
+            spans = missing_spans(days, lambda day: not self._is_fresh(day))
+            new_closed_days = False
+            complete_window = True
+            uncached: Dict[date, DayCohorts] = {}
+            for span_start, span_end in spans:
+                cohorts, complete = fetch_day_cohorts(client, span_start, span_end, leader_coords, self._interner)
+                self._fetches += 1
+                if not complete:
+                    logger.warning("Retention inputs for %s..%s incomplete; not caching the span", span_start, span_end)
+                    complete_window = False
+                    day = span_start
+                    while day <= span_end:
+                        uncached[day] = cohorts.get(day, {})
+                        day += timedelta(days=1)
+                    continue
+                self._store_span(span_start, span_end, cohorts)
+                new_closed_days = new_closed_days or self._is_closed(span_start)
+            if new_closed_days:
+                self._save()
+            weeks = self._weeks(days, uncached)
+        return WeeklyCohorts(weeks, end_date), complete_window
+
+    def clear(self) -> None:
+        with self._lock:
+            self._interner = LeaderInterner()
+            self._days.clear()
+            self._fetched_at.clear()
+            self._closed_weeks.clear()
+            self._context = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "days_cached": len(self._days),
+                "closed_weeks_cached": len(self._closed_weeks),
+                "leaders_interned": len(self._interner),
+                "fetches": self._fetches,
+                "days_fetched": self._days_fetched,
+                "weeks_merged": self._weeks_merged,
+                "weeks_reused": self._weeks_reused,
+            }
+
+
+_STORE: Optional[RetentionCohortStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_retention_cohort_store() -> RetentionCohortStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = RetentionCohortStore()
+        return _STORE
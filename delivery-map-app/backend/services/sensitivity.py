@@ -6,13 +6,17 @@ from collections import defaultdict
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-import httpx
 import logging
 from dotenv import load_dotenv
+import numpy as np
 import pandas as pd
 
+from .benchmark_chunks import BENCHMARK_API_KEY, BENCHMARK_API_URL, fetch_benchmark_rows
+from .benchmark_index import BenchmarkLocationIndex
+from .clickhouse_rollup import order_rollup_for, query_rollup_or_raw, sql_list
+from .local_replica import order_replica_for
 # Import geocoding utility
 from .geocoding import geocode_location
 from .sheet_data import fetch_raw_sheet_data
@@ -26,24 +30,9 @@ DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 DATA_POINTS_DIR = PROJECT_ROOT / "data_points"
 ALIAS_FILE = DATA_DIR / "product_aliases.json"
 
-BENCHMARK_API_URL = os.getenv("BENCHMARK_API_URL")
-BENCHMARK_API_KEY = os.getenv("BENCHMARK_API_KEY")
-BENCHMARK_LOCATION_GROUPS = [
-    "farm",
-    "distribution-center",
-    "local-shops",
-    "sunday-market",
-    "supermarket",
-    "ecommerce",
-    "chipchip",
-]
-
-BENCHMARK_CHUNK_DAYS = int(os.getenv("BENCHMARK_CHUNK_DAYS", "21"))
 DEFAULT_LOCAL_WEIGHT = float(os.getenv("SENSITIVITY_LOCAL_WEIGHT", "0.6"))
 DEFAULT_DISTRIBUTION_WEIGHT = float(os.getenv("SENSITIVITY_DISTRIBUTION_WEIGHT", "0.4"))
 
-_BENCHMARK_CACHE: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
-
 SGL_DEAL_TYPES = (
     "SUPER_GROUP",
     "SUPER_GROUP_FLASH_SALE",
@@ -112,65 +101,6 @@ def _build_alias_indexes(aliases: Iterable[AliasRecord]) -> Tuple[Dict[str, str]
     return order_index, benchmark_index, distribution_index
 
 
-def _haversine_distance(coord_a: Tuple[float, float], coord_b: Tuple[float, float]) -> float:
-    lat1, lon1 = coord_a
-    lat2, lon2 = coord_b
-    radius = 6371.0  # km
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return radius * c
-
-
-def _select_price_for_leader(price_entry: Optional[Dict[str, Any]], channel: str, leader_coord: Optional[Tuple[float, float]]) -> Tuple[Optional[float], Optional[float], Optional[str], Optional[str]]:
-    """
-    Select the price for a leader based on closest benchmark location.
-    
-    If leader coordinates are available and benchmark points with coordinates exist,
-    returns the price from the closest benchmark location. Otherwise falls back to average.
-    
-    Returns: (price, distance_km, location_name, location_group)
-    """
-    if not price_entry:
-        return (None, None, None, None)
-    channel_entry = price_entry.get(channel)
-    if not channel_entry:
-        return (None, None, None, None)
-
-    points: List[Dict[str, Any]] = channel_entry.get("points") or []
-    
-    # If we have leader coordinates and benchmark points with coordinates, use closest
-    if leader_coord and points:
-        best_price: Optional[float] = None
-        best_distance: Optional[float] = None
-        best_location: Optional[str] = None
-        best_location_group: Optional[str] = None
-        
-        for point in points:
-            lat = point.get("lat")
-            lon = point.get("lon")
-            if lat is None or lon is None:
-                continue
-            distance = _haversine_distance(leader_coord, (lat, lon))
-            if best_distance is None or distance < best_distance:
-                best_distance = distance
-                best_price = point.get("price")
-                best_location = point.get("location", "Unknown")
-                best_location_group = point.get("location_group")
-        
-        # Return closest price if found
-        if best_price is not None:
-            logger.debug(f"Using closest benchmark location '{best_location}' ({best_location_group}) at {best_distance:.2f}km instead of average")
-            return (best_price, best_distance, best_location, best_location_group)
-
-    # Fallback to average if no coordinates available
-    avg_price = channel_entry.get("avg")
-    return (avg_price, None, None, None)
-
-
 def _week_start_from_date(day: date) -> date:
     days_since_friday = (day.weekday() - 4) % 7
     return day - timedelta(days=days_since_friday)
@@ -180,108 +110,78 @@ def _fetch_benchmark_prices(
     start_date: date,
     end_date: date,
     benchmark_index: Dict[str, str],
-) -> Dict[Tuple[str, date], Dict[str, Any]]:
+) -> Tuple[Dict[Tuple[str, date], Dict[str, Any]], bool]:
+    """Benchmark price series per (product, day) and whether every benchmark chunk was available."""
     if not BENCHMARK_API_URL or not BENCHMARK_API_KEY:
-        return {}
+        return {}, False
 
     series: Dict[Tuple[str, date], Dict[str, Any]] = {}
-    cursor = start_date
-
-    while cursor <= end_date:
-        chunk_end = min(cursor + timedelta(days=BENCHMARK_CHUNK_DAYS - 1), end_date)
-        params = {
-            "dateFrom": cursor.strftime("%Y-%m-%d"),
-            "dateTo": chunk_end.strftime("%Y-%m-%d"),
-            "frequency": "daily",
-            "comparisonType": "avg",
-            "locationGroups": ",".join(BENCHMARK_LOCATION_GROUPS),
-        }
-        headers = {
-            "apikey": BENCHMARK_API_KEY,
-            "Authorization": f"Bearer {BENCHMARK_API_KEY}",
-            "Content-Type": "application/json",
-        }
-        cache_key = (params["dateFrom"], params["dateTo"])
-        if cache_key in _BENCHMARK_CACHE:
-            chunk_data = _BENCHMARK_CACHE[cache_key]
-        else:
-            try:
-                with httpx.Client(timeout=20.0) as client:
-                    response = client.get(BENCHMARK_API_URL, params=params, headers=headers)
-                    response.raise_for_status()
-                    payload = response.json()
-                    chunk_data = payload.get("data", [])
-                    _BENCHMARK_CACHE[cache_key] = chunk_data
-            except Exception:
-                # Leave chunk empty; continue to next window so we still return partial data
-                cursor = chunk_end + timedelta(days=1)
-                continue
 
-        for entry in chunk_data:
-            canonical = benchmark_index.get((entry.get("product_name") or "").strip().lower())
-            if not canonical:
-                continue
-            day = _parse_date(entry.get("date", ""))
-            if day is None or day < start_date or day > end_date:
-                continue
-            try:
-                price = float(entry.get("price"))
-            except (TypeError, ValueError):
-                continue
-            if price <= 0:
-                continue
-            location_group = (entry.get("location_group") or "").strip().lower()
-            key = (canonical, day)
-            location_name = entry.get("location", "").strip()
-            
-            # Try to get coordinates from API first
-            lat_raw = entry.get("latitude") or entry.get("lat") or entry.get("location_latitude")
-            lon_raw = entry.get("longitude") or entry.get("lon") or entry.get("location_longitude")
-            try:
-                lat_val = float(lat_raw) if lat_raw is not None else None
-                lon_val = float(lon_raw) if lon_raw is not None else None
-            except (TypeError, ValueError):
-                lat_val = None
-                lon_val = None
-            
-            # If no coordinates from API, try geocoding the location name
-            if (lat_val is None or lon_val is None) and location_name:
-                coords = geocode_location(location_name, location_group)
-                if coords:
-                    lat_val, lon_val = coords
-
-            record = series.setdefault(
-                key,
-                {
-                    "local_prices": [],
-                    "distribution_prices": [],
-                    "sunday_prices": [],
-                    "local_points": [],
-                    "distribution_points": [],
-                    "sunday_points": [],
-                    "sources": set(),
-                },
-            )
-            # Store location name along with coordinates for better tracking
-            price_point = {
-                "price": price,
-                "lat": lat_val,
-                "lon": lon_val,
-                "location": location_name,  # Store location name
-                "location_group": location_group,  # Store location group
-            }
-            if location_group == "local-shops":
-                record["local_prices"].append(price)
-                record["local_points"].append(price_point)
-            elif location_group in {"distribution-center", "farm"}:
-                record["distribution_prices"].append(price)
-                record["distribution_points"].append(price_point)
-            elif location_group == "sunday-market":
-                record["sunday_prices"].append(price)
-                record["sunday_points"].append(price_point)
-            record["sources"].add("benchmark_api")
-
-        cursor = chunk_end + timedelta(days=1)
+    # Grid-aligned chunks are fetched concurrently and cached on disk once closed
+    rows, complete = fetch_benchmark_rows(start_date, end_date)
+    for entry in rows:
+        canonical = benchmark_index.get((entry.get("product_name") or "").strip().lower())
+        if not canonical:
+            continue
+        day = _parse_date(entry.get("date", ""))
+        if day is None or day < start_date or day > end_date:
+            continue
+        try:
+            price = float(entry.get("price"))
+        except (TypeError, ValueError):
+            continue
+        if price <= 0:
+            continue
+        location_group = (entry.get("location_group") or "").strip().lower()
+        key = (canonical, day)
+        location_name = entry.get("location", "").strip()
+        
+        # Try to get coordinates from API first
+        lat_raw = entry.get("latitude") or entry.get("lat") or entry.get("location_latitude")
+        lon_raw = entry.get("longitude") or entry.get("lon") or entry.get("location_longitude")
+        try:
+            lat_val = float(lat_raw) if lat_raw is not None else None
+            lon_val = float(lon_raw) if lon_raw is not None else None
+        except (TypeError, ValueError):
+            lat_val = None
+            lon_val = None
+        
+        # If no coordinates from API, try geocoding the location name
+        if (lat_val is None or lon_val is None) and location_name:
+            coords = geocode_location(location_name, location_group)
+            if coords:
+                lat_val, lon_val = coords
+
+        record = series.setdefault(
+            key,
+            {
+                "local_prices": [],
+                "distribution_prices": [],
+                "sunday_prices": [],
+                "local_points": [],
+                "distribution_points": [],
+                "sunday_points": [],
+                "sources": set(),
+            },
+        )
+        # Store location name along with coordinates for better tracking
+        price_point = {
+            "price": price,
+            "lat": lat_val,
+            "lon": lon_val,
+            "location": location_name,  # Store location name
+            "location_group": location_group,  # Store location group
+        }
+        if location_group == "local-shops":
+            record["local_prices"].append(price)
+            record["local_points"].append(price_point)
+        elif location_group in {"distribution-center", "farm"}:
+            record["distribution_prices"].append(price)
+            record["distribution_points"].append(price_point)
+        elif location_group == "sunday-market":
+            record["sunday_prices"].append(price)
+            record["sunday_points"].append(price_point)
+        record["sources"].add("benchmark_api")
 
     # Transform averaged values
     final: Dict[Tuple[str, date], Dict[str, Any]] = {}
@@ -305,17 +205,18 @@ def _fetch_benchmark_prices(
             },
             "sources": record["sources"],
         }
-    return final
+    return final, complete
 
 
 def _fetch_distribution_prices(
     start_date: date,
     end_date: date,
     distribution_index: Dict[str, str],
-) -> Dict[Tuple[str, date], Dict[str, Any]]:
+) -> Tuple[Dict[Tuple[str, date], Dict[str, Any]], bool]:
+    """Distribution-center prices per (product, day) from the sheet, and whether the sheet was available."""
     df = fetch_raw_sheet_data()
     if df is None or df.empty:
-        return {}
+        return {}, False
 
     series: Dict[Tuple[str, date], Dict[str, Any]] = {}
     
@@ -355,7 +256,7 @@ def _fetch_distribution_prices(
             "sunday": {"avg": None, "points": []},
             "sources": record["sources"],
         }
-    return final
+    return final, True
 
 
 def _merge_price_series(
@@ -401,14 +302,57 @@ def _fetch_order_series(
     end_date: date,
     order_index: Dict[str, str],
     deal_types: Optional[Iterable[str]] = None,
-) -> List[Dict[str, Any]]:
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    SGL order rows per (day, leader, product), and whether they are current.
+
+    Rows read from a replica that has not synced within its lag budget (served
+    only while ClickHouse is down) are reported as not current.
+    """
     start_dt = datetime.combine(start_date, datetime.min.time())
     end_dt = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
-    deal_filter = ""
-    if deal_types:
-        allowed = ", ".join(f"'{deal_type}'" for deal_type in deal_types)
-        deal_filter = f"            AND gd.deal_type IN ({allowed})\n"
-    query = f"""
+    allowed = sql_list(deal_types) if deal_types else ""
+    deal_filter = f"            AND gd.deal_type IN ({allowed})\n" if allowed else ""
+    replica = order_replica_for(client)
+    rollup = order_rollup_for(start_date, end_date)
+    rollup_query: Optional[str] = None
+    if replica is not None:
+        replica_deal_filter = f"AND deal_type IN ({allowed})" if allowed else ""
+        query = f"""
+        SELECT
+            order_day                                                      AS order_date,
+            leader_id,
+            any_value(leader_phone)                                        AS leader_phone,
+            any_value(leader_name)                                         AS leader_name,
+            any_value(coalesce(product_name, product_local_name, product_id)) AS product_name,
+            sum(quantity)                                                  AS total_kg,
+            sum(quantity * group_price) / nullif(sum(quantity), 0)         AS unit_price_etb
+        FROM order_facts
+        WHERE order_day BETWEEN DATE '{start_date.isoformat()}' AND DATE '{end_date.isoformat()}'
+          {replica_deal_filter}
+        GROUP BY order_date, leader_id, product_id
+        HAVING sum(quantity) > 0
+    """
+    elif rollup is not None:
+        rollup_deal_filter = f"AND deal_type IN ({allowed})" if allowed else ""
+        rollup_query = f"""
+        SELECT
+            order_day                                                      AS order_date,
+            leader_id,
+            anyOrNull(r.leader_phone)                                      AS leader_phone,
+            anyOrNull(r.leader_name)                                       AS leader_name,
+            anyOrNull(coalesce(r.product_name, r.product_local_name, toString(r.product_id))) AS product_name,
+            sum(r.total_kg)                                                AS total_kg,
+            sum(r.revenue_etb) / nullIf(sum(r.total_kg), 0)                AS unit_price_etb
+        FROM {rollup.table} AS r
+        WHERE order_day >= toDate('{start_date.isoformat()}')
+          AND order_day <= toDate('{end_date.isoformat()}')
+          {rollup_deal_filter}
+        GROUP BY order_date, leader_id, product_id
+        HAVING sum(r.total_kg) > 0
+    """
+    if replica is None:
+        query = f"""
         SELECT
             toDate(o.created_at)                                          AS order_date,
             g.created_by                                                  AS leader_id,
@@ -446,7 +390,10 @@ def _fetch_order_series(
         HAVING sum(gc.quantity) > 0
     """
 
-    result = client.query(query)
+    if replica is not None:
+        result = replica.query(query)
+    else:
+        result = query_rollup_or_raw(client, rollup_query, query, "leader order series")
     rows: List[Dict[str, Any]] = []
     for (
         order_date,
@@ -475,288 +422,394 @@ def _fetch_order_series(
                 "unit_price_etb": float(unit_price_etb),
             }
         )
-    return rows
+    return rows, replica is None or not replica.stale
 
 
-def compute_leader_sensitivity(
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+def _weighted_mean(total: np.ndarray, weight: np.ndarray) -> np.ndarray:
+    out = np.full(len(total), np.nan)
+    np.divide(total, weight, out=out, where=weight > 0)
+    return out
+
+
+def _blend(local: np.ndarray, distribution: np.ndarray) -> np.ndarray:
+    """Weighted local/distribution blend, falling back to whichever side is present."""
+    both = DEFAULT_LOCAL_WEIGHT * local + DEFAULT_DISTRIBUTION_WEIGHT * distribution
+    return np.where(np.isnan(local), distribution, np.where(np.isnan(distribution), local, both))
+
+
+def _group_ids(*columns: pd.Series) -> Tuple[np.ndarray, int]:
+    """Dense group ids numbered in order of first appearance, plus the group count."""
+    combined = np.zeros(len(columns[0]), dtype=np.int64)
+    for column in columns:
+        codes, uniques = pd.factorize(column, use_na_sentinel=False)
+        combined = combined * max(len(uniques), 1) + codes
+    ids, uniques = pd.factorize(combined)
+    return ids, len(uniques)
+
+
+def _first_positions(ids: np.ndarray, groups: int) -> np.ndarray:
+    first = np.full(groups, len(ids), dtype=np.intp)
+    np.minimum.at(first, ids, np.arange(len(ids)))
+    return first
+
+
+def _group_sum(ids: np.ndarray, groups: int, values: Any) -> np.ndarray:
+    # bincount accumulates in input order, like the running sums it replaces
+    return np.bincount(ids, weights=np.asarray(values, dtype=float), minlength=groups)
+
+
+def _group_any(ids: np.ndarray, groups: int, mask: Any) -> np.ndarray:
+    return np.bincount(ids[np.asarray(mask, dtype=bool)], minlength=groups) > 0
+
+
+def _group_first_truthy(values: pd.Series, ids: np.ndarray, groups: int) -> np.ndarray:
+    """Per group: the first non-empty value in row order, else the first row's value."""
+    raw = values.to_numpy(dtype=object)
+    out = raw[_first_positions(ids, groups)]
+    truthy = np.flatnonzero(values.notna().to_numpy() & values.astype(bool).to_numpy())
+    if len(truthy):
+        truthy_groups, first = np.unique(ids[truthy], return_index=True)
+        out[truthy_groups] = raw[truthy[first]]
+    return out
+
+
+def _group_closest(distance: np.ndarray, ids: np.ndarray, groups: int) -> np.ndarray:
+    """Per group, the position of the first row at the strictly smallest distance (-1 if none)."""
+    best = np.full(groups, -1, dtype=np.intp)
+    candidates = np.flatnonzero(~np.isnan(distance))
+    if len(candidates):
+        order = candidates[np.lexsort((candidates, distance[candidates], ids[candidates]))]
+        closest_groups, first = np.unique(ids[order], return_index=True)
+        best[closest_groups] = order[first]
+    return best
+
+
+def _take_closest(frame: pd.DataFrame, channel: str, best: np.ndarray) -> Dict[str, Any]:
+    found = best >= 0
+    distance = np.full(len(best), np.nan)
+    distance[found] = frame[f"{channel}_distance"].to_numpy(dtype=float)[best[found]]
+    columns: Dict[str, Any] = {f"{channel}_distance": distance}
+    for suffix in ("location", "group"):
+        values = np.full(len(best), None, dtype=object)
+        values[found] = frame[f"{channel}_{suffix}"].to_numpy(dtype=object)[best[found]]
+        columns[f"{channel}_{suffix}"] = values
+    return columns
+
+
+def _distinct_days(day_codes: np.ndarray, day_count: int, ids: np.ndarray, groups: int, mask: np.ndarray) -> np.ndarray:
+    """Per group, the number of distinct days among rows where ``mask`` holds."""
+    pairs = np.unique(ids[mask].astype(np.int64) * max(day_count, 1) + day_codes[mask])
+    return np.bincount(pairs // max(day_count, 1), minlength=groups)
+
+
+def _attach_leader_prices(
+    orders: pd.DataFrame,
+    price_series: Dict[Tuple[str, date], Dict[str, Any]],
+    leader_coords: Dict[str, Tuple[float, float]],
+    channels: Tuple[str, ...] = ("local", "distribution"),
+) -> pd.DataFrame:
+    """Add closest benchmark columns per channel, resolved once per distinct order key."""
+    price_index = BenchmarkLocationIndex(price_series)
+    lookup = orders[["canonical_product", "order_date", "leader_phone"]].drop_duplicates()
+    keys = list(zip(lookup["canonical_product"], lookup["order_date"]))
+    coords = [leader_coords.get(phone) if phone else None for phone in lookup["leader_phone"]]
+
+    columns: Dict[str, Any] = {}
+    for channel, (prices, distances, locations, groups) in price_index.select_many(keys, coords, channels).items():
+        columns[f"{channel}_price"] = prices
+        columns[f"{channel}_distance"] = distances
+        columns[f"{channel}_location"] = pd.Series(locations, index=lookup.index, dtype=object)
+        columns[f"{channel}_group"] = pd.Series(groups, index=lookup.index, dtype=object)
+    sources = [(price_series.get(key) or {}).get("sources") or () for key in keys]
+    columns["has_benchmark_api"] = ["benchmark_api" in entry for entry in sources]
+    columns["has_distribution_fallback"] = ["distribution_fallback" in entry for entry in sources]
+
+    resolved = lookup.assign(**columns)
+    return orders.merge(resolved, on=["canonical_product", "order_date", "leader_phone"], how="left", sort=False)
+
+
+def _channel_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """Per-row gap and weight columns; rows without a positive benchmark price contribute zero."""
+    kg = frame["total_kg"].to_numpy(dtype=float)
+    unit_price = frame["unit_price_etb"].to_numpy(dtype=float)
+    columns: Dict[str, Any] = {}
+    for channel in ("local", "distribution"):
+        price = frame[f"{channel}_price"].to_numpy(dtype=float)
+        valid = price > 0  # NaN compares False
+        gap = np.where(valid, price - unit_price, 0.0)
+        safe_price = np.where(valid, price, 1.0)
+        columns[f"{channel}_valid"] = valid
+        columns[f"{channel}_gap_sum"] = np.where(valid, gap * kg, 0.0)
+        columns[f"{channel}_weight"] = np.where(valid, kg, 0.0)
+        columns[f"{channel}_pct_sum"] = np.where(valid, (gap / safe_price) * kg, 0.0)
+        if channel == "local":
+            columns["local_above_volume"] = np.where(valid & (unit_price >= safe_price), kg, 0.0)
+    return frame.assign(**columns)
+
+
+_ORDER_COLUMNS = ["order_date", "leader_id", "leader_phone", "leader_name", "canonical_product", "total_kg", "unit_price_etb"]
+_ORDER_NUMERIC_COLUMNS = {"total_kg", "unit_price_etb"}
+_PARTIAL_KEYS = ["order_date", "leader_id", "canonical_product"]
+
+_SUM_COLUMNS = [
+    "total_kg",
+    "local_gap_sum",
+    "local_weight",
+    "local_pct_sum",
+    "local_above_volume",
+    "distribution_gap_sum",
+    "distribution_weight",
+    "distribution_pct_sum",
+]
+_FLAG_COLUMNS = ["local_valid", "distribution_valid", "has_benchmark_api", "has_distribution_fallback"]
+_CLOSEST_COLUMNS = [
+    "local_distance",
+    "local_location",
+    "local_group",
+    "distribution_distance",
+    "distribution_location",
+    "distribution_group",
+]
+
+PARTIAL_COLUMNS = (
+    _PARTIAL_KEYS + ["first_row", "leader_phone", "leader_name"] + _SUM_COLUMNS + _FLAG_COLUMNS + _CLOSEST_COLUMNS
+)
+
+
+def _order_frame(order_rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Dated order rows as a frame with a ``row_order`` column."""
+    rows = [row for row in order_rows if row["order_date"] is not None]
+    # Text columns stay object dtype so missing phones/names remain None rather than NaN.
+    orders = pd.DataFrame(
+        {
+            column: pd.Series([row[column] for row in rows], dtype=float if column in _ORDER_NUMERIC_COLUMNS else object)
+            for column in _ORDER_COLUMNS
+        }
+    )
+    orders["row_order"] = np.arange(len(orders))
+    return orders
+
+
+def empty_leader_partials() -> pd.DataFrame:
+    return pd.DataFrame({column: pd.Series(dtype=object) for column in PARTIAL_COLUMNS})
+
+
+def build_leader_partials(
+    order_rows: List[Dict[str, Any]],
+    price_series: Dict[Tuple[str, date], Dict[str, Any]],
+    leader_coords: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> pd.DataFrame:
+    """
+    Additive sensitivity accumulators per (order day, leader, product).
+
+    Each row holds the gap/pct/weight sums, whether the day had a usable
+    local/distribution benchmark, the source flags and the closest benchmark
+    seen that day. Every sensitivity metric is a ratio of sums or a distinct-day
+    count over these rows, so partials for different days can be merged freely.
+    """
+    orders = _order_frame(order_rows)
+    if orders.empty:
+        return empty_leader_partials()
+
+    frame = _channel_columns(_attach_leader_prices(orders, price_series, leader_coords or {}))
+    frame = frame.sort_values("row_order", kind="stable").reset_index(drop=True)
+
+    ids, groups = _group_ids(*(frame[key] for key in _PARTIAL_KEYS))
+    first = _first_positions(ids, groups)
+    columns: Dict[str, Any] = {key: frame[key].to_numpy(dtype=object)[first] for key in _PARTIAL_KEYS}
+    columns["first_row"] = frame["row_order"].to_numpy()[first]
+    columns["leader_phone"] = _group_first_truthy(frame["leader_phone"], ids, groups)
+    columns["leader_name"] = _group_first_truthy(frame["leader_name"], ids, groups)
+    for column in _SUM_COLUMNS:
+        columns[column] = _group_sum(ids, groups, frame[column])
+    for column in _FLAG_COLUMNS:
+        columns[column] = _group_any(ids, groups, frame[column])
+    for channel in ("local", "distribution"):
+        best = _group_closest(frame[f"{channel}_distance"].to_numpy(dtype=float), ids, groups)
+        columns.update(_take_closest(frame, channel, best))
+    # Keep text columns as object dtype; pandas would otherwise infer str and turn None into NaN.
+    return pd.DataFrame(
+        {
+            column: pd.Series(values, dtype=object) if getattr(values, "dtype", None) == object else values
+            for column, values in columns.items()
+        }
+    )[PARTIAL_COLUMNS]
+
+
+def _fetch_span_inputs(
     client,
     start_date: date,
     end_date: date,
-    leader_coords: Optional[Dict[str, Tuple[float, float]]] = None,
-) -> Dict[str, Dict[str, Any]]:
+) -> Tuple[List[Dict[str, Any]], Dict[Tuple[str, date], Dict[str, Any]], bool]:
+    """
+    SGL order rows and merged price series for ``[start_date, end_date]``.
+
+    The flag is True only when every source answered in full: all benchmark
+    chunks, the sheet and a current order source. Callers must not keep
+    results built from incomplete inputs.
+    """
     aliases = _ensure_aliases()
     order_index, benchmark_index, distribution_index = _build_alias_indexes(aliases)
 
-    benchmark_series = _fetch_benchmark_prices(start_date, end_date, benchmark_index)
-    distribution_series = _fetch_distribution_prices(start_date, end_date, distribution_index)
+    benchmark_series, benchmark_complete = _fetch_benchmark_prices(start_date, end_date, benchmark_index)
+    distribution_series, distribution_complete = _fetch_distribution_prices(start_date, end_date, distribution_index)
     price_series = _merge_price_series(benchmark_series, distribution_series)
 
-    order_rows = _fetch_order_series(client, start_date, end_date, order_index, deal_types=SGL_DEAL_TYPES)
-
-    leader_stats: Dict[str, Dict[str, Any]] = {}
-
-    def ensure_stats(leader_id: str, leader_phone: Optional[str], leader_name: Optional[str]) -> Dict[str, Any]:
-        stats = leader_stats.get(leader_id)
-        if stats is None:
-            stats = {
-                "leader_id": leader_id,
-                "leader_phone": leader_phone,
-                "leader_name": leader_name,
-                "total_kg": 0.0,
-                "local_gap_sum": 0.0,
-                "local_weight": 0.0,
-                "local_pct_sum": 0.0,
-                "local_above_volume": 0.0,
-                "local_dates": set(),
-                "distribution_gap_sum": 0.0,
-                "distribution_weight": 0.0,
-                "distribution_pct_sum": 0.0,
-                "distribution_dates": set(),
-                "sources": set(),
-                "products": {},
-                "closest_local_benchmark": {"distance_km": None, "location_group": None, "location": None},
-                "closest_distribution_benchmark": {"distance_km": None, "location_group": None, "location": None},
-            }
-            leader_stats[leader_id] = stats
-        if leader_phone and not stats.get("leader_phone"):
-            stats["leader_phone"] = leader_phone
-        if leader_name and not stats.get("leader_name"):
-            stats["leader_name"] = leader_name
-        return stats
-
-    leader_coords = leader_coords or {}
-
-    for row in order_rows:
-        order_date = row["order_date"]
-        if order_date is None:
-            continue
-        canonical = row["canonical_product"]
-        key = (canonical, order_date)
-        price_entry = price_series.get(key)
-        leader_coord: Optional[Tuple[float, float]] = None
-        leader_phone = row.get("leader_phone")
-        if leader_phone:
-            leader_coord = leader_coords.get(leader_phone)
-        local_price, local_distance, local_location, local_location_group = _select_price_for_leader(price_entry, "local", leader_coord)
-        distribution_price, dist_distance, dist_location, dist_location_group = _select_price_for_leader(price_entry, "distribution", leader_coord)
-        price_sources = set()
-        if price_entry and "sources" in price_entry:
-            price_sources = price_entry["sources"]
-
-        stats = ensure_stats(row["leader_id"], row["leader_phone"], row["leader_name"])
-        
-        # Track closest benchmark info (keep closest if multiple orders)
-        if local_distance is not None:
-            current_local_dist = stats["closest_local_benchmark"]["distance_km"]
-            if current_local_dist is None or local_distance < current_local_dist:
-                stats["closest_local_benchmark"] = {
-                    "distance_km": local_distance,
-                    "location_group": local_location_group,
-                    "location": local_location,
-                }
-        if dist_distance is not None:
-            current_dist_dist = stats["closest_distribution_benchmark"]["distance_km"]
-            if current_dist_dist is None or dist_distance < current_dist_dist:
-                stats["closest_distribution_benchmark"] = {
-                    "distance_km": dist_distance,
-                    "location_group": dist_location_group,
-                    "location": dist_location,
-                }
-        total_kg = row["total_kg"]
-        unit_price = row["unit_price_etb"]
-
-        stats["total_kg"] += total_kg
-
-        products_map: Dict[str, Dict[str, Any]] = stats["products"]
-        product_stats = products_map.get(canonical)
-        if product_stats is None:
-            product_stats = {
-                "total_kg": 0.0,
-                "local_gap_sum": 0.0,
-                "local_weight": 0.0,
-                "local_pct_sum": 0.0,
-                "local_above_volume": 0.0,
-                "local_dates": set(),
-                "distribution_gap_sum": 0.0,
-                "distribution_weight": 0.0,
-                "distribution_pct_sum": 0.0,
-                "distribution_dates": set(),
-            }
-            products_map[canonical] = product_stats
-        product_stats["total_kg"] += total_kg
-
-        if local_price and local_price > 0:
-            gap = local_price - unit_price
-            stats["local_gap_sum"] += gap * total_kg
-            stats["local_weight"] += total_kg
-            stats["local_pct_sum"] += (gap / local_price) * total_kg
-            if unit_price >= local_price:
-                stats["local_above_volume"] += total_kg
-            stats["local_dates"].add(order_date)
-            product_stats["local_gap_sum"] += gap * total_kg
-            product_stats["local_weight"] += total_kg
-            product_stats["local_pct_sum"] += (gap / local_price) * total_kg
-            if unit_price >= local_price:
-                product_stats["local_above_volume"] += total_kg
-            product_stats["local_dates"].add(order_date)
-
-        if distribution_price and distribution_price > 0:
-            gap = distribution_price - unit_price
-            stats["distribution_gap_sum"] += gap * total_kg
-            stats["distribution_weight"] += total_kg
-            stats["distribution_pct_sum"] += (gap / distribution_price) * total_kg
-            stats["distribution_dates"].add(order_date)
-            product_stats["distribution_gap_sum"] += gap * total_kg
-            product_stats["distribution_weight"] += total_kg
-            product_stats["distribution_pct_sum"] += (gap / distribution_price) * total_kg
-            product_stats["distribution_dates"].add(order_date)
-
-        stats["sources"].update(price_sources)
-
-    by_phone: Dict[str, Dict[str, Any]] = {}
-    by_leader_id: Dict[str, Dict[str, Any]] = {}
-    by_name: Dict[str, Dict[str, Any]] = {}
+    order_rows, orders_complete = _fetch_order_series(
+        client, start_date, end_date, order_index, deal_types=SGL_DEAL_TYPES
+    )
+    return order_rows, price_series, benchmark_complete and distribution_complete and orders_complete
 
-    for stats in leader_stats.values():
-        local_discount_etb = (
-            stats["local_gap_sum"] / stats["local_weight"] if stats["local_weight"] > 0 else None
-        )
-        local_discount_pct = (
-            stats["local_pct_sum"] / stats["local_weight"] if stats["local_weight"] > 0 else None
-        )
-        distribution_discount_etb = (
-            stats["distribution_gap_sum"] / stats["distribution_weight"]
-            if stats["distribution_weight"] > 0
-            else None
-        )
-        distribution_discount_pct = (
-            stats["distribution_pct_sum"] / stats["distribution_weight"]
-            if stats["distribution_weight"] > 0
-            else None
-        )
 
-        combined_sensitivity = None
-        if local_discount_etb is not None and distribution_discount_etb is not None:
-            combined_sensitivity = (
-                DEFAULT_LOCAL_WEIGHT * local_discount_etb
-                + DEFAULT_DISTRIBUTION_WEIGHT * distribution_discount_etb
-            )
-        elif local_discount_etb is not None:
-            combined_sensitivity = local_discount_etb
-        elif distribution_discount_etb is not None:
-            combined_sensitivity = distribution_discount_etb
-
-        combined_sensitivity_pct = None
-        if (
-            local_discount_pct is not None
-            and distribution_discount_pct is not None
-        ):
-            combined_sensitivity_pct = (
-                DEFAULT_LOCAL_WEIGHT * local_discount_pct
-                + DEFAULT_DISTRIBUTION_WEIGHT * distribution_discount_pct
-            )
-        elif local_discount_pct is not None:
-            combined_sensitivity_pct = local_discount_pct
-        elif distribution_discount_pct is not None:
-            combined_sensitivity_pct = distribution_discount_pct
-
-        pct_volume_at_or_above_local = (
-            (stats["local_above_volume"] / stats["local_weight"]) * 100
-            if stats["local_weight"] > 0
-            else None
-        )
-
-        coverage_days = len(stats["local_dates"] | stats["distribution_dates"])
+def fetch_leader_partials(
+    client,
+    start_date: date,
+    end_date: date,
+    leader_coords: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> Tuple[pd.DataFrame, bool]:
+    """Partials for ``[start_date, end_date]`` and whether all of their inputs were complete."""
+    order_rows, price_series, complete = _fetch_span_inputs(client, start_date, end_date)
+    return build_leader_partials(order_rows, price_series, leader_coords), complete
 
-        product_entries: List[Dict[str, Any]] = []
-        total_leader_volume = stats["total_kg"] or 0.0
-        for product_name, pdata in stats["products"].items():
-            product_total = pdata["total_kg"]
-            if product_total <= 0:
-                continue
 
-            product_local_discount_etb = (
-                pdata["local_gap_sum"] / pdata["local_weight"] if pdata["local_weight"] > 0 else None
-            )
-            product_local_discount_pct = (
-                pdata["local_pct_sum"] / pdata["local_weight"] if pdata["local_weight"] > 0 else None
-            )
-            product_distribution_discount_etb = (
-                pdata["distribution_gap_sum"] / pdata["distribution_weight"]
-                if pdata["distribution_weight"] > 0
-                else None
-            )
-            product_distribution_discount_pct = (
-                pdata["distribution_pct_sum"] / pdata["distribution_weight"]
-                if pdata["distribution_weight"] > 0
-                else None
-            )
+def _channel_metrics(sums: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    local_etb = _weighted_mean(sums["local_gap_sum"], sums["local_weight"])
+    local_pct = _weighted_mean(sums["local_pct_sum"], sums["local_weight"])
+    distribution_etb = _weighted_mean(sums["distribution_gap_sum"], sums["distribution_weight"])
+    distribution_pct = _weighted_mean(sums["distribution_pct_sum"], sums["distribution_weight"])
+    return {
+        "local_discount_etb": local_etb,
+        "local_discount_pct": local_pct,
+        "distribution_discount_etb": distribution_etb,
+        "distribution_discount_pct": distribution_pct,
+        "combined_etb": _blend(local_etb, distribution_etb),
+        "combined_pct": _blend(local_pct, distribution_pct),
+        "pct_above_local": _weighted_mean(sums["local_above_volume"], sums["local_weight"]) * 100,
+    }
 
-            product_combined = None
-            if (
-                product_local_discount_etb is not None
-                and product_distribution_discount_etb is not None
-            ):
-                product_combined = (
-                    DEFAULT_LOCAL_WEIGHT * product_local_discount_etb
-                    + DEFAULT_DISTRIBUTION_WEIGHT * product_distribution_discount_etb
-                )
-            elif product_local_discount_etb is not None:
-                product_combined = product_local_discount_etb
-            elif product_distribution_discount_etb is not None:
-                product_combined = product_distribution_discount_etb
-
-            product_combined_pct = None
-            if (
-                product_local_discount_pct is not None
-                and product_distribution_discount_pct is not None
-            ):
-                product_combined_pct = (
-                    DEFAULT_LOCAL_WEIGHT * product_local_discount_pct
-                    + DEFAULT_DISTRIBUTION_WEIGHT * product_distribution_discount_pct
-                )
-            elif product_local_discount_pct is not None:
-                product_combined_pct = product_local_discount_pct
-            elif product_distribution_discount_pct is not None:
-                product_combined_pct = product_distribution_discount_pct
 
-            volume_share_pct = (
-                (product_total / total_leader_volume) * 100 if total_leader_volume > 0 else 0.0
-            )
+def _top_products(
+    partials: pd.DataFrame,
+    leader_ids: np.ndarray,
+    leader_totals: np.ndarray,
+    limit: int = 5,
+) -> List[List[Dict[str, Any]]]:
+    """Top products per leader (indexed by leader group id) by volume; ties keep first-seen order."""
+    ids, groups = _group_ids(partials["leader_id"], partials["canonical_product"])
+    first = _first_positions(ids, groups)
+    sums = {column: _group_sum(ids, groups, partials[column]) for column in _SUM_COLUMNS}
+    metrics = _channel_metrics(sums)
+    owner = leader_ids[first]
+    total_kg = sums["total_kg"]
+    share = np.zeros(groups)
+    np.divide(total_kg, leader_totals[owner], out=share, where=leader_totals[owner] > 0)
+    share *= 100
+    # One partial per (day, leader, product), so counting flagged partials counts distinct days.
+    local_observations = np.bincount(ids, weights=partials["local_valid"].to_numpy(dtype=float), minlength=groups)
+    distribution_observations = np.bincount(
+        ids, weights=partials["distribution_valid"].to_numpy(dtype=float), minlength=groups
+    )
+
+    ranked = np.flatnonzero(total_kg > 0)
+    ranked = ranked[np.lexsort((first[ranked], -total_kg[ranked], owner[ranked]))]
+    products = partials["canonical_product"].to_numpy(dtype=object)[first]
+    nullable = {name: _nullable(values) for name, values in metrics.items()}
+
+    entries: List[List[Dict[str, Any]]] = [[] for _ in range(len(leader_totals))]
+    for group in ranked.tolist():
+        bucket = entries[owner[group]]
+        if len(bucket) >= limit:
+            continue
+        combined = nullable["combined_etb"][group]
+        bucket.append(
+            {
+                "product_name": products[group],
+                "total_kg": float(total_kg[group]),
+                "volume_share_pct": float(share[group]),
+                "local_discount_etb": nullable["local_discount_etb"][group],
+                "distribution_discount_etb": nullable["distribution_discount_etb"][group],
+                "combined_sensitivity_etb": combined,
+                "borderline_discount_etb": combined,
+                "borderline_discount_pct": nullable["combined_pct"][group],
+                "local_discount_pct": nullable["local_discount_pct"][group],
+                "distribution_discount_pct": nullable["distribution_discount_pct"][group],
+                "local_observations": int(local_observations[group]),
+                "distribution_observations": int(distribution_observations[group]),
+                "pct_volume_at_or_above_local": nullable["pct_above_local"][group],
+            }
+        )
+    return entries
 
-            product_entries.append(
-                {
-                    "product_name": product_name,
-                    "total_kg": product_total,
-                    "volume_share_pct": volume_share_pct,
-                    "local_discount_etb": product_local_discount_etb,
-                    "distribution_discount_etb": product_distribution_discount_etb,
-                    "combined_sensitivity_etb": product_combined,
-                    "borderline_discount_etb": product_combined,
-                    "borderline_discount_pct": product_combined_pct,
-                    "local_discount_pct": product_local_discount_pct,
-                    "distribution_discount_pct": product_distribution_discount_pct,
-                    "local_observations": len(pdata["local_dates"]),
-                    "distribution_observations": len(pdata["distribution_dates"]),
-                    "pct_volume_at_or_above_local": (
-                        (pdata["local_above_volume"] / pdata["local_weight"]) * 100
-                        if pdata["local_weight"] > 0
-                        else None
-                    ),
-                }
-            )
 
-        product_entries.sort(key=lambda item: item["total_kg"], reverse=True)
-        top_products = product_entries[:5]
+def leader_records_from_partials(
+    partials: pd.DataFrame,
+    start_date: date,
+    end_date: date,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Merge per-day partials into leader sensitivity records keyed by phone, id and name.
 
-        # Get closest benchmark info (use the one with shortest distance)
-        local_bench = stats.get("closest_local_benchmark") or {}
-        dist_bench = stats.get("closest_distribution_benchmark") or {}
-        local_dist = local_bench.get("distance_km")
-        dist_dist = dist_bench.get("distance_km")
-        
+    Rows are taken in (day, first seen) order, which decides the leader's phone
+    and name, the closest-benchmark tie-break and the top-product tie-break.
+    """
+    by_phone: Dict[str, Dict[str, Any]] = {}
+    by_leader_id: Dict[str, Dict[str, Any]] = {}
+    by_name: Dict[str, Dict[str, Any]] = {}
+    if partials.empty:
+        return {"by_phone": by_phone, "by_leader_id": by_leader_id, "by_name": by_name}
+
+    partials = partials.sort_values(["order_date", "first_row"], kind="stable").reset_index(drop=True)
+    ids, groups = _group_ids(partials["leader_id"])
+    first = _first_positions(ids, groups)
+    sums = {column: _group_sum(ids, groups, partials[column]) for column in _SUM_COLUMNS}
+    metrics = _channel_metrics(sums)
+
+    day_codes, day_uniques = pd.factorize(partials["order_date"])
+    local_valid = partials["local_valid"].to_numpy(dtype=bool)
+    distribution_valid = partials["distribution_valid"].to_numpy(dtype=bool)
+    local_observations = _distinct_days(day_codes, len(day_uniques), ids, groups, local_valid)
+    distribution_observations = _distinct_days(day_codes, len(day_uniques), ids, groups, distribution_valid)
+    coverage_days = _distinct_days(day_codes, len(day_uniques), ids, groups, local_valid | distribution_valid)
+    benchmark_api = _group_any(ids, groups, partials["has_benchmark_api"])
+    distribution_fallback = _group_any(ids, groups, partials["has_distribution_fallback"])
+    phones = _group_first_truthy(partials["leader_phone"], ids, groups)
+    names = _group_first_truthy(partials["leader_name"], ids, groups)
+    leader_ids = partials["leader_id"].to_numpy(dtype=object)[first]
+
+    top_products = _top_products(partials, ids, sums["total_kg"])
+    closest = {
+        channel: _take_closest(
+            partials, channel, _group_closest(partials[f"{channel}_distance"].to_numpy(dtype=float), ids, groups)
+        )
+        for channel in ("local", "distribution")
+    }
+    period = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+
+    values: Dict[str, List[Any]] = {name: _nullable(array) for name, array in metrics.items()}
+    values["total_kg"] = sums["total_kg"].tolist()
+    for channel in ("local", "distribution"):
+        values[f"{channel}_distance"] = _nullable(closest[channel][f"{channel}_distance"])
+        values[f"{channel}_location"] = closest[channel][f"{channel}_location"].tolist()
+        values[f"{channel}_group"] = closest[channel][f"{channel}_group"].tolist()
+
+    for position in range(groups):
+        local_bench = {
+            "distance_km": values["local_distance"][position],
+            "location_group": values["local_group"][position],
+            "location": values["local_location"][position],
+        }
+        dist_bench = {
+            "distance_km": values["distribution_distance"][position],
+            "location_group": values["distribution_group"][position],
+            "location": values["distribution_location"][position],
+        }
+        local_dist = local_bench["distance_km"]
+        dist_dist = dist_bench["distance_km"]
         if local_dist is not None and dist_dist is not None:
-            # Use whichever is closer
             closest_benchmark = local_bench if local_dist <= dist_dist else dist_bench
         elif local_dist is not None:
             closest_benchmark = local_bench
@@ -764,38 +817,35 @@ def compute_leader_sensitivity(
             closest_benchmark = dist_bench
         else:
             closest_benchmark = {}
-        
+
         record = {
-            "leader_id": stats["leader_id"],
-            "leader_phone": stats.get("leader_phone"),
-            "leader_name": stats.get("leader_name"),
-            "total_kg": stats["total_kg"],
-            "local_discount_etb": local_discount_etb,
-            "distribution_discount_etb": distribution_discount_etb,
-            "combined_sensitivity_etb": combined_sensitivity,
-            "combined_sensitivity_pct": combined_sensitivity_pct,
-            "local_discount_pct": local_discount_pct,
-            "distribution_discount_pct": distribution_discount_pct,
-            "coverage_days": coverage_days,
-            "local_observations": len(stats["local_dates"]),
-            "distribution_observations": len(stats["distribution_dates"]),
-            "pct_volume_at_or_above_local": pct_volume_at_or_above_local,
+            "leader_id": leader_ids[position],
+            "leader_phone": phones[position],
+            "leader_name": names[position],
+            "total_kg": values["total_kg"][position],
+            "local_discount_etb": values["local_discount_etb"][position],
+            "distribution_discount_etb": values["distribution_discount_etb"][position],
+            "combined_sensitivity_etb": values["combined_etb"][position],
+            "combined_sensitivity_pct": values["combined_pct"][position],
+            "local_discount_pct": values["local_discount_pct"][position],
+            "distribution_discount_pct": values["distribution_discount_pct"][position],
+            "coverage_days": int(coverage_days[position]),
+            "local_observations": int(local_observations[position]),
+            "distribution_observations": int(distribution_observations[position]),
+            "pct_volume_at_or_above_local": values["pct_above_local"][position],
             "source_flags": {
-                "benchmark_api": "benchmark_api" in stats["sources"],
-                "distribution_fallback": "distribution_fallback" in stats["sources"],
-            },
-            "period": {
-                "start_date": start_date.isoformat(),
-                "end_date": end_date.isoformat(),
+                "benchmark_api": bool(benchmark_api[position]),
+                "distribution_fallback": bool(distribution_fallback[position]),
             },
-            "product_sensitivity": top_products,
+            "period": dict(period),
+            "product_sensitivity": top_products[position],
             "closest_benchmark": {
                 "distance_km": closest_benchmark.get("distance_km"),
                 "location_group": closest_benchmark.get("location_group"),
                 "location": closest_benchmark.get("location"),
             },
-            "closest_local_benchmark": stats.get("closest_local_benchmark", {}),
-            "closest_distribution_benchmark": stats.get("closest_distribution_benchmark", {}),
+            "closest_local_benchmark": local_bench,
+            "closest_distribution_benchmark": dist_bench,
         }
 
         if record["leader_phone"]:
@@ -811,135 +861,121 @@ def compute_leader_sensitivity(
     }
 
 
-def compute_weekly_retention(
+def summarize_leader_sensitivity(
+    order_rows: List[Dict[str, Any]],
+    price_series: Dict[Tuple[str, date], Dict[str, Any]],
+    start_date: date,
+    end_date: date,
+    leader_coords: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Leader sensitivity records for one order series and merged price series."""
+    return leader_records_from_partials(build_leader_partials(order_rows, price_series, leader_coords), start_date, end_date)
+
+
+def compute_leader_sensitivity(
     client,
     start_date: date,
     end_date: date,
     leader_coords: Optional[Dict[str, Tuple[float, float]]] = None,
-) -> List[Dict[str, Any]]:
-    aliases = _ensure_aliases()
-    order_index, benchmark_index, distribution_index = _build_alias_indexes(aliases)
+) -> Tuple[Dict[str, Dict[str, Any]], bool]:
+    """
+    Leader sensitivity for a window, merged from stored per-day partials.
 
-    benchmark_series = _fetch_benchmark_prices(start_date, end_date, benchmark_index)
-    distribution_series = _fetch_distribution_prices(start_date, end_date, distribution_index)
-    price_series = _merge_price_series(benchmark_series, distribution_series)
+    Only days that are not materialized yet (or are still open) are fetched.
+    Returns ``(records, complete)``; ``complete`` is False when a fetched day
+    had incomplete inputs (benchmark chunks, sheet or order source).
+    """
+    from .sensitivity_partials import get_leader_partial_store
 
-    order_rows = _fetch_order_series(client, start_date, end_date, order_index, deal_types=SGL_DEAL_TYPES)
-    leader_coords = leader_coords or {}
+    partials, complete = get_leader_partial_store().window(client, start_date, end_date, leader_coords)
+    return leader_records_from_partials(partials, start_date, end_date), complete
 
-    product_weeks: Dict[str, Dict[date, Dict[str, Any]]] = defaultdict(dict)
 
-    for row in order_rows:
-        order_date = row["order_date"]
-        if order_date is None:
-            continue
-        week_start = _week_start_from_date(order_date)
-        canonical = row["canonical_product"]
-        entry = product_weeks.setdefault(canonical, {}).setdefault(
-            week_start,
-            {
-                "leaders": set(),
-                "unit_price_sum": 0.0,
-                "unit_price_weight": 0.0,
-                "local_gap_sum": 0.0,
-                "local_weight": 0.0,
-                "local_pct_sum": 0.0,
-                "distribution_gap_sum": 0.0,
-                "distribution_weight": 0.0,
-                "distribution_pct_sum": 0.0,
-                "sunday_gap_sum": 0.0,
-                "sunday_weight": 0.0,
-                "sunday_pct_sum": 0.0,
-            },
-        )
+RETENTION_CHANNELS = ("local", "distribution", "sunday")
+RETENTION_SUM_COLUMNS = ["unit_price_sum", "unit_price_weight"] + [
+    f"{channel}_{suffix}" for channel in RETENTION_CHANNELS for suffix in ("gap_sum", "weight", "pct_sum")
+]
 
-        total_kg = row["total_kg"]
-        unit_price = row["unit_price_etb"]
-        entry["leaders"].add(row["leader_id"])
-        entry["unit_price_sum"] += unit_price * total_kg
-        entry["unit_price_weight"] += total_kg
-
-        leader_coord: Optional[Tuple[float, float]] = None
-        leader_phone = row.get("leader_phone")
-        if leader_phone:
-            leader_coord = leader_coords.get(leader_phone)
-
-        price_entry = price_series.get((canonical, order_date))
-        local_price, _, _, _ = _select_price_for_leader(price_entry, "local", leader_coord)
-        distribution_price, _, _, _ = _select_price_for_leader(price_entry, "distribution", leader_coord)
-        sunday_price, _, _, _ = _select_price_for_leader(price_entry, "sunday", leader_coord)
-
-        if local_price and local_price > 0:
-            gap = local_price - unit_price
-            entry["local_gap_sum"] += gap * total_kg
-            entry["local_weight"] += total_kg
-            entry["local_pct_sum"] += (gap / local_price) * total_kg
-
-        if distribution_price and distribution_price > 0:
-            gap = distribution_price - unit_price
-            entry["distribution_gap_sum"] += gap * total_kg
-            entry["distribution_weight"] += total_kg
-            entry["distribution_pct_sum"] += (gap / distribution_price) * total_kg
-
-        if sunday_price and sunday_price > 0:
-            gap = sunday_price - unit_price
-            entry["sunday_gap_sum"] += gap * total_kg
-            entry["sunday_weight"] += total_kg
-            entry["sunday_pct_sum"] += (gap / sunday_price) * total_kg
-
-    products_payload: List[Dict[str, Any]] = []
-
-    for product, weeks_map in product_weeks.items():
-        sorted_weeks = sorted(weeks_map.keys())
-        for idx, week_start in enumerate(sorted_weeks):
-            current_entry = weeks_map[week_start]
-            next_week = weeks_map.get(sorted_weeks[idx + 1]) if idx + 1 < len(sorted_weeks) else None
-            if next_week and current_entry["leaders"]:
-                retained = len(current_entry["leaders"] & next_week["leaders"])
-                current_entry["retention_pct"] = (retained / len(current_entry["leaders"])) * 100
-            else:
-                current_entry["retention_pct"] = None
-
-        weeks_payload: List[Dict[str, Any]] = []
-        for week_start in sorted_weeks:
-            info = weeks_map[week_start]
-            avg_unit_price = (
-                info["unit_price_sum"] / info["unit_price_weight"] if info["unit_price_weight"] > 0 else None
-            )
-            local_down = info["local_gap_sum"] / info["local_weight"] if info["local_weight"] > 0 else None
-            local_pct = info["local_pct_sum"] / info["local_weight"] if info["local_weight"] > 0 else None
-            distribution_down = (
-                info["distribution_gap_sum"] / info["distribution_weight"] if info["distribution_weight"] > 0 else None
-            )
-            distribution_pct = (
-                info["distribution_pct_sum"] / info["distribution_weight"] if info["distribution_weight"] > 0 else None
-            )
-            sunday_down = info["sunday_gap_sum"] / info["sunday_weight"] if info["sunday_weight"] > 0 else None
-            sunday_pct = info["sunday_pct_sum"] / info["sunday_weight"] if info["sunday_weight"] > 0 else None
-
-            weeks_payload.append(
-                {
-                    "week_start": week_start.isoformat(),
-                    "active_leaders": len(info["leaders"]),
-                    "avg_unit_price": avg_unit_price,
-                    "retained_pct": info.get("retention_pct"),
-                    "price_down": {
-                        "local_etb": local_down,
-                        "local_pct": (local_pct * 100) if local_pct is not None else None,
-                        "distribution_etb": distribution_down,
-                        "distribution_pct": (distribution_pct * 100) if distribution_pct is not None else None,
-                        "sunday_etb": sunday_down,
-                        "sunday_pct": (sunday_pct * 100) if sunday_pct is not None else None,
-                    },
-                }
-            )
 
-        products_payload.append(
-            {
-                "product": product,
-                "weeks": weeks_payload,
-            }
-        )
+def build_day_cohorts(
+    order_rows: List[Dict[str, Any]],
+    price_series: Dict[Tuple[str, date], Dict[str, Any]],
+    leader_coords: Optional[Dict[str, Tuple[float, float]]],
+    intern: Callable[[str], int],
+) -> Dict[date, Dict[str, Dict[str, Any]]]:
+    """
+    Retention cohorts per order day and product.
+
+    Each cohort holds the active leaders as an integer bitmap (bit ``intern(leader_id)``)
+    and the additive unit-price and benchmark-gap sums for the weekly payload.
+    """
+    orders = _order_frame(order_rows)
+    if orders.empty:
+        return {}
+    frame = _attach_leader_prices(orders, price_series, leader_coords or {}, RETENTION_CHANNELS)
+    frame = frame.sort_values("row_order", kind="stable").reset_index(drop=True)
+
+    kg = frame["total_kg"].to_numpy(dtype=float)
+    unit_price = frame["unit_price_etb"].to_numpy(dtype=float)
+    values: Dict[str, np.ndarray] = {"unit_price_sum": unit_price * kg, "unit_price_weight": kg}
+    for channel in RETENTION_CHANNELS:
+        price = frame[f"{channel}_price"].to_numpy(dtype=float)
+        valid = price > 0  # NaN compares False
+        gap = np.where(valid, price - unit_price, 0.0)
+        values[f"{channel}_gap_sum"] = np.where(valid, gap * kg, 0.0)
+        values[f"{channel}_weight"] = np.where(valid, kg, 0.0)
+        values[f"{channel}_pct_sum"] = np.where(valid, (gap / np.where(valid, price, 1.0)) * kg, 0.0)
+
+    ids, groups = _group_ids(frame["order_date"], frame["canonical_product"])
+    first = _first_positions(ids, groups)
+    sums = {column: _group_sum(ids, groups, values[column]).tolist() for column in RETENTION_SUM_COLUMNS}
+
+    bitmaps = [0] * groups
+    leader_bits: Dict[str, int] = {}
+    for group, leader_id in zip(ids.tolist(), frame["leader_id"].tolist()):
+        bit = leader_bits.get(leader_id)
+        if bit is None:
+            bit = leader_bits[leader_id] = 1 << intern(leader_id)
+        bitmaps[group] |= bit
+
+    days = frame["order_date"].to_numpy(dtype=object)[first]
+    products = frame["canonical_product"].to_numpy(dtype=object)[first]
+    cohorts: Dict[date, Dict[str, Dict[str, Any]]] = {}
+    for group in range(groups):
+        cohort = {column: sums[column][group] for column in RETENTION_SUM_COLUMNS}
+        cohort["leaders"] = bitmaps[group]
+        cohorts.setdefault(days[group], {})[products[group]] = cohort
+    return cohorts
+
+
+def fetch_day_cohorts(
+    client,
+    start_date: date,
+    end_date: date,
+    leader_coords: Optional[Dict[str, Tuple[float, float]]],
+    intern: Callable[[str], int],
+) -> Tuple[Dict[date, Dict[str, Dict[str, Any]]], bool]:
+    """Day cohorts for ``[start_date, end_date]`` and whether all of their inputs were complete."""
+    order_rows, price_series, complete = _fetch_span_inputs(client, start_date, end_date)
+    return build_day_cohorts(order_rows, price_series, leader_coords, intern), complete
+
 
-    return products_payload
+def compute_weekly_retention(
+    client,
+    start_date: date,
+    end_date: date,
+    leader_coords: Optional[Dict[str, Tuple[float, float]]] = None,
+    curve_weeks: int = 0,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Weekly retention and price-down metrics per product.
+
+    Day cohorts come from the retention cohort store, so only days not yet
+    materialized are fetched. ``curve_weeks`` adds N-week retention curves and
+    reactivation counts to every week. Returns ``(products, complete)`` like
+    :func:`compute_leader_sensitivity`.
+    """
+    from .retention_cohorts import get_retention_cohort_store
 
+    engine, complete = get_retention_cohort_store().engine(client, start_date, end_date, leader_coords)
+    return engine.products_payload(curve_weeks), complete
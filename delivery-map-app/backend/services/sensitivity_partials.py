@@ -0,0 +1,231 @@
+"""
+Day-partitioned store of leader sensitivity partials.
+
+``/api/personas/leaders`` metrics are ratios of additive sums and distinct-day
+counts, so they are kept as per-(day, leader, product) partial accumulators
+(see ``sensitivity.build_leader_partials``). A window is answered by merging
+the stored days; only days that were never materialized, or recent days whose
+TTL expired, are fetched from ClickHouse and the benchmark sources, one fetch
+per contiguous span. Closed days are persisted to Parquet so restarts reuse
+them.
+
+A span is only stored when all of its inputs were complete (every benchmark
+chunk, the sheet and a current order source); otherwise it is served for that
+request and fetched again next time, so an outage is never frozen into closed
+days. Days stay open for ``ORDER_ROLLUP_OPEN_DAYS``, the same window the order
+rollup rebuilds.
+
+Partials depend on the leader coordinates, product aliases and the sheet
+snapshot (distribution prices), so the store is rebuilt whenever any changes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from .b2b_day_cache import missing_spans
+from .clickhouse_rollup import ORDER_ROLLUP_OPEN_DAYS
+from .sensitivity import ALIAS_FILE, SGL_DEAL_TYPES, PARTIAL_COLUMNS, empty_leader_partials, fetch_leader_partials
+from .sheet_data import get_sheet_snapshot
+from .snapshot_files import ParquetSnapshotFile
+
+logger = logging.getLogger(__name__)
+
+# Days newer than the order open window may still change and are re-fetched after the TTL.
+SENSITIVITY_OPEN_DAYS = ORDER_ROLLUP_OPEN_DAYS
+SENSITIVITY_OPEN_DAY_TTL_SECONDS = float(os.getenv("SENSITIVITY_OPEN_DAY_TTL_SECONDS", "900"))
+
+
+def sensitivity_context_version(leader_coords: Dict[str, Tuple[float, float]]) -> str:
+    """Fingerprint of everything besides the day that per-day sensitivity aggregates depend on."""
+    try:
+        alias_stat = ALIAS_FILE.stat()
+        alias_marker = f"{alias_stat.st_mtime_ns}:{alias_stat.st_size}"
+    except OSError:
+        alias_marker = "missing"
+    sheet = get_sheet_snapshot()
+    payload = json.dumps(
+        {
+            "coords": sorted((phone, float(lat), float(lon)) for phone, (lat, lon) in leader_coords.items()),
+            "aliases": alias_marker,
+            "sheet": sheet.version if sheet is not None else "missing",
+            "deal_types": list(SGL_DEAL_TYPES),
+        },
+        separators=(",", ":"),
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+_TEXT_COLUMNS = [
+    "leader_id",
+    "canonical_product",
+    "leader_phone",
+    "leader_name",
+    "local_location",
+    "local_group",
+    "distribution_location",
+    "distribution_group",
+]
+
+
+def _restore_partials(frame: pd.DataFrame) -> pd.DataFrame:
+    """Undo Parquet typing: text back to object columns with None, days back to ``date``."""
+    restored = frame.copy()
+    for column in _TEXT_COLUMNS:
+        values = restored[column].astype(object)
+        restored[column] = values.where(values.notna(), None)
+    restored["order_date"] = pd.Series(
+        [day if isinstance(day, date) and not isinstance(day, datetime) else pd.Timestamp(day).date()
+         for day in restored["order_date"]],
+        index=restored.index,
+        dtype=object,
+    )
+    return restored[PARTIAL_COLUMNS]
+
+
+class LeaderPartialStore:
+    """Per-day partial frames for leader sensitivity, merged on demand."""
+
+    def __init__(self, persist: Optional[ParquetSnapshotFile] = None) -> None:
+        self._persist = persist
+        self._days: Dict[date, pd.DataFrame] = {}
+        self._fetched_at: Dict[date, float] = {}
+        self._context: Optional[str] = None
+        self._lock = threading.Lock()
+        self._fetches = 0
+        self._days_fetched = 0
+        self._days_served = 0
+
+    def _is_closed(self, day: date) -> bool:
+        return day <= date.today() - timedelta(days=SENSITIVITY_OPEN_DAYS)
+
+    def _is_fresh(self, day: date) -> bool:
+        fetched_at = self._fetched_at.get(day)
+        if fetched_at is None:
+            return False
+        return self._is_closed(day) or time.time() - fetched_at <= SENSITIVITY_OPEN_DAY_TTL_SECONDS
+
+    def _reset(self, context: str) -> None:
+        self._days.clear()
+        self._fetched_at.clear()
+        self._context = context
+        if self._persist is None:
+            return
+        loaded = self._persist.load()
+        if loaded is None:
+            return
+        frame, version, fetched_at = loaded
+        if version != context:
+            logger.info("Ignoring persisted sensitivity partials built for another leader/alias context")
+            return
+        for day, day_frame in frame.groupby("order_date", sort=False):
+            if self._is_closed(day):
+                self._days[day] = day_frame.reset_index(drop=True)
+                self._fetched_at[day] = fetched_at
+        logger.info("Loaded sensitivity partials for %d days from %s", len(self._days), self._persist.path)
+
+    def _store_span(self, span_start: date, span_end: date, by_day: Dict[date, pd.DataFrame]) -> None:
+        fetched_at = time.time()
+        day = span_start
+        while day <= span_end:
+            self._days[day] = by_day.get(day, empty_leader_partials())
+            self._fetched_at[day] = fetched_at
+            self._days_fetched += 1
+            day += timedelta(days=1)
+
+    def _save(self) -> None:
+        if self._persist is None or self._context is None:
+            return
+        closed = [frame for day, frame in sorted(self._days.items()) if self._is_closed(day) and not frame.empty]
+        frame = pd.concat(closed, ignore_index=True) if closed else empty_leader_partials()
+        self._persist.save(frame, self._context, time.time())
+
+    def window(
+        self,
+        client,
+        start_date: date,
+        end_date: date,
+        leader_coords: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> Tuple[pd.DataFrame, bool]:
+        """
+        Partials for ``[start_date, end_date]``, fetching only missing or expired days.
+
+        Also returns whether every fetched span had complete inputs.
+        """
+        leader_coords = leader_coords or {}
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        with self._lock:
+            context = sensitivity_context_version(leader_coords)
+            if context != self._context:
+                self._reset(context)
+
+            spans = missing_spans(days, lambda day: not self._is_fresh(day))
+            new_closed_days = False
+            complete_window = True
+            uncached: Dict[date, pd.DataFrame] = {}
+            for span_start, span_end in spans:
+                partials, complete = fetch_leader_partials(client, span_start, span_end, leader_coords)
+                self._fetches += 1
+                by_day = {day: frame.reset_index(drop=True) for day, frame in partials.groupby("order_date", sort=False)}
+                if not complete:
+                    logger.warning("Sensitivity inputs for %s..%s incomplete; not caching the span", span_start, span_end)
+                    complete_window = False
+                    day = span_start
+                    while day <= span_end:
+                        uncached[day] = by_day.get(day, empty_leader_partials())
+                        day += timedelta(days=1)
+                    continue
+                self._store_span(span_start, span_end, by_day)
+                new_closed_days = new_closed_days or self._is_closed(span_start)
+            if new_closed_days:
+                self._save()
+
+            self._days_served += len(days)
+            frames = [uncached.get(day, self._days.get(day)) for day in days]
+            frames = [frame for frame in frames if frame is not None and not frame.empty]
+        if not frames:
+            return empty_leader_partials(), complete_window
+        return pd.concat(frames, ignore_index=True)[PARTIAL_COLUMNS], complete_window
+
+    def clear(self) -> None:
+        with self._lock:
+            self._days.clear()
+            self._fetched_at.clear()
+            self._context = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            closed = sum(1 for day in self._days if self._is_closed(day))
+            return {
+                "days_cached": len(self._days),
+                "closed_days": closed,
+                "partial_rows": sum(len(frame) for frame in self._days.values()),
+                "fetches": self._fetches,
+                "days_fetched": self._days_fetched,
+                "days_served": self._days_served,
+            }
+
+
+_STORE: Optional[LeaderPartialStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_leader_partial_store() -> LeaderPartialStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = LeaderPartialStore(
+                persist=ParquetSnapshotFile(
+                    "sensitivity_leader_partials", to_frame=lambda frame: frame, from_frame=_restore_partials
+                )
+            )
+        return _STORE
@@ -3,9 +3,14 @@ import pandas as pd
 from google.oauth2.service_account import Credentials
 from pathlib import Path
 import logging
+import os
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 
+from .coalesce import get_single_flight
+from .snapshot_files import ParquetSnapshotFile
+from .snapshots import Snapshot, SnapshotStore
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -18,8 +23,22 @@ SERVICE_ACCOUNT_FILE = PROJECT_ROOT / KEY_FILE_NAME
 SPREADSHEET_ID = '1cOQdUcxsu3reQV1Bi96_9a6isUavEz7YkhsQnRKPNi0'
 TARGET_GID = 431565719
 
+# How long a downloaded "All Data" snapshot is served before a background revalidation
+SHEET_SNAPSHOT_TTL = float(os.getenv("SHEET_SNAPSHOT_TTL", os.getenv("GOOGLE_SHEETS_CACHE_TTL", "600")))
+
+_client: Optional[gspread.Client] = None
+
+
+def sheet_configured() -> bool:
+    """Whether Google Sheets credentials are installed; without them the sheet is simply not used."""
+    return SERVICE_ACCOUNT_FILE.exists()
+
+
 def _get_client():
-    """Authenticate and return a gspread client."""
+    """Authenticate once and return the shared gspread client."""
+    global _client
+    if _client is not None:
+        return _client
     if not SERVICE_ACCOUNT_FILE.exists():
         logger.error(f"Service account file not found at: {SERVICE_ACCOUNT_FILE}")
         return None
@@ -31,15 +50,15 @@ def _get_client():
     
     try:
         creds = Credentials.from_service_account_file(str(SERVICE_ACCOUNT_FILE), scopes=scope)
-        client = gspread.authorize(creds)
-        return client
+        _client = gspread.authorize(creds)
+        return _client
     except Exception as e:
         logger.error(f"Failed to authenticate with Google Sheets: {e}")
         return None
 
-def fetch_raw_sheet_data() -> Optional[pd.DataFrame]:
+def _download_raw_sheet_data() -> Optional[pd.DataFrame]:
     """
-    Fetches raw data from the 'All Data' sheet and performs basic cleaning:
+    Downloads the 'All Data' sheet and performs basic cleaning:
     - Date parsing (created_at -> date_dt)
     - Numeric conversion (removing commas, handling NaNs)
     - Returns the DataFrame with all history
@@ -142,13 +161,66 @@ def fetch_raw_sheet_data() -> Optional[pd.DataFrame]:
         logger.error(f"Error in fetch_raw_sheet_data: {e}")
         return None
 
-def fetch_sheet_metrics() -> Optional[Dict[str, Any]]:
+
+_SHEET_STORE = SnapshotStore(
+    "all_data",
+    _download_raw_sheet_data,
+    ttl_seconds=SHEET_SNAPSHOT_TTL,
+    persist=ParquetSnapshotFile("all_data"),
+)
+_metrics_cache: Dict[str, Any] = {}
+_SHEET_FLIGHT = get_single_flight("sheet")
+
+
+def get_sheet_snapshot() -> Optional[Snapshot]:
+    """
+    Return the shared snapshot of the cleaned 'All Data' frame.
+
+    Concurrent callers share a single download; once the TTL passes the stale
+    frame keeps being served while one background refresh runs. ``version``
+    changes only when the sheet content changes, so callers can key caches on it.
+    After a restart the last persisted copy is served until the download succeeds.
+    """
+    return _SHEET_STORE.get()
+
+
+def get_sheet_snapshot_store() -> SnapshotStore:
+    return _SHEET_STORE
+
+
+def fetch_raw_sheet_data() -> Optional[pd.DataFrame]:
+    """
+    Return the cleaned 'All Data' frame from the shared snapshot.
+
+    The frame is shared between callers and must not be modified in place.
+    """
+    snapshot = get_sheet_snapshot()
+    return snapshot.data if snapshot else None
+
+
+def fetch_sheet_metrics(snapshot: Optional[Snapshot] = None) -> Optional[Dict[str, Any]]:
     """
     Fetches data from the 'All Data' sheet, filters for the last 7 days based on the
     latest date in the 'created_at' column, and aggregates metrics by Product Name.
     Returns a dict with 'metrics' (list) and 'window' (dict with start/end dates).
+    Results are memoized per sheet snapshot version; pass ``snapshot`` to pin one.
     """
-    df = fetch_raw_sheet_data()
+    if snapshot is None:
+        snapshot = get_sheet_snapshot()
+    if snapshot is None:
+        return None
+    if _metrics_cache.get("version") == snapshot.version:
+        return _metrics_cache["result"]
+
+    # Requests racing on a new snapshot version aggregate it once.
+    result = _SHEET_FLIGHT.do(("sheet-metrics", snapshot.version), _aggregate_sheet_metrics, snapshot.data)
+    if result is not None:
+        _metrics_cache.clear()
+        _metrics_cache.update({"version": snapshot.version, "result": result})
+    return result
+
+
+def _aggregate_sheet_metrics(df: Optional[pd.DataFrame]) -> Optional[Dict[str, Any]]:
     if df is None or df.empty:
         return None
 
@@ -232,6 +304,99 @@ def fetch_sheet_metrics() -> Optional[Dict[str, Any]]:
         logger.error(f"Error in fetch_sheet_metrics aggregation: {e}")
         return None
 
+def summarize_sales_purchases(
+    df: Optional[pd.DataFrame],
+    week_start,
+    week_end,
+    alias_map: Dict[str, str],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-product purchase/selling price summary over the whole sheet history.
+
+    Product names are canonicalised through ``alias_map`` (lower-cased alias ->
+    canonical name). Latest prices come from the most recent day with a
+    positive price (first such row wins on ties); averages are over positive
+    prices only; the ``weekly_*`` figures cover ``[week_start, week_end]``.
+    """
+    summary: Dict[str, Dict[str, Any]] = {}
+    if df is None or df.empty or "Product Name" not in df.columns:
+        return summary
+
+    names = df["Product Name"].astype(str).str.strip()
+    valid = (names != "").to_numpy()
+    if not valid.any():
+        return summary
+    canonical = names.str.lower().map(alias_map).fillna(names)
+
+    dates = df["date_dt"]
+    if getattr(dates.dt, "tz", None) is not None:
+        dates = dates.dt.tz_localize(None)
+
+    frame = pd.DataFrame(
+        {
+            "product": canonical.to_numpy(),
+            "day": dates.dt.normalize().to_numpy(),
+            "purchase": df["PurchasingPrice"].astype(float).to_numpy(),
+            "selling": df["price"].astype(float).to_numpy(),
+            "qty": df["final_volume_kg"].astype(float).to_numpy(),
+        }
+    )[valid].reset_index(drop=True)
+
+    has_purchase = frame["purchase"] > 0
+    has_selling = frame["selling"] > 0
+    in_week = (frame["day"] >= pd.Timestamp(week_start)) & (frame["day"] <= pd.Timestamp(week_end))
+
+    frame["purchase_pos"] = frame["purchase"].where(has_purchase, 0.0)
+    frame["purchase_n"] = has_purchase.astype("int64")
+    frame["selling_pos"] = frame["selling"].where(has_selling, 0.0)
+    frame["selling_n"] = has_selling.astype("int64")
+    frame["weekly_qty"] = frame["qty"].where(in_week, 0.0)
+    frame["weekly_cost"] = (frame["purchase"] * frame["qty"]).where(in_week & has_purchase, 0.0)
+    frame["weekly_revenue"] = (frame["selling"] * frame["qty"]).where(in_week & has_selling, 0.0)
+
+    grouped = frame.groupby("product", sort=False).agg(
+        total_quantity=("qty", "sum"),
+        weekly_quantity=("weekly_qty", "sum"),
+        weekly_purchase_cost=("weekly_cost", "sum"),
+        weekly_sales_revenue=("weekly_revenue", "sum"),
+        purchase_sum=("purchase_pos", "sum"),
+        purchase_count=("purchase_n", "sum"),
+        selling_sum=("selling_pos", "sum"),
+        selling_count=("selling_n", "sum"),
+    )
+
+    def _latest(mask: pd.Series, price_col: str) -> Dict[str, tuple]:
+        priced = frame.loc[mask, ["product", "day", price_col]]
+        if priced.empty:
+            return {}
+        rows = priced.loc[priced.groupby("product", sort=False)["day"].idxmax()]
+        return {
+            product: (float(price), day.date())
+            for product, day, price in zip(rows["product"], rows["day"], rows[price_col])
+        }
+
+    latest_purchase = _latest(has_purchase, "purchase")
+    latest_selling = _latest(has_selling, "selling")
+
+    for product, row in zip(grouped.index, grouped.itertuples(index=False)):
+        purchase_price, purchase_date = latest_purchase.get(product, (None, None))
+        selling_price, selling_date = latest_selling.get(product, (None, None))
+        summary[product] = {
+            "latest_purchase_price": purchase_price,
+            "latest_purchase_date": purchase_date,
+            "latest_selling_price": selling_price,
+            "latest_selling_date": selling_date,
+            "total_quantity": float(row.total_quantity),
+            "weekly_quantity": float(row.weekly_quantity),
+            "weekly_purchase_cost": float(row.weekly_purchase_cost),
+            "weekly_sales_revenue": float(row.weekly_sales_revenue),
+            "avg_purchase_price": float(row.purchase_sum) / row.purchase_count if row.purchase_count else None,
+            "avg_selling_price": float(row.selling_sum) / row.selling_count if row.selling_count else None,
+        }
+
+    return summary
+
+
 if __name__ == "__main__":
     # Local test
     import sys
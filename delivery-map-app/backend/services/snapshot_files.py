@@ -0,0 +1,145 @@
+"""Parquet persistence for snapshots so restarts and Sheets outages can serve the last good copy."""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = Path(
+    os.getenv("SNAPSHOT_CACHE_DIR") or Path(__file__).resolve().parent.parent / "data" / "snapshots"
+)
+SNAPSHOT_PERSIST_ENABLED = os.getenv("SNAPSHOT_PERSIST_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_VERSION_KEY = b"snapshot_version"
+_FETCHED_AT_KEY = b"snapshot_fetched_at"
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "snapshot"
+
+
+def typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give every column a single Parquet type.
+
+    Sheet exports mix numbers and blank strings in one column; such columns are
+    stored as text, purely numeric ones keep their numeric dtype.
+    """
+    out = df.copy()
+    out.columns = [str(c) for c in out.columns]
+    for col in out.columns:
+        series = out[col]
+        if series.dtype != object:
+            continue
+        kinds = {type(v) for v in series}
+        if kinds and kinds <= {int, float}:
+            out[col] = pd.to_numeric(series)
+        elif kinds and kinds <= {bool}:
+            out[col] = series.astype(bool)
+        else:
+            out[col] = series.map(lambda v: "" if v is None else str(v))
+    return out
+
+
+def records_to_frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    return typed_frame(pd.DataFrame(records))
+
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return df.to_dict("records")
+
+
+def grid_to_frame(values: List[List[Any]]) -> pd.DataFrame:
+    """Store a raw value grid (``get_all_values``) positionally; headers may repeat."""
+    width = max((len(row) for row in values), default=0)
+    padded = [[("" if v is None else str(v)) for v in row] + [""] * (width - len(row)) for row in values]
+    return pd.DataFrame(padded, columns=[f"c{i}" for i in range(width)], dtype=str)
+
+
+def frame_to_grid(df: pd.DataFrame) -> List[List[str]]:
+    return df.astype(str).values.tolist()
+
+
+class ParquetSnapshotFile:
+    """
+    One snapshot on disk as ``<SNAPSHOT_DIR>/<name>.parquet``.
+
+    Writes go to a temporary file that is swapped in with ``os.replace``, so
+    readers never see a partial file. The snapshot version and fetch time are
+    kept in the Parquet schema metadata. ``to_frame``/``from_frame`` convert
+    non-DataFrame payloads (record lists, value grids).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        to_frame: Callable[[Any], pd.DataFrame] = typed_frame,
+        from_frame: Callable[[pd.DataFrame], Any] = lambda df: df,
+        directory: Optional[Path] = None,
+    ) -> None:
+        self.name = name
+        self.path = (directory or SNAPSHOT_DIR) / f"{_slug(name)}.parquet"
+        self._to_frame = to_frame
+        self._from_frame = from_frame
+
+    @property
+    def enabled(self) -> bool:
+        if not SNAPSHOT_PERSIST_ENABLED:
+            return False
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def load(self) -> Optional[Tuple[Any, str, float]]:
+        """Return ``(data, version, fetched_at)`` from disk, or None if absent or unreadable."""
+        if not self.enabled or not self.path.exists():
+            return None
+        try:
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(self.path, memory_map=True)
+            metadata = table.schema.metadata or {}
+            version = metadata.get(_VERSION_KEY, b"").decode("utf-8") or None
+            fetched_at = float(metadata.get(_FETCHED_AT_KEY, b"0").decode("utf-8") or 0)
+            if version is None:
+                return None
+            return self._from_frame(table.to_pandas()), version, fetched_at
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Failed to read snapshot file %s: %s", self.path, exc)
+            return None
+
+    def save(self, data: Any, version: str, fetched_at: float) -> bool:
+        """Atomically replace the file on disk with ``data``."""
+        if not self.enabled:
+            return False
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(self._to_frame(data), preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[_VERSION_KEY] = version.encode("utf-8")
+            metadata[_FETCHED_AT_KEY] = repr(fetched_at).encode("utf-8")
+            table = table.replace_schema_metadata(metadata)
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            pq.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, self.path)
+            return True
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Failed to persist snapshot '%s' to %s: %s", self.name, self.path, exc)
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return False
@@ -0,0 +1,213 @@
+"""In-process snapshot store with TTL, stale-while-revalidate refresh and single-flight loading."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .snapshot_files import ParquetSnapshotFile
+
+logger = logging.getLogger(__name__)
+
+FAILURE_RETRY_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """An immutable result of one successful load. Treat ``data`` as read-only."""
+
+    data: Any
+    version: str
+    fetched_at: float
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.fetched_at
+
+
+def frame_version(df: Optional[pd.DataFrame]) -> str:
+    """Content hash of a DataFrame; unchanged data keeps the same version across reloads."""
+    if df is None:
+        return "empty"
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=False).values
+        digest = hashlib.sha1(row_hashes.tobytes())
+        digest.update(",".join(map(str, df.columns)).encode("utf-8"))
+        return digest.hexdigest()[:16]
+    except Exception:  # pylint: disable=broad-except
+        return f"t{time.time_ns():x}"
+
+
+def json_version(data: Any) -> str:
+    """Content hash for JSON-like payloads (record lists, value grids)."""
+    payload = json.dumps(data, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class SnapshotStore:
+    """
+    Holds the latest snapshot produced by ``loader``.
+
+    Fresh snapshots are returned directly. Once the TTL has passed the stale
+    snapshot is still returned immediately while a single background refresh
+    runs. Callers that arrive with nothing cached share one in-flight load.
+
+    With ``persist`` set, every new version is written to disk and a cold
+    store is seeded from that file before falling back to ``loader``, so a
+    restart serves the last good copy while the source is re-fetched.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        ttl_seconds: float,
+        versioner: Callable[[Any], str] = frame_version,
+        persist: Optional["ParquetSnapshotFile"] = None,
+    ) -> None:
+        self.name = name
+        self._loader = loader
+        self._ttl = ttl_seconds
+        self._versioner = versioner
+        self._persist = persist
+        self._seeded_from_disk = False
+        self._snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+        self._inflight: Optional[threading.Event] = None
+        self._retry_after = 0.0
+        self._loads = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+
+    def get(self) -> Optional[Snapshot]:
+        """Return the current snapshot, loading or refreshing it as needed."""
+        snapshot = self._snapshot
+        if snapshot is None and self.load_persisted():
+            snapshot = self._snapshot
+        if snapshot is not None:
+            if snapshot.age_seconds > self._ttl and time.time() >= self._retry_after:
+                self._refresh_in_background()
+            return snapshot
+        if time.time() < self._retry_after:
+            # The last cold load failed; don't hammer the source on every request.
+            return None
+        return self.refresh()
+
+    def peek(self) -> Optional[Snapshot]:
+        """Return the current snapshot without triggering any load."""
+        return self._snapshot
+
+    def load_persisted(self) -> bool:
+        """Seed an empty store from its on-disk copy. Returns True if a snapshot is now installed."""
+        if self._persist is None:
+            return self._snapshot is not None
+        with self._lock:
+            if self._snapshot is not None:
+                return True
+            if self._seeded_from_disk:
+                return False
+            self._seeded_from_disk = True
+            loaded = self._persist.load()
+            if loaded is None:
+                return False
+            data, version, fetched_at = loaded
+            self.set(data, version=version, fetched_at=fetched_at)
+        logger.info(
+            "Snapshot '%s' seeded from %s (version %s, %.0fs old)",
+            self.name,
+            self._persist.path,
+            version,
+            time.time() - fetched_at,
+        )
+        return True
+
+    def refresh(self) -> Optional[Snapshot]:
+        """Load now, or wait for the load already in flight, and return the resulting snapshot."""
+        with self._lock:
+            event = self._inflight
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight = event
+        if not leader:
+            event.wait()
+            return self._snapshot
+        try:
+            self._load()
+        finally:
+            with self._lock:
+                self._inflight = None
+            event.set()
+        return self._snapshot
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._inflight is not None:
+                return
+        threading.Thread(target=self.refresh, name=f"snapshot-{self.name}", daemon=True).start()
+
+    def _load(self) -> None:
+        started = time.monotonic()
+        try:
+            data = self._loader()
+        except Exception as exc:  # pylint: disable=broad-except
+            data = None
+            self._last_error = str(exc)
+            logger.error("Snapshot '%s' load failed: %s", self.name, exc)
+        self._loads += 1
+        if data is None:
+            self._failures += 1
+            self._retry_after = time.time() + min(self._ttl, FAILURE_RETRY_SECONDS)
+            if self._snapshot is not None:
+                logger.warning("Snapshot '%s' refresh returned no data; keeping version %s", self.name, self._snapshot.version)
+            return
+        previous = self._snapshot
+        snapshot = self.set(data)
+        if self._persist is not None and (previous is None or previous.version != snapshot.version):
+            self._persist.save(snapshot.data, snapshot.version, snapshot.fetched_at)
+        logger.info(
+            "Snapshot '%s' loaded in %.2fs (version %s)",
+            self.name,
+            time.monotonic() - started,
+            self._snapshot.version if self._snapshot else None,
+        )
+
+    def set(self, data: Any, version: Optional[str] = None, fetched_at: Optional[float] = None) -> Snapshot:
+        """Install ``data`` as the current snapshot."""
+        snapshot = Snapshot(
+            data=data,
+            version=version or self._versioner(data),
+            fetched_at=fetched_at if fetched_at is not None else time.time(),
+        )
+        self._snapshot = snapshot
+        self._retry_after = 0.0
+        self._last_error = None
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Mark the current snapshot as expired so the next ``get`` revalidates it."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            self._snapshot = Snapshot(data=snapshot.data, version=snapshot.version, fetched_at=0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "name": self.name,
+            "version": snapshot.version if snapshot else None,
+            "age_seconds": round(snapshot.age_seconds, 1) if snapshot else None,
+            "ttl_seconds": self._ttl,
+            "refreshing": self._inflight is not None,
+            "loads": self._loads,
+            "failures": self._failures,
+            "last_error": self._last_error,
+            "persist_path": str(self._persist.path) if self._persist is not None else None,
+        }
@@ -0,0 +1,304 @@
+"""
+Normal-group coverage of SGL leaders within a radius (``/api/spatial/coverage``).
+
+For every SGL location the normal-group locations within ``radius_km`` are
+found through the normal-location ``GridIndex``. Pairs are reduced per SGL
+leader (a leader can have several locations; a normal location near two of
+them counts once), and over the whole network. Each covered normal location
+is also assigned to its nearest SGL location, which is what the Playground
+pickup estimate needs.
+
+Results are memoized on the ``DeliveryPoints`` snapshot per (radius, weekday
+filter), so they are computed once per data version.
+
+``CoverageCurve`` (``/api/spatial/coverage-curve``) answers every radius up to
+``COVERAGE_CURVE_MAX_KM`` at once: one pair scan at the largest radius keeps,
+per normal location, the distance to its nearest SGL location and, per leader,
+the distance to that leader's nearest location. Sorted, with prefix sums of
+orders, kg and members, coverage at any radius is a binary search.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .delivery_points import WEEKDAYS, DeliveryPoints
+from .spatial_index import grid_for
+
+COVERAGE_RADIUS_DECIMALS = 3
+COVERAGE_CURVE_MAX_KM = float(os.getenv("COVERAGE_CURVE_MAX_KM", "5"))
+COVERAGE_CURVE_MAX_SAMPLES = 1000
+
+
+def _share(part: float, whole: float) -> float:
+    return part / whole if whole > 0 else 0.0
+
+
+def _shares(parts: np.ndarray, whole: float) -> np.ndarray:
+    return parts / whole if whole > 0 else np.zeros(len(parts))
+
+
+class _SglLeaders:
+    """SGL locations grouped by leader (``group_created_by``), so pair batches never split a leader."""
+
+    def __init__(self, points: DeliveryPoints, active: np.ndarray, orders: np.ndarray) -> None:
+        sgl_ids = np.flatnonzero(points.is_sgl & active)
+        keys = np.array([str(points.records[i].get("group_created_by") or "") for i in sgl_ids], dtype=object)
+        self.keys, leader_of = np.unique(keys, return_inverse=True)
+        by_leader = np.argsort(leader_of, kind="stable")
+        self.ids, self.leader_of = sgl_ids[by_leader], leader_of[by_leader]
+        self.starts = np.flatnonzero(np.r_[True, self.leader_of[1:] != self.leader_of[:-1]]) if len(sgl_ids) else np.empty(0, int)
+        self.ends = np.r_[self.starts[1:], len(sgl_ids)].astype(int)
+        self.orders = np.bincount(self.leader_of, weights=orders[self.ids], minlength=len(self.keys))
+        self.kg = np.bincount(self.leader_of, weights=points.kg[self.ids], minlength=len(self.keys))
+        self._points = points
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def by_orders(self) -> List[int]:
+        """Leader indexes, largest own orders first."""
+        return np.argsort(-self.orders, kind="stable").tolist()
+
+    def describe(self, leader: int) -> Dict[str, Any]:
+        points = self._points
+        location_ids = self.ids[self.starts[leader]:self.ends[leader]]
+        record = points.records[location_ids[0]]
+        return {
+            "group_created_by": self.keys[leader],
+            "leader_name": record.get("leader_name"),
+            "leader_phone": record.get("leader_phone"),
+            "sgl_locations": len(location_ids),
+            "sgl_orders": self.orders[leader],
+            "sgl_kg": self.kg[leader],
+            "locations": [[points.lat[i], points.lon[i]] for i in location_ids.tolist()],
+        }
+
+
+def build_coverage(points: DeliveryPoints, radius_km: float, days: Sequence[int] = ()) -> Dict[str, Any]:
+    """Per-leader and network coverage payload for one radius and weekday filter."""
+    active, orders = points.select(None, days)
+    grid = grid_for(points, sgl=False, radius_km=radius_km)
+    normal_active = active[grid.ids]
+    sgl = _SglLeaders(points, active, orders)
+    sgl_ids, leader_of = sgl.ids, sgl.leader_of
+
+    n_leaders, n_normals = len(sgl), len(grid)
+    covered_locations = np.zeros(n_leaders)
+    covered_orders = np.zeros(n_leaders)
+    covered_kg = np.zeros(n_leaders)
+    covered_members = np.zeros(n_leaders)
+    nearest_km = np.full(n_normals, np.inf)
+    nearest_sgl = np.full(n_normals, -1, dtype=np.int64)
+
+    for query_rows, grid_rows, distance in grid.pairs(points.lat[sgl_ids], points.lon[sgl_ids], radius_km, sgl.starts):
+        keep = normal_active[grid_rows]
+        query_rows, grid_rows, distance = query_rows[keep], grid_rows[keep], distance[keep]
+        if not len(grid_rows):
+            continue
+        # One (leader, normal location) pair per leader, however many of its locations reach it.
+        leader_pairs = np.sort(leader_of[query_rows] * n_normals + grid_rows)
+        leader_pairs = leader_pairs[np.r_[True, leader_pairs[1:] != leader_pairs[:-1]]]
+        pair_leader, pair_normal = leader_pairs // n_normals, leader_pairs % n_normals
+        normal_ids = grid.ids[pair_normal]
+        covered_locations += np.bincount(pair_leader, minlength=n_leaders)
+        covered_orders += np.bincount(pair_leader, weights=orders[normal_ids], minlength=n_leaders)
+        covered_kg += np.bincount(pair_leader, weights=points.kg[normal_ids], minlength=n_leaders)
+        covered_members += np.bincount(pair_leader, weights=points.members[normal_ids], minlength=n_leaders)
+
+        # Nearest SGL location per normal location: closest pair of this batch, then against earlier batches.
+        by_normal = np.argsort(grid_rows, kind="stable")
+        rows = grid_rows[by_normal]
+        bounds = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        closest = np.minimum.reduceat(distance[by_normal], bounds)
+        is_closest = distance[by_normal] == np.repeat(closest, np.diff(np.r_[bounds, len(rows)]))
+        pick = by_normal[is_closest]
+        pick = pick[np.r_[True, grid_rows[pick][1:] != grid_rows[pick][:-1]]]
+        better = distance[pick] < nearest_km[grid_rows[pick]]
+        nearest_km[grid_rows[pick][better]] = distance[pick][better]
+        nearest_sgl[grid_rows[pick][better]] = sgl_ids[query_rows[pick][better]]
+
+    sgls: List[Dict[str, Any]] = []
+    for leader in sgl.by_orders():
+        sgls.append({
+            **sgl.describe(leader),
+            "normal_locations": int(covered_locations[leader]),
+            "normal_orders": covered_orders[leader],
+            "normal_kg": covered_kg[leader],
+            "normal_members": int(covered_members[leader]),
+        })
+
+    normal_ids = grid.ids[normal_active]
+    covered = np.isfinite(nearest_km)
+    covered_ids = grid.ids[covered]
+    network = {
+        "sgl_leaders": n_leaders,
+        "sgl_locations": int(len(sgl_ids)),
+        "normal_locations": int(len(normal_ids)),
+        "normal_orders": orders[normal_ids].sum(),
+        "normal_kg": points.kg[normal_ids].sum(),
+        "covered_locations": int(covered.sum()),
+        "covered_orders": orders[covered_ids].sum(),
+        "covered_kg": points.kg[covered_ids].sum(),
+    }
+    network["covered_locations_pct"] = _share(network["covered_locations"], network["normal_locations"])
+    network["covered_orders_pct"] = _share(network["covered_orders"], network["normal_orders"])
+    network["covered_kg_pct"] = _share(network["covered_kg"], network["normal_kg"])
+
+    assignments = []
+    for row in np.flatnonzero(covered).tolist():
+        normal = points.records[grid.ids[row]]
+        nearest = nearest_sgl[row]
+        assignments.append({
+            "group_created_by": normal.get("group_created_by"),
+            "delivery_location_name": normal.get("delivery_location_name"),
+            "sgl_group_created_by": points.records[nearest].get("group_created_by"),
+            "sgl_lat": points.lat[nearest],
+            "sgl_lon": points.lon[nearest],
+            "distance_km": nearest_km[row],
+        })
+
+    return {
+        "radius_km": radius_km,
+        "days": [WEEKDAYS[day] for day in days],
+        "network": network,
+        "sgls": sgls,
+        "assignments": assignments,
+    }
+
+
+def coverage_for(points: DeliveryPoints, radius_km: float, days: Sequence[int] = ()) -> Dict[str, Any]:
+    """``build_coverage`` memoized per snapshot, radius (rounded to metres) and weekday filter."""
+    radius_km = round(float(radius_km), COVERAGE_RADIUS_DECIMALS)
+    days = tuple(days)
+    return points.derived(("coverage", radius_km, days), lambda snapshot: build_coverage(snapshot, radius_km, days))
+
+
+class CoverageCurve:
+    """Cumulative normal-group coverage by radius (0..``max_km``) for the network and each SGL leader."""
+
+    _FIELDS = ("locations", "orders", "kg", "members")
+
+    def __init__(self, points: DeliveryPoints, max_km: float = COVERAGE_CURVE_MAX_KM) -> None:
+        self.max_km = max_km
+        active = np.ones(len(points), dtype=bool)
+        grid = grid_for(points, sgl=False, radius_km=max_km)
+        self.sgl = _SglLeaders(points, active, points.orders)
+        n_normals = len(grid)
+        nearest = np.full(n_normals, np.inf)
+        leaders, distances, normals = [], [], []
+        for query_rows, grid_rows, distance in grid.pairs(
+            points.lat[self.sgl.ids], points.lon[self.sgl.ids], max_km, self.sgl.starts
+        ):
+            if not len(grid_rows):
+                continue
+            np.minimum.at(nearest, grid_rows, distance)
+            # Closest location of each leader per normal location; batches arrive in leader order.
+            key = self.sgl.leader_of[query_rows] * n_normals + grid_rows
+            order = np.lexsort((distance, key))
+            key, distance = key[order], distance[order]
+            first = np.r_[True, key[1:] != key[:-1]]
+            key, distance = key[first], distance[first]
+            order = np.lexsort((distance, key // n_normals))
+            leaders.append(key[order] // n_normals)
+            distances.append(distance[order])
+            normals.append(grid.ids[key[order] % n_normals])
+
+        weights = {"orders": points.orders, "kg": points.kg, "members": points.members}
+        normal_ids = grid.ids
+        self.totals = {
+            "locations": float(n_normals),
+            **{name: float(values[normal_ids].sum()) for name, values in weights.items()},
+        }
+
+        # Network curve: nearest-SGL distance of every normal location reached within max_km.
+        reached = np.isfinite(nearest)
+        order = np.argsort(nearest[reached], kind="stable")
+        self.network_km = nearest[reached][order]
+        reached_ids = normal_ids[reached][order]
+        self.network_sums = self._prefix_sums(reached_ids, weights)
+
+        # Leader curves, concatenated leader-major; keys leader * span + km keep one sorted array.
+        self.pair_leader = np.concatenate(leaders) if leaders else np.empty(0, dtype=np.int64)
+        self.pair_km = np.concatenate(distances) if distances else np.empty(0)
+        pair_ids = np.concatenate(normals) if normals else np.empty(0, dtype=np.int64)
+        self._span = 2.0 * max_km
+        self._pair_key = self.pair_leader * self._span + self.pair_km
+        self._leader_start = np.searchsorted(self.pair_leader, np.arange(len(self.sgl)))
+        self.leader_sums = self._prefix_sums(pair_ids, weights)
+
+    @staticmethod
+    def _prefix_sums(ids: np.ndarray, weights: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        sums = {"locations": np.arange(len(ids) + 1)}
+        for name, values in weights.items():
+            sums[name] = np.r_[0.0, np.cumsum(values[ids])]
+        return sums
+
+    def network_at(self, radii: np.ndarray) -> Dict[str, np.ndarray]:
+        """Covered normal locations, orders, kg and members of the whole network at each radius."""
+        positions = np.searchsorted(self.network_km, radii, "right")
+        return {name: self.network_sums[name][positions] for name in self._FIELDS}
+
+    def leaders_at(self, leaders: Sequence[int], radii: np.ndarray) -> Dict[str, np.ndarray]:
+        """``(len(leaders), len(radii))`` arrays of each leader's coverage at each radius."""
+        leaders = np.asarray(leaders, dtype=np.int64)
+        radii = np.minimum(np.asarray(radii, dtype=np.float64), self.max_km)
+        positions = np.searchsorted(self._pair_key, leaders[:, None] * self._span + radii[None, :], "right")
+        starts = self._leader_start[leaders][:, None]
+        return {name: self.leader_sums[name][positions] - self.leader_sums[name][starts] for name in self._FIELDS}
+
+    def sample_radii(self, step_km: float) -> np.ndarray:
+        """``step_km, 2 * step_km, ...`` up to ``max_km``; ValueError past ``COVERAGE_CURVE_MAX_SAMPLES``."""
+        samples = int(math.floor(self.max_km / step_km + 1e-9))
+        if samples > COVERAGE_CURVE_MAX_SAMPLES:
+            raise ValueError(f"step_km is too small: at most {COVERAGE_CURVE_MAX_SAMPLES} samples up to {self.max_km:g} km")
+        return np.round(np.arange(1, samples + 1) * step_km, 6)
+
+    def payload(self, step_km: float, top: Optional[int], radius_km: Optional[float]) -> Dict[str, Any]:
+        """Network and leader curves sampled every ``step_km``; ``top`` largest leaders (None: all)."""
+        if radius_km is not None and radius_km > self.max_km:
+            raise ValueError(f"radius_km must be at most {self.max_km:g}")
+        radii = self.sample_radii(step_km)
+        ranked = self.sgl.by_orders()
+        sampled = ranked if top is None else ranked[:top]
+        network = self.network_at(radii)
+        leader_curves = self.leaders_at(sampled, radii)
+        payload: Dict[str, Any] = {
+            "max_radius_km": self.max_km,
+            "radius_km": radii,
+            "network": {
+                "normal_locations": int(self.totals["locations"]),
+                "normal_orders": self.totals["orders"],
+                "normal_kg": self.totals["kg"],
+                **network,
+                **{f"{name}_pct": _shares(network[name], self.totals[name]) for name in ("locations", "orders", "kg")},
+            },
+            "sgls": [
+                {**self.sgl.describe(leader), **{name: values[row] for name, values in leader_curves.items()}}
+                for row, leader in enumerate(sampled)
+            ],
+        }
+        if radius_km is not None:
+            at = np.array([radius_km])
+            everyone = self.leaders_at(ranked, at)
+            payload["at_radius"] = {
+                "radius_km": radius_km,
+                "network": {name: values[0] for name, values in self.network_at(at).items()},
+                "sgls": [
+                    {
+                        "group_created_by": self.sgl.keys[leader],
+                        **{f"normal_{name}": everyone[name][row, 0] for name in self._FIELDS},
+                    }
+                    for row, leader in enumerate(ranked)
+                ],
+            }
+        return payload
+
+
+def coverage_curve_for(points: DeliveryPoints) -> CoverageCurve:
+    """The ``CoverageCurve`` of a snapshot, built on first use."""
+    return points.derived(("coverage-curve", COVERAGE_CURVE_MAX_KM), CoverageCurve)
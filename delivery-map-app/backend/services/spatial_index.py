@@ -0,0 +1,146 @@
+"""
+Fixed-radius neighbour search over delivery coordinates.
+
+``GridIndex`` buckets a point set into square lat/lon cells at least
+``cell_km`` wide (the longitude step is widened for the highest latitude in
+the set) and keeps the points sorted by cell key. Any point within
+``cell_km`` of a query lies in the query's cell or one of its eight
+neighbours, so a radius query is nine binary searches plus an exact
+haversine check of the candidates: O(log N + k) per query point, done for
+all query points at once with numpy.
+
+``grid_for`` picks the cell size from a fixed ladder (``SPATIAL_GRID_BASE_KM``
+doubled until it covers the radius) and memoizes one grid per subset and
+cell size on the ``DeliveryPoints`` snapshot, so nearby radii share a grid.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from .benchmark_index import EARTH_RADIUS_KM
+from .delivery_points import DeliveryPoints
+
+SPATIAL_GRID_BASE_KM = float(os.getenv("SPATIAL_GRID_BASE_KM", "0.25"))
+# Candidate pairs materialized per batch; bounds memory for large radii.
+SPATIAL_MAX_BATCH_PAIRS = int(os.getenv("SPATIAL_MAX_BATCH_PAIRS", "2000000"))
+
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180.0
+_ROW_BITS = 24
+_ROW_OFFSET = 1 << (_ROW_BITS - 1)
+
+PairBatch = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def haversine_pairs_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Element-wise great-circle distances in km between two coordinate arrays (degrees)."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class GridIndex:
+    """Points bucketed into cells of at least ``cell_km``; ``ids`` maps grid rows back to point ids."""
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, cell_km: float, ids: Optional[np.ndarray] = None) -> None:
+        self.cell_km = cell_km
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.ids = np.arange(len(self.lat)) if ids is None else np.asarray(ids)
+        self.cell_lat = cell_km / KM_PER_DEGREE
+        top = float(np.abs(self.lat).max()) + self.cell_lat if len(self.lat) else 0.0
+        self.cell_lon = self.cell_lat / max(math.cos(math.radians(min(top, 89.0))), 1e-6)
+        keys = self._keys(*self._cells(self.lat, self.lon))
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def _cells(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return (np.floor(lon / self.cell_lon).astype(np.int64), np.floor(lat / self.cell_lat).astype(np.int64))
+
+    @staticmethod
+    def _keys(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+        return (cx << _ROW_BITS) + (cy + _ROW_OFFSET)
+
+    def pairs(self, lat: np.ndarray, lon: np.ndarray, radius_km: float,
+              breaks: Optional[np.ndarray] = None) -> Iterator[PairBatch]:
+        """
+        ``(query_rows, grid_rows, distance_km)`` batches of every pair within ``radius_km``.
+
+        Queries are processed in order, in batches of about ``SPATIAL_MAX_BATCH_PAIRS``
+        candidates; with ``breaks`` (sorted query positions) a batch only ends at one
+        of them, so callers can keep groups of queries in the same batch.
+        """
+        if radius_km > self.cell_km:
+            raise ValueError(f"radius {radius_km} km exceeds the grid cell size {self.cell_km} km")
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if not len(lat) or not len(self):
+            return
+        cx, cy = self._cells(lat, lon)
+        ranges = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = self._keys(cx + dx, cy + dy)
+                ranges.append((np.searchsorted(self.keys, keys, "left"), np.searchsorted(self.keys, keys, "right")))
+        counts = sum(hi - lo for lo, hi in ranges)
+        cumulative = np.cumsum(counts)
+
+        cuts = np.arange(len(lat) + 1) if breaks is None else np.union1d(np.asarray(breaks), [0, len(lat)])
+        start = 0
+        while start < len(lat):
+            base = cumulative[start - 1] if start else 0
+            limit = np.searchsorted(cumulative, base + SPATIAL_MAX_BATCH_PAIRS, "right")
+            stop = int(cuts[np.searchsorted(cuts, max(limit, start + 1), "right") - 1])
+            if stop <= start:
+                stop = int(cuts[np.searchsorted(cuts, start, "right")])
+            yield self._batch(lat, lon, ranges, start, stop, radius_km)
+            start = stop
+
+    def _batch(self, lat: np.ndarray, lon: np.ndarray, ranges, start: int, stop: int, radius_km: float) -> PairBatch:
+        queries, rows = [], []
+        window = np.arange(start, stop)
+        for lo, hi in ranges:
+            lo, n = lo[start:stop], (hi - lo)[start:stop]
+            total = int(n.sum())
+            if not total:
+                continue
+            first = np.cumsum(n) - n
+            queries.append(np.repeat(window, n))
+            rows.append(self.order[np.arange(total) - np.repeat(first, n) + np.repeat(lo, n)])
+        if not queries:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+        query_rows, grid_rows = np.concatenate(queries), np.concatenate(rows)
+        # Cheap planar pre-check (1% slack) before the exact haversine distance.
+        q_lat = lat[query_rows]
+        dy = (self.lat[grid_rows] - q_lat) * KM_PER_DEGREE
+        dx = (self.lon[grid_rows] - lon[query_rows]) * (KM_PER_DEGREE * np.cos(np.radians(q_lat)))
+        near = dx * dx + dy * dy <= (radius_km * 1.01) ** 2
+        query_rows, grid_rows = query_rows[near], grid_rows[near]
+        distance = haversine_pairs_km(lat[query_rows], lon[query_rows], self.lat[grid_rows], self.lon[grid_rows])
+        keep = distance <= radius_km
+        return query_rows[keep], grid_rows[keep], distance[keep]
+
+
+def grid_cell_km(radius_km: float) -> float:
+    """Smallest ``SPATIAL_GRID_BASE_KM * 2**k`` that is at least ``radius_km``."""
+    steps = max(0, math.ceil(math.log2(max(radius_km, 1e-9) / SPATIAL_GRID_BASE_KM)))
+    return SPATIAL_GRID_BASE_KM * 2 ** steps
+
+
+def grid_for(points: DeliveryPoints, sgl: bool, radius_km: float) -> GridIndex:
+    """Grid over the SGL (``sgl=True``) or normal locations of ``points`` usable for ``radius_km``."""
+    cell_km = grid_cell_km(radius_km)
+
+    def build(snapshot: DeliveryPoints) -> GridIndex:
+        ids = np.flatnonzero(snapshot.is_sgl if sgl else ~snapshot.is_sgl)
+        return GridIndex(snapshot.lat[ids], snapshot.lon[ids], cell_km, ids)
+
+    return points.derived(("grid", "sgl" if sgl else "normal", cell_km), build)
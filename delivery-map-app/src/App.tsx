@@ -10,6 +10,8 @@ import type {
   SglRetentionResponse,
   BenchmarkLocationsResponse,
   ProductCost,
+  CoverageAtRadius,
+  Weekday,
 } from './types';
 import { DataProcessor } from './utils/dataProcessor';
 import { ApiClient } from './utils/apiClient';
@@ -37,6 +39,40 @@ Icon.Default.mergeOptions({
 
 const WAREHOUSE_COORDINATE: [number, number] = [8.992697915198226, 38.821279561426266];
 
+/**
+ * Weekdays to request the backend SGL coverage for, or null when it cannot match the map.
+ * The backend filters both group types by one weekday set; any other active filter is
+ * counted over the filtered markers instead.
+ */
+function backendCoverageDays(filters: FilterOptions): Weekday[] | null {
+  const unbounded = (min: number, max: number) => min <= 1 && max >= 1000;
+  if (
+    filters.groupType !== 'all' ||
+    filters.searchTerm ||
+    !unbounded(filters.normalMinGroups, filters.normalMaxGroups) ||
+    !unbounded(filters.normalMinGroupsPerDay, filters.normalMaxGroupsPerDay) ||
+    !unbounded(filters.superMinGroups, filters.superMaxGroups) ||
+    !unbounded(filters.superMinGroupsPerDay, filters.superMaxGroupsPerDay)
+  ) {
+    return null;
+  }
+  const normalDays = [...filters.normalSelectedDays].sort();
+  const superDays = [...filters.superSelectedDays].sort();
+  return normalDays.join(',') === superDays.join(',') ? normalDays : null;
+}
+
+const haversineDistance = (lat1: number, lon1: number, lat2: number, lon2: number): number => {
+  const R = 6371; // Earth radius in km
+  const dLat = (lat2 - lat1) * Math.PI / 180;
+  const dLon = (lon2 - lon1) * Math.PI / 180;
+  const a =
+    Math.sin(dLat / 2) * Math.sin(dLat / 2) +
+    Math.cos(lat1 * Math.PI / 180) * Math.cos(lat2 * Math.PI / 180) *
+    Math.sin(dLon / 2) * Math.sin(dLon / 2);
+  const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
+  return R * c;
+};
+
 const applyForecastMultiplierToMarkers = (markers: MapMarker[], multiplier: number): MapMarker[] => {
   return markers.map(marker => {
     const baseOrders = marker.data.total_orders || 0;
@@ -98,6 +134,10 @@ function App() {
   // Always center on Addis Ababa, Ethiopia
   const [mapCenter, setMapCenter] = useState<[number, number]>([9.1450, 38.7667]);
   const [leaderAnalysis, setLeaderAnalysis] = useState<any[]>([]);
+  // Normal-group coverage per SGL leader at filters.radiusKm, from the backend for the active weekday filter.
+  const [leaderCoverage, setLeaderCoverage] = useState<Map<string, CoverageAtRadius>>(new Map());
+  const coverageDays = backendCoverageDays(filters);
+  const coverageDaysKey = coverageDays ? coverageDays.join(',') : null;
   const [activeSection, setActiveSection] = useState<NavigationSection>('overview');
   const [forecastMultiplier, setForecastMultiplier] = useState<number>(1);
   const [personaLeaders, setPersonaLeaders] = useState<PersonaLeader[]>([]);
@@ -182,6 +222,29 @@ function App() {
     }
   }, [data, statistics]);
 
+  useEffect(() => {
+    if (!filters.showTop15SuperLeaders || coverageDaysKey === null) {
+      return;
+    }
+    let cancelled = false;
+    const days = coverageDaysKey ? (coverageDaysKey.split(',') as Weekday[]) : [];
+    // The precomputed curve covers the whole week; a weekday filter needs the per-day coverage.
+    const request: Promise<CoverageAtRadius[]> = days.length > 0
+      ? ApiClient.getSpatialCoverage(filters.radiusKm, { days }).then(coverage => coverage.sgls)
+      : ApiClient.getSpatialCoverageCurve({ radiusKm: filters.radiusKm, stepKm: 0.5 })
+          .then(curve => curve.at_radius?.sgls ?? []);
+    request
+      .then(sgls => {
+        if (!cancelled) {
+          setLeaderCoverage(new Map(sgls.map(leader => [leader.group_created_by, leader])));
+        }
+      })
+      .catch(error => console.error('Failed to load SGL coverage:', error));
+    return () => {
+      cancelled = true;
+    };
+  }, [filters.showTop15SuperLeaders, filters.radiusKm, coverageDaysKey, data]);
+
   useEffect(() => {
     if (markers.length > 0) {
       const processor = new DataProcessor(data);
@@ -253,52 +316,43 @@ function App() {
         
         finalFilteredMarkers = [...normalGroupMarkers, ...top15SuperGroupMarkers];
         
-        // Calculate leader analysis with NG coverage within radius
-        const haversineDistance = (lat1: number, lon1: number, lat2: number, lon2: number): number => {
-          const R = 6371; // Earth radius in km
-          const dLat = (lat2 - lat1) * Math.PI / 180;
-          const dLon = (lon2 - lon1) * Math.PI / 180;
-          const a = 
-            Math.sin(dLat / 2) * Math.sin(dLat / 2) +
-            Math.cos(lat1 * Math.PI / 180) * Math.cos(lat2 * Math.PI / 180) *
-            Math.sin(dLon / 2) * Math.sin(dLon / 2);
-          const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
-          return R * c;
-        };
-        
+        // NG coverage within radius comes from the backend (see leaderCoverage) when it matches the
+        // active filters; otherwise it is counted over the filtered normal-group markers.
+        const useBackendCoverage = backendCoverageDays(filters) !== null;
         const analysis = top15LeaderIds.map((leaderId, index) => {
           const leaderMarkers = superGroupMarkers.filter(m => m.data.group_created_by === leaderId);
           const sgOrders = leaderMarkers.reduce((sum, m) => sum + m.data.total_orders, 0);
           const sgKg = leaderMarkers.reduce((sum, m) => sum + (m.data.total_kg || 0), 0);
-          
-          // Calculate NG coverage within radius
-          const ngCoverageSet = new Set<string>();
+
+          let ngLocationsInRadius = 0;
           let ngOrdersInRadius = 0;
           let ngKgInRadius = 0;
-          
-          leaderMarkers.forEach(sgMarker => {
-            if (sgMarker.data.latitude && sgMarker.data.longitude) {
-              normalGroupMarkers.forEach(ngMarker => {
-                if (ngMarker.data.latitude && ngMarker.data.longitude) {
-                  const distance = haversineDistance(
-                    sgMarker.data.latitude!,
-                    sgMarker.data.longitude!,
-                    ngMarker.data.latitude!,
-                    ngMarker.data.longitude!
-                  );
-                  
-                  if (distance <= filters.radiusKm) {
-                    const ngKey = `${ngMarker.data.delivery_location_name}_${ngMarker.data.group_created_by}`;
-                    if (!ngCoverageSet.has(ngKey)) {
-                      ngCoverageSet.add(ngKey);
-                      ngOrdersInRadius += ngMarker.data.total_orders;
-                      ngKgInRadius += ngMarker.data.total_kg || 0;
-                    }
-                  }
-                }
-              });
-            }
-          });
+          if (useBackendCoverage) {
+            const coverage = leaderCoverage.get(leaderId);
+            ngLocationsInRadius = coverage?.normal_locations ?? 0;
+            ngOrdersInRadius = coverage?.normal_orders ?? 0;
+            ngKgInRadius = coverage?.normal_kg ?? 0;
+          } else {
+            const sgPositions = leaderMarkers.filter(m => m.data.latitude && m.data.longitude);
+            normalGroupMarkers.forEach(ngMarker => {
+              if (!ngMarker.data.latitude || !ngMarker.data.longitude) {
+                return;
+              }
+              const inRadius = sgPositions.some(sgMarker =>
+                haversineDistance(
+                  sgMarker.data.latitude!,
+                  sgMarker.data.longitude!,
+                  ngMarker.data.latitude!,
+                  ngMarker.data.longitude!
+                ) <= filters.radiusKm
+              );
+              if (inRadius) {
+                ngLocationsInRadius += 1;
+                ngOrdersInRadius += ngMarker.data.total_orders;
+                ngKgInRadius += ngMarker.data.total_kg || 0;
+              }
+            });
+          }
           
           const totalPotential = sgOrders + ngOrdersInRadius;
           const growthFactor = sgOrders > 0 ? totalPotential / sgOrders : 0;
@@ -311,7 +365,7 @@ function App() {
             sgLocations: leaderMarkers.length,
             sgOrders,
             sgKg,
-            ngLocationsIn05km: ngCoverageSet.size,
+            ngLocationsIn05km: ngLocationsInRadius,
             ngOrdersIn05km: ngOrdersInRadius,
             ngKgIn05km: ngKgInRadius,
             totalPotential,
@@ -337,7 +391,7 @@ function App() {
         setMapCenter([9.1450, 38.7667]);
       }
     }
-  }, [filters, markers, data]);
+  }, [filters, markers, data, leaderCoverage]);
 
   useEffect(() => {
     if (!markers) {
@@ -1,11 +1,12 @@
 import React, { useState, useEffect, useMemo, useCallback } from 'react';
-import { MapContainer, TileLayer, Popup, CircleMarker, Circle, useMap, ZoomControl, Tooltip, Marker } from 'react-leaflet';
-import type { DeliveryData, MapMarker, FilterOptions, PersonaLeader } from '../types';
+import { MapContainer, TileLayer, Popup, CircleMarker, Circle, Rectangle, useMap, ZoomControl, Tooltip, Marker } from 'react-leaflet';
+import type { DeliveryData, MapMarker, FilterOptions, PersonaLeader, MapDensityResponse } from '../types';
 import { StatisticsPanel } from './StatisticsPanel';
 import { MapLegend } from './MapLegend';
 import { SimpleFilters } from './SimpleFilters';
 import { TopLeadersPanel } from './TopLeadersPanel';
 import L from 'leaflet';
+import { ApiClient } from '../utils/apiClient';
 
 interface SensitivityClusterSummary {
   id: number;
@@ -102,6 +103,8 @@ export const AnalyticsPage: React.FC<AnalyticsPageProps> = ({
   const [selectedMarker, setSelectedMarker] = useState<MapMarker | null>(null);
   const [showSensitivityClusters, setShowSensitivityClusters] = useState(false);
   const [showCorridors, setShowCorridors] = useState(false);
+  // Geohash density cells from the backend, shown instead of a per-point heatmap.
+  const [density, setDensity] = useState<MapDensityResponse | null>(null);
 
   const handleMarkerClick = (marker: MapMarker) => {
     setSelectedMarker(marker);
@@ -535,6 +538,24 @@ export const AnalyticsPage: React.FC<AnalyticsPageProps> = ({
     }
   }, [sensitivityInsights]);
 
+  useEffect(() => {
+    if (!filters.showHeatmap) {
+      setDensity(null);
+      return;
+    }
+    let cancelled = false;
+    ApiClient.getMapDensity({ category: filters.groupType })
+      .then(response => {
+        if (!cancelled) {
+          setDensity(response);
+        }
+      })
+      .catch(error => console.error('Failed to load map density:', error));
+    return () => {
+      cancelled = true;
+    };
+  }, [filters.showHeatmap, filters.groupType]);
+
   return (
     <div className="flex h-full">
       {/* Sidebar - Filters and Stats (conditionally hidden) */}
@@ -688,6 +709,23 @@ export const AnalyticsPage: React.FC<AnalyticsPageProps> = ({
             <MapUpdater center={mapCenter} />
             <ZoomControl position="topright" />
             
+            {density?.cells.map(cell => {
+              const intensity = density.max.orders > 0 ? cell.orders / density.max.orders : 0;
+              const [minLon, minLat, maxLon, maxLat] = cell.bounds;
+              return (
+                <Rectangle
+                  key={`density-${cell.id}`}
+                  bounds={[[minLat, minLon], [maxLat, maxLon]]}
+                  pathOptions={{ stroke: false, fillColor: '#ef4444', fillOpacity: 0.1 + 0.6 * intensity }}
+                >
+                  <Tooltip>
+                    {cell.locations} locations · {Math.round(cell.orders)} orders · {Math.round(cell.kg)} kg ·{' '}
+                    {Math.round(cell.sgl_share * 100)}% SGL
+                  </Tooltip>
+                </Rectangle>
+              );
+            })}
+
             {filteredMarkers.map((marker) => {
               const clusterColor =
                 hideFilters && marker.data.group_deal_category === 'SUPER_GROUPS'
@@ -4,17 +4,13 @@ import type {
   SimulationResult,
   ProductCost,
   SGLTier,
-  DeliveryData
+  SpatialConsolidationResponse
 } from '../../types';
 import { ApiClient } from '../../utils/apiClient';
 import { DataStore } from '../../utils/dataStore';
 import { ScenarioControls } from './ScenarioControls';
 import { ResultsComparison } from './ResultsComparison';
 
-const WAREHOUSE_COORD = {
-  lat: 8.992697915198226,
-  lon: 38.821279561426266
-};
 const PICKUP_RADIUS_KM = 0.5;
 const LOGISTICS_COST_PER_KG = 6.41;
 
@@ -27,109 +23,26 @@ interface PickupOptimizationResult {
   coveragePct: number;
 }
 
-const degToRad = (deg: number) => (deg * Math.PI) / 180;
-
-const haversineKm = (lat1: number, lon1: number, lat2: number, lon2: number): number => {
-  const R = 6371; // Earth radius in km
-  const dLat = degToRad(lat2 - lat1);
-  const dLon = degToRad(lon2 - lon1);
-  const a =
-    Math.sin(dLat / 2) * Math.sin(dLat / 2) +
-    Math.cos(degToRad(lat1)) * Math.cos(degToRad(lat2)) * Math.sin(dLon / 2) * Math.sin(dLon / 2);
-  const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1 - a));
-  return R * c;
-};
-
-const computePickupOptimization = (deliveryData: DeliveryData[]): PickupOptimizationResult | null => {
-  if (!deliveryData.length) {
-    return null;
-  }
-
-  const superLeaders = deliveryData.filter(
-    leader =>
-      leader.group_deal_category === 'SUPER_GROUPS' &&
-      typeof leader.latitude === 'number' &&
-      typeof leader.longitude === 'number'
-  );
-
-  const normalLeaders = deliveryData.filter(
-    leader =>
-      leader.group_deal_category === 'NORMAL_GROUPS' &&
-      typeof leader.latitude === 'number' &&
-      typeof leader.longitude === 'number'
-  );
-
-  if (!superLeaders.length || !normalLeaders.length) {
-    return null;
-  }
-
-  let baselineDistanceVolume = 0;
-  let optimizedDistanceVolume = 0;
-  let matchedVolumeKg = 0;
-  let totalNormalVolumeKg = 0;
-
-  const warehouseLat = WAREHOUSE_COORD.lat;
-  const warehouseLon = WAREHOUSE_COORD.lon;
-
-  // Precompute super leader distances to warehouse
-  const superWarehouseDistances = new Map<string, number>();
-  superLeaders.forEach(leader => {
-    const volume = leader.total_kg ?? 0;
-    if (volume <= 0) {
-      return;
-    }
-    const dist = haversineKm(warehouseLat, warehouseLon, leader.latitude!, leader.longitude!);
-    superWarehouseDistances.set(leader.group_created_by, dist);
-    baselineDistanceVolume += dist * volume;
-    optimizedDistanceVolume += dist * volume;
-  });
-
-  // Process normal leaders
-  normalLeaders.forEach(leader => {
-    const volume = leader.total_kg ?? 0;
-    if (volume <= 0) {
-      return;
-    }
-    const leaderDist = haversineKm(warehouseLat, warehouseLon, leader.latitude!, leader.longitude!);
-    baselineDistanceVolume += leaderDist * volume;
-    totalNormalVolumeKg += volume;
-
-    let assignedDist: number | null = null;
-    for (const sgl of superLeaders) {
-      const distanceToSGL = haversineKm(leader.latitude!, leader.longitude!, sgl.latitude!, sgl.longitude!);
-      if (distanceToSGL <= PICKUP_RADIUS_KM) {
-        const sglWarehouseDist =
-          superWarehouseDistances.get(sgl.group_created_by) ??
-          haversineKm(warehouseLat, warehouseLon, sgl.latitude!, sgl.longitude!);
-        assignedDist = sglWarehouseDist;
-        break;
-      }
-    }
-
-    if (assignedDist !== null) {
-      optimizedDistanceVolume += assignedDist * volume;
-      matchedVolumeKg += volume;
-    } else {
-      optimizedDistanceVolume += leaderDist * volume;
-    }
-  });
-
-  if (baselineDistanceVolume <= 0) {
+// Warehouse km x kg before/after moving normal locations to their SGL, from the backend consolidation engine.
+const computePickupOptimization = (
+  consolidation: SpatialConsolidationResponse
+): PickupOptimizationResult | null => {
+  const { network, logistics } = consolidation;
+  if (!network.sgl_leaders || !network.normal_locations || logistics.baseline_km_kg <= 0) {
     return null;
   }
 
-  const logisticsMultiplier = optimizedDistanceVolume / baselineDistanceVolume;
+  const logisticsMultiplier = logistics.multiplier;
   const adjustedLogisticsCost = LOGISTICS_COST_PER_KG * logisticsMultiplier;
   const savingsPerKg = LOGISTICS_COST_PER_KG - adjustedLogisticsCost;
-  const coveragePct = totalNormalVolumeKg > 0 ? matchedVolumeKg / totalNormalVolumeKg : 0;
 
   return {
     logisticsMultiplier,
     adjustedLogisticsCost,
     savingsPerKg,
-    matchedVolumeKg,
-    totalNormalVolumeKg,
-    coveragePct
+    matchedVolumeKg: network.assigned_kg,
+    totalNormalVolumeKg: network.normal_kg,
+    coveragePct: network.assigned_kg_pct
   };
 };
 
@@ -162,9 +75,12 @@ export const PlaygroundPage: React.FC = () => {
         await DataStore.loadAll();
       }
 
-      const [deliveryDataset, elasticityResponse] = await Promise.all([
-        ApiClient.getDeliveryData(),
-        ApiClient.getForecastElasticities().catch(() => ({ elasticities: {} }))
+      const [elasticityResponse, pickupConsolidation] = await Promise.all([
+        ApiClient.getForecastElasticities().catch(() => ({ elasticities: {} })),
+        ApiClient.getSpatialConsolidation({ radiusKm: PICKUP_RADIUS_KM }).catch(error => {
+          console.error('Failed to load SGL pickup consolidation:', error);
+          return null;
+        })
       ]);
 
       const loadedProducts = DataStore.getProductCosts();
@@ -177,7 +93,7 @@ export const PlaygroundPage: React.FC = () => {
       setVolumeData(weeklyVolumes);
       setLocalPrices(localShopPrices);
       setElasticities(elasticityResponse.elasticities || {});
-      setPickupOptimization(computePickupOptimization(deliveryDataset.records ?? []));
+      setPickupOptimization(pickupConsolidation ? computePickupOptimization(pickupConsolidation) : null);
     } catch (error) {
       console.error('Failed to load playground data:', error);
     } finally {
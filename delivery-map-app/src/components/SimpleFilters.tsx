@@ -278,6 +278,23 @@ export const SimpleFilters: React.FC<SimpleFiltersProps> = ({ filters, onFilterC
                     Shows all Normal Groups + all locations for top 15 Super Group leaders
                   </p>
                 </div>
+                {/* Density heatmap */}
+                <div className="pt-3 border-t border-gray-200">
+                  <label className="flex items-center space-x-2 mb-2">
+                    <input
+                      type="checkbox"
+                      checked={filters.showHeatmap}
+                      onChange={(e) => onFilterChange({ showHeatmap: e.target.checked })}
+                      className="rounded border-gray-300 text-red-600 focus:ring-red-500"
+                    />
+                    <span className="text-sm font-medium text-gray-700">
+                      Show Order Density Heatmap
+                    </span>
+                  </label>
+                  <p className="text-xs text-gray-500 mb-2 ml-6">
+                    Orders per ~1 km cell, shaded relative to the busiest cell
+                  </p>
+                </div>
                 <button
                   onClick={() => onFilterChange({
                     groupType: 'all',
@@ -294,7 +311,8 @@ export const SimpleFilters: React.FC<SimpleFiltersProps> = ({ filters, onFilterC
                     searchTerm: '',
                     showSuperGroupRadius: false,
                     radiusKm: 1,
-                    showTop15SuperLeaders: false
+                    showTop15SuperLeaders: false,
+                    showHeatmap: false
                   })}
                   className="w-full px-3 py-2 text-sm bg-gray-100 hover:bg-gray-200 text-gray-700 rounded transition-colors"
                 >
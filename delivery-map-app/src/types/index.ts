@@ -31,6 +31,271 @@ export interface DeliveryDataResponse {
     start: string;
     end: string;
   };
+  /** Why the payload is incomplete (database, sheet or replica unavailable), if it is. */
+  degraded?: string;
+}
+
+export type Weekday = 'monday' | 'tuesday' | 'wednesday' | 'thursday' | 'friday' | 'saturday' | 'sunday';
+
+export interface MapClusterQuery {
+  /** Viewport as [minLon, minLat, maxLon, maxLat]. */
+  bbox?: [number, number, number, number];
+  zoom: number;
+  category?: 'all' | 'NORMAL_GROUPS' | 'SUPER_GROUPS';
+  days?: Weekday[];
+}
+
+export interface MapCluster {
+  id: string;
+  lat: number;
+  lon: number;
+  count: number;
+  sgl_count: number;
+  normal_count: number;
+  orders: number;
+  kg: number;
+  members: number;
+  groups: number;
+  /** Zoom at which the cluster splits up. */
+  expansion_zoom: number;
+}
+
+export interface MapClusterPoint {
+  id: number;
+  lat: number;
+  lon: number;
+  sgl: boolean;
+  /** Orders on the requested days (all days without a filter). */
+  orders: number;
+  record: DeliveryData;
+}
+
+export interface MapClustersResponse {
+  version: string;
+  bbox: [number, number, number, number] | null;
+  category: string;
+  days: Weekday[];
+  max_cluster_zoom: number;
+  zoom: number;
+  clusters: MapCluster[];
+  points: MapClusterPoint[];
+  totals: { locations: number; orders: number; kg: number; members: number; groups: number };
+  /** True when more points were in view than the server returns. */
+  truncated: boolean;
+}
+
+export interface MapDensityQuery {
+  /** Geohash length of the cells (4-8); the server default is 6 (about 1.2 x 0.6 km). */
+  resolution?: number;
+  /** Viewport as [minLon, minLat, maxLon, maxLat]. */
+  bbox?: [number, number, number, number];
+  category?: 'all' | 'NORMAL_GROUPS' | 'SUPER_GROUPS';
+  days?: Weekday[];
+}
+
+export interface MapDensityCell {
+  /** Geohash of the cell. */
+  id: string;
+  /** Centroid of the cell's locations. */
+  lat: number;
+  lon: number;
+  /** [minLon, minLat, maxLon, maxLat] */
+  bounds: [number, number, number, number];
+  locations: number;
+  sgl_locations: number;
+  orders: number;
+  sgl_orders: number;
+  kg: number;
+  members: number;
+  /** SGL share of the cell's orders. */
+  sgl_share: number;
+  /** Orders per weekday, Monday first. */
+  weekday_orders: number[];
+}
+
+export interface MapDensityResponse {
+  version: string;
+  bbox: [number, number, number, number] | null;
+  category: string;
+  days: Weekday[];
+  resolution: number;
+  cell_km: { height: number; width: number };
+  cells: MapDensityCell[];
+  totals: {
+    cells: number;
+    locations: number;
+    sgl_locations: number;
+    orders: number;
+    sgl_orders: number;
+    kg: number;
+    members: number;
+  };
+  /** Largest cell values, for color scales. */
+  max: { orders: number; kg: number; locations: number };
+}
+
+export interface SpatialCoverageLeader {
+  group_created_by: string;
+  leader_name?: string | null;
+  leader_phone?: string | null;
+  sgl_locations: number;
+  sgl_orders: number;
+  sgl_kg: number;
+  /** [lat, lon] of each of the leader's SGL locations. */
+  locations: [number, number][];
+  normal_locations: number;
+  normal_orders: number;
+  normal_kg: number;
+  normal_members: number;
+}
+
+export interface SpatialCoverageAssignment {
+  group_created_by: string;
+  delivery_location_name: string;
+  sgl_group_created_by: string;
+  sgl_lat: number;
+  sgl_lon: number;
+  distance_km: number;
+}
+
+export interface SpatialCoverageResponse {
+  version: string;
+  radius_km: number;
+  days: Weekday[];
+  network: {
+    sgl_leaders: number;
+    sgl_locations: number;
+    normal_locations: number;
+    normal_orders: number;
+    normal_kg: number;
+    covered_locations: number;
+    covered_orders: number;
+    covered_kg: number;
+    covered_locations_pct: number;
+    covered_orders_pct: number;
+    covered_kg_pct: number;
+  };
+  /** SGL leaders by their own orders, with the normal-group locations within the radius. */
+  sgls: SpatialCoverageLeader[];
+  /** Nearest SGL location of each covered normal location (only with `assignments=true`). */
+  assignments?: SpatialCoverageAssignment[];
+}
+
+export interface CoverageCurveValues {
+  locations: number[];
+  orders: number[];
+  kg: number[];
+  members: number[];
+}
+
+export interface CoverageAtRadius {
+  group_created_by: string;
+  normal_locations: number;
+  normal_orders: number;
+  normal_kg: number;
+  normal_members: number;
+}
+
+export interface SpatialCoverageCurveResponse {
+  version: string;
+  max_radius_km: number;
+  /** Sampled radii; every curve array below has one value per radius. */
+  radius_km: number[];
+  /** Normal locations by distance to their nearest SGL location. */
+  network: CoverageCurveValues & {
+    normal_locations: number;
+    normal_orders: number;
+    normal_kg: number;
+    locations_pct: number[];
+    orders_pct: number[];
+    kg_pct: number[];
+  };
+  /** Curves of the largest SGL leaders by their own orders. */
+  sgls: (Omit<SpatialCoverageLeader, 'normal_locations' | 'normal_orders' | 'normal_kg' | 'normal_members'> &
+    CoverageCurveValues)[];
+  /** Every leader's coverage at the requested `radius_km`. */
+  at_radius?: {
+    radius_km: number;
+    network: { locations: number; orders: number; kg: number; members: number };
+    sgls: CoverageAtRadius[];
+  };
+}
+
+export interface ConsolidationQuery {
+  radiusKm?: number;
+  /** Most orders / kg per SGL leader, own volume included; unlimited when omitted. */
+  capacityOrders?: number;
+  capacityKg?: number;
+  /** Only the largest leaders by their own orders. */
+  top?: number;
+  days?: Weekday[];
+  /** Share of moved orders kept (0..1). */
+  retention?: number;
+  assignments?: boolean;
+}
+
+export interface ConsolidationLeader
+  extends Omit<SpatialCoverageLeader, 'normal_locations' | 'normal_orders' | 'normal_kg' | 'normal_members'> {
+  assigned_locations: number;
+  assigned_orders: number;
+  assigned_kg: number;
+  assigned_members: number;
+  load_orders: number;
+  load_kg: number;
+  orders_utilization: number | null;
+  kg_utilization: number | null;
+  mean_distance_km: number;
+  max_distance_km: number;
+  tier: 'bronze' | 'silver' | 'gold';
+  incentive: number;
+}
+
+export interface SpatialConsolidationResponse {
+  version: string;
+  radius_km: number;
+  days: Weekday[];
+  capacity: { orders: number | null; kg: number | null };
+  network: {
+    sgl_leaders: number;
+    normal_locations: number;
+    normal_orders: number;
+    normal_kg: number;
+    candidate_locations: number;
+    candidate_orders: number;
+    assigned_locations: number;
+    assigned_orders: number;
+    assigned_kg: number;
+    capacity_limited_locations: number;
+    capacity_limited_orders: number;
+    assigned_locations_pct: number;
+    assigned_orders_pct: number;
+    assigned_kg_pct: number;
+  };
+  /** Cost and revenue of the moved orders over the data window, in ETB. */
+  economics: {
+    retention: number;
+    moved_orders: number;
+    retained_orders: number;
+    lost_orders: number;
+    current_cost: number;
+    consolidated_cost: number;
+    incentive_cost: number;
+    cost_delta: number;
+    revenue_delta: number;
+    profit_delta: number;
+    cost_per_order: { current: number; consolidated: number; revenue: number };
+  };
+  /** Warehouse distance x volume of all deliveries, before and after consolidation. */
+  logistics: { baseline_km_kg: number; consolidated_km_kg: number; multiplier: number };
+  sgls: ConsolidationLeader[];
+  /** SGL location each assigned normal location moves to (only with `assignments=true`). */
+  assignments?: SpatialCoverageAssignment[];
+}
+
+/** Column layout of a row list (`format=columns`): each key is sent once with one value per row. */
+export interface ColumnarRows {
+  length: number;
+  columns: Record<string, unknown[]>;
 }
 
 export interface MapMarker {
@@ -190,6 +455,17 @@ export interface LocalShopPricesResponse {
   prices: LocalShopPriceEntry[];
 }
 
+export interface DashboardBootstrapResponse {
+  version: string;
+  sheet_version?: string | null;
+  generated_at: string;
+  costs: { products: ProductCost[] };
+  operational: { costs: OperationalCost[] };
+  tiers: { tiers: SGLTier[] };
+  metrics: ProductMetricsResponse;
+  local_prices: LocalShopPricesResponse;
+}
+
 export interface PersonaLeader {
   phone: string;
   leader_name?: string;
@@ -256,6 +532,15 @@ export interface SglRetentionWeek {
     sunday_etb?: number | null;
     sunday_pct?: number | null;
   };
+  new_leaders?: number;
+  reactivated_leaders?: number;
+  retention_curve?: SglRetentionCurvePoint[];
+}
+
+export interface SglRetentionCurvePoint {
+  weeks_after: number;
+  retained_pct: number | null;
+  returned_pct: number | null;
 }
 
 export interface SglRetentionProduct {
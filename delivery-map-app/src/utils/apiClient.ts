@@ -15,6 +15,7 @@ import type {
   SGLTier,
   ProductMetricsResponse,
   LocalShopPricesResponse,
+  DashboardBootstrapResponse,
   PersonaLeadersResponse,
   SglRetentionResponse,
   BenchmarkLocationsResponse,
@@ -27,6 +28,16 @@ import type {
   B2BCreditRiskDashboard,
   B2BPaymentBehavior,
   B2BProductProfitAnalysis,
+  ColumnarRows,
+  MapClusterQuery,
+  MapClustersResponse,
+  MapDensityQuery,
+  MapDensityResponse,
+  SpatialCoverageResponse,
+  SpatialCoverageCurveResponse,
+  ConsolidationQuery,
+  SpatialConsolidationResponse,
+  Weekday,
 } from '../types';
 
 function resolveApiBaseUrl(): string {
@@ -48,6 +59,19 @@ function resolveApiBaseUrl(): string {
 
 const API_BASE_URL = resolveApiBaseUrl();
 
+function rowsFromColumns<T>(table: ColumnarRows): T[] {
+  const names = Object.keys(table.columns);
+  const rows: T[] = new Array(table.length);
+  for (let i = 0; i < table.length; i++) {
+    const row: Record<string, unknown> = {};
+    for (const name of names) {
+      row[name] = table.columns[name][i];
+    }
+    rows[i] = row as T;
+  }
+  return rows;
+}
+
 export class ApiClient {
   private static async fetchWithErrorHandling<T>(url: string): Promise<T> {
     try {
@@ -66,7 +90,108 @@ export class ApiClient {
   }
 
   static async getDeliveryData(): Promise<DeliveryDataResponse> {
-    return await this.fetchWithErrorHandling<DeliveryDataResponse>(`${API_BASE_URL}/data`);
+    // Column layout avoids repeating the 23 record keys for every location.
+    const response = await this.fetchWithErrorHandling<
+      Omit<DeliveryDataResponse, 'records'> & { records: DeliveryDataResponse['records'] | ColumnarRows; layout?: string }
+    >(`${API_BASE_URL}/data?format=columns`);
+    const { records, layout, ...rest } = response;
+    if (layout === 'columns' && !Array.isArray(records)) {
+      return { ...rest, records: rowsFromColumns<DeliveryDataResponse['records'][number]>(records) };
+    }
+    return { ...rest, records: records as DeliveryDataResponse['records'] };
+  }
+
+  static async getMapClusters(query: MapClusterQuery): Promise<MapClustersResponse> {
+    const params = new URLSearchParams({ zoom: String(query.zoom) });
+    if (query.bbox) {
+      params.set('bbox', query.bbox.join(','));
+    }
+    if (query.category && query.category !== 'all') {
+      params.set('category', query.category);
+    }
+    if (query.days && query.days.length > 0) {
+      params.set('day', query.days.join(','));
+    }
+    return await this.fetchWithErrorHandling<MapClustersResponse>(`${API_BASE_URL}/map/clusters?${params.toString()}`);
+  }
+
+  static async getMapDensity(query: MapDensityQuery = {}): Promise<MapDensityResponse> {
+    const params = new URLSearchParams();
+    if (query.resolution !== undefined) {
+      params.set('resolution', String(query.resolution));
+    }
+    if (query.bbox) {
+      params.set('bbox', query.bbox.join(','));
+    }
+    if (query.category && query.category !== 'all') {
+      params.set('category', query.category);
+    }
+    if (query.days && query.days.length > 0) {
+      params.set('day', query.days.join(','));
+    }
+    const search = params.toString();
+    return await this.fetchWithErrorHandling<MapDensityResponse>(
+      `${API_BASE_URL}/map/density${search ? `?${search}` : ''}`
+    );
+  }
+
+  static async getSpatialCoverage(
+    radiusKm: number,
+    options: { assignments?: boolean; days?: Weekday[] } = {}
+  ): Promise<SpatialCoverageResponse> {
+    const params = new URLSearchParams({ radius_km: String(radiusKm) });
+    if (options.days && options.days.length > 0) {
+      params.set('day', options.days.join(','));
+    }
+    if (options.assignments) {
+      params.set('assignments', 'true');
+    }
+    return await this.fetchWithErrorHandling<SpatialCoverageResponse>(`${API_BASE_URL}/spatial/coverage?${params.toString()}`);
+  }
+
+  static async getSpatialCoverageCurve(
+    options: { stepKm?: number; top?: number; radiusKm?: number } = {}
+  ): Promise<SpatialCoverageCurveResponse> {
+    const params = new URLSearchParams();
+    if (options.stepKm !== undefined) {
+      params.set('step_km', String(options.stepKm));
+    }
+    if (options.top !== undefined) {
+      params.set('top', String(options.top));
+    }
+    if (options.radiusKm !== undefined) {
+      params.set('radius_km', String(options.radiusKm));
+    }
+    const query = params.toString();
+    return await this.fetchWithErrorHandling<SpatialCoverageCurveResponse>(
+      `${API_BASE_URL}/spatial/coverage-curve${query ? `?${query}` : ''}`
+    );
+  }
+
+  static async getSpatialConsolidation(query: ConsolidationQuery = {}): Promise<SpatialConsolidationResponse> {
+    const params = new URLSearchParams();
+    const numbers: [string, number | undefined][] = [
+      ['radius_km', query.radiusKm],
+      ['capacity_orders', query.capacityOrders],
+      ['capacity_kg', query.capacityKg],
+      ['top', query.top],
+      ['retention', query.retention],
+    ];
+    numbers.forEach(([key, value]) => {
+      if (value !== undefined) {
+        params.set(key, String(value));
+      }
+    });
+    if (query.days && query.days.length > 0) {
+      params.set('day', query.days.join(','));
+    }
+    if (query.assignments) {
+      params.set('assignments', 'true');
+    }
+    const search = params.toString();
+    return await this.fetchWithErrorHandling<SpatialConsolidationResponse>(
+      `${API_BASE_URL}/spatial/consolidation${search ? `?${search}` : ''}`
+    );
   }
 
   static async getStatistics(): Promise<Statistics> {
@@ -144,6 +269,10 @@ export class ApiClient {
     return await this.fetchWithErrorHandling<LocalShopPricesResponse>(`${API_BASE_URL}/benchmark/local-prices`);
   }
 
+  static async getDashboardBootstrap(): Promise<DashboardBootstrapResponse> {
+    return await this.fetchWithErrorHandling<DashboardBootstrapResponse>(`${API_BASE_URL}/dashboard/bootstrap`);
+  }
+
   static async getPersonaLeaders(): Promise<PersonaLeadersResponse> {
     return await this.fetchWithErrorHandling<PersonaLeadersResponse>(`${API_BASE_URL}/personas/leaders`);
   }
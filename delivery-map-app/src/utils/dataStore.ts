@@ -45,13 +45,7 @@ class DataStoreClass {
 
     this.loadingPromise = (async () => {
       try {
-        const [costsRes, operationalRes, tiersRes, metricsRes, localPricesRes] = await Promise.all([
-          ApiClient.getProductCosts(),
-          ApiClient.getOperationalCosts(),
-          ApiClient.getSGLTiers(),
-          ApiClient.getProductMetrics(),
-          ApiClient.getLocalShopPrices()
-        ]);
+        const { costsRes, operationalRes, tiersRes, metricsRes, localPricesRes } = await this.fetchInputs();
 
         this.productCosts = costsRes.products ?? [];
         this.operationalCosts = operationalRes.costs ?? [];
@@ -76,6 +70,29 @@ class DataStoreClass {
     await this.loadingPromise;
   }
 
+  private async fetchInputs() {
+    try {
+      const bootstrap = await ApiClient.getDashboardBootstrap();
+      return {
+        costsRes: bootstrap.costs,
+        operationalRes: bootstrap.operational,
+        tiersRes: bootstrap.tiers,
+        metricsRes: bootstrap.metrics,
+        localPricesRes: bootstrap.local_prices
+      };
+    } catch {
+      // Older backends without the bootstrap endpoint
+      const [costsRes, operationalRes, tiersRes, metricsRes, localPricesRes] = await Promise.all([
+        ApiClient.getProductCosts(),
+        ApiClient.getOperationalCosts(),
+        ApiClient.getSGLTiers(),
+        ApiClient.getProductMetrics(),
+        ApiClient.getLocalShopPrices()
+      ]);
+      return { costsRes, operationalRes, tiersRes, metricsRes, localPricesRes };
+    }
+  }
+
   async reload(): Promise<void> {
     this.loaded = false;
     this.loadingPromise = null;
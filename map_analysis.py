@@ -15,12 +15,26 @@ from typing import List, Tuple, Dict
 import webbrowser
 import os
 
+HEATMAP_RESOLUTION = 6  # geohash length: cells of about 1.2 x 0.6 km
+
+
+def geohash_cells(lat: np.ndarray, lon: np.ndarray, resolution: int = HEATMAP_RESOLUTION) -> np.ndarray:
+    """Integer id of the geohash cell (same grid as the backend's /api/map/density) of each point"""
+    bits = 5 * resolution
+    lon_bits, lat_bits = (bits + 1) // 2, bits // 2
+    lon_cells = np.floor((np.asarray(lon, dtype=float) + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64)
+    lat_cells = np.floor((np.asarray(lat, dtype=float) + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64)
+    lon_cells = np.clip(lon_cells, 0, (1 << lon_bits) - 1)
+    lat_cells = np.clip(lat_cells, 0, (1 << lat_bits) - 1)
+    return (lat_cells << lon_bits) | lon_cells
+
 class DeliveryMapAnalyzer:
     def __init__(self, csv_file_path: str):
         """Initialize the analyzer with CSV data"""
         self.csv_file_path = csv_file_path
         self.df = None
         self.map_center = None
+        self._density = {}
         self.load_data()
     
     def load_data(self):
@@ -51,6 +65,31 @@ class DeliveryMapAnalyzer:
             pass
         return 0.0, 0.0
     
+    def _density_cells(self, resolution: int = HEATMAP_RESOLUTION) -> List[Dict]:
+        """Geohash cells with their mean position and summed orders, kg and members (built once per resolution)"""
+        if resolution not in self._density:
+            located = self.df[(self.df['latitude'] != 0.0) & (self.df['longitude'] != 0.0)]
+            cells = located.assign(cell=geohash_cells(located['latitude'], located['longitude'], resolution))
+            self._density[resolution] = (
+                cells.groupby('cell')
+                .agg(
+                    lat=('latitude', 'mean'),
+                    lon=('longitude', 'mean'),
+                    locations=('latitude', 'size'),
+                    orders=('total_orders', 'sum'),
+                    kg=('total_kg', 'sum'),
+                    members=('unique_group_members', 'sum'),
+                )
+                .to_dict('records')
+            )
+        return self._density[resolution]
+    
+    def _heat_data(self, resolution: int = HEATMAP_RESOLUTION) -> List[List[float]]:
+        """[lat, lon, weight] per density cell, weighted by orders relative to the busiest cell"""
+        cells = self._density_cells(resolution)
+        peak = max((cell['orders'] for cell in cells), default=0) or 1
+        return [[cell['lat'], cell['lon'], cell['orders'] / peak] for cell in cells]
+    
     def create_basic_map(self) -> folium.Map:
         """Create a basic map with all delivery points"""
         print("Creating basic map...")
@@ -148,13 +187,8 @@ class DeliveryMapAnalyzer:
             tiles='OpenStreetMap'
         )
         
-        # Prepare heatmap data
-        heat_data = []
-        for idx, row in self.df.iterrows():
-            if row['latitude'] != 0.0 and row['longitude'] != 0.0:
-                # Weight by total orders
-                weight = min(1.0, row['total_orders'] / 100)
-                heat_data.append([row['latitude'], row['longitude'], weight])
+        # Heatmap from geohash density cells, weighted by orders
+        heat_data = self._heat_data()
         
         # Add heatmap layer
         plugins.HeatMap(
@@ -237,12 +271,8 @@ class DeliveryMapAnalyzer:
                     )
                 ).add_to(marker_cluster)
         
-        # 3. Add heatmap layer
-        heat_data = []
-        for idx, row in self.df.iterrows():
-            if row['latitude'] != 0.0 and row['longitude'] != 0.0:
-                weight = min(1.0, row['total_orders'] / 200)
-                heat_data.append([row['latitude'], row['longitude'], weight])
+        # 3. Add heatmap layer (geohash density cells)
+        heat_data = self._heat_data()
         
         plugins.HeatMap(
             heat_data,